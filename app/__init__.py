@@ -11,6 +11,17 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 cache = Cache()
 
+from app.events import events
+from app.wc_client import wc_pool
+from app.jobs import jobs
+from app.fc_costs import fc_costs
+from app.exchange_rates import exchange_rates
+from app.report_cache import report_cache
+from app.list_counts import list_counts
+from app.product_cache import product_cache
+from app.cache_stats import cache_stats
+from app.product_search import product_search
+
 def create_app(config_name=None):
     """Factory para crear la aplicación Flask"""
     
@@ -20,14 +31,20 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
 
-    # Configuración de caché
-    app.config['CACHE_TYPE'] = 'SimpleCache'  # Caché en memoria (para desarrollo)
-    app.config['CACHE_DEFAULT_TIMEOUT'] = 300  # 5 minutos por defecto
-
     # Inicializar extensiones
     db.init_app(app)
     login_manager.init_app(app)
     cache.init_app(app)
+    events.init_app(app)
+    wc_pool.init_app(app)
+    jobs.init_app(app)
+    fc_costs.init_app(app)
+    exchange_rates.init_app(app)
+    report_cache.init_app(app)
+    list_counts.init_app(app)
+    product_cache.init_app(app)
+    cache_stats.init_app(app)
+    product_search.init_app(app)
     
     # ========================================
     # MANEJAR RECONEXIÓN DE BD
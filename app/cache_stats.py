@@ -0,0 +1,117 @@
+# app/cache_stats.py
+"""
+Contadores de la caché por endpoint (aciertos, fallos, descartes)
+
+Las capas de caché (app/report_cache.py, app/product_cache.py,
+app/list_counts.py) llaman a cache_stats.record(nombre, evento):
+
+    - 'hit': respuesta servida desde la caché
+    - 'miss': no había entrada; se calculó
+    - 'eviction': había entrada pero se descartó (invalidada por una
+      escritura o desplazada del LRU local)
+
+Cada worker acumula en memoria y, cada CACHE_STATS_FLUSH_SECONDS, copia sus
+totales a la caché de la app (una clave por worker). snapshot() suma los
+workers registrados: con una caché compartida (CACHE_TYPE FileSystemCache o
+RedisCache) son los totales de todos los workers de gunicorn; con
+SimpleCache, solo los del worker que atiende el request.
+
+Uso:
+    cache_stats.record('reports.api_summary', 'hit')
+    cache_stats.snapshot()   # {'reports.api_summary': {'hit': 10, ...}, ...}
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+
+# Prefijo de las claves en la caché de la app
+KEY_PREFIX = 'cache_stats:'
+
+EVENTS = ('hit', 'miss', 'eviction')
+
+# Vigencia de los totales de un worker sin actividad (el registro se limpia solo)
+WORKER_TTL_SECONDS = 7 * 24 * 3600
+
+
+class CacheStats:
+    """Contadores por endpoint, acumulados por worker en la caché de la app."""
+
+    def __init__(self, app=None):
+        self.flush_seconds = 10
+        self._counters = defaultdict(lambda: dict.fromkeys(EVENTS, 0))
+        self._flushed_at = 0
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.flush_seconds = app.config.get('CACHE_STATS_FLUSH_SECONDS', 10)
+
+    def _cache(self):
+        from app import cache
+        return cache
+
+    @property
+    def _worker_key(self):
+        # Incluye el arranque: un pid reutilizado no suma los totales de otro proceso
+        return f'{KEY_PREFIX}worker:{os.getpid()}:{int(self._started_at)}'
+
+    def record(self, name, event, amount=1):
+        """Suma amount al evento ('hit', 'miss', 'eviction') del endpoint."""
+        with self._lock:
+            self._counters[name][event] += amount
+            due = time.time() - self._flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Copia los totales de este worker a la caché de la app."""
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            self._flushed_at = time.time()
+
+        try:
+            cache = self._cache()
+            cache.set(self._worker_key, counters, timeout=WORKER_TTL_SECONDS)
+            workers = cache.get(f'{KEY_PREFIX}workers') or []
+            if self._worker_key not in workers:
+                cache.set(f'{KEY_PREFIX}workers', workers + [self._worker_key], timeout=0)
+        except Exception:
+            # Las estadísticas nunca deben romper un request
+            pass
+
+    def snapshot(self):
+        """
+        Totales de todos los workers registrados.
+
+        Returns:
+            dict: {endpoint: {'hit', 'miss', 'eviction', 'hit_rate'}}
+        """
+        self.flush()
+        cache = self._cache()
+        workers = cache.get(f'{KEY_PREFIX}workers') or []
+        per_worker = cache.get_many(*workers) if workers else []
+
+        # Quitar del registro los workers cuyos totales ya vencieron
+        alive = [key for key, counters in zip(workers, per_worker) if counters is not None]
+        if len(alive) != len(workers):
+            cache.set(f'{KEY_PREFIX}workers', alive, timeout=0)
+
+        totals = defaultdict(lambda: dict.fromkeys(EVENTS, 0))
+        for counters in per_worker:
+            for name, values in (counters or {}).items():
+                for event in EVENTS:
+                    totals[name][event] += values.get(event, 0)
+
+        result = {}
+        for name in sorted(totals):
+            values = totals[name]
+            lookups = values['hit'] + values['miss']
+            result[name] = {**values, 'hit_rate': round(values['hit'] / lookups, 4) if lookups else None}
+        return result
+
+
+cache_stats = CacheStats()
@@ -0,0 +1,208 @@
+# app/events.py
+"""
+Difusión de eventos en tiempo real (Server-Sent Events)
+
+Los endpoints publican eventos DESPUÉS del commit (publish) y los clientes
+los reciben mediante un endpoint SSE que itera stream().
+
+Backends (config EVENTS_BACKEND):
+    - 'database': tabla woo_dispatch_events. Cada worker de gunicorn lee los
+      eventos nuevos por id, por lo que funciona con varios workers sin
+      servicios externos (valor por defecto).
+    - 'memory': cola en memoria del proceso. Solo sirve con un único
+      proceso (servidor de desarrollo).
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+
+class MemoryEventBackend:
+    """Eventos en memoria del proceso (un solo worker)."""
+
+    def __init__(self, max_events=1000):
+        self._events = deque(maxlen=max_events)
+        self._last_id = 0
+        self._condition = threading.Condition()
+
+    def publish(self, channel, event_type, payload):
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, channel, event_type, payload))
+            self._condition.notify_all()
+            return self._last_id
+
+    def last_id(self, channel):
+        return self._last_id
+
+    def read(self, channel, after_id, timeout):
+        """Espera hasta `timeout` segundos por eventos con id > after_id."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                events = [
+                    (event_id, event_type, payload)
+                    for event_id, event_channel, event_type, payload in self._events
+                    if event_channel == channel and event_id > after_id
+                ]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._condition.wait(remaining)
+
+
+class DatabaseEventBackend:
+    """
+    Eventos en la tabla woo_dispatch_events (compartida entre workers).
+
+    La lectura consulta por id (PK) cada `poll_interval` segundos usando una
+    conexión del pool solo durante la consulta, así un stream abierto no
+    retiene conexiones.
+    """
+
+    def __init__(self, db, poll_interval=1.0, retention_minutes=60):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.retention_minutes = retention_minutes
+        self._last_purge = 0
+
+    def publish(self, channel, event_type, payload):
+        with self.db.engine.begin() as conn:
+            result = conn.execute(text("""
+                INSERT INTO woo_dispatch_events (channel, event_type, payload, created_at)
+                VALUES (:channel, :event_type, :payload, :created_at)
+            """), {
+                'channel': channel,
+                'event_type': event_type,
+                'payload': payload,
+                'created_at': datetime.utcnow()
+            })
+            event_id = result.lastrowid
+
+            # Purgar eventos antiguos como máximo una vez por minuto
+            if time.monotonic() - self._last_purge > 60:
+                self._last_purge = time.monotonic()
+                conn.execute(
+                    text("DELETE FROM woo_dispatch_events WHERE created_at < :limit"),
+                    {'limit': datetime.utcnow() - timedelta(minutes=self.retention_minutes)}
+                )
+
+        return event_id
+
+    def last_id(self, channel):
+        with self.db.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT COALESCE(MAX(id), 0) FROM woo_dispatch_events WHERE channel = :channel"),
+                {'channel': channel}
+            ).scalar()
+
+    def read(self, channel, after_id, timeout):
+        """Consulta periódicamente hasta `timeout` segundos por eventos con id > after_id."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.db.engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT id, event_type, payload
+                    FROM woo_dispatch_events
+                    WHERE channel = :channel AND id > :after_id
+                    ORDER BY id
+                    LIMIT 100
+                """), {'channel': channel, 'after_id': after_id}).fetchall()
+
+            if rows or time.monotonic() + self.poll_interval > deadline:
+                return [(row[0], row[1], row[2]) for row in rows]
+
+            time.sleep(self.poll_interval)
+
+
+class EventBroadcaster:
+    """
+    Publica eventos y genera streams SSE.
+
+    Uso:
+        events.publish('dispatch', 'move', {'order_id': 123, ...})
+        Response(events.stream('dispatch', last_event_id), mimetype='text/event-stream')
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.logger = None
+        self.heartbeat = 15
+        self.max_stream_seconds = 55
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        backend = app.config.get('EVENTS_BACKEND', 'database')
+        if backend == 'memory':
+            self.backend = MemoryEventBackend()
+        elif backend == 'database':
+            self.backend = DatabaseEventBackend(
+                db,
+                poll_interval=app.config.get('EVENTS_POLL_INTERVAL', 1.0),
+                retention_minutes=app.config.get('EVENTS_RETENTION_MINUTES', 60)
+            )
+        else:
+            raise ValueError(f"EVENTS_BACKEND inválido: {backend}")
+
+        self.heartbeat = app.config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+        self.max_stream_seconds = app.config.get('EVENTS_MAX_STREAM_SECONDS', 55)
+        self.logger = app.logger
+
+    def publish(self, channel, event_type, data):
+        """
+        Publicar un evento. Llamar después del commit de la operación.
+
+        Nunca lanza excepción: un fallo al publicar no debe romper la
+        operación que ya se guardó (los clientes se recuperan con el
+        refresco periódico).
+        """
+        try:
+            return self.backend.publish(channel, event_type, json.dumps(data, default=str))
+        except Exception as e:
+            self.logger.warning(f"[EVENTS] No se pudo publicar {event_type} en {channel}: {str(e)}")
+            return None
+
+    def stream(self, channel, last_event_id=None):
+        """
+        Generador de mensajes SSE.
+
+        El stream se cierra tras max_stream_seconds (menor al timeout de
+        gunicorn); EventSource reconecta solo enviando Last-Event-ID, por lo
+        que no se pierden eventos entre conexiones.
+        """
+        try:
+            after_id = int(last_event_id)
+        except (TypeError, ValueError):
+            after_id = self.backend.last_id(channel)
+
+        deadline = time.monotonic() + self.max_stream_seconds
+
+        # Reintento de reconexión del navegador (ms)
+        yield 'retry: 2000\n\n'
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            events = self.backend.read(channel, after_id, min(self.heartbeat, remaining))
+
+            if not events:
+                # Comentario SSE para mantener viva la conexión en proxies
+                yield ': ping\n\n'
+                continue
+
+            for event_id, event_type, payload in events:
+                after_id = event_id
+                yield f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+
+
+events = EventBroadcaster()
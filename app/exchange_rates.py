@@ -0,0 +1,162 @@
+# app/exchange_rates.py
+"""
+Calendario de tipos de cambio USD/PEN compartido por el proceso
+
+La tasa de una fecha es la del último registro activo de woo_tipo_cambio
+con fecha <= a esa fecha (los fines de semana y feriados usan la tasa
+anterior). Antes cada reporte recorría todas las tasas por pedido
+(get_tc_for_date) o hacía ORDER BY fecha DESC LIMIT 1 por fila; aquí las
+tasas activas se cargan una vez en dos arreglos ordenados (fechas y
+registros) y se buscan con bisect: O(log n) por consulta.
+
+El calendario se recarga cuando api_create_exchange_rate llama a
+invalidate() y, para los demás workers, cuando cambia la firma de
+woo_tipo_cambio (revisada cada EXCHANGE_RATES_CHECK_SECONDS).
+
+Uso:
+    from app.exchange_rates import exchange_rates
+    tasa = exchange_rates.rate_for(fecha_pedido, default=3.8)
+    registro = exchange_rates.entry_for(fecha)   # id, fecha, tasa_compra, ...
+"""
+
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+# Registro del calendario (mismos atributos que TipoCambio, solo lectura)
+RateEntry = namedtuple('RateEntry', [
+    'id', 'fecha', 'tasa_compra', 'tasa_venta', 'tasa_promedio', 'actualizado_por', 'notas'
+])
+
+
+def _as_date(value):
+    """date, datetime o 'YYYY-MM-DD' -> date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class RateCalendar:
+    """Tasas activas ordenadas por fecha (inmutable)."""
+
+    def __init__(self, entries):
+        """
+        Args:
+            entries: Iterable de RateEntry (cualquier orden). Con varias
+                     tasas activas en la misma fecha se usa la de mayor id
+        """
+        by_date = {}
+        for entry in sorted(entries, key=lambda e: (e.fecha, e.id)):
+            by_date[entry.fecha] = entry
+
+        self.dates = sorted(by_date)
+        self.entries = [by_date[fecha] for fecha in self.dates]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry_for(self, fecha):
+        """Registro vigente en la fecha (None si es anterior a la primera tasa)."""
+        position = bisect_right(self.dates, _as_date(fecha))
+        return self.entries[position - 1] if position else None
+
+    def rate_for(self, fecha, field='tasa_promedio', default=None):
+        """Tasa vigente en la fecha como float (default si no hay)."""
+        entry = self.entry_for(fecha)
+        if entry is None:
+            return default
+        return float(getattr(entry, field))
+
+    def next_date(self, fecha):
+        """Primera fecha con tasa posterior a la indicada (None si no hay)."""
+        position = bisect_right(self.dates, _as_date(fecha))
+        return self.dates[position] if position < len(self.dates) else None
+
+    def latest(self):
+        """Registro más reciente (None si no hay tasas)."""
+        return self.entries[-1] if self.entries else None
+
+
+class ExchangeRateCalendar:
+    """
+    Calendario compartido con recarga automática.
+
+    Uso:
+        exchange_rates.rate_for('2025-03-15')
+        exchange_rates.invalidate()   # tras guardar una tasa
+    """
+
+    def __init__(self, app=None):
+        self.check_seconds = 30
+        self._calendar = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.check_seconds = app.config.get('EXCHANGE_RATES_CHECK_SECONDS', 30)
+
+    def _session(self):
+        from app import db
+        return db.session
+
+    def _read_signature(self, session):
+        """Firma de woo_tipo_cambio: cambia con altas, ediciones y (des)activaciones."""
+        return tuple(session.execute(text("""
+            SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', id, fecha, tasa_compra, tasa_venta, tasa_promedio, activo))), 0)
+            FROM woo_tipo_cambio
+        """)).fetchone())
+
+    def _load_calendar(self, session):
+        rows = session.execute(text("""
+            SELECT id, fecha, tasa_compra, tasa_venta, tasa_promedio, actualizado_por, notas
+            FROM woo_tipo_cambio
+            WHERE activo = TRUE
+        """)).fetchall()
+        return RateCalendar(RateEntry(*row) for row in rows)
+
+    @property
+    def calendar(self):
+        """Calendario vigente (se recarga si cambió la firma de la tabla)."""
+        now = time.monotonic()
+        if self._calendar is not None and now - self._checked_at < self.check_seconds:
+            return self._calendar
+
+        with self._lock:
+            if self._calendar is not None and now - self._checked_at < self.check_seconds:
+                return self._calendar
+
+            session = self._session()
+            signature = self._read_signature(session)
+            if self._calendar is None or signature != self._signature:
+                self._calendar = self._load_calendar(session)
+                self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._calendar
+
+    def invalidate(self):
+        """Fuerza la recarga del calendario en el próximo uso."""
+        with self._lock:
+            self._calendar = None
+            self._signature = None
+            self._checked_at = 0.0
+
+    def entry_for(self, fecha):
+        return self.calendar.entry_for(fecha)
+
+    def rate_for(self, fecha, field='tasa_promedio', default=None):
+        return self.calendar.rate_for(fecha, field, default)
+
+    def latest(self):
+        return self.calendar.latest()
+
+
+exchange_rates = ExchangeRateCalendar()
@@ -0,0 +1,183 @@
+# app/fc_costs.py
+"""
+Resolución de costos FC (Fishbowl) por SKU de WooCommerce
+
+El costo de un producto es la suma de FCLastCost de todos los SKU de
+woo_products_fccost (7 caracteres) contenidos en su SKU de Woo: un SKU de
+combo como 'ABC1234-XYZ5678' suma los costos de ABC1234 y XYZ5678.
+
+Antes cada reporte recorría el mapa completo de FC por cada item
+(`if fc_sku in sku`) o hacía LIKE CONCAT('%', fc.sku, '%') en subconsultas
+correlacionadas. Aquí:
+
+    - El mapa FC se indexa por SKU y se revisan solo las ventanas de 7
+      caracteres del SKU de Woo: O(len(sku)) en vez de O(tamaño de FC)
+    - La descomposición de cada SKU de Woo se calcula una vez y se memoriza
+    - El mapa se recarga cuando cambia la firma de woo_products_fccost
+      (revisada cada FC_COSTS_CHECK_SECONDS) o con invalidate()
+
+La memoria se indexa por el texto del SKU, no por producto: si cambia el
+_sku de un producto, el SKU nuevo simplemente no está memorizado y se
+descompone al primer uso.
+
+La comparación no distingue mayúsculas, igual que el LIKE con
+utf8mb4_unicode_520_ci de los reportes SQL.
+
+Uso:
+    from app.fc_costs import fc_costs
+    costo_unitario_usd = fc_costs.unit_cost(sku)
+    componentes = fc_costs.components(sku)   # ((fc_sku, costo), ...)
+"""
+
+import threading
+import time
+
+from sqlalchemy import text
+
+# Largo de los SKU de woo_products_fccost que se consideran componentes
+FC_SKU_LENGTH = 7
+
+
+class FCCostIndex:
+    """
+    Índice inmutable de costos FC.
+
+    Separado del resolver para poder construirlo desde filas cualquiera
+    (ver verify_fc_cost_resolver.py).
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: Iterable de (sku, FCLastCost), en el orden de la tabla
+        """
+        # Clave normalizada -> [(posición, sku, costo)]; la posición
+        # conserva el orden de suma del recorrido original del mapa
+        self._by_key = {}
+        by_sku = {}
+        for sku, cost in rows:
+            if sku is None:
+                continue
+            by_sku[sku] = float(cost or 0)
+
+        for position, (sku, cost) in enumerate(by_sku.items()):
+            self._by_key.setdefault(sku.upper(), []).append((position, sku, cost))
+
+        # Largos (en caracteres) a revisar; LENGTH() de MySQL cuenta bytes
+        self._lengths = sorted({len(key) for key in self._by_key})
+        self._memo = {}
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._by_key.values())
+
+    def components(self, sku):
+        """
+        Componentes FC contenidos en un SKU de Woo.
+
+        Returns:
+            tuple: ((fc_sku, costo), ...) en el orden de woo_products_fccost;
+                   vacío si el SKU no tiene componentes o es None
+        """
+        if not sku:
+            return ()
+
+        cached = self._memo.get(sku)
+        if cached is not None:
+            return cached
+
+        key = sku.upper()
+        found = {}
+        for length in self._lengths:
+            for start in range(len(key) - length + 1):
+                entries = self._by_key.get(key[start:start + length])
+                if entries:
+                    for position, fc_sku, cost in entries:
+                        found[position] = (fc_sku, cost)
+
+        result = tuple(found[position] for position in sorted(found))
+        self._memo[sku] = result
+        return result
+
+    def unit_cost(self, sku):
+        """Costo unitario en USD (0.0 si no hay componentes)."""
+        cost = 0.0
+        for _, component_cost in self.components(sku):
+            cost += component_cost
+        return cost
+
+
+class FCCostResolver:
+    """
+    Índice de costos FC compartido por los reportes, con recarga automática.
+
+    Uso:
+        fc_costs.unit_cost('ABC1234-XYZ5678')
+        fc_costs.invalidate()   # tras importar costos
+    """
+
+    def __init__(self, app=None):
+        self.check_seconds = 30
+        self._index = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.check_seconds = app.config.get('FC_COSTS_CHECK_SECONDS', 30)
+
+    def _session(self):
+        from app import db
+        return db.session
+
+    def _read_signature(self, session):
+        """Firma barata de woo_products_fccost: cambia con altas, bajas y cambios de costo."""
+        return tuple(session.execute(text("""
+            SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT(sku, '|', COALESCE(FCLastCost, '')))), 0)
+            FROM woo_products_fccost
+            WHERE LENGTH(sku) = :length
+        """), {'length': FC_SKU_LENGTH}).fetchone())
+
+    def _load_index(self, session):
+        rows = session.execute(text("""
+            SELECT sku, FCLastCost
+            FROM woo_products_fccost
+            WHERE LENGTH(sku) = :length
+        """), {'length': FC_SKU_LENGTH}).fetchall()
+        return FCCostIndex(rows)
+
+    @property
+    def index(self):
+        """Índice vigente (se recarga si cambió la firma de la tabla)."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.check_seconds:
+            return self._index
+
+        with self._lock:
+            if self._index is not None and now - self._checked_at < self.check_seconds:
+                return self._index
+
+            session = self._session()
+            signature = self._read_signature(session)
+            if self._index is None or signature != self._signature:
+                self._index = self._load_index(session)
+                self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        """Fuerza la recarga del índice en el próximo uso."""
+        with self._lock:
+            self._index = None
+            self._signature = None
+            self._checked_at = 0.0
+
+    def components(self, sku):
+        return self.index.components(sku)
+
+    def unit_cost(self, sku):
+        return self.index.unit_cost(sku)
+
+
+fc_costs = FCCostResolver()
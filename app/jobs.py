@@ -0,0 +1,499 @@
+# app/jobs.py
+"""
+Cola de trabajos en segundo plano (tracking masivo)
+
+Los endpoints encolan un trabajo con sus ítems (un ítem por pedido) y
+responden de inmediato con el job_id; el progreso se consulta en
+/dispatch/api/jobs/<id>.
+
+Almacenamiento (config JOBS_QUEUE_URI):
+    - None: tablas woo_dispatch_jobs / woo_dispatch_job_items en la BD de
+      la aplicación (MySQL, ver migrations/create_dispatch_jobs_tables.sql)
+    - 'sqlite:///ruta/jobs.db': archivo SQLite (pruebas locales); las
+      tablas se crean automáticamente
+
+Ejecución (config JOBS_EXECUTOR):
+    - 'thread': un hilo dentro del worker web que encoló el trabajo
+    - 'process': un proceso aparte (python run_jobs_worker.py) que toma
+      los trabajos de la cola
+
+Reanudación: cada ítem se marca al terminar y, mientras el trabajo corre,
+un hilo actualiza heartbeat_at cada JOBS_STALE_SECONDS / 4 (un lote con
+reintentos de la API puede tardar más que JOBS_STALE_SECONDS). Si el
+proceso que lo ejecutaba muere, el trabajo queda con heartbeat vencido y
+se retoma (solo ítems pendientes) por el worker de procesos o al consultar
+su estado en modo 'thread'.
+
+Idempotencia: cada ítem tiene idempotency_key (pedido + tracking). Un ítem
+cuya clave ya se completó en cualquier trabajo se marca 'skipped' sin
+volver a procesarse.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Integer, MetaData, String, Table, Text,
+    Index, create_engine, select, update, insert, func
+)
+
+# BIGINT en MySQL; INTEGER en SQLite (requerido para autoincrement)
+IdType = BigInteger().with_variant(Integer, 'sqlite')
+
+metadata = MetaData()
+
+jobs_table = Table(
+    'woo_dispatch_jobs', metadata,
+    Column('id', IdType, primary_key=True, autoincrement=True),
+    Column('job_type', String(50), nullable=False),
+    Column('status', String(20), nullable=False, default='queued'),  # queued, running, completed, failed
+    Column('params', Text),  # JSON
+    Column('total', Integer, nullable=False, default=0),
+    Column('processed', Integer, nullable=False, default=0),
+    Column('exitosos', Integer, nullable=False, default=0),
+    Column('fallidos', Integer, nullable=False, default=0),
+    Column('created_by', String(100)),
+    Column('created_at', DateTime, nullable=False),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+    Column('heartbeat_at', DateTime),
+    Column('error', Text),
+    Index('idx_status', 'status')
+)
+
+job_items_table = Table(
+    'woo_dispatch_job_items', metadata,
+    Column('id', IdType, primary_key=True, autoincrement=True),
+    Column('job_id', IdType, nullable=False),
+    Column('position', Integer, nullable=False),
+    Column('order_id', BigInteger, nullable=False),
+    Column('tracking_number', Text),
+    Column('idempotency_key', String(64), nullable=False),
+    Column('status', String(20), nullable=False, default='pending'),  # pending, done, failed, skipped
+    Column('result', Text),  # JSON
+    Column('processed_at', DateTime),
+    Index('idx_job_position', 'job_id', 'position'),
+    Index('idx_idempotency_status', 'idempotency_key', 'status')
+)
+
+
+def make_idempotency_key(order_id, reference):
+    """Clave de idempotencia: pedido + tracking (o referencia equivalente)."""
+    raw = f"{int(order_id)}:{reference or ''}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class JobContext:
+    """Trabajo en ejecución que recibe el handler."""
+
+    def __init__(self, queue, row):
+        self.queue = queue
+        self.id = row.id
+        self.job_type = row.job_type
+        self.params = json.loads(row.params) if row.params else {}
+        self.created_by = row.created_by
+
+    def pending_chunks(self, size):
+        """Itera los ítems pendientes en lotes de `size` (lee de la cola en cada lote)."""
+        while True:
+            with self.queue.engine.connect() as conn:
+                items = conn.execute(
+                    select(job_items_table)
+                    .where(job_items_table.c.job_id == self.id)
+                    .where(job_items_table.c.status == 'pending')
+                    .order_by(job_items_table.c.position)
+                    .limit(size)
+                ).fetchall()
+
+            if not items:
+                return
+            yield items
+
+    def record(self, item_id, success, result):
+        """Marca un ítem como terminado y actualiza contadores y heartbeat."""
+        self.record_many([(item_id, success, result)])
+
+    def record_many(self, outcomes):
+        """
+        Marca varios ítems como terminados en una sola transacción.
+
+        Args:
+            outcomes: Lista de tuplas (item_id, success, result)
+        """
+        if not outcomes:
+            return
+
+        now = datetime.utcnow()
+        exitosos = sum(1 for _, success, _ in outcomes if success)
+
+        with self.queue.engine.begin() as conn:
+            for item_id, success, result in outcomes:
+                conn.execute(
+                    update(job_items_table)
+                    .where(job_items_table.c.id == item_id)
+                    .values(
+                        status='done' if success else 'failed',
+                        result=json.dumps(result, default=str),
+                        processed_at=now
+                    )
+                )
+            conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id == self.id)
+                .values(
+                    processed=jobs_table.c.processed + len(outcomes),
+                    exitosos=jobs_table.c.exitosos + exitosos,
+                    fallidos=jobs_table.c.fallidos + (len(outcomes) - exitosos),
+                    heartbeat_at=now
+                )
+            )
+
+
+class JobQueue:
+    """
+    Registro de handlers, encolado y ejecución de trabajos.
+
+    Uso:
+        @jobs.handler('bulk_tracking')
+        def bulk_tracking_job(job):
+            for items in job.pending_chunks(10):
+                ...
+                job.record(item.id, True, {...})
+
+        job_id = jobs.enqueue('bulk_tracking', items, params, created_by)
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self._engine = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.queue_uri = app.config.get('JOBS_QUEUE_URI')
+        self.executor = app.config.get('JOBS_EXECUTOR', 'thread')
+        self.stale_seconds = app.config.get('JOBS_STALE_SECONDS', 120)
+        self.poll_interval = app.config.get('JOBS_POLL_INTERVAL', 2)
+
+        if self.executor not in ('thread', 'process'):
+            raise ValueError(f"JOBS_EXECUTOR inválido: {self.executor}")
+
+    @property
+    def engine(self):
+        """Engine de la cola: SQLite propio si JOBS_QUEUE_URI, si no la BD de la app."""
+        if self.queue_uri is None:
+            from app import db
+            return db.engine
+
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine = create_engine(self.queue_uri)
+                    metadata.create_all(engine)
+                    self._engine = engine
+        return self._engine
+
+    def handler(self, job_type):
+        """Decorador para registrar el handler de un tipo de trabajo."""
+        def decorator(f):
+            self.handlers[job_type] = f
+            return f
+        return decorator
+
+    # ------------------------------------------------------------
+    # Encolado y consulta
+    # ------------------------------------------------------------
+
+    def enqueue(self, job_type, items, params=None, created_by=None):
+        """
+        Encola un trabajo.
+
+        Args:
+            items: Lista de {'order_id', 'tracking_number', 'key' (opcional)}.
+                   'key' reemplaza al tracking en la clave de idempotencia
+            params: Parámetros del trabajo (JSON)
+
+        Returns:
+            int: ID del trabajo
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"Tipo de trabajo no registrado: {job_type}")
+
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            job_id = conn.execute(insert(jobs_table).values(
+                job_type=job_type,
+                status='queued',
+                params=json.dumps(params or {}, default=str),
+                total=len(items),
+                processed=0,
+                exitosos=0,
+                fallidos=0,
+                created_by=created_by,
+                created_at=now
+            )).inserted_primary_key[0]
+
+            if items:
+                conn.execute(insert(job_items_table), [
+                    {
+                        'job_id': job_id,
+                        'position': position,
+                        'order_id': int(item['order_id']),
+                        'tracking_number': item.get('tracking_number'),
+                        'idempotency_key': make_idempotency_key(
+                            item['order_id'], item.get('key') or item.get('tracking_number')
+                        ),
+                        'status': 'pending'
+                    }
+                    for position, item in enumerate(items)
+                ])
+
+        self.app.logger.info(f"[JOBS] Trabajo {job_id} ({job_type}) encolado: {len(items)} ítems")
+
+        if self.executor == 'thread':
+            self.start_thread(job_id)
+
+        return job_id
+
+    def get(self, job_id):
+        """
+        Estado del trabajo con el resultado de cada ítem.
+
+        Returns:
+            dict o None si no existe
+        """
+        with self.engine.connect() as conn:
+            job = conn.execute(select(jobs_table).where(jobs_table.c.id == job_id)).fetchone()
+            if job is None:
+                return None
+
+            items = conn.execute(
+                select(job_items_table)
+                .where(job_items_table.c.job_id == job_id)
+                .order_by(job_items_table.c.position)
+            ).fetchall()
+
+        # Modo hilo: retomar trabajos huérfanos (worker reiniciado)
+        if self.executor == 'thread' and self._is_stale(job):
+            self.start_thread(job_id)
+
+        return {
+            'id': job.id,
+            'type': job.job_type,
+            'status': job.status,
+            'total': job.total,
+            'processed': job.processed,
+            'exitosos': job.exitosos,
+            'fallidos': job.fallidos,
+            'created_by': job.created_by,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'error': job.error,
+            'items': [
+                {
+                    'order_id': item.order_id,
+                    'tracking_number': item.tracking_number,
+                    'status': item.status,
+                    'result': json.loads(item.result) if item.result else None
+                }
+                for item in items
+            ]
+        }
+
+    def active_job_id(self, job_type):
+        """ID del trabajo de ese tipo en cola o en ejecución (None si no hay)."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(jobs_table.c.id)
+                .where(jobs_table.c.job_type == job_type)
+                .where(jobs_table.c.status.in_(('queued', 'running')))
+                .order_by(jobs_table.c.id)
+                .limit(1)
+            ).scalar()
+
+    # ------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------
+
+    def _stale_limit(self):
+        return datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+
+    def _is_stale(self, job):
+        if job.status == 'running':
+            return job.heartbeat_at is None or job.heartbeat_at < self._stale_limit()
+        if job.status == 'queued':
+            return job.created_at < self._stale_limit()
+        return False
+
+    def _claim(self, job_id):
+        """Marca el trabajo como 'running' si está en cola o huérfano. Atómico."""
+        now = datetime.utcnow()
+        stale = self._stale_limit()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id == job_id)
+                .where(
+                    (jobs_table.c.status == 'queued') |
+                    ((jobs_table.c.status == 'running') & (
+                        jobs_table.c.heartbeat_at.is_(None) | (jobs_table.c.heartbeat_at < stale)
+                    ))
+                )
+                .values(
+                    status='running',
+                    started_at=func.coalesce(jobs_table.c.started_at, now),
+                    heartbeat_at=now
+                )
+            )
+            return result.rowcount == 1
+
+    def _skip_completed_items(self, job_id):
+        """Idempotencia: ítems pendientes cuya clave ya se completó en otro ítem."""
+        with self.engine.begin() as conn:
+            pending = conn.execute(
+                select(job_items_table.c.id, job_items_table.c.idempotency_key)
+                .where(job_items_table.c.job_id == job_id)
+                .where(job_items_table.c.status == 'pending')
+            ).fetchall()
+            if not pending:
+                return
+
+            done = dict(conn.execute(
+                select(job_items_table.c.idempotency_key, job_items_table.c.result)
+                .where(job_items_table.c.idempotency_key.in_([item.idempotency_key for item in pending]))
+                .where(job_items_table.c.status == 'done')
+            ).fetchall())
+
+            skipped = 0
+            for item in pending:
+                if item.idempotency_key not in done:
+                    continue
+                previous = json.loads(done[item.idempotency_key]) if done[item.idempotency_key] else {}
+                previous['mensaje'] = 'Ya procesado anteriormente (omitido)'
+                conn.execute(
+                    update(job_items_table)
+                    .where(job_items_table.c.id == item.id)
+                    .values(status='skipped', result=json.dumps(previous, default=str), processed_at=datetime.utcnow())
+                )
+                skipped += 1
+
+            if skipped:
+                conn.execute(
+                    update(jobs_table)
+                    .where(jobs_table.c.id == job_id)
+                    .values(
+                        processed=jobs_table.c.processed + skipped,
+                        exitosos=jobs_table.c.exitosos + skipped
+                    )
+                )
+
+    def _finish(self, job_id, status, error=None):
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id == job_id)
+                .values(status=status, error=error, finished_at=datetime.utcnow())
+            )
+
+    def _heartbeat_loop(self, job_id, stop):
+        """Actualiza heartbeat_at del trabajo hasta que se active `stop`."""
+        interval = max(1, self.stale_seconds / 4)
+        with self.app.app_context():
+            while not stop.wait(interval):
+                try:
+                    with self.engine.begin() as conn:
+                        conn.execute(
+                            update(jobs_table)
+                            .where(jobs_table.c.id == job_id)
+                            .where(jobs_table.c.status == 'running')
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+                except Exception as e:
+                    self.app.logger.warning(f"[JOBS] No se pudo actualizar el heartbeat del trabajo {job_id}: {str(e)}")
+
+    def run(self, job_id):
+        """
+        Ejecuta (o retoma) un trabajo. Requiere contexto de aplicación.
+
+        Returns:
+            bool: False si otro proceso ya lo está ejecutando
+        """
+        from app import db
+
+        if not self._claim(job_id):
+            return False
+
+        with self.engine.connect() as conn:
+            row = conn.execute(select(jobs_table).where(jobs_table.c.id == job_id)).fetchone()
+
+        self.app.logger.info(f"[JOBS] Ejecutando trabajo {job_id} ({row.job_type})")
+
+        # Heartbeat independiente de los lotes: el trabajo no queda huérfano
+        # mientras este proceso siga vivo
+        stop_heartbeat = threading.Event()
+        threading.Thread(
+            target=self._heartbeat_loop, args=(job_id, stop_heartbeat),
+            name=f'job-{job_id}-heartbeat', daemon=True
+        ).start()
+
+        try:
+            self._skip_completed_items(job_id)
+            self.handlers[row.job_type](JobContext(self, row))
+            self._finish(job_id, 'completed')
+            self.app.logger.info(f"[JOBS] Trabajo {job_id} completado")
+        except Exception as e:
+            db.session.rollback()
+            self._finish(job_id, 'failed', str(e))
+            self.app.logger.error(f"[JOBS] Trabajo {job_id} falló: {str(e)}")
+        finally:
+            stop_heartbeat.set()
+            db.session.remove()
+
+        return True
+
+    def start_thread(self, job_id):
+        """Ejecuta el trabajo en un hilo del proceso actual."""
+        app = self.app
+
+        def target():
+            with app.app_context():
+                self.run(job_id)
+
+        threading.Thread(target=target, name=f'job-{job_id}', daemon=True).start()
+
+    def next_job_id(self):
+        """Siguiente trabajo en cola o huérfano (para el worker de procesos)."""
+        stale = self._stale_limit()
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(jobs_table.c.id)
+                .where(
+                    (jobs_table.c.status == 'queued') |
+                    ((jobs_table.c.status == 'running') & (
+                        jobs_table.c.heartbeat_at.is_(None) | (jobs_table.c.heartbeat_at < stale)
+                    ))
+                )
+                .order_by(jobs_table.c.id)
+                .limit(1)
+            ).scalar()
+
+    def run_worker(self):
+        """Bucle del worker de procesos (run_jobs_worker.py)."""
+        self.app.logger.info(f"[JOBS] Worker iniciado (cola: {self.queue_uri or 'BD de la aplicación'})")
+        with self.app.app_context():
+            while True:
+                job_id = self.next_job_id()
+                if job_id is None:
+                    time.sleep(self.poll_interval)
+                    continue
+                self.run(job_id)
+
+
+jobs = JobQueue()
@@ -0,0 +1,122 @@
+# app/list_counts.py
+"""
+Totales de los listados de pedidos (caché por firma de filtros)
+
+Cada página de los listados ejecutaba un COUNT(DISTINCT o.id) con los
+mismos JOIN que la consulta de la página, aunque solo cambiara el número
+de página. Aquí el total se guarda en la caché de la app por listado +
+filtros:
+
+    - Hasta LIST_COUNT_FRESH_SECONDS: se usa tal cual
+    - Hasta LIST_COUNT_MAX_AGE_SECONDS: se devuelve como estimación
+      (total_estimated) y se recalcula en un hilo en segundo plano
+    - Sin valor (o más antiguo): se calcula en el request
+
+Las escrituras de pedidos llaman a invalidate(listado), que cambia la
+generación del listado: los totales anteriores dejan de usarse.
+
+Uso:
+    total, estimated = list_counts.count('whatsapp', filters, compute)
+    list_counts.invalidate('whatsapp')
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from app.cache_stats import cache_stats
+
+# Prefijo de las claves en la caché de la app
+KEY_PREFIX = 'list_counts:'
+
+
+class ListCounts:
+    """Totales por listado y filtros con recálculo en segundo plano."""
+
+    def __init__(self, app=None):
+        self.fresh_seconds = 60
+        self.max_age_seconds = 900
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.fresh_seconds = app.config.get('LIST_COUNT_FRESH_SECONDS', 60)
+        self.max_age_seconds = app.config.get('LIST_COUNT_MAX_AGE_SECONDS', 900)
+        self._app = app
+
+    def _cache(self):
+        from app import cache
+        return cache
+
+    def _key(self, name, filters):
+        generation = self._cache().get(f'{KEY_PREFIX}generation:{name}') or 0
+        signature = hashlib.sha1(json.dumps(filters, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return f'{KEY_PREFIX}{name}:{generation}:{signature}'
+
+    def _store(self, key, total):
+        self._cache().set(key, (total, time.time()), timeout=self.max_age_seconds)
+
+    def _refresh_async(self, key, compute):
+        """Recalcula un total en un hilo (uno por clave a la vez)."""
+        with self._lock:
+            if key in self._refreshing or self._app is None:
+                return
+            self._refreshing.add(key)
+
+        app = self._app
+
+        def refresh():
+            from app import db
+            with app.app_context():
+                try:
+                    self._store(key, compute())
+                except Exception as e:
+                    app.logger.warning(f"Could not refresh list count {key}: {str(e)}")
+                finally:
+                    db.session.remove()
+                    with self._lock:
+                        self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f'list-count-{key[-8:]}', daemon=True).start()
+
+    def count(self, name, filters, compute):
+        """
+        Total de un listado.
+
+        Args:
+            name: Listado ('whatsapp', 'woocommerce', 'external')
+            filters: dict con los filtros aplicados (firma del total)
+            compute: Función sin argumentos que ejecuta el COUNT. Puede
+                     ejecutarse en otro hilo: debe usar db.session (no
+                     objetos ligados al request)
+
+        Returns:
+            tuple: (total, estimated)
+        """
+        key = self._key(name, filters)
+        entry = self._cache().get(key)
+        stats_name = f'list_counts.{name}'
+
+        if entry is not None:
+            cache_stats.record(stats_name, 'hit')
+            total, computed_at = entry
+            if time.time() - computed_at < self.fresh_seconds:
+                return total, False
+            self._refresh_async(key, compute)
+            return total, True
+
+        cache_stats.record(stats_name, 'miss')
+        total = compute()
+        self._store(key, total)
+        return total, False
+
+    def invalidate(self, name):
+        """Descarta los totales de un listado (tras crear/editar/eliminar pedidos)."""
+        self._cache().set(f'{KEY_PREFIX}generation:{name}', time.time(), timeout=0)
+
+
+list_counts = ListCounts()
@@ -46,11 +46,23 @@ class Product(db.Model):
     def __init__(self, *args, **kwargs):
         super(Product, self).__init__(*args, **kwargs)
         self._meta_cache = {}
+        self._meta_loaded = False
+        self._image_url_cache = None
+        self._image_loaded = False
+        self._variations_cache = None
+        self._variations_count = None
 
     @db.orm.reconstructor
     def init_on_load(self):
         self._meta_cache = {}
+        # True cuando ya se cargaron todos los metadatos (las claves ausentes no existen)
+        self._meta_loaded = False
         self._image_url_cache = None
+        # True cuando preload_images_for_products ya resolvió la imagen (aunque sea None)
+        self._image_loaded = False
+        # Variaciones / cantidad precargadas (preload_variations_for_products, preload_variation_counts)
+        self._variations_cache = None
+        self._variations_count = None
 
     def get_meta(self, key):
         """
@@ -62,6 +74,9 @@ class Product(db.Model):
             
         if key in self._meta_cache:
             return self._meta_cache[key]
+
+        if getattr(self, '_meta_loaded', False):
+            return None
             
         meta = self.product_meta.filter_by(meta_key=key).first()
         value = meta.meta_value if meta else None
@@ -84,6 +99,12 @@ class Product(db.Model):
         metas = query.all()
         for meta in metas:
             self._meta_cache[meta.meta_key] = meta.meta_value
+
+        if meta_keys:
+            for key in meta_keys:
+                self._meta_cache.setdefault(key, None)
+        else:
+            self._meta_loaded = True
             
         return self._meta_cache
 
@@ -116,6 +137,13 @@ class Product(db.Model):
                 product._meta_cache = {}
             product._meta_cache.update(meta_map.get(product.ID, {}))
 
+            # Las claves sin fila no existen: evitar una consulta por producto en get_meta
+            if meta_keys:
+                for key in meta_keys:
+                    product._meta_cache.setdefault(key, None)
+            else:
+                product._meta_loaded = True
+
     def set_meta(self, key, value):
         """
         Método útil para establecer o actualizar un metadato
@@ -143,6 +171,10 @@ class Product(db.Model):
         if hasattr(self, '_image_url_cache') and self._image_url_cache:
             return self._image_url_cache
 
+        # Ya resuelta en bulk por preload_images_for_products (incluida la herencia del padre)
+        if getattr(self, '_image_loaded', False):
+            return self._image_url_cache
+
         try:
             from sqlalchemy import text
             
@@ -187,30 +219,22 @@ class Product(db.Model):
             return None
 
     @staticmethod
-    def preload_images_for_products(products):
+    def image_urls_for_attachments(attachment_ids):
         """
-        Carga las URLs de imágenes para una lista de productos en UNA sola consulta.
+        Obtiene las URLs de una lista de adjuntos (thumbnail_id) en UNA sola consulta.
+
+        Retorna un diccionario {attachment_id (int): url}
         """
-        if not products:
-            return
-            
-        # 1. Identificar thumbnail_ids únicos
-        thumbnail_ids = []
-        for p in products:
-            if not hasattr(p, '_image_url_cache'):
-                p._image_url_cache = None
-            
-            tid = p.get_meta('_thumbnail_id')
-            if tid:
-                try:
-                    thumbnail_ids.append(int(tid))
-                except:
-                    pass
-        
-        if not thumbnail_ids:
-            return
-            
-        # 2. Consultar todos los _wp_attached_file en una vez
+        ids = set()
+        for attachment_id in attachment_ids:
+            try:
+                ids.add(int(attachment_id))
+            except (TypeError, ValueError):
+                pass
+
+        if not ids:
+            return {}
+
         from sqlalchemy import text
         image_query = text("""
             SELECT post_id, meta_value
@@ -218,40 +242,178 @@ class Product(db.Model):
             WHERE post_id IN :ids
             AND meta_key = '_wp_attached_file'
         """)
-        
-        result = db.session.execute(image_query, {'ids': tuple(set(thumbnail_ids))})
-        
-        # 3. Mapear IDs a URLs
+
+        result = db.session.execute(image_query, {'ids': tuple(ids)})
+
         base_url = 'https://www.izistoreperu.com/wp-content/uploads/'
-        image_map = {row[0]: base_url + row[1] for row in result if row[1]}
-        
-        # 4. Asignar a la caché de cada producto
+        return {int(row[0]): base_url + row[1] for row in result if row[1]}
+
+    @staticmethod
+    def preload_images_for_products(products, inherit_parent=False):
+        """
+        Carga las URLs de imágenes para una lista de productos en bulk.
+
+        Con inherit_parent=True, las variaciones sin imagen propia heredan la
+        del producto padre (como get_image_url), sin consultar cada padre:
+        los _thumbnail_id de los padres que no están en la lista se leen en
+        una sola consulta adicional.
+        """
+        if not products:
+            return
+
+        # 1. Identificar thumbnail_ids propios (usa la caché de metas)
+        own_thumbnails = {}
         for p in products:
+            if not hasattr(p, '_image_url_cache'):
+                p._image_url_cache = None
+
             tid = p.get_meta('_thumbnail_id')
             if tid:
-                p._image_url_cache = image_map.get(int(tid))
-    
+                try:
+                    own_thumbnails[p.ID] = int(tid)
+                except (TypeError, ValueError):
+                    pass
+
+        # 2. Variaciones sin imagen propia: thumbnail del padre
+        inheriting = []
+        parent_thumbnails = {}
+        if inherit_parent:
+            inheriting = [
+                p for p in products
+                if p.ID not in own_thumbnails and p.post_type == 'product_variation' and p.post_parent
+            ]
+            loaded = {p.ID: p for p in products}
+            missing_parents = set()
+            for p in inheriting:
+                if p.post_parent in loaded:
+                    if p.post_parent in own_thumbnails:
+                        parent_thumbnails[p.post_parent] = own_thumbnails[p.post_parent]
+                else:
+                    missing_parents.add(p.post_parent)
+
+            if missing_parents:
+                from sqlalchemy import text
+                parents_query = text("""
+                    SELECT post_id, meta_value
+                    FROM wpyz_postmeta
+                    WHERE post_id IN :ids
+                    AND meta_key = '_thumbnail_id'
+                """)
+                result = db.session.execute(parents_query, {'ids': tuple(missing_parents)})
+                for row in result:
+                    try:
+                        parent_thumbnails[row[0]] = int(row[1])
+                    except (TypeError, ValueError):
+                        pass
+
+        # 3. Consultar todos los _wp_attached_file en una vez
+        image_map = Product.image_urls_for_attachments(
+            list(own_thumbnails.values()) + list(parent_thumbnails.values())
+        )
+
+        # 4. Asignar a la caché de cada producto
+        for p in products:
+            if p.ID in own_thumbnails:
+                p._image_url_cache = image_map.get(own_thumbnails[p.ID])
+                p._image_loaded = True
+            elif p.post_type != 'product_variation' or not p.post_parent:
+                p._image_url_cache = None
+                p._image_loaded = True
+
+        for p in inheriting:
+            tid = parent_thumbnails.get(p.post_parent)
+            p._image_url_cache = image_map.get(tid) if tid else None
+            p._image_loaded = True
+
+    @staticmethod
+    def preload_variation_counts(products):
+        """
+        Cuenta las variaciones de una lista de productos en UNA sola consulta.
+
+        Después, is_variable() y variations_count() no consultan la base de datos.
+        """
+        if not products:
+            return
+
+        from sqlalchemy import func
+        product_ids = [p.ID for p in products]
+        rows = db.session.query(
+            Product.post_parent,
+            func.count(Product.ID)
+        ).filter(
+            Product.post_type == 'product_variation',
+            Product.post_parent.in_(product_ids)
+        ).group_by(Product.post_parent).all()
+
+        counts = {row[0]: row[1] for row in rows}
+        for p in products:
+            p._variations_count = counts.get(p.ID, 0)
+
+    @staticmethod
+    def preload_variations_for_products(products):
+        """
+        Carga las variaciones de una lista de productos en UNA sola consulta.
+
+        Después, get_variations(), is_variable() y variations_count() usan la
+        caché. Retorna la lista de todas las variaciones cargadas (útil para
+        precargar sus metadatos e imágenes).
+        """
+        if not products:
+            return []
+
+        product_ids = [p.ID for p in products]
+        variations = Product.query.filter(
+            Product.post_type == 'product_variation',
+            Product.post_parent.in_(product_ids)
+        ).order_by(Product.ID.asc()).all()
+
+        # Organizar por producto padre
+        variations_map = {}
+        for variation in variations:
+            variations_map.setdefault(variation.post_parent, []).append(variation)
+
+        for p in products:
+            p._variations_cache = variations_map.get(p.ID, [])
+            p._variations_count = len(p._variations_cache)
+
+        return variations
+
     def get_variations(self):
         """
         Obtener todas las variaciones de este producto
         
         Retorna una lista de objetos Product con post_type='product_variation'
+        (usa la caché de preload_variations_for_products si existe)
         """
-        return Product.query.filter_by(
+        if getattr(self, '_variations_cache', None) is not None:
+            return self._variations_cache
+
+        self._variations_cache = Product.query.filter_by(
             post_type='product_variation',
             post_parent=self.ID
-        ).all()
-    
+        ).order_by(Product.ID.asc()).all()
+        self._variations_count = len(self._variations_cache)
+        return self._variations_cache
+
+    def variations_count(self):
+        """
+        Cantidad de variaciones de este producto
+        (usa la caché de preload_variation_counts si existe)
+        """
+        if getattr(self, '_variations_count', None) is None:
+            self._variations_count = Product.query.filter_by(
+                post_type='product_variation',
+                post_parent=self.ID
+            ).count()
+        return self._variations_count
+
     def is_variable(self):
         """
         Verificar si este producto es variable (tiene variaciones)
         
         Retorna True si tiene variaciones, False si no
         """
-        return Product.query.filter_by(
-            post_type='product_variation',
-            post_parent=self.ID
-        ).count() > 0
+        return self.variations_count() > 0
 
 
 class ProductMeta(db.Model):
@@ -742,28 +904,21 @@ class TipoCambio(db.Model):
 
     @staticmethod
     def get_tasa_actual():
-        """Obtener tasa de cambio actual (más reciente activa)"""
-        return TipoCambio.query.filter_by(activo=True).order_by(TipoCambio.fecha.desc()).first()
+        """Obtener tasa de cambio actual (más reciente activa, del calendario compartido)"""
+        from app.exchange_rates import exchange_rates
+        return exchange_rates.latest()
 
     @staticmethod
     def get_tasa_por_fecha(fecha):
-        """Obtener tasa de cambio para una fecha específica"""
-        # Buscar tasa exacta de esa fecha
-        tasa = TipoCambio.query.filter(
-            TipoCambio.fecha == fecha,
-            TipoCambio.activo == True
-        ).first()
-
-        if tasa:
-            return tasa
-
-        # Si no existe, buscar la más cercana anterior
-        tasa = TipoCambio.query.filter(
-            TipoCambio.fecha <= fecha,
-            TipoCambio.activo == True
-        ).order_by(TipoCambio.fecha.desc()).first()
+        """
+        Obtener tasa de cambio para una fecha específica: la de esa fecha o,
+        si no existe, la más cercana anterior.
 
-        return tasa
+        Se resuelve con el calendario compartido (app/exchange_rates.py) y
+        devuelve un RateEntry de solo lectura con los mismos atributos.
+        """
+        from app.exchange_rates import exchange_rates
+        return exchange_rates.entry_for(fecha)
 
 
 class ExpenseDetail(db.Model):
@@ -1124,6 +1279,9 @@ class DispatchPriority(db.Model):
     marked_at = db.Column(db.DateTime)
     priority_note = db.Column(db.Text)
 
+    # Última modificación (cursor incremental del tablero)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     # Relación con Order
     order = db.relationship('Order', backref=db.backref('dispatch_priority', uselist=False))
 
@@ -1147,6 +1305,186 @@ class DispatchPriority(db.Model):
         }
 
 
+class DispatchBoard(db.Model):
+    """
+    Snapshot materializado del tablero Kanban de despacho
+
+    Tabla: woo_dispatch_board
+    Propósito: Una fila por pedido activo con la columna actual, prioridad,
+    atendido, COD, costo de envío y datos del cliente. Se actualiza en la
+    misma transacción que los movimientos del tablero (ver
+    dispatch.sync_board_orders) para que leer el tablero sea un solo scan.
+    """
+    __tablename__ = 'woo_dispatch_board'
+
+    order_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    order_number = db.Column(db.String(50), nullable=False)
+    whatsapp_number = db.Column(db.String(50))
+
+    # Ubicación en el tablero
+    board_column = db.Column(db.String(100), nullable=False, default='Por Asignar')
+    shipping_method = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False)
+
+    # Fechas del pedido (GMT)
+    date_created_gmt = db.Column(db.DateTime)
+    source_updated_gmt = db.Column(db.DateTime)
+
+    # Cliente
+    total_amount = db.Column(db.Numeric(26, 8))
+    billing_email = db.Column(db.String(320))
+    first_name = db.Column(db.String(255))
+    last_name = db.Column(db.String(255))
+    phone = db.Column(db.String(100))
+    shipping_district = db.Column(db.String(255))
+    created_by = db.Column(db.String(100))
+
+    # Estado de despacho
+    is_priority = db.Column(db.Boolean, default=False, nullable=False)
+    priority_level = db.Column(db.Enum('normal', 'high', 'urgent', name='priority_level_enum'), default='normal')
+    is_atendido = db.Column(db.Boolean, default=False, nullable=False)
+    is_cod = db.Column(db.Boolean, default=False, nullable=False)
+    shipping_cost = db.Column(db.Numeric(10, 2), default=0)
+
+    # Última sincronización (UTC, cursor incremental del tablero)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DispatchBoard Order:{self.order_number} Column:{self.board_column}>'
+
+
+class ShalomDniIndex(db.Model):
+    """
+    Índice de pedidos por DNI para el tracking masivo Shalom
+
+    Tabla: woo_shalom_dni_index
+    Propósito: Una fila por pedido reciente (ventana SHALOM_DNI_LOOKUP_DAYS)
+    con el DNI de facturación normalizado (dni_key). dni_key solo se llena
+    para pedidos Shalom en wc-processing/wc-completed con DNI válido, así el
+    preview busca únicamente los DNIs del Excel por índice. Se actualiza de
+    forma incremental (ver dispatch.refresh_shalom_dni_index).
+    """
+    __tablename__ = 'woo_shalom_dni_index'
+
+    order_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    dni_key = db.Column(db.String(20), index=True)  # normalize_dni(dni)[0] (sin ceros iniciales)
+    dni_original = db.Column(db.String(100))
+    order_number = db.Column(db.String(50), nullable=False)
+    customer_name = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False)
+    date_created_gmt = db.Column(db.DateTime)
+    source_updated_gmt = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<ShalomDniIndex Order:{self.order_number} DNI:{self.dni_key}>'
+
+
+class OrderProfitFact(db.Model):
+    """
+    Hechos de ganancia por pedido y por línea
+
+    Tabla: woo_order_profit_facts
+    Propósito: Read model de los reportes de ganancias. Por cada pedido hay
+    una fila de cabecera (order_item_id = 0) y una fila por line_item, con
+    los montos, el costo FC (USD) ya resuelto y el tipo de cambio del día
+    (Lima). Se actualiza de forma incremental por date_updated_gmt y se
+    reconstruye a pedido (ver app/profit_facts.py).
+    """
+    __tablename__ = 'woo_order_profit_facts'
+
+    order_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    order_item_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # 0 = cabecera
+
+    # Comunes (cabecera y líneas)
+    order_type = db.Column(db.String(20))
+    status = db.Column(db.String(20), nullable=False)
+    fecha_lima = db.Column(db.Date, index=True)       # DATE(date_created_gmt - 5h)
+    date_created_gmt = db.Column(db.DateTime)
+    order_number = db.Column(db.String(50))           # _order_number (NULL = pedido web)
+    created_by = db.Column(db.String(100))
+    tipo_cambio = db.Column(db.Numeric(10, 4))        # Última tasa activa <= fecha_lima (NULL si no hay)
+
+    # Cabecera
+    total_amount = db.Column(db.Numeric(12, 2))
+    tax_amount = db.Column(db.Numeric(12, 2))
+    shipping_cost = db.Column(db.Numeric(12, 2))
+    discount_amount = db.Column(db.Numeric(12, 2))
+    payment_method_label = db.Column(db.String(255))  # COALESCE(payment_method_title, payment_method, 'N/A')
+    cost_usd = db.Column(db.Float)                    # Suma de las líneas con costo FC (NULL si ninguna)
+    items_count = db.Column(db.Integer)
+    billing_first_name = db.Column(db.String(255))
+    billing_last_name = db.Column(db.String(255))
+    billing_company = db.Column(db.String(255))
+    billing_doc_type = db.Column(db.String(20))
+    billing_business_name = db.Column(db.String(255))
+    is_community = db.Column(db.String(10))
+
+    # Líneas
+    product_name = db.Column(db.String(255))
+    sku = db.Column(db.String(100))
+    qty = db.Column(db.Numeric(10, 2))
+    line_subtotal = db.Column(db.Numeric(12, 2))
+    line_subtotal_tax = db.Column(db.Numeric(12, 2))
+    line_total = db.Column(db.Numeric(12, 2))
+    line_tax = db.Column(db.Numeric(12, 2))
+    unit_cost_usd = db.Column(db.Float)               # Suma de componentes FC del SKU (NULL si ninguno)
+
+    source_updated_gmt = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<OrderProfitFact Order:{self.order_id} Item:{self.order_item_id}>'
+
+
+class SalesDaily(db.Model):
+    """
+    Resumen diario de ventas
+
+    Tabla: woo_sales_daily
+    Propósito: Read model de los reportes de series de tiempo. Una fila por
+    día (Lima), canal (woocommerce / whatsapp / external), estado, método
+    de pago y asesor, con pedidos y montos sumados. Se recalcula por día
+    al sincronizar los hechos de ganancia (ver app/sales_daily.py).
+    """
+    __tablename__ = 'woo_sales_daily'
+
+    fecha_lima = db.Column(db.Date, primary_key=True)
+    channel = db.Column(db.String(20), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    payment_method = db.Column(db.String(255), primary_key=True)
+    advisor = db.Column(db.String(100), primary_key=True)  # '' = sin _created_by
+
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2))
+    discount_amount = db.Column(db.Numeric(14, 2))
+    shipping_cost = db.Column(db.Numeric(14, 2))
+    cost_pen = db.Column(db.Float)                     # SUM(cost_usd * tipo_cambio); NULL en externos
+    refreshed_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<SalesDaily {self.fecha_lima} {self.channel} {self.status}: {self.orders_count}>'
+
+
+class DispatchEvent(db.Model):
+    """
+    Eventos en tiempo real del tablero de despacho
+
+    Tabla: woo_dispatch_events
+    Propósito: Backend 'database' de app.events. Los workers de gunicorn
+    leen los eventos nuevos por id para enviarlos por SSE. Se purgan
+    automáticamente después de EVENTS_RETENTION_MINUTES.
+    """
+    __tablename__ = 'woo_dispatch_events'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    channel = db.Column(db.String(50), nullable=False, default='dispatch')
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DispatchEvent {self.id} {self.event_type}>'
+
+
 # =====================================================================
 # MODELO PARA REGISTRO DE ENVÍOS CHAMO
 # =====================================================================
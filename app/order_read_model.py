@@ -0,0 +1,255 @@
+# app/order_read_model.py
+"""
+Modelo de lectura de pedidos (HPOS)
+
+Muchas vistas arman la misma "vista de pedido": un LEFT JOIN a
+wpyz_wc_orders_meta por cada meta_key, las dos direcciones y una subconsulta
+correlacionada para el método de envío. Aquí se reemplaza por un loader en
+lote:
+
+    1. El endpoint obtiene los IDs (filtros, orden y paginación en SQL)
+    2. load_orders() trae solo los campos pedidos con una consulta por
+       fuente (wpyz_wc_orders, meta, direcciones, items), todas por IN
+
+Uso:
+    order_ids = [...]   # ya filtrados y ordenados
+    orders = load_orders(order_ids, ['order_number', 'status', 'billing_first_name', 'shipping_method'])
+    for order_id in order_ids:
+        order = orders.get(order_id)   # dict con 'id' + campos pedidos
+
+Campos disponibles: ORDER_COLUMNS, META_FIELDS, billing_*/shipping_* de
+ADDRESS_COLUMNS e ITEM_FIELDS.
+"""
+
+from sqlalchemy import text
+
+# Columnas de wpyz_wc_orders
+ORDER_COLUMNS = (
+    'status',
+    'type',
+    'currency',
+    'total_amount',
+    'tax_amount',
+    'billing_email',
+    'payment_method',
+    'payment_method_title',
+    'customer_id',
+    'date_created_gmt',
+    'date_updated_gmt'
+)
+
+# Campo -> meta_key de wpyz_wc_orders_meta
+META_FIELDS = {
+    'order_number': '_order_number',
+    'created_by': '_created_by',
+    'is_cod': '_is_cod',
+    'is_community': '_is_community',
+    'order_source': '_order_source',
+    'tracking_number': '_tracking_number',
+    'billing_entrega': '_billing_entrega',
+    'billing_doc_type': '_billing_doc_type',
+    'billing_business_name': '_billing_business_name',
+    'billing_sexo': '_billing_sexo',
+    'discount_amount': '_wc_discount_amount',
+    'payment_method_meta': '_payment_method'
+}
+
+# Columnas de wpyz_wc_order_addresses (campo = '<address_type>_<columna>')
+ADDRESS_COLUMNS = (
+    'first_name',
+    'last_name',
+    'company',
+    'address_1',
+    'address_2',
+    'city',
+    'state',
+    'postcode',
+    'country',
+    'phone'
+)
+ADDRESS_TYPES = ('billing', 'shipping')
+
+# Campos derivados de wpyz_woocommerce_order_items
+ITEM_FIELDS = (
+    'shipping_method',   # Nombre del primer item de envío
+    'shipping_cost',     # Suma del meta 'cost' de los items de envío
+    'items_count'        # Cantidad de line_items
+)
+
+# IDs por consulta
+LOAD_CHUNK = 1000
+
+
+def _split_fields(fields):
+    """Agrupa los campos pedidos por tabla de origen (valida nombres)."""
+    order_columns = []
+    meta_fields = []
+    address_fields = {}
+    item_fields = []
+
+    for field in fields:
+        if field in ORDER_COLUMNS:
+            order_columns.append(field)
+        elif field in META_FIELDS:
+            meta_fields.append(field)
+        elif field in ITEM_FIELDS:
+            item_fields.append(field)
+        else:
+            address_type, _, column = field.partition('_')
+            if address_type not in ADDRESS_TYPES or column not in ADDRESS_COLUMNS:
+                raise ValueError(f"Campo de pedido desconocido: {field}")
+            address_fields.setdefault(address_type, []).append((field, column))
+
+    return order_columns, meta_fields, address_fields, item_fields
+
+
+def _load_chunk(session, order_ids, order_columns, meta_fields, address_fields, item_fields):
+    params = {'order_ids': tuple(order_ids)}
+
+    # 1. wpyz_wc_orders (también define qué pedidos existen)
+    rows = session.execute(text(f"""
+        SELECT id{''.join(f', {column}' for column in order_columns)}
+        FROM wpyz_wc_orders
+        WHERE id IN :order_ids
+    """), params).fetchall()
+
+    orders = {}
+    for row in rows:
+        order = {'id': row[0]}
+        order.update(zip(order_columns, row[1:]))
+        for field in meta_fields:
+            order[field] = None
+        for fields in address_fields.values():
+            for field, _ in fields:
+                order[field] = None
+        orders[row[0]] = order
+
+    if not orders:
+        return orders
+
+    # 2. Meta en una sola consulta, pivoteada aquí. Con meta_key repetido
+    #    se usa el primero (igual que get_meta de WooCommerce)
+    if meta_fields:
+        field_by_key = {META_FIELDS[field]: field for field in meta_fields}
+        meta_rows = session.execute(text("""
+            SELECT order_id, meta_key, meta_value
+            FROM wpyz_wc_orders_meta
+            WHERE order_id IN :order_ids
+              AND meta_key IN :meta_keys
+            ORDER BY id
+        """), {**params, 'meta_keys': tuple(field_by_key)}).fetchall()
+
+        seen = set()
+        for order_id, meta_key, meta_value in meta_rows:
+            if (order_id, meta_key) in seen or order_id not in orders:
+                continue
+            seen.add((order_id, meta_key))
+            orders[order_id][field_by_key[meta_key]] = meta_value
+
+    # 3. Direcciones (billing y/o shipping)
+    if address_fields:
+        columns = sorted({column for fields in address_fields.values() for _, column in fields})
+        address_rows = session.execute(text(f"""
+            SELECT order_id, address_type, {', '.join(columns)}
+            FROM wpyz_wc_order_addresses
+            WHERE order_id IN :order_ids
+              AND address_type IN :address_types
+        """), {**params, 'address_types': tuple(address_fields)}).fetchall()
+
+        for row in address_rows:
+            order = orders.get(row[0])
+            if order is None:
+                continue
+            values = dict(zip(columns, row[2:]))
+            for field, column in address_fields[row[1]]:
+                order[field] = values[column]
+
+    # 4. Derivados de los items
+    if item_fields:
+        for order in orders.values():
+            if 'shipping_method' in item_fields:
+                order['shipping_method'] = None
+            if 'shipping_cost' in item_fields:
+                order['shipping_cost'] = 0
+            if 'items_count' in item_fields:
+                order['items_count'] = 0
+
+        if 'shipping_method' in item_fields or 'items_count' in item_fields:
+            item_rows = session.execute(text("""
+                SELECT order_id, order_item_type, order_item_name
+                FROM wpyz_woocommerce_order_items
+                WHERE order_id IN :order_ids
+                  AND order_item_type IN ('shipping', 'line_item')
+                ORDER BY order_item_id
+            """), params).fetchall()
+
+            for order_id, item_type, item_name in item_rows:
+                order = orders.get(order_id)
+                if order is None:
+                    continue
+                if item_type == 'line_item':
+                    if 'items_count' in item_fields:
+                        order['items_count'] += 1
+                elif 'shipping_method' in item_fields and order['shipping_method'] is None:
+                    order['shipping_method'] = item_name
+
+        if 'shipping_cost' in item_fields:
+            cost_rows = session.execute(text("""
+                SELECT oi.order_id, SUM(CAST(oim.meta_value AS DECIMAL(10,2)))
+                FROM wpyz_woocommerce_order_items oi
+                INNER JOIN wpyz_woocommerce_order_itemmeta oim
+                    ON oi.order_item_id = oim.order_item_id
+                    AND oim.meta_key = 'cost'
+                WHERE oi.order_id IN :order_ids
+                  AND oi.order_item_type = 'shipping'
+                GROUP BY oi.order_id
+            """), params).fetchall()
+
+            for order_id, cost in cost_rows:
+                if order_id in orders:
+                    orders[order_id]['shipping_cost'] = cost or 0
+
+    return orders
+
+
+def load_orders(order_ids, fields, session=None):
+    """
+    Carga en lote los campos indicados de varios pedidos.
+
+    Args:
+        order_ids: IDs de pedidos (se ignoran duplicados)
+        fields: Nombres de campos (ver ORDER_COLUMNS, META_FIELDS,
+                billing_*/shipping_* e ITEM_FIELDS)
+        session: Sesión SQLAlchemy (por defecto db.session)
+
+    Returns:
+        dict: {order_id: {'id': order_id, campo: valor, ...}}; los pedidos
+              inexistentes no aparecen y los meta/direcciones ausentes son None
+
+    Raises:
+        ValueError: Si algún campo no existe
+    """
+    if session is None:
+        from app import db
+        session = db.session
+
+    groups = _split_fields(fields)
+
+    unique_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    orders = {}
+    for i in range(0, len(unique_ids), LOAD_CHUNK):
+        orders.update(_load_chunk(session, unique_ids[i:i + LOAD_CHUNK], *groups))
+    return orders
+
+
+def full_name(order, address_type='billing'):
+    """
+    Nombre completo como CONCAT(first_name, ' ', last_name) de MySQL
+    (None si falta alguno). Requiere cargar <address_type>_first_name y
+    <address_type>_last_name.
+    """
+    first_name = order[f'{address_type}_first_name']
+    last_name = order[f'{address_type}_last_name']
+    if first_name is None or last_name is None:
+        return None
+    return f"{first_name} {last_name}"
@@ -0,0 +1,200 @@
+# app/product_cache.py
+"""
+Caché de los listados de productos, stock y precios (por producto)
+
+Los listados (/products/list, /stock/list, /prices/list) usaban
+@cache.cached y cada edición de stock, precios o imágenes llamaba a
+cache.clear(): cualquier cambio descartaba todas las páginas de todos los
+usuarios, así que con el uso normal la caché casi nunca acertaba.
+
+Con @product_cache.cached cada página guardada recuerda los IDs de
+producto que contiene (los 'id' y 'parent_id' de response['products'],
+más los que la vista marque con tag_products()). Al escribir,
+invalidate_products(ids) marca esos productos y sus padres con la hora del
+cambio; una página se descarta solo si alguno de sus productos fue marcado
+después de guardarla. El resto de páginas sigue sirviéndose.
+
+Las marcas se guardan en la caché de Flask-Caching de la app (una clave por
+producto) y viven lo mismo que la entrada más larga, de modo que con una
+caché compartida todos los workers ven las invalidaciones.
+
+SimpleCache y FileSystemCache podan claves al llegar a CACHE_THRESHOLD: si
+se perdiera la marca de un producto, la página que lo contiene seguiría
+sirviéndose. Por eso, al guardar una página, los productos sin marca
+reciben una marca base (0) y la página guarda el valor de cada marca (y el
+de la marca global de clear()); al leerla, cualquier marca distinta de la
+guardada (cambiada, podada o vencida) cuenta como fallo.
+
+Uso:
+    @bp.route('/list')
+    @login_required
+    @product_cache.cached(timeout=300)
+    def list_stock(): ...
+
+    product_cache.invalidate_products(product_ids)   # tras el commit
+"""
+
+import functools
+import time
+
+from flask import Response, g, request
+from sqlalchemy import text
+
+from app.cache_stats import cache_stats
+
+# Prefijo de las claves en la caché de la app
+KEY_PREFIX = 'product_cache:'
+
+
+class ProductCache:
+    """Caché de respuestas JSON de listados de productos con invalidación por producto."""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_timeout = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PRODUCT_CACHE_ENABLED', True)
+
+    def _cache(self):
+        from app import cache
+        return cache
+
+    @staticmethod
+    def _stamp_key(product_id):
+        return f'{KEY_PREFIX}product:{product_id}'
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _request_key(self):
+        args = sorted((key, value) for key, value in request.args.items(multi=True))
+        params = '&'.join(f'{key}={value}' for key, value in args)
+        return f'{KEY_PREFIX}{request.endpoint}?{params}'
+
+    def _stamp_keys(self, ids):
+        return [f'{KEY_PREFIX}cleared'] + [self._stamp_key(product_id) for product_id in ids]
+
+    def _snapshot_stamps(self, ids):
+        """
+        Valores actuales de la marca global y de las de `ids`, creando una
+        marca base (0) para las que no existen: así una marca ausente al leer
+        solo puede ser una marca podada o vencida.
+        """
+        cache = self._cache()
+        keys = self._stamp_keys(ids)
+        for stamp_key, stamp in zip(keys, cache.get_many(*keys)):
+            if stamp is None:
+                # add() no pisa una invalidación concurrente
+                cache.add(stamp_key, 0, timeout=self.max_timeout)
+        return tuple(cache.get_many(*keys))
+
+    def _is_stale(self, entry):
+        saved = entry.get('stamps')
+        if saved is None:
+            return True
+        current = tuple(self._cache().get_many(*self._stamp_keys(entry['ids'])))
+        # Marca cambiada, podada o vencida desde que se guardó la página
+        if current != saved:
+            return True
+        # Invalidación ocurrida mientras se generaba la página
+        return max((stamp or 0 for stamp in current), default=0) >= entry['written_at']
+
+    @staticmethod
+    def _response_ids(response):
+        """IDs de producto ('id' y 'parent_id') de response['products']."""
+        data = response.get_json(silent=True) or {}
+        ids = set()
+        for item in data.get('products') or []:
+            for field in ('id', 'parent_id'):
+                if item.get(field):
+                    ids.add(int(item[field]))
+        return ids
+
+    def tag_products(self, product_ids):
+        """
+        Marca IDs adicionales de los que depende la página en curso (p. ej.
+        todos los candidatos de una búsqueda antes de filtrar por stock).
+        """
+        tagged = g.setdefault('_product_cache_ids', set())
+        tagged.update(int(product_id) for product_id in product_ids if product_id)
+
+    def cached(self, timeout):
+        """Decorador de vistas JSON de listados de productos."""
+        self.max_timeout = max(self.max_timeout, timeout)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                cache = self._cache()
+                key = self._request_key()
+                entry = cache.get(key)
+                if entry is not None:
+                    if not self._is_stale(entry):
+                        cache_stats.record(request.endpoint, 'hit')
+                        return Response(entry['body'], status=200, mimetype=entry['mimetype'])
+                    cache_stats.record(request.endpoint, 'eviction')
+                cache_stats.record(request.endpoint, 'miss')
+
+                written_at = time.time()
+                g._product_cache_ids = set()
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+
+                ids = tuple(sorted(self._response_ids(response) | g._product_cache_ids))
+                cache.set(key, {
+                    'body': response.get_data(),
+                    'mimetype': response.mimetype,
+                    'written_at': written_at,
+                    'ids': ids,
+                    'stamps': self._snapshot_stamps(ids)
+                }, timeout=timeout)
+                return response
+
+            return wrapper
+
+        return decorator
+
+    # ------------------------------------------------------------------
+    # Invalidación
+    # ------------------------------------------------------------------
+
+    def invalidate_products(self, product_ids, session=None):
+        """
+        Descarta las páginas que contienen alguno de los productos (o su
+        padre, para variaciones). Llamar después del commit.
+        """
+        product_ids = {int(product_id) for product_id in product_ids if product_id}
+        if not product_ids:
+            return
+
+        if session is None:
+            from app import db
+            session = db.session
+
+        rows = session.execute(text("""
+            SELECT post_parent
+            FROM wpyz_posts
+            WHERE ID IN :product_ids AND post_parent > 0
+        """), {'product_ids': tuple(product_ids)}).fetchall()
+        product_ids.update(row[0] for row in rows)
+
+        stamp = time.time()
+        self._cache().set_many(
+            {self._stamp_key(product_id): stamp for product_id in product_ids},
+            timeout=self.max_timeout
+        )
+
+    def clear(self):
+        """Descarta todas las páginas (cambios que afectan a cualquier listado)."""
+        self._cache().set(f'{KEY_PREFIX}cleared', time.time(), timeout=self.max_timeout)
+
+
+product_cache = ProductCache()
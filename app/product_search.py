@@ -0,0 +1,393 @@
+# app/product_search.py
+"""
+Índice de búsqueda de productos (catálogo, stock, precios, imágenes y pedidos)
+
+La búsqueda de productos estaba implementada cinco veces con
+LIKE '%término%' sobre wpyz_posts.post_title y el _sku de wpyz_postmeta
+(products.list_products, stock.list_stock, prices.list_prices,
+images.list_products y orders.search_products): cada tecla recorría las
+tablas de posts y postmeta. Aquí los productos y variaciones se cargan una
+vez en memoria (título, SKU y atributos de variación normalizados, sin
+tildes ni mayúsculas, como la collation _ci de MySQL) y se buscan con:
+
+    - Trigramas del texto: candidatos de un término de 3+ caracteres
+      (búsqueda parcial, equivalente a LIKE '%término%')
+    - SKU ordenados: prefijo del SKU base de 7 dígitos con bisect
+    - Hijos por padre: ID de 5 dígitos (producto o su padre)
+
+Reglas por término (se separa por espacios; todos deben coincidir):
+    - 7 dígitos + guión ('1003228-CSHWGT4BR22M'): SKU que contiene el término
+    - 5 dígitos: ID del producto o de su padre
+    - 7 dígitos: SKU que empieza con el término (1003226 y 1003226-VARIANTE)
+    - Otro: título, atributos o SKU que contienen el término
+
+Actualización (incremental):
+    - Cada PRODUCT_SEARCH_CHECK_SECONDS se lee COUNT(*) y
+      MAX(post_modified_gmt) de los productos; si hay cambios se recargan
+      solo los modificados desde la última revisión. Si el conteo no cuadra
+      (productos borrados) se recarga todo
+    - refresh_products(ids): recarga ya los indicados (tras crear/editar)
+    - Los cambios se acumulan sobre el índice base y se reconstruye al
+      pasar de OVERLAY_MAX_ENTRIES o cada PRODUCT_SEARCH_RELOAD_SECONDS
+
+Uso:
+    from app.product_search import product_search
+    entries = product_search.search('polo negro', post_types=('product',))
+    parent_ids = product_search.search_parent_ids('1003226')
+"""
+
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from sqlalchemy import text
+
+PRODUCT_TYPES = ('product', 'product_variation')
+
+# Reglas de búsqueda
+PRODUCT_ID_LENGTH = 5
+SKU_BASE_LENGTH = 7
+TRIGRAM = 3
+
+# Cambios acumulados sobre el índice base antes de reconstruirlo
+OVERLAY_MAX_ENTRIES = 500
+
+# Producto o variación indexado
+ProductEntry = namedtuple('ProductEntry', [
+    'id', 'parent_id', 'post_type', 'status', 'post_date', 'title', 'sku', 'sku_norm', 'text'
+])
+
+# Término de búsqueda: kind en 'sku', 'sku_base', 'id', 'text'
+SearchTerm = namedtuple('SearchTerm', ['kind', 'value'])
+
+
+def normalize(value):
+    """Minúsculas y sin tildes (como las collations _ci de MySQL)."""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def parse_terms(search):
+    """Texto de búsqueda -> [SearchTerm] (ver reglas en el docstring del módulo)."""
+    terms = []
+    for raw in (search or '').split():
+        term = normalize(raw)
+        head = term.split('-', 1)[0]
+        if '-' in term and head.isdigit() and len(head) == SKU_BASE_LENGTH:
+            terms.append(SearchTerm('sku', term))
+        elif term.isdigit() and len(term) == PRODUCT_ID_LENGTH:
+            terms.append(SearchTerm('id', int(term)))
+        elif term.isdigit() and len(term) == SKU_BASE_LENGTH:
+            terms.append(SearchTerm('sku_base', term))
+        else:
+            terms.append(SearchTerm('text', term))
+    return terms
+
+
+def entry_matches(entry, term):
+    """True si el producto cumple el término."""
+    if term.kind == 'id':
+        return entry.id == term.value or entry.parent_id == term.value
+    if term.kind == 'sku_base':
+        return entry.sku_norm.startswith(term.value)
+    if term.kind == 'sku':
+        return term.value in entry.sku_norm
+    return term.value in entry.text
+
+
+def _trigrams(value):
+    return {value[i:i + TRIGRAM] for i in range(len(value) - TRIGRAM + 1)}
+
+
+def build_entry(row, sku, attributes):
+    """
+    Args:
+        row: (ID, post_parent, post_type, post_status, post_date, post_title)
+        sku: _sku o None
+        attributes: Valores de attribute_* de la variación
+    """
+    product_id, parent_id, post_type, status, post_date, title = row
+    sku = sku or ''
+    searchable = ' '.join([title or ''] + [value for value in attributes if value] + [sku])
+    return ProductEntry(
+        id=product_id, parent_id=parent_id or 0, post_type=post_type, status=status,
+        post_date=post_date, title=title or '', sku=sku, sku_norm=normalize(sku),
+        text=normalize(searchable)
+    )
+
+
+class ProductSearchIndex:
+    """
+    Índice inmutable de productos.
+
+    Separado del buscador para poder construirlo desde entradas cualquiera.
+    """
+
+    def __init__(self, entries):
+        self.entries = {entry.id: entry for entry in entries}
+
+        postings = {}
+        children = {}
+        for entry in self.entries.values():
+            for trigram in _trigrams(entry.text):
+                postings.setdefault(trigram, array('I')).append(entry.id)
+            if entry.parent_id:
+                children.setdefault(entry.parent_id, []).append(entry.id)
+
+        self._postings = postings
+        self._children = children
+        self._skus = sorted((entry.sku_norm, entry.id) for entry in self.entries.values() if entry.sku_norm)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self, term):
+        """
+        IDs que pueden cumplir el término (superconjunto; None = todos).
+        """
+        if term.kind == 'id':
+            return [term.value] + self._children.get(term.value, [])
+
+        if term.kind == 'sku_base':
+            ids = []
+            position = bisect_left(self._skus, (term.value,))
+            while position < len(self._skus) and self._skus[position][0].startswith(term.value):
+                ids.append(self._skus[position][1])
+                position += 1
+            return ids
+
+        # 'sku' y 'text': el SKU forma parte del texto indexado
+        trigrams = _trigrams(term.value)
+        if not trigrams:
+            return None
+        return min((self._postings.get(trigram, ()) for trigram in trigrams), key=len)
+
+    def match(self, terms):
+        """Entradas que cumplen todos los términos."""
+        best = None
+        for term in terms:
+            candidates = self.candidates(term)
+            if candidates is not None and (best is None or len(candidates) < len(best)):
+                best = candidates
+
+        pool = self.entries.values() if best is None else (
+            self.entries[product_id] for product_id in set(best) if product_id in self.entries
+        )
+        return [entry for entry in pool if all(entry_matches(entry, term) for term in terms)]
+
+
+class ProductSearch:
+    """
+    Buscador de productos compartido por el proceso, con actualización
+    incremental.
+
+    Uso:
+        product_search.search('polo m', post_types=('product_variation',))
+        product_search.refresh_products([product_id])   # tras crear/editar
+    """
+
+    def __init__(self, app=None):
+        self.check_seconds = 30
+        self.reload_seconds = 3600
+        self._index = None
+        self._overlay = {}                # id -> ProductEntry o None (eliminado)
+        self._watermark = None            # MAX(post_modified_gmt) cargado
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.check_seconds = app.config.get('PRODUCT_SEARCH_CHECK_SECONDS', 30)
+        self.reload_seconds = app.config.get('PRODUCT_SEARCH_RELOAD_SECONDS', 3600)
+
+    def _session(self):
+        from app import db
+        return db.session
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def _load_entries(self, session, product_ids=None, modified_since=None):
+        """
+        Productos y variaciones (todos los estados) como ProductEntry.
+
+        Returns:
+            tuple: ([ProductEntry], MAX(post_modified_gmt) de las filas)
+        """
+        conditions, params = '', {'types': PRODUCT_TYPES}
+        if product_ids is not None:
+            conditions, params['ids'] = 'AND p.ID IN :ids', tuple(product_ids)
+        elif modified_since is not None:
+            conditions, params['since'] = 'AND p.post_modified_gmt >= :since', modified_since
+
+        rows = session.execute(text(f"""
+            SELECT p.ID, p.post_parent, p.post_type, p.post_status, p.post_date, p.post_title,
+                   p.post_modified_gmt
+            FROM wpyz_posts p
+            WHERE p.post_type IN :types
+            {conditions}
+        """), params).fetchall()
+        if not rows:
+            return [], None
+
+        metas = session.execute(text(f"""
+            SELECT pm.post_id, pm.meta_key, pm.meta_value
+            FROM wpyz_postmeta pm
+            INNER JOIN wpyz_posts p ON p.ID = pm.post_id
+            WHERE p.post_type IN :types
+            {conditions}
+            AND (pm.meta_key = '_sku' OR pm.meta_key LIKE 'attribute_%')
+        """), params).fetchall()
+
+        skus, attributes = {}, {}
+        for post_id, meta_key, meta_value in metas:
+            if meta_key == '_sku':
+                skus[post_id] = meta_value
+            else:
+                attributes.setdefault(post_id, []).append(meta_value)
+
+        entries = [build_entry(row[:6], skus.get(row[0]), attributes.get(row[0], [])) for row in rows]
+        watermark = max((row[6] for row in rows if row[6] is not None), default=None)
+        return entries, watermark
+
+    def _read_signature(self, session):
+        """(COUNT(*), MAX(post_modified_gmt)) de productos y variaciones."""
+        return tuple(session.execute(text("""
+            SELECT COUNT(*), MAX(post_modified_gmt)
+            FROM wpyz_posts
+            WHERE post_type IN :types
+        """), {'types': PRODUCT_TYPES}).fetchone())
+
+    def _rebuild(self, session):
+        entries, watermark = self._load_entries(session)
+        self._index = ProductSearchIndex(entries)
+        self._overlay = {}
+        self._watermark = watermark
+        self._loaded_at = time.monotonic()
+
+    def _apply(self, entries, removed_ids=()):
+        """Agrega cambios al overlay (copia nueva: los lectores usan la anterior)."""
+        overlay = dict(self._overlay)
+        for product_id in removed_ids:
+            overlay[product_id] = None
+        for entry in entries:
+            overlay[entry.id] = entry
+        self._overlay = overlay
+
+    def _size(self):
+        base = self._index.entries
+        added = sum(1 for product_id, entry in self._overlay.items() if entry and product_id not in base)
+        removed = sum(1 for product_id, entry in self._overlay.items() if entry is None and product_id in base)
+        return len(base) + added - removed
+
+    def _ensure_current(self):
+        """Carga o actualiza el índice si venció la revisión."""
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.check_seconds:
+            return
+
+        with self._lock:
+            if self._index is not None and now - self._checked_at < self.check_seconds:
+                return
+
+            session = self._session()
+            if (self._index is None or now - self._loaded_at >= self.reload_seconds
+                    or len(self._overlay) > OVERLAY_MAX_ENTRIES):
+                self._rebuild(session)
+            else:
+                count, modified = self._read_signature(session)
+                if modified is not None and (self._watermark is None or modified > self._watermark):
+                    entries, watermark = self._load_entries(session, modified_since=self._watermark)
+                    self._apply(entries)
+                    self._watermark = max(watermark, self._watermark) if self._watermark else watermark
+                if count != self._size():
+                    # Hubo productos borrados (o cambios fuera de post_modified)
+                    self._rebuild(session)
+            self._checked_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def search(self, search, post_types=PRODUCT_TYPES, statuses=('publish',)):
+        """
+        Productos/variaciones que cumplen todos los términos.
+
+        Args:
+            search: Texto de búsqueda (términos separados por espacios)
+            post_types: Tipos a incluir
+            statuses: Estados a incluir (None = todos)
+
+        Returns:
+            list: ProductEntry ordenados por ID descendente
+        """
+        terms = parse_terms(search)
+        if not terms:
+            return []
+
+        self._ensure_current()
+        index, overlay = self._index, self._overlay
+
+        found = {entry.id: entry for entry in index.match(terms) if entry.id not in overlay}
+        for entry in overlay.values():
+            if entry is not None and all(entry_matches(entry, term) for term in terms):
+                found[entry.id] = entry
+
+        return sorted(
+            (entry for entry in found.values()
+             if entry.post_type in post_types and (statuses is None or entry.status in statuses)),
+            key=lambda entry: entry.id, reverse=True
+        )
+
+    def search_parent_ids(self, search, statuses=('publish',)):
+        """
+        IDs de productos padre que cumplen la búsqueda o tienen una variación
+        que la cumple (las variaciones no se filtran por estado).
+
+        Returns:
+            list: IDs ordenados de forma descendente
+        """
+        parents = {entry.id for entry in self.search(search, post_types=('product',), statuses=statuses)}
+        parents.update(
+            entry.parent_id
+            for entry in self.search(search, post_types=('product_variation',), statuses=None)
+            if entry.parent_id
+        )
+        return sorted(parents, reverse=True)
+
+    # ------------------------------------------------------------------
+    # Actualización
+    # ------------------------------------------------------------------
+
+    def refresh_products(self, product_ids, session=None):
+        """Recarga ya los productos indicados (y sus variaciones). Llamar tras el commit."""
+        product_ids = {int(product_id) for product_id in product_ids if product_id}
+        if not product_ids or self._index is None:
+            return
+
+        session = session or self._session()
+        product_ids.update(row[0] for row in session.execute(text("""
+            SELECT ID FROM wpyz_posts
+            WHERE post_parent IN :ids AND post_type = 'product_variation'
+        """), {'ids': tuple(product_ids)}).fetchall())
+
+        entries, _ = self._load_entries(session, product_ids=product_ids)
+        with self._lock:
+            self._apply(entries, removed_ids=product_ids - {entry.id for entry in entries})
+
+    def invalidate(self):
+        """Fuerza la recarga completa en el próximo uso."""
+        with self._lock:
+            self._index = None
+            self._checked_at = 0.0
+
+
+product_search = ProductSearch()
@@ -0,0 +1,445 @@
+# app/profit_facts.py
+"""
+Hechos de ganancia precalculados (woo_order_profit_facts)
+
+Los reportes de ganancias recalculaban en cada request el costo FC, el
+envío y el tipo de cambio desde wpyz_woocommerce_order_itemmeta y
+wpyz_postmeta (el gráfico mensual repetía las mismas subconsultas
+correlacionadas varias veces). Aquí se guarda ese cálculo por pedido:
+
+    - Cabecera (order_item_id = 0): montos, envío, plataforma, cliente,
+      costo FC total en USD y tipo de cambio del día
+    - Línea (order_item_id del line_item): producto, SKU, cantidad, montos
+      de la línea y costo FC unitario en USD
+
+Los reportes agregan sobre esta tabla (índices por fecha_lima).
+
+Mantenimiento:
+    - sync_profit_facts(): incremental, pedidos creados o modificados desde
+      el mayor date_updated_gmt ya sincronizado. Se llama al inicio de cada
+      reporte (igual que refresh_shalom_dni_index), como mucho una vez cada
+      PROFIT_FACTS_SYNC_SECONDS por worker y con GET_LOCK('profit_facts_sync'):
+      si otro request ya está sincronizando, se omite (los reportes del
+      dashboard se piden en paralelo y sus DELETE/INSERT se bloqueaban).
+      Nunca reconstruye la tabla dentro del request: vacía, encola
+      'profit_facts_rebuild'; mientras ese trabajo corre, no sincroniza
+    - apply_exchange_rates(): recalcula solo tipo_cambio (tras editar
+      woo_tipo_cambio, solo los días a los que aplica la tasa); al
+      sincronizar, la tasa sale del calendario compartido
+      (app/exchange_rates.py)
+    - refresh_order_facts(order_ids): recalcula los pedidos que se acaban
+      de escribir desde orders, antes de invalidar la caché de reportes
+      (la sincronización de los reportes puede omitirse)
+    - rebuild_profit_facts(order_ids): recalcula pedidos completos (tras
+      importar costos FC); la reconstrucción total se encola como trabajo
+      'profit_facts_rebuild' (ver reports.rebuild_profit_facts_endpoint) o
+      con python migrations/create_order_profit_facts_table.py
+
+Cada escritura recalcula además, en la misma transacción, los días
+afectados del resumen diario woo_sales_daily (app/sales_daily.py).
+"""
+
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.exchange_rates import exchange_rates
+from app.fc_costs import fc_costs
+from app.order_read_model import load_orders
+from app.sales_daily import refresh_sales_daily
+from app.utils.dates import lima_day
+from app.utils.locks import try_named_lock
+
+# Pedidos por lote de sincronización
+PROFIT_FACTS_SYNC_CHUNK = 500
+
+# Margen (minutos) sobre la marca de agua para no perder pedidos
+# modificados en el mismo segundo que la última sincronización
+PROFIT_FACTS_OVERLAP_MINUTES = 5
+
+# Lock de MySQL (GET_LOCK) que serializa la sincronización entre workers
+PROFIT_FACTS_SYNC_LOCK = 'profit_facts_sync'
+
+# Última sincronización de este worker (time.monotonic) y lock entre hilos
+_sync_state = {'synced_at': 0.0}
+_sync_thread_lock = threading.Lock()
+
+ORDER_FIELDS = [
+    'type', 'status', 'date_created_gmt', 'date_updated_gmt', 'order_number',
+    'created_by', 'total_amount', 'tax_amount', 'shipping_cost', 'discount_amount',
+    'payment_method_title', 'payment_method', 'billing_first_name', 'billing_last_name',
+    'billing_company', 'billing_doc_type', 'billing_business_name', 'is_community'
+]
+
+FACT_COLUMNS = (
+    'order_id', 'order_item_id', 'order_type', 'status', 'fecha_lima', 'date_created_gmt',
+    'order_number', 'created_by', 'total_amount', 'tax_amount', 'shipping_cost',
+    'discount_amount', 'payment_method_label', 'cost_usd', 'items_count',
+    'billing_first_name', 'billing_last_name', 'billing_company', 'billing_doc_type',
+    'billing_business_name', 'is_community', 'product_name', 'sku', 'qty',
+    'line_subtotal', 'line_subtotal_tax', 'line_total', 'line_tax', 'unit_cost_usd',
+    'tipo_cambio', 'source_updated_gmt'
+)
+
+INSERT_FACTS_SQL = text(f"""
+    INSERT INTO woo_order_profit_facts ({', '.join(FACT_COLUMNS)})
+    VALUES ({', '.join(f':{column}' for column in FACT_COLUMNS)})
+""")
+
+# Tipo de cambio: última tasa activa con fecha <= día del pedido en Lima
+# (misma regla que app/exchange_rates.py, en una sola sentencia)
+APPLY_RATES_SQL = """
+    UPDATE woo_order_profit_facts f
+    SET f.tipo_cambio = (
+        SELECT tc.tasa_promedio
+        FROM woo_tipo_cambio tc
+        WHERE tc.fecha <= f.fecha_lima
+            AND tc.activo = TRUE
+        ORDER BY tc.fecha DESC
+        LIMIT 1
+    )
+"""
+
+
+def _session(session):
+    if session is None:
+        from app import db
+        return db.session
+    return session
+
+
+def _meta_decimal(value):
+    """meta_value numérico como Decimal (None si falta; texto no numérico = 0 como en MySQL)."""
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def _build_rows(session, order_ids):
+    """Filas de hechos (cabecera + líneas) de un lote de pedidos."""
+    orders = load_orders(order_ids, ORDER_FIELDS, session=session)
+    if not orders:
+        return []
+
+    item_rows = session.execute(text("""
+        SELECT
+            oi.order_id,
+            oi.order_item_id,
+            oi.order_item_name,
+            oim_qty.meta_value as qty,
+            pm_sku.meta_value as sku,
+            oim_subtotal.meta_value as line_subtotal,
+            oim_subtotal_tax.meta_value as line_subtotal_tax,
+            oim_total.meta_value as line_total,
+            oim_tax.meta_value as line_tax
+        FROM wpyz_woocommerce_order_items oi
+        INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id AND oim_pid.meta_key = '_product_id'
+        INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id AND oim_qty.meta_key = '_qty'
+        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id AND oim_vid.meta_key = '_variation_id'
+        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_subtotal ON oi.order_item_id = oim_subtotal.order_item_id AND oim_subtotal.meta_key = '_line_subtotal'
+        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_subtotal_tax ON oi.order_item_id = oim_subtotal_tax.order_item_id AND oim_subtotal_tax.meta_key = '_line_subtotal_tax'
+        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_total ON oi.order_item_id = oim_total.order_item_id AND oim_total.meta_key = '_line_total'
+        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_tax ON oi.order_item_id = oim_tax.order_item_id AND oim_tax.meta_key = '_line_tax'
+        LEFT JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id AND pm_sku.meta_key = '_sku'
+        WHERE oi.order_id IN :order_ids
+            AND oi.order_item_type = 'line_item'
+        ORDER BY oi.order_item_id
+    """), {'order_ids': tuple(orders)}).fetchall()
+
+    fc_index = fc_costs.index
+    tc_calendar = exchange_rates.calendar
+    items_by_order = {}
+    seen_items = set()
+    for order_id, item_id, name, qty, sku, subtotal, subtotal_tax, total, tax in item_rows:
+        # Un _sku repetido en postmeta duplicaría la línea
+        if item_id in seen_items:
+            continue
+        seen_items.add(item_id)
+
+        components = fc_index.components(sku)
+        items_by_order.setdefault(order_id, []).append({
+            'order_item_id': item_id,
+            'product_name': name,
+            'sku': sku,
+            'qty': _meta_decimal(qty),
+            'line_subtotal': _meta_decimal(subtotal),
+            'line_subtotal_tax': _meta_decimal(subtotal_tax),
+            'line_total': _meta_decimal(total),
+            'line_tax': _meta_decimal(tax),
+            'unit_cost_usd': fc_index.unit_cost(sku) if components else None
+        })
+
+    rows = []
+    for order_id, order in orders.items():
+        items = items_by_order.get(order_id, [])
+        date_created = order['date_created_gmt']
+        fecha_lima = lima_day(date_created)
+        rate = tc_calendar.entry_for(fecha_lima) if fecha_lima else None
+
+        common = {column: None for column in FACT_COLUMNS}
+        common.update({
+            'order_id': order_id,
+            'order_type': order['type'],
+            'status': order['status'],
+            'fecha_lima': fecha_lima,
+            'date_created_gmt': date_created,
+            'order_number': order['order_number'],
+            'created_by': order['created_by'],
+            'tipo_cambio': rate.tasa_promedio if rate else None,
+            'source_updated_gmt': order['date_updated_gmt']
+        })
+
+        # Costo del pedido: solo las líneas con SKU y componentes FC (NULL si ninguna)
+        line_costs = [
+            item['unit_cost_usd'] * float(item['qty'])
+            for item in items
+            if item['unit_cost_usd'] is not None and item['qty'] is not None
+        ]
+
+        header = dict(common)
+        header.update({
+            'order_item_id': 0,
+            'total_amount': order['total_amount'],
+            'tax_amount': order['tax_amount'],
+            'shipping_cost': order['shipping_cost'],
+            'discount_amount': order['discount_amount'],
+            'payment_method_label': next(
+                (value for value in (order['payment_method_title'], order['payment_method']) if value is not None),
+                'N/A'
+            ),
+            'cost_usd': sum(line_costs) if line_costs else None,
+            'items_count': len(items),
+            'billing_first_name': order['billing_first_name'],
+            'billing_last_name': order['billing_last_name'],
+            'billing_company': order['billing_company'],
+            'billing_doc_type': order['billing_doc_type'],
+            'billing_business_name': order['billing_business_name'],
+            'is_community': order['is_community']
+        })
+        rows.append(header)
+
+        for item in items:
+            line = dict(common)
+            line.update(item)
+            rows.append(line)
+
+    return rows
+
+
+def _fact_days(session, order_ids):
+    """Días (fecha_lima) con hechos de los pedidos indicados."""
+    return {
+        row[0] for row in session.execute(text("""
+            SELECT DISTINCT fecha_lima FROM woo_order_profit_facts
+            WHERE order_id IN :order_ids AND order_item_id = 0
+        """), {'order_ids': tuple(order_ids)}).fetchall()
+    }
+
+
+def _write_chunk(session, order_ids):
+    """
+    Reemplaza los hechos de un lote de pedidos (sin commit).
+
+    Returns:
+        set: Días (fecha_lima) afectados, anteriores y nuevos
+    """
+    params = {'order_ids': tuple(order_ids)}
+    rows = _build_rows(session, order_ids)
+    days = _fact_days(session, order_ids)
+
+    session.execute(text("DELETE FROM woo_order_profit_facts WHERE order_id IN :order_ids"), params)
+    if rows:
+        session.execute(INSERT_FACTS_SQL, rows)
+
+    days.update(row['fecha_lima'] for row in rows if row['order_item_id'] == 0)
+    return days
+
+
+def apply_exchange_rates(order_ids=None, session=None, start_day=None, end_day=None):
+    """
+    Recalcula tipo_cambio de los hechos: los pedidos indicados, los días
+    start_day..end_day (fecha_lima, ambos incluidos) o, sin filtros, todos.
+
+    Es una sola sentencia UPDATE por lote; no hace commit.
+    """
+    session = _session(session)
+    if start_day is not None and end_day is not None:
+        session.execute(
+            text(APPLY_RATES_SQL + " WHERE f.fecha_lima BETWEEN :start_day AND :end_day"),
+            {'start_day': start_day, 'end_day': end_day}
+        )
+        return
+
+    if order_ids is None:
+        session.execute(text(APPLY_RATES_SQL))
+        return
+
+    order_ids = list(order_ids)
+    for i in range(0, len(order_ids), PROFIT_FACTS_SYNC_CHUNK):
+        session.execute(
+            text(APPLY_RATES_SQL + " WHERE f.order_id IN :order_ids"),
+            {'order_ids': tuple(order_ids[i:i + PROFIT_FACTS_SYNC_CHUNK])}
+        )
+
+
+def rebuild_profit_facts(order_ids, session=None):
+    """
+    Recalcula por completo los hechos de los pedidos indicados, con un
+    commit por lote de PROFIT_FACTS_SYNC_CHUNK pedidos.
+
+    Returns:
+        int: Pedidos procesados
+    """
+    session = _session(session)
+    order_ids = list(order_ids)
+
+    for i in range(0, len(order_ids), PROFIT_FACTS_SYNC_CHUNK):
+        days = _write_chunk(session, order_ids[i:i + PROFIT_FACTS_SYNC_CHUNK])
+        refresh_sales_daily(days, session)
+        session.commit()
+
+    return len(order_ids)
+
+
+def refresh_order_facts(order_ids, session=None):
+    """
+    Recalcula los hechos de pocos pedidos recién escritos y sus días de
+    woo_sales_daily, con commit (crear/editar/estado/papelera en orders).
+
+    Returns:
+        set: Días (fecha_lima) afectados, anteriores y nuevos
+    """
+    session = _session(session)
+    order_ids = [int(order_id) for order_id in order_ids if order_id]
+    if not order_ids:
+        return set()
+
+    days = _write_chunk(session, order_ids)
+    refresh_sales_daily(days, session)
+    session.commit()
+    return days
+
+
+def all_order_ids(session=None):
+    """IDs de todos los pedidos (para la reconstrucción total)."""
+    session = _session(session)
+    return [row[0] for row in session.execute(text("SELECT id FROM wpyz_wc_orders ORDER BY id")).fetchall()]
+
+
+def purge_orphan_facts(session=None):
+    """Elimina hechos de pedidos que ya no existen (sin commit)."""
+    session = _session(session)
+    orphan_days = [
+        row[0] for row in session.execute(text("""
+            SELECT DISTINCT f.fecha_lima FROM woo_order_profit_facts f
+            LEFT JOIN wpyz_wc_orders o ON o.id = f.order_id
+            WHERE o.id IS NULL AND f.order_item_id = 0
+        """)).fetchall()
+    ]
+    session.execute(text("""
+        DELETE f FROM woo_order_profit_facts f
+        LEFT JOIN wpyz_wc_orders o ON o.id = f.order_id
+        WHERE o.id IS NULL
+    """))
+    refresh_sales_daily(orphan_days, session)
+
+
+def enqueue_rebuild(created_by=None, session=None):
+    """
+    Encola la reconstrucción total como trabajo 'profit_facts_rebuild'
+    (un ítem por pedido; handler en app/routes/reports.py).
+
+    Returns:
+        tuple: (job_id, total de pedidos)
+    """
+    from app.jobs import jobs
+
+    order_ids = all_order_ids(session)
+    rebuild_key = f"profit_facts:{datetime.utcnow().isoformat()}"
+    job_id = jobs.enqueue(
+        'profit_facts_rebuild',
+        [{'order_id': order_id, 'key': rebuild_key} for order_id in order_ids],
+        created_by=created_by
+    )
+    return job_id, len(order_ids)
+
+
+def _sync_changed(session):
+    """Sincronización incremental (con el lock tomado). Ver sync_profit_facts."""
+    from app.jobs import jobs
+
+    # La reconstrucción en curso escribe los mismos pedidos y días
+    if jobs.active_job_id('profit_facts_rebuild') is not None:
+        return 0
+
+    watermark = session.execute(text("""
+        SELECT MAX(source_updated_gmt) FROM woo_order_profit_facts WHERE order_item_id = 0
+    """)).scalar()
+
+    if watermark is None:
+        # Tabla vacía: la carga completa no se hace dentro de un request
+        job_id, total = enqueue_rebuild(created_by='sistema', session=session)
+        current_app.logger.info(
+            f"[PROFIT_FACTS] Tabla vacía: reconstrucción encolada (trabajo {job_id}, {total} pedidos)"
+        )
+        return 0
+
+    changed_ids = [
+        row[0] for row in session.execute(text("""
+            SELECT o.id
+            FROM wpyz_wc_orders o
+            LEFT JOIN woo_order_profit_facts f ON f.order_id = o.id AND f.order_item_id = 0
+            WHERE o.date_updated_gmt >= :watermark - INTERVAL :overlap MINUTE
+              AND (f.order_id IS NULL OR NOT (f.source_updated_gmt <=> o.date_updated_gmt))
+        """), {
+            'watermark': watermark,
+            'overlap': PROFIT_FACTS_OVERLAP_MINUTES
+        }).fetchall()
+    ]
+
+    days = set()
+    for i in range(0, len(changed_ids), PROFIT_FACTS_SYNC_CHUNK):
+        days.update(_write_chunk(session, changed_ids[i:i + PROFIT_FACTS_SYNC_CHUNK]))
+
+    refresh_sales_daily(days, session)
+    session.commit()
+    return len(changed_ids)
+
+
+def sync_profit_facts(session=None):
+    """
+    Incorpora los pedidos creados o modificados desde la última
+    sincronización (marca de agua: mayor date_updated_gmt ya sincronizado).
+
+    Se omite (devuelve 0) si este worker sincronizó hace menos de
+    PROFIT_FACTS_SYNC_SECONDS, si otro request tiene el lock o si hay una
+    reconstrucción en curso. Con la tabla vacía encola la reconstrucción.
+
+    Returns:
+        int: Pedidos actualizados
+    """
+    session = _session(session)
+    check_seconds = current_app.config.get('PROFIT_FACTS_SYNC_SECONDS', 30)
+
+    if time.monotonic() - _sync_state['synced_at'] < check_seconds:
+        return 0
+    if not _sync_thread_lock.acquire(blocking=False):
+        return 0
+
+    try:
+        with try_named_lock(session, PROFIT_FACTS_SYNC_LOCK) as acquired:
+            if not acquired:
+                return 0
+            synced = _sync_changed(session)
+
+        _sync_state['synced_at'] = time.monotonic()
+        return synced
+    finally:
+        _sync_thread_lock.release()
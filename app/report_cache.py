@@ -0,0 +1,308 @@
+# app/report_cache.py
+"""
+Caché de resultados de los reportes (blueprint reports)
+
+Los endpoints del dashboard (resumen, ventas por día, top productos,
+gráficos de ganancias...) se recalculaban en cada carga aunque el período
+fuera de días ya cerrados. Con @report_cache.cached la respuesta JSON se
+guarda por endpoint + parámetros normalizados:
+
+    - Rango que termina antes de hoy (Lima), backend 'shared':
+      REPORT_CACHE_PAST_SECONDS (un día). Acotado porque las marcas de invalidación son claves comunes de
+      la caché: SimpleCache/FileSystemCache pueden podarlas al llegar a
+      CACHE_THRESHOLD y, sin marca, una entrada sin vencimiento quedaría
+      desactualizada para siempre
+    - Rango que termina antes de hoy, backend 'local': igual que hoy
+      (REPORT_CACHE_TODAY_SECONDS); ver Backends
+    - Rango que incluye hoy (o sin fechas, que usan hoy por defecto):
+      REPORT_CACHE_TODAY_SECONDS
+    - Solo se guardan respuestas 200
+
+Invalidación por fechas: invalidate_orders()/invalidate_dates() marcan los
+días afectados con la hora del cambio; una entrada cuyo rango contiene un
+día marcado después de guardarse se descarta. Lo llaman orders
+(crear/editar/procesar/papelera) y el alta de tipos de cambio.
+
+Backends (config REPORT_CACHE_BACKEND):
+    - 'local': LRU en memoria del proceso (REPORT_CACHE_MAX_ENTRIES). Las
+      marcas de invalidación también son locales: con varios workers cada
+      uno solo se entera de sus propios cambios, por eso todas las entradas
+      (también las de días pasados) vencen a los REPORT_CACHE_TODAY_SECONDS
+    - 'shared': además del LRU local, entradas y marcas en la caché de
+      Flask-Caching de la app (una clave por día marcado), visibles para
+      todos los workers si esa caché es compartida
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from flask import Response, request
+from sqlalchemy import text
+
+from app.cache_stats import cache_stats
+from app.utils.dates import lima_day, parse_day
+from config import get_local_time
+
+# Prefijo de las claves en la caché compartida
+KEY_PREFIX = 'report_cache:'
+
+def _days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+class LocalReportStore:
+    """LRU en memoria del proceso."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()     # clave -> entrada
+        self._stamps = {}                 # día -> hora de la última invalidación
+        self._cleared_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] is not None and entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                cache_stats.record(evicted.split('?', 1)[0], 'eviction')
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stamp_days(self, days, stamp):
+        with self._lock:
+            for day in days:
+                self._stamps[day] = stamp
+            # Descartar ya las entradas afectadas (libera memoria)
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry['start'] is not None and any(entry['start'] <= day <= entry['end'] for day in days)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def last_stamp(self, start, end):
+        with self._lock:
+            return max((self._stamps.get(day, 0) for day in _days(start, end)), default=0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stamps.clear()
+            self._cleared_at = time.time()
+
+    def cleared_at(self):
+        return self._cleared_at
+
+
+class SharedReportStore:
+    """Entradas y marcas en la caché de Flask-Caching (delante, un LRU local)."""
+
+    def __init__(self, cache, local, stamp_seconds=86400):
+        self.cache = cache
+        self.local = local
+        # Las marcas solo deben durar lo que la entrada más larga
+        self.stamp_seconds = stamp_seconds
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self.cache.get(KEY_PREFIX + key)
+            if entry is not None:
+                self.local.set(key, entry, None)
+        return entry
+
+    def set(self, key, entry, timeout):
+        self.local.set(key, entry, timeout)
+        self.cache.set(KEY_PREFIX + key, entry, timeout=timeout)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.cache.delete(KEY_PREFIX + key)
+
+    def stamp_days(self, days, stamp):
+        self.local.stamp_days(days, stamp)
+        self.cache.set_many(
+            {f'{KEY_PREFIX}day:{day.isoformat()}': stamp for day in days},
+            timeout=self.stamp_seconds
+        )
+
+    def last_stamp(self, start, end):
+        keys = [f'{KEY_PREFIX}day:{day.isoformat()}' for day in _days(start, end)]
+        shared = max((stamp or 0 for stamp in self.cache.get_many(*keys)), default=0)
+        return max(shared, self.local.last_stamp(start, end))
+
+    def clear(self):
+        self.local.clear()
+        # Las entradas compartidas quedan invalidadas por la marca global
+        self.cache.set(f'{KEY_PREFIX}cleared', time.time(), timeout=self.stamp_seconds)
+
+    def cleared_at(self):
+        return max(self.cache.get(f'{KEY_PREFIX}cleared') or 0, self.local.cleared_at())
+
+
+class ReportCache:
+    """
+    Caché de respuestas de reportes con invalidación por fechas.
+
+    Uso:
+        @bp.route('/api/summary')
+        @login_required
+        @report_cache.cached
+        def api_summary(): ...
+
+        report_cache.invalidate_orders([order_id])   # tras el commit
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.today_seconds = 60
+        self.past_seconds = 86400
+        self.store = LocalReportStore()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('REPORT_CACHE_ENABLED', True)
+        self.today_seconds = app.config.get('REPORT_CACHE_TODAY_SECONDS', 60)
+        self.past_seconds = app.config.get('REPORT_CACHE_PAST_SECONDS', 86400)
+        local = LocalReportStore(app.config.get('REPORT_CACHE_MAX_ENTRIES', 512))
+
+        if app.config.get('REPORT_CACHE_BACKEND', 'local') == 'shared':
+            from app import cache
+            self.store = SharedReportStore(cache, local, stamp_seconds=self.past_seconds)
+        else:
+            self.store = local
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _request_key(self):
+        """
+        Clave y rango de fechas del request actual.
+
+        Returns:
+            tuple: (clave, inicio, fin) o None si las fechas no son válidas
+        """
+        args = {key: value for key, value in request.args.items() if value != ''}
+        today = get_local_time().date()
+        try:
+            start = parse_day(args['start_date']) if 'start_date' in args else None
+            end = parse_day(args['end_date']) if 'end_date' in args else None
+        except ValueError:
+            return None
+
+        # Sin alguna fecha, el endpoint usa una relativa a hoy: la clave incluye el día
+        if start is None or end is None:
+            args['_today'] = today.isoformat()
+            end = max(end or today, today)
+
+        params = '&'.join(f'{key}={args[key]}' for key in sorted(args))
+        return f'{request.endpoint}?{params}', start, end
+
+    def _is_stale(self, entry):
+        if entry['written_at'] <= self.store.cleared_at():
+            return True
+        if entry['start'] is None:
+            return False
+        return self.store.last_stamp(entry['start'], entry['end']) >= entry['written_at']
+
+    def cached(self, view):
+        """Decorador de vistas JSON del blueprint reports."""
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return view(*args, **kwargs)
+
+            request_key = self._request_key()
+            if request_key is None:
+                return view(*args, **kwargs)
+            key, start, end = request_key
+
+            entry = self.store.get(key)
+            if entry is not None:
+                if not self._is_stale(entry):
+                    cache_stats.record(request.endpoint, 'hit')
+                    return Response(entry['body'], status=200, mimetype=entry['mimetype'])
+                cache_stats.record(request.endpoint, 'eviction')
+            cache_stats.record(request.endpoint, 'miss')
+
+            written_at = time.time()
+            response = view(*args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+
+            timeout = self.today_seconds
+            if end < get_local_time().date() and isinstance(self.store, SharedReportStore):
+                timeout = self.past_seconds
+            self.store.set(key, {
+                'body': response.get_data(),
+                'mimetype': response.mimetype,
+                'written_at': written_at,
+                'start': start,
+                'end': end,
+                'expires_at': written_at + timeout
+            }, timeout)
+            return response
+
+        return wrapper
+
+    # ------------------------------------------------------------------
+    # Invalidación
+    # ------------------------------------------------------------------
+
+    def invalidate_dates(self, days):
+        """Descarta los resultados cuyos rangos contienen alguno de los días (date)."""
+        days = sorted({day for day in days if day is not None})
+        if days:
+            self.store.stamp_days(days, time.time())
+
+    def invalidate_range(self, start, end):
+        """Como invalidate_dates, para todos los días de start a end (inclusive)."""
+        self.invalidate_dates(_days(start, end))
+
+    def invalidate_orders(self, order_ids, session=None):
+        """Invalida los días (Lima) de creación de los pedidos indicados."""
+        if session is None:
+            from app import db
+            session = db.session
+
+        order_ids = [order_id for order_id in order_ids if order_id]
+        if not order_ids:
+            return
+
+        rows = session.execute(text("""
+            SELECT date_created_gmt
+            FROM wpyz_wc_orders
+            WHERE id IN :order_ids
+        """), {'order_ids': tuple(order_ids)}).fetchall()
+        self.invalidate_dates(lima_day(row[0]) for row in rows)
+
+    def clear(self):
+        """Descarta todos los resultados (p. ej. tras reconstruir costos)."""
+        self.store.clear()
+
+
+report_cache = ReportCache()
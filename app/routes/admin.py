@@ -1,6 +1,7 @@
 # app/routes/admin.py
-from flask import Blueprint, send_file, current_app, flash, redirect, url_for
+from flask import Blueprint, send_file, current_app, flash, redirect, url_for, jsonify
 from flask_login import login_required, current_user
+from app.routes.auth import admin_required
 import subprocess
 import os
 import tempfile
@@ -173,3 +174,21 @@ def backup_db():
         # si se está sirviendo vía send_file, a menos que se use un generador o 
         # cleanup posterior. Sin embargo, en tempdir se limpiará eventualmente.
         pass
+
+
+@bp.route('/cache/stats')
+@login_required
+@admin_required
+def cache_stats_view():
+    """
+    Aciertos, fallos y descartes de la caché por endpoint (todos los
+    workers si CACHE_TYPE es compartida; ver app/cache_stats.py).
+    """
+    from app.cache_stats import cache_stats
+
+    return jsonify({
+        'success': True,
+        'backend': current_app.config.get('CACHE_TYPE'),
+        'report_cache_backend': current_app.config.get('REPORT_CACHE_BACKEND'),
+        'endpoints': cache_stats.snapshot()
+    })
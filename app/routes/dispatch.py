@@ -10,9 +10,15 @@ y trazabilidad completa de cambios.
 Acceso exclusivo para usuario master (Jleon).
 """
 
-from flask import Blueprint, render_template, jsonify, request, current_app
+from flask import Blueprint, render_template, jsonify, request, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from app import db
+from app.events import events
+from app.wc_client import wc_pool
+from app.jobs import jobs
+from app.order_read_model import load_orders, full_name
+from app.utils.dates import lima_range_filter, lima_range_params
+from app.utils.locks import try_named_lock
 from app.models import Order, OrderMeta, DispatchHistory, DispatchPriority, ShippingRate
 from sqlalchemy import text, or_
 from datetime import datetime, timedelta
@@ -20,6 +26,8 @@ from functools import wraps
 import unicodedata
 import os
 import json
+import threading
+import time
 
 # Crear blueprint
 bp = Blueprint('dispatch', __name__, url_prefix='/dispatch')
@@ -162,6 +170,12 @@ def get_column_from_shipping_method(order_id):
     Versión legacy que mantiene compatibilidad pero evita N+1 si se usa correctamente.
     """
     try:
+        # 0. Snapshot del tablero
+        board_query = text("SELECT board_column FROM woo_dispatch_board WHERE order_id = :order_id")
+        board_column = db.session.execute(board_query, {'order_id': order_id}).scalar()
+        if board_column:
+            return board_column
+
         # 1. Historial
         history_query = text("SELECT new_shipping_method FROM woo_dispatch_history WHERE order_id = :order_id ORDER BY changed_at DESC LIMIT 1")
         history_result = db.session.execute(history_query, {'order_id': order_id}).fetchone()
@@ -220,7 +234,7 @@ def parse_date_flexible(date_string):
     return None
 
 
-def register_chamo_shipment(order_id, order_number, tracking_number, delivery_date, sent_via='individual'):
+def register_chamo_shipment(order_id, order_number, tracking_number, delivery_date, sent_via='individual', sent_by=None):
     """
     Registra envío de CHAMO cuando se envía tracking.
 
@@ -230,6 +244,7 @@ def register_chamo_shipment(order_id, order_number, tracking_number, delivery_da
         tracking_number: Mensaje de tracking enviado
         delivery_date: Fecha de entrega (YYYY-MM-DD)
         sent_via: 'individual' o 'bulk'
+        sent_by: Usuario que envía (por defecto, el usuario actual)
 
     Returns:
         ChamoShipment o None si falla
@@ -333,20 +348,21 @@ def register_chamo_shipment(order_id, order_number, tracking_number, delivery_da
             shipping_cost=shipping_cost,
             cod_amount=cod_amount,
             is_cod=is_cod,
-            sent_by=current_user.username,
+            sent_by=sent_by or current_user.username,
             sent_at=datetime.utcnow(),
             sent_via=sent_via,
             column_at_send='Motorizado (CHAMO)'
         )
 
-        db.session.add(chamo_shipment)
-        
-        # Intentar commit inmediato para este registro si es individual,
-        # o flush si es bulk (el bulk manejará el commit)
+        # Intentar commit inmediato para este registro si es individual; en
+        # bulk, savepoint (el bulk manejará el commit y un error aquí no
+        # debe deshacer el tracking del lote)
         if sent_via == 'individual':
+            db.session.add(chamo_shipment)
             db.session.commit()
         else:
-            db.session.flush()
+            with db.session.begin_nested():
+                db.session.add(chamo_shipment)
 
         current_app.logger.info(
             f"[CHAMO-REGISTRY] Order {order_number} ({sent_via}): Registrado "
@@ -357,13 +373,470 @@ def register_chamo_shipment(order_id, order_number, tracking_number, delivery_da
         return chamo_shipment
 
     except Exception as e:
-        db.session.rollback()
+        if sent_via == 'individual':
+            db.session.rollback()
         current_app.logger.error(
             f"[CHAMO-REGISTRY] Error registrando {order_number}: {str(e)}"
         )
         return None
 
 
+# Columnas del tablero Kanban (en orden de visualización)
+BOARD_COLUMNS = [
+    'Por Asignar',
+    'Olva Courier',
+    'Recojo en Almacén',
+    'Motorizado (CHAMO)',
+    'SHALOM',
+    'DINSIDES'
+]
+
+# Formato del cursor incremental de get_orders (UTC)
+BOARD_CURSOR_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_board_cursor(cursor):
+    """
+    Convierte el cursor recibido en ?since= a datetime (UTC).
+
+    Args:
+        cursor: String 'YYYY-MM-DD HH:MM:SS' devuelto por una llamada anterior
+
+    Returns:
+        datetime o None si el cursor no es válido
+    """
+    try:
+        return datetime.strptime(cursor.strip(), BOARD_CURSOR_FORMAT)
+    except (ValueError, AttributeError):
+        return None
+
+
+def get_changed_order_ids(since):
+    """
+    Obtiene los IDs de pedidos con cambios posteriores al cursor.
+
+    Lee woo_dispatch_board.updated_at, que se actualiza cada vez que cambia
+    un pedido del tablero (movimiento, prioridad, atendido, tracking, salida
+    de wc-processing o cambios hechos en WooCommerce detectados por
+    refresh_dispatch_board).
+
+    Se usa >= porque el cursor tiene precisión de segundos: es preferible
+    reenviar un pedido (el parche es idempotente) que perder un cambio.
+
+    Args:
+        since: datetime UTC del cursor
+
+    Returns:
+        list: IDs de pedidos modificados
+    """
+    query = text("""
+        SELECT b.order_id
+        FROM woo_dispatch_board b
+        WHERE b.updated_at >= :since
+    """)
+    return [row[0] for row in db.session.execute(query, {'since': since}).fetchall()]
+
+
+def get_last_positions(order_ids):
+    """
+    Obtiene la última columna registrada en el historial para cada pedido.
+
+    Args:
+        order_ids: Lista de IDs de pedidos
+
+    Returns:
+        dict: {order_id: new_shipping_method}
+    """
+    if not order_ids:
+        return {}
+
+    positions_query = text("""
+        SELECT
+            dh.order_id,
+            dh.new_shipping_method
+        FROM woo_dispatch_history dh
+        INNER JOIN (
+            SELECT order_id, MAX(changed_at) as last_changed
+            FROM woo_dispatch_history
+            WHERE order_id IN :order_ids
+            GROUP BY order_id
+        ) latest ON dh.order_id = latest.order_id
+            AND dh.changed_at = latest.last_changed
+    """)
+
+    positions_result = db.session.execute(
+        positions_query,
+        {'order_ids': tuple(order_ids)}
+    ).fetchall()
+
+    return {row[0]: row[1] for row in positions_result}
+
+
+def build_board_order(row):
+    """
+    Construye el diccionario de un pedido del tablero a partir de una fila
+    de la consulta de get_orders.
+    """
+    # Si es pedido WhatsApp, mostrar #ID principal y W-XXXXX secundario
+    whatsapp_number = row[2]  # W-XXXXX si existe, None si no
+    display_number = row[1]   # Ya viene como COALESCE(W-XXXXX, #ID)
+
+    if whatsapp_number and whatsapp_number.startswith('W-'):
+        display_number = f"#{row[0]}"  # ID original
+        whatsapp_label = whatsapp_number  # W-XXXXX
+    else:
+        whatsapp_label = None
+
+    return {
+        'id': row[0],
+        'number': display_number,
+        'whatsapp_number': whatsapp_label,  # W-XXXXX para mostrar en gris
+        'date_created': row[3].strftime('%Y-%m-%d %H:%M') if row[3] else None,
+        'total': float(row[4]) if row[4] else 0,
+        'status': row[5],
+        'email': row[6],
+        'customer_name': f"{row[7]} {row[8]}" if row[7] and row[8] else 'N/A',
+        'customer_phone': row[9] or 'N/A',
+        'shipping_method': row[10] or 'Sin método',
+        'is_priority': bool(row[11]) if row[11] is not None else False,
+        'priority_level': row[12] or 'normal',
+        'is_atendido': bool(row[13]) if row[13] is not None else False,
+        'hours_since_update': row[14] or 0,
+        'is_stale': (row[14] or 0) > 24,  # Más de 24h sin mover
+        'created_by': row[15] or 'Desconocido',
+        'shipping_district': row[16] or None,  # Distrito de envío
+        'is_cod': bool(row[17]),  # Pago contraentrega
+        'shipping_cost': float(row[18]) if row[18] else 0  # Costo de envío (para COD)
+    }
+
+
+# ============================================
+# SNAPSHOT DEL TABLERO (woo_dispatch_board)
+# ============================================
+
+# Consulta fuente del snapshot: datos del pedido, cliente, prioridad y COD.
+# {where} se reemplaza por el filtro de pedidos a sincronizar.
+# Campos del pedido que guarda el snapshot (ver app/order_read_model.py)
+BOARD_ORDER_FIELDS = [
+    'order_number', 'status', 'date_created_gmt', 'date_updated_gmt',
+    'total_amount', 'billing_email', 'billing_first_name', 'billing_last_name',
+    'billing_phone', 'shipping_city', 'shipping_method', 'shipping_cost',
+    'billing_entrega', 'created_by', 'is_cod'
+]
+
+
+def board_shipping_method(order):
+    """Método de envío del pedido (con fallback para pedidos sin shipping item)."""
+    if order['shipping_method']:
+        return order['shipping_method']
+
+    billing_entrega = order['billing_entrega'] or ''
+    if billing_entrega == 'billing_recojo' or 'recojo' in billing_entrega.lower():
+        return 'Recojo en Almacén'
+    if billing_entrega == 'billing_address':
+        return 'Envío a domicilio'
+    return None
+
+
+# Cantidad de pedidos por lote al sincronizar/reconstruir el snapshot
+BOARD_SYNC_CHUNK = 500
+
+# Margen al buscar pedidos modificados en WooCommerce desde la última
+# sincronización (cubre transacciones que confirmaron con fecha anterior)
+BOARD_REFRESH_OVERLAP_MINUTES = 2
+
+# Pedidos que salieron de wc-processing se conservan este tiempo en el
+# snapshot para que el modo incremental los reporte como 'removed'
+BOARD_RETENTION_HOURS = 24
+
+# Lock de MySQL (GET_LOCK) que serializa refresh_dispatch_board entre workers
+BOARD_REFRESH_LOCK = 'dispatch_board_refresh'
+
+# Última sincronización de este worker (time.monotonic) y lock entre hilos
+_board_refresh_state = {'refreshed_at': 0.0}
+_board_refresh_lock = threading.Lock()
+
+
+def _board_row_params(order, priority, shipping_method, column, now):
+    """Convierte un pedido de load_orders en parámetros del upsert."""
+    is_priority, priority_level, is_atendido = priority or (False, None, False)
+    return {
+        'order_id': order['id'],
+        'order_number': order['order_number'] or f"#{order['id']}",
+        'whatsapp_number': order['order_number'],
+        'board_column': column,
+        'shipping_method': shipping_method,
+        'status': order['status'],
+        'date_created_gmt': order['date_created_gmt'],
+        'source_updated_gmt': order['date_updated_gmt'],
+        'total_amount': order['total_amount'],
+        'billing_email': order['billing_email'],
+        'first_name': order['billing_first_name'],
+        'last_name': order['billing_last_name'],
+        'phone': order['billing_phone'],
+        'shipping_district': order['shipping_city'],
+        'created_by': order['created_by'],
+        'is_priority': bool(is_priority),
+        'priority_level': priority_level or 'normal',
+        'is_atendido': bool(is_atendido),
+        'is_cod': order['is_cod'] == 'yes',
+        'shipping_cost': order['shipping_cost'] or 0,
+        'updated_at': now
+    }
+
+
+def _sync_board_chunk(order_ids, now):
+    """
+    Sincroniza en woo_dispatch_board los pedidos indicados.
+
+    Los pedidos en wc-processing se insertan/actualizan. Los que ya no están
+    en wc-processing solo se actualizan si ya estaban en el snapshot (así el
+    modo incremental puede informar que salieron del tablero).
+
+    Returns:
+        set: IDs encontrados en wpyz_wc_orders
+    """
+    orders = load_orders(order_ids, BOARD_ORDER_FIELDS)
+
+    if not orders:
+        return set()
+
+    active_ids = [order_id for order_id, order in orders.items() if order['status'] == 'wc-processing']
+
+    priorities = {}
+    if active_ids:
+        priorities = {
+            row[0]: row[1:]
+            for row in db.session.execute(text("""
+                SELECT order_id, is_priority, priority_level, is_atendido
+                FROM woo_dispatch_priorities
+                WHERE order_id IN :order_ids
+            """), {'order_ids': tuple(active_ids)}).fetchall()
+        }
+
+    last_positions = get_last_positions(active_ids) if active_ids else {}
+
+    active = []
+    inactive = []
+    for order_id, order in orders.items():
+        if order['status'] == 'wc-processing':
+            shipping_method = board_shipping_method(order)
+            if order_id in last_positions:
+                column = last_positions[order_id]
+            else:
+                column = map_shipping_method_to_column(shipping_method, order_id)
+            active.append(_board_row_params(order, priorities.get(order_id), shipping_method, column, now))
+        else:
+            inactive.append({
+                'order_id': order_id,
+                'status': order['status'],
+                'source_updated_gmt': order['date_updated_gmt'],
+                'updated_at': now
+            })
+
+    if active:
+        db.session.execute(text("""
+            INSERT INTO woo_dispatch_board (
+                order_id, order_number, whatsapp_number, board_column,
+                shipping_method, status, date_created_gmt, source_updated_gmt,
+                total_amount, billing_email, first_name, last_name, phone,
+                shipping_district, created_by, is_priority, priority_level,
+                is_atendido, is_cod, shipping_cost, updated_at
+            ) VALUES (
+                :order_id, :order_number, :whatsapp_number, :board_column,
+                :shipping_method, :status, :date_created_gmt, :source_updated_gmt,
+                :total_amount, :billing_email, :first_name, :last_name, :phone,
+                :shipping_district, :created_by, :is_priority, :priority_level,
+                :is_atendido, :is_cod, :shipping_cost, :updated_at
+            )
+            ON DUPLICATE KEY UPDATE
+                order_number = VALUES(order_number),
+                whatsapp_number = VALUES(whatsapp_number),
+                board_column = VALUES(board_column),
+                shipping_method = VALUES(shipping_method),
+                status = VALUES(status),
+                date_created_gmt = VALUES(date_created_gmt),
+                source_updated_gmt = VALUES(source_updated_gmt),
+                total_amount = VALUES(total_amount),
+                billing_email = VALUES(billing_email),
+                first_name = VALUES(first_name),
+                last_name = VALUES(last_name),
+                phone = VALUES(phone),
+                shipping_district = VALUES(shipping_district),
+                created_by = VALUES(created_by),
+                is_priority = VALUES(is_priority),
+                priority_level = VALUES(priority_level),
+                is_atendido = VALUES(is_atendido),
+                is_cod = VALUES(is_cod),
+                shipping_cost = VALUES(shipping_cost),
+                updated_at = VALUES(updated_at)
+        """), active)
+
+    if inactive:
+        db.session.execute(text("""
+            UPDATE woo_dispatch_board
+            SET status = :status,
+                source_updated_gmt = :source_updated_gmt,
+                updated_at = :updated_at
+            WHERE order_id = :order_id
+        """), inactive)
+
+    return set(orders)
+
+
+def sync_board_orders(order_ids):
+    """
+    Actualiza el snapshot del tablero para los pedidos indicados.
+
+    Debe llamarse ANTES del commit de la operación que modifica el pedido
+    (mover, prioridad, atendido, tracking, creación) para que el snapshot
+    quede en la misma transacción.
+
+    Args:
+        order_ids: ID o lista de IDs de pedidos
+    """
+    if isinstance(order_ids, int):
+        order_ids = [order_ids]
+    order_ids = list({int(order_id) for order_id in order_ids})
+    if not order_ids:
+        return
+
+    # Las consultas text() no disparan autoflush: enviar cambios ORM pendientes
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for i in range(0, len(order_ids), BOARD_SYNC_CHUNK):
+        chunk = order_ids[i:i + BOARD_SYNC_CHUNK]
+        found = _sync_board_chunk(chunk, now)
+
+        # Pedidos eliminados de WooCommerce
+        missing = [order_id for order_id in chunk if order_id not in found]
+        if missing:
+            db.session.execute(
+                text("DELETE FROM woo_dispatch_board WHERE order_id IN :order_ids"),
+                {'order_ids': tuple(missing)}
+            )
+
+
+def rebuild_dispatch_board():
+    """
+    Regenera woo_dispatch_board desde las tablas fuente.
+
+    Returns:
+        int: Cantidad de pedidos en el tablero
+    """
+    db.session.execute(text("DELETE FROM woo_dispatch_board"))
+
+    order_ids = [
+        row[0] for row in db.session.execute(text(
+            "SELECT id FROM wpyz_wc_orders WHERE status = 'wc-processing'"
+        )).fetchall()
+    ]
+
+    now = datetime.utcnow()
+    for i in range(0, len(order_ids), BOARD_SYNC_CHUNK):
+        chunk = order_ids[i:i + BOARD_SYNC_CHUNK]
+        _sync_board_chunk(chunk, now)
+
+    db.session.commit()
+    current_app.logger.info(f"[DISPATCH] Snapshot del tablero reconstruido: {len(order_ids)} pedidos")
+    return len(order_ids)
+
+
+def _refresh_changed():
+    """Sincronización incremental (con el lock tomado). Ver refresh_dispatch_board."""
+    watermark = db.session.execute(
+        text("SELECT MAX(source_updated_gmt) FROM woo_dispatch_board")
+    ).scalar()
+
+    if watermark is None:
+        # Tabla vacía (sin pedidos en proceso, o antes de la migración): es
+        # un estado válido; solo se incorporan los wc-processing que falten
+        changed_ids = [
+            row[0] for row in db.session.execute(text("""
+                SELECT o.id
+                FROM wpyz_wc_orders o
+                LEFT JOIN woo_dispatch_board b ON b.order_id = o.id
+                WHERE o.status = 'wc-processing' AND b.order_id IS NULL
+            """)).fetchall()
+        ]
+    else:
+        # Pedidos modificados en WooCommerce que el snapshot aún no refleja
+        changed_ids = [
+            row[0] for row in db.session.execute(text("""
+                SELECT o.id
+                FROM wpyz_wc_orders o
+                LEFT JOIN woo_dispatch_board b ON b.order_id = o.id
+                WHERE o.date_updated_gmt >= :watermark - INTERVAL :overlap MINUTE
+                  AND (
+                      (b.order_id IS NULL AND o.status = 'wc-processing')
+                      OR b.source_updated_gmt <> o.date_updated_gmt
+                  )
+            """), {
+                'watermark': watermark,
+                'overlap': BOARD_REFRESH_OVERLAP_MINUTES
+            }).fetchall()
+        ]
+
+    if changed_ids:
+        sync_board_orders(changed_ids)
+
+    # Purgar pedidos que salieron del tablero hace tiempo
+    db.session.execute(text("""
+        DELETE FROM woo_dispatch_board
+        WHERE status <> 'wc-processing'
+          AND updated_at < UTC_TIMESTAMP() - INTERVAL :hours HOUR
+    """), {'hours': BOARD_RETENTION_HOURS})
+
+    db.session.commit()
+
+
+def refresh_dispatch_board():
+    """
+    Incorpora al snapshot los cambios hechos fuera del tablero (pedidos web
+    nuevos, cambios de estado desde wp-admin o desde el módulo de pedidos).
+
+    Usa como marca de agua el mayor date_updated_gmt ya sincronizado, por lo
+    que en condiciones normales solo revisa unos pocos pedidos. Se ejecuta
+    como mucho una vez cada DISPATCH_BOARD_REFRESH_SECONDS por worker y con
+    GET_LOCK: si otro request ya está sincronizando, se omite. Nunca
+    reconstruye la tabla (eso es rebuild_dispatch_board, desde el endpoint
+    de reconstrucción o la migración).
+    """
+    check_seconds = current_app.config.get('DISPATCH_BOARD_REFRESH_SECONDS', 10)
+
+    if time.monotonic() - _board_refresh_state['refreshed_at'] < check_seconds:
+        return
+    if not _board_refresh_lock.acquire(blocking=False):
+        return
+
+    try:
+        with try_named_lock(db.session, BOARD_REFRESH_LOCK) as acquired:
+            if not acquired:
+                return
+            _refresh_changed()
+
+        _board_refresh_state['refreshed_at'] = time.monotonic()
+    finally:
+        _board_refresh_lock.release()
+
+
+def publish_board_event(event_type, order_id, **data):
+    """
+    Publica un evento del tablero para los clientes conectados por SSE.
+    Llamar DESPUÉS del commit.
+
+    Args:
+        event_type: 'move', 'priority', 'atendido', 'note' o 'tracking'
+        order_id: ID del pedido afectado
+        **data: Datos adicionales del evento ('by' = usuario, por defecto el actual)
+    """
+    data['order_id'] = int(order_id)
+    if 'by' not in data:
+        data['by'] = current_user.username if current_user and current_user.is_authenticated else None
+    events.publish('dispatch', event_type, data)
+
+
 # ============================================
 # MIDDLEWARE DE AUTORIZACIÓN
 # ============================================
@@ -465,9 +938,13 @@ def get_orders():
         - date_to: Fecha fin (YYYY-MM-DD)
         - priority_only: Si es 'true', solo pedidos prioritarios
         - shipping_methods: Métodos de envío separados por coma
+        - since: Cursor devuelto por una llamada anterior. Si se envía, solo
+          retorna los pedidos modificados desde ese momento (modo incremental)
+          y en 'removed' los IDs que ya no pertenecen al tablero
 
     Returns:
-        JSON con pedidos agrupados por método de envío
+        JSON con pedidos agrupados por método de envío y el 'cursor'
+        para la siguiente consulta incremental
     """
     try:
         # Parámetros de filtro
@@ -478,6 +955,38 @@ def get_orders():
         no_atendido_only = request.args.get('no_atendido_only', 'false').lower() == 'true'
         shipping_methods_filter = request.args.get('shipping_methods', '').split(',') if request.args.get('shipping_methods') else None
 
+        # Modo incremental (delta)
+        since_param = request.args.get('since')
+        since = None
+        if since_param:
+            since = parse_board_cursor(since_param)
+            if since is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Cursor inválido: {since_param}'
+                }), 400
+
+        # Incorporar al snapshot los cambios hechos fuera del tablero
+        refresh_dispatch_board()
+
+        # Cursor para la siguiente consulta: se toma ANTES de leer los datos
+        # para no perder cambios que ocurran mientras se ejecuta la consulta
+        cursor = db.session.execute(text("SELECT UTC_TIMESTAMP()")).scalar()
+        cursor_str = cursor.strftime(BOARD_CURSOR_FORMAT)
+
+        changed_ids = None
+        if since is not None:
+            changed_ids = get_changed_order_ids(since)
+
+            if not changed_ids:
+                return jsonify({
+                    'success': True,
+                    'delta': True,
+                    'cursor': cursor_str,
+                    'orders': {column: [] for column in BOARD_COLUMNS},
+                    'removed': []
+                })
+
         # Convertir formato de fecha si viene en formato dd/mm/yyyy a yyyy-mm-dd
         if date_from and '/' in date_from:
             # Formato dd/mm/yyyy -> yyyy-mm-dd
@@ -491,102 +1000,36 @@ def get_orders():
             if len(parts) == 3:
                 date_to = f"{parts[2]}-{parts[1]}-{parts[0]}"
 
-        # Query base: TODOS los pedidos wc-processing (WooCommerce nativos + WhatsApp)
+        # Query base: snapshot de pedidos wc-processing (WooCommerce nativos + WhatsApp)
         query = text("""
             SELECT
-                o.id,
-                MAX(COALESCE(om_number.meta_value, CONCAT('#', o.id))) as order_number,
-                MAX(om_number.meta_value) as whatsapp_number,
-                MAX(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) as date_created_local,
-                MAX(o.total_amount) as total_amount,
-                MAX(o.status) as status,
-                MAX(o.billing_email) as billing_email,
-
-                -- Datos de cliente
-                MAX(ba.first_name) as first_name,
-                MAX(ba.last_name) as last_name,
-                MAX(ba.phone) as phone,
-
-                -- Método de envío (con fallback para pedidos sin shipping item)
-                COALESCE(
-                    (SELECT oi.order_item_name
-                     FROM wpyz_woocommerce_order_items oi
-                     WHERE oi.order_id = o.id
-                       AND oi.order_item_type = 'shipping'
-                     LIMIT 1),
-                    -- Fallback: extraer desde _billing_entrega metadata
-                    MAX(CASE
-                        WHEN om_billing_entrega.meta_value = 'billing_recojo' THEN 'Recojo en Almacén'
-                        WHEN om_billing_entrega.meta_value LIKE '%recojo%' THEN 'Recojo en Almacén'
-                        WHEN om_billing_entrega.meta_value = 'billing_address' THEN 'Envío a domicilio'
-                        ELSE NULL
-                    END)
-                ) as shipping_method,
-
-                -- Prioridad (si existe)
-                MAX(dp.is_priority) as is_priority,
-                MAX(dp.priority_level) as priority_level,
-                MAX(dp.is_atendido) as is_atendido,
+                b.order_id,
+                b.order_number,
+                b.whatsapp_number,
+                DATE_SUB(b.date_created_gmt, INTERVAL 5 HOUR) as date_created_local,
+                b.total_amount,
+                b.status,
+                b.billing_email,
+                b.first_name,
+                b.last_name,
+                b.phone,
+                b.shipping_method,
+                b.is_priority,
+                b.priority_level,
+                b.is_atendido,
 
                 -- Tiempo sin mover (horas desde última actualización)
-                MAX(TIMESTAMPDIFF(HOUR, o.date_updated_gmt, UTC_TIMESTAMP())) as hours_since_update,
-
-                -- Usuario que creó el pedido
-                MAX(om_created.meta_value) as created_by,
-
-                -- Distrito de envío (para pedidos 1 día hábil)
-                MAX(sa.city) as shipping_district,
-
-                -- Pago contraentrega (COD)
-                MAX(om_is_cod.meta_value) as is_cod,
-
-                -- Costo de envío (para calcular monto COD)
-                (SELECT SUM(CAST(oim_cost.meta_value AS DECIMAL(10,2)))
-                 FROM wpyz_woocommerce_order_items oi
-                 LEFT JOIN wpyz_woocommerce_order_itemmeta oim_cost
-                     ON oi.order_item_id = oim_cost.order_item_id
-                     AND oim_cost.meta_key = 'cost'
-                 WHERE oi.order_id = o.id
-                   AND oi.order_item_type = 'shipping'
-                 LIMIT 1) as shipping_cost
-
-            FROM wpyz_wc_orders o
-
-            -- Número de pedido (opcional - puede no tener W-XXXXX si es WooCommerce nativo)
-            LEFT JOIN wpyz_wc_orders_meta om_number
-                ON o.id = om_number.order_id
-                AND om_number.meta_key = '_order_number'
-
-            -- Dirección de facturación (datos de cliente)
-            LEFT JOIN wpyz_wc_order_addresses ba
-                ON o.id = ba.order_id
-                AND ba.address_type = 'billing'
-
-            -- Dirección de envío (para obtener distrito)
-            LEFT JOIN wpyz_wc_order_addresses sa
-                ON o.id = sa.order_id
-                AND sa.address_type = 'shipping'
-
-            -- Prioridades
-            LEFT JOIN woo_dispatch_priorities dp
-                ON o.id = dp.order_id
-
-            -- Usuario que creó
-            LEFT JOIN wpyz_wc_orders_meta om_created
-                ON o.id = om_created.order_id
-                AND om_created.meta_key = '_created_by'
+                TIMESTAMPDIFF(HOUR, b.source_updated_gmt, UTC_TIMESTAMP()) as hours_since_update,
 
-            -- Metadata de tipo de entrega (fallback para shipping_method)
-            LEFT JOIN wpyz_wc_orders_meta om_billing_entrega
-                ON o.id = om_billing_entrega.order_id
-                AND om_billing_entrega.meta_key = '_billing_entrega'
+                b.created_by,
+                b.shipping_district,
+                b.is_cod,
+                b.shipping_cost,
+                b.board_column
 
-            -- Metadata de pago contraentrega (COD)
-            LEFT JOIN wpyz_wc_orders_meta om_is_cod
-                ON o.id = om_is_cod.order_id
-                AND om_is_cod.meta_key = '_is_cod'
+            FROM woo_dispatch_board b
 
-            WHERE o.status = 'wc-processing'
+            WHERE b.status = 'wc-processing'
 
             -- Filtro por fecha
             {date_filter}
@@ -597,11 +1040,12 @@ def get_orders():
             -- Filtro por estado de atendido
             {atendido_filter}
 
-            GROUP BY o.id
+            -- Filtro incremental (solo pedidos modificados)
+            {delta_filter}
 
             ORDER BY
-                dp.is_priority DESC,
-                dp.priority_level DESC,
+                b.is_priority DESC,
+                b.priority_level DESC,
                 hours_since_update DESC  -- Pedidos con más retraso primero
         """)
 
@@ -609,139 +1053,81 @@ def get_orders():
         date_filter = ""
         priority_filter = ""
         atendido_filter = ""
+        delta_filter = ""
         params = {}
 
         # NOTA: El filtro de fechas es OPCIONAL
         # Por defecto, muestra TODOS los pedidos en estado wc-processing
         # Solo filtra por fecha si el usuario aplica el filtro manualmente
-        # IMPORTANTE: Usar DATE_SUB para convertir GMT a hora de Perú (UTC-5)
+        # IMPORTANTE: Los días son de hora de Perú (UTC-5); se convierten a
+        # límites GMT para que el filtro use el índice de date_created_gmt
         if date_from and date_to:
-            date_filter = "AND DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :date_from AND :date_to"
-            params['date_from'] = date_from
-            params['date_to'] = date_to
+            date_filter = f"AND {lima_range_filter('b.date_created_gmt')}"
+            params.update(lima_range_params(date_from, date_to))
 
         if priority_only:
-            priority_filter = "AND dp.is_priority = TRUE"
+            priority_filter = "AND b.is_priority = TRUE"
 
         # Filtros de estado de atendido (mutuamente excluyentes)
         if atendido_only:
-            atendido_filter = "AND dp.is_atendido = TRUE"
+            atendido_filter = "AND b.is_atendido = TRUE"
         elif no_atendido_only:
-            atendido_filter = "AND (dp.is_atendido = FALSE OR dp.is_atendido IS NULL)"
+            atendido_filter = "AND b.is_atendido = FALSE"
+
+        if changed_ids is not None:
+            delta_filter = "AND b.order_id IN :changed_ids"
+            params['changed_ids'] = tuple(changed_ids)
 
         # Reemplazar placeholders
         query_str = str(query).format(
             date_filter=date_filter,
             priority_filter=priority_filter,
-            atendido_filter=atendido_filter
+            atendido_filter=atendido_filter,
+            delta_filter=delta_filter
         )
 
-        # Log para debug
-        current_app.logger.info("="*80)
-        current_app.logger.info(f"DISPATCH API - GET ORDERS REQUEST")
-        current_app.logger.info(f"date_from (convertido): {date_from}")
-        current_app.logger.info(f"date_to (convertido): {date_to}")
-        current_app.logger.info(f"priority_only: {priority_only}")
-        current_app.logger.info(f"Query params: {params}")
-        current_app.logger.info(f"Date filter SQL: {date_filter}")
-        current_app.logger.info("="*80)
-
         # Ejecutar query
         results = db.session.execute(text(query_str), params).fetchall()
 
-        current_app.logger.info(f"✓ Pedidos encontrados: {len(results)}")
-        if len(results) > 0:
-            current_app.logger.info(f"  Primer pedido: ID={results[0][0]}, Numero={results[0][1]}, Fecha={results[0][2]}")
-        current_app.logger.info("="*80)
+        if since is None:
+            current_app.logger.info(f"[DISPATCH] get_orders completo: {len(results)} pedidos (filtros: {params})")
+        else:
+            current_app.logger.info(
+                f"[DISPATCH] get_orders incremental desde {since_param}: "
+                f"{len(changed_ids)} modificados, {len(results)} en tablero"
+            )
 
         # Agrupar por método de envío
-        orders_by_method = {
-            'Por Asignar': [],
-            'Olva Courier': [],
-            'Recojo en Almacén': [],
-            'Motorizado (CHAMO)': [],
-            'SHALOM': [],
-            'DINSIDES': []
-        }
+        orders_by_method = {column: [] for column in BOARD_COLUMNS}
 
-        # Obtener última ubicación de cada pedido desde el historial
-        order_ids = [row[0] for row in results]
-        last_positions = {}
-
-        if order_ids:
-            # Query para obtener el último movimiento de cada pedido
-            positions_query = text("""
-                SELECT
-                    dh.order_id,
-                    dh.new_shipping_method
-                FROM woo_dispatch_history dh
-                INNER JOIN (
-                    SELECT order_id, MAX(changed_at) as last_changed
-                    FROM woo_dispatch_history
-                    WHERE order_id IN :order_ids
-                    GROUP BY order_id
-                ) latest ON dh.order_id = latest.order_id
-                    AND dh.changed_at = latest.last_changed
-            """)
-
-            positions_result = db.session.execute(
-                positions_query,
-                {'order_ids': tuple(order_ids)}
-            ).fetchall()
-
-            # Mapear order_id -> última columna
-            for pos_row in positions_result:
-                last_positions[pos_row[0]] = pos_row[1]
+        # IDs que siguen visibles en el tablero (para calcular 'removed')
+        visible_ids = set()
 
         for row in results:
             order_id = row[0]
 
-            # Verificar historial vs método de envío (SIN consultas adicionales)
-            shipping_method_str = row[10]
-            if order_id in last_positions:
-                column = last_positions[order_id]
-            else:
-                column = map_shipping_method_to_column(shipping_method_str, order_id)
+            # Columna ya resuelta en el snapshot (historial o método de envío)
+            column = row[19]
 
             # Aplicar filtro de métodos si existe
             if shipping_methods_filter and column not in shipping_methods_filter:
                 continue
 
-            # Construir objeto de pedido
-            whatsapp_number = row[2]  # W-XXXXX si existe, None si no
-            display_number = row[1]   # Ya viene como COALESCE(W-XXXXX, #ID)
-
-            # Si es pedido WhatsApp, mostrar #ID principal y W-XXXXX secundario
-            if whatsapp_number and whatsapp_number.startswith('W-'):
-                display_number = f"#{row[0]}"  # ID original
-                whatsapp_label = whatsapp_number  # W-XXXXX
-            else:
-                whatsapp_label = None
-
-            order_data = {
-                'id': row[0],
-                'number': display_number,
-                'whatsapp_number': whatsapp_label,  # W-XXXXX para mostrar en gris
-                'date_created': row[3].strftime('%Y-%m-%d %H:%M') if row[3] else None,
-                'total': float(row[4]) if row[4] else 0,
-                'status': row[5],
-                'email': row[6],
-                'customer_name': f"{row[7]} {row[8]}" if row[7] and row[8] else 'N/A',
-                'customer_phone': row[9] or 'N/A',
-                'shipping_method': row[10] or 'Sin método',
-                'is_priority': bool(row[11]) if row[11] is not None else False,
-                'priority_level': row[12] or 'normal',
-                'is_atendido': bool(row[13]) if row[13] is not None else False,
-                'hours_since_update': row[14] or 0,
-                'is_stale': (row[14] or 0) > 24,  # Más de 24h sin mover
-                'created_by': row[15] or 'Desconocido',
-                'shipping_district': row[16] or None,  # Distrito de envío
-                'is_cod': row[17] == 'yes',  # Pago contraentrega
-                'shipping_cost': float(row[18]) if row[18] else 0  # Costo de envío (para COD)
-            }
+            order_data = build_board_order(row)
 
             # Agregar a la columna correspondiente (con fallback de seguridad)
             orders_by_method.get(column, orders_by_method['Por Asignar']).append(order_data)
+            visible_ids.add(order_id)
+
+        # Modo incremental: el cliente aplica el parche sobre su estado local
+        if since is not None:
+            return jsonify({
+                'success': True,
+                'delta': True,
+                'cursor': cursor_str,
+                'orders': orders_by_method,
+                'removed': [order_id for order_id in changed_ids if order_id not in visible_ids]
+            })
 
         # Calcular estadísticas
         total_orders = sum(len(orders) for orders in orders_by_method.values())
@@ -763,6 +1149,8 @@ def get_orders():
 
         return jsonify({
             'success': True,
+            'delta': False,
+            'cursor': cursor_str,
             'orders': orders_by_method,
             'stats': {
                 'total': total_orders,
@@ -783,6 +1171,62 @@ def get_orders():
         }), 500
 
 
+@bp.route('/api/events', methods=['GET'])
+@login_required
+@master_required
+def board_events():
+    """
+    Stream SSE de eventos del tablero (move, priority, atendido, note, tracking).
+
+    Cada evento solo indica el pedido afectado; el cliente aplica el cambio
+    pidiendo /api/orders?since=<cursor>. La conexión se cierra a los
+    EVENTS_MAX_STREAM_SECONDS y EventSource reconecta con Last-Event-ID.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    # Liberar la conexión de BD de la sesión antes del stream de larga duración
+    db.session.remove()
+
+    return Response(
+        stream_with_context(events.stream('dispatch', last_event_id)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Evitar buffering en nginx
+        }
+    )
+
+
+@bp.route('/api/board/rebuild', methods=['POST'])
+@login_required
+@master_required
+def rebuild_board():
+    """
+    Regenerar el snapshot del tablero (woo_dispatch_board) desde las tablas
+    fuente. Útil si el snapshot quedó desincronizado.
+
+    Returns:
+        JSON con la cantidad de pedidos en el tablero
+    """
+    try:
+        total = rebuild_dispatch_board()
+
+        current_app.logger.info(f"[DISPATCH] Snapshot reconstruido por {current_user.username}: {total} pedidos")
+
+        return jsonify({
+            'success': True,
+            'total': total
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error reconstruyendo snapshot del tablero: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @bp.route('/api/move', methods=['POST'])
 @login_required
 @master_required
@@ -853,8 +1297,14 @@ def move_order():
         # Actualizar date_updated_gmt del pedido
         order.date_updated_gmt = datetime.utcnow()
 
+        # Actualizar snapshot del tablero en la misma transacción
+        sync_board_orders(order_id)
+
         db.session.commit()
 
+        publish_board_event('move', order_id, order_number=order_number,
+                            previous_column=current_shipping, column=new_shipping_method)
+
         current_app.logger.info(
             f"Pedido {order_number} movido de '{current_shipping}' a '{new_shipping_method}' "
             f"por {current_user.username}"
@@ -940,8 +1390,14 @@ def set_priority():
         priority.marked_at = datetime.utcnow() if is_priority else None
         priority.priority_note = note if is_priority else None
 
+        # Actualizar snapshot del tablero en la misma transacción
+        sync_board_orders(order_id)
+
         db.session.commit()
 
+        publish_board_event('priority', order_id, order_number=order_number,
+                            is_priority=is_priority, priority_level=priority_level)
+
         action = "marcado como prioritario" if is_priority else "desmarcado como prioritario"
         current_app.logger.info(
             f"Pedido {order_number} {action} (nivel: {priority_level}) "
@@ -1022,8 +1478,13 @@ def set_atendido():
         priority.atendido_by = current_user.username if is_atendido else None
         priority.atendido_at = datetime.utcnow() if is_atendido else None
 
+        # Actualizar snapshot del tablero en la misma transacción
+        sync_board_orders(order_id)
+
         db.session.commit()
 
+        publish_board_event('atendido', order_id, order_number=order_number, is_atendido=is_atendido)
+
         action = "marcado como atendido/empaquetado" if is_atendido else "desmarcado como atendido"
         current_app.logger.info(
             f"Pedido {order_number} {action} por {current_user.username}"
@@ -1100,6 +1561,8 @@ def add_note():
         db.session.add(history_entry)
         db.session.commit()
 
+        publish_board_event('note', order_id, order_number=order_number)
+
         current_app.logger.info(
             f"Nota agregada al pedido {order_number} por {current_user.username}: {note[:50]}..."
         )
@@ -1594,8 +2057,13 @@ def add_tracking():
             'serialized_items': serialized_items
         })
 
+        # Actualizar snapshot del tablero en la misma transacción
+        sync_board_orders(order_id)
+
         db.session.commit()
 
+        publish_board_event('tracking', order_id, status_changed=mark_as_shipped)
+
         # Obtener número de pedido
         order_number = order.get_meta('_order_number')
         if not order_number:
@@ -1633,12 +2101,173 @@ def add_tracking():
 # ============================================
 
 
+def format_date_spanish(date_str):
+    """Formatea una fecha YYYY-MM-DD a texto legible (ej: "21 de enero")."""
+    months = [
+        'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+        'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+    ]
+    try:
+        year, month, day = date_str.split('-')
+        day_num = int(day)
+        month_name = months[int(month) - 1]
+        return f"{day_num} de {month_name}"
+    except:
+        return date_str
+
+
+def run_bulk_tracking_simple(order_ids, column, shipping_date, username=None):
+    """
+    Asigna tracking con mensaje dinámico a pedidos CHAMO o DINSIDES.
+
+    Igual que run_bulk_tracking: carga los pedidos en lote, prepara los
+    payloads, llama a la API en paralelo con wc_pool y guarda en BD con
+    save_tracking_batch (un commit por lote; por pedido si el lote falla).
+
+    Args:
+        order_ids: Lista de IDs de pedidos
+        column: 'chamo' o 'dinsides'
+        shipping_date: Fecha de envío (YYYY-MM-DD)
+        username: Usuario que asigna el tracking (por defecto, el actual)
+
+    Returns:
+        tuple: (resultados, exitosos, fallidos, chamo_registered);
+               resultados en el mismo orden que order_ids
+    """
+    username = username or current_user.username
+
+    # Formatear fecha para el mensaje
+    fecha_formateada = format_date_spanish(shipping_date)
+
+    # Plantillas de mensajes con fecha dinámica (normal y COD)
+    message_templates = {
+        'chamo': {
+            'normal': f"Hola, somos izistore. Su pedido estará llegando el {fecha_formateada} entre las 11:00 am y 7:00 pm.",
+            'cod': f"Hola, somos izistore. Su pedido estará llegando el {fecha_formateada} entre las 11:00 am y 7:00 pm.\n\n⚠️ IMPORTANTE: Este pedido es PAGO CONTRAENTREGA.\nMonto a cancelar: S/ {{monto}}\n\nPor favor, tenga el monto exacto disponible para el courier."
+        },
+        'dinsides': {
+            'normal': f"Hola, somos izistore. Su pedido está programado para ser entregado el {fecha_formateada} entre las 11:00 AM y 7:00 PM.",
+            'cod': f"Hola, somos izistore. Su pedido está programado para ser entregado el {fecha_formateada} entre las 11:00 AM y 7:00 PM.\n\n⚠️ IMPORTANTE: Este pedido es PAGO CONTRAENTREGA.\nMonto a cancelar: S/ {{monto}}\n\nPor favor, tenga el monto exacto disponible para el courier."
+        }
+    }
+
+    # Proveedores por columna
+    providers = {
+        'chamo': "Motorizado Izi",
+        'dinsides': "Dinsides Courier"
+    }
+
+    shipping_provider = providers[column]
+    date_shipped = shipping_date  # Usar la fecha seleccionada
+    timestamp = int(datetime.utcnow().timestamp())
+
+    resultados = [None] * len(order_ids)
+    chamo_registered = 0  # Contador de envíos CHAMO registrados
+
+    current_app.logger.info(f"[BULK-TRACKING-SIMPLE] Iniciando proceso para {len(order_ids)} pedidos de {column.upper()}")
+
+    # 1. PREPARAR MENSAJES Y PAYLOADS (pedidos cargados en lote)
+    orders = load_tracking_orders(order_ids)
+    pendientes = []
+    for index, order_id in enumerate(order_ids):
+        # Validar que el pedido existe
+        order = orders.get(int(order_id))
+        if not order:
+            resultados[index] = {
+                'order_id': order_id,
+                'success': False,
+                'error': 'Pedido no encontrado'
+            }
+            continue
+
+        order_number = order['order_number']
+
+        # Verificar si es pedido COD y generar mensaje personalizado
+        if order['is_cod']:
+            tracking_message = message_templates[column]['cod'].format(
+                monto=f"{float(order['total_amount'] or 0):.2f}"
+            )
+            current_app.logger.info(f"[BULK-TRACKING-SIMPLE] Pedido {order_number} es COD, usando mensaje personalizado")
+        else:
+            tracking_message = message_templates[column]['normal']
+
+        tracking_items = build_tracking_items(tracking_message, shipping_provider, date_shipped, timestamp)
+        pendientes.append({
+            'index': index,
+            'order_id': int(order_id),
+            'order_number': order_number,
+            'tracking_number': tracking_message,
+            'tracking_items': tracking_items,
+            'payload': build_tracking_api_payload(
+                order['payment_method'], tracking_message, shipping_provider, tracking_items
+            )
+        })
+
+    # Cerrar la transacción de lectura: la conexión vuelve al pool
+    # mientras se espera a la API
+    db.session.commit()
+
+    # 2. ACTUALIZAR VÍA API EN PARALELO (cambia estado y envía email)
+    api_results = wc_pool.map([
+        ('PUT', f"orders/{pendiente['order_id']}", pendiente['payload'])
+        for pendiente in pendientes
+    ])
+    for pendiente, api_result in zip(pendientes, api_results):
+        pendiente['api_result'] = api_result
+
+    # 3. GUARDAR EN BASE DE DATOS (mismo guardado en lote que Shalom / Olva)
+    chamo_registrations = {}
+
+    def register_chamo(entries):
+        # REGISTRO CHAMO en la misma transacción que el tracking
+        for entry in entries:
+            chamo_registrations[entry['order_id']] = bool(register_chamo_shipment(
+                order_id=entry['order_id'],
+                order_number=entry['order_number'],
+                tracking_number=entry['tracking_number'],
+                delivery_date=shipping_date,
+                sent_via='bulk',
+                sent_by=username
+            ))
+
+    saved = save_tracking_batch(
+        pendientes, shipping_provider, username,
+        history_method=None,
+        before_commit=register_chamo if column == 'chamo' else None
+    )
+
+    for pendiente, resultado in zip(pendientes, saved):
+        if resultado['success']:
+            resultados[pendiente['index']] = {
+                'order_id': pendiente['order_id'],
+                'order_number': pendiente['order_number'],
+                'success': True
+            }
+            if chamo_registrations.get(pendiente['order_id']):
+                chamo_registered += 1
+        else:
+            resultados[pendiente['index']] = {
+                'order_id': pendiente['order_id'],
+                'success': False,
+                'error': resultado['error']
+            }
+
+    exitosos = sum(1 for resultado in resultados if resultado['success'])
+    fallidos = len(resultados) - exitosos
+
+    current_app.logger.info(
+        f"[BULK-TRACKING-SIMPLE] Proceso completado: {exitosos} exitosos, {fallidos} fallidos"
+    )
+
+    return resultados, exitosos, fallidos, chamo_registered
+
+
 @bp.route('/api/bulk-tracking-simple', methods=['POST'])
 @login_required
 @master_required
 def bulk_tracking_simple():
     """
-    Procesa tracking masivo para CHAMO o DINSIDES con mensaje dinámico.
+    Encola tracking masivo para CHAMO o DINSIDES con mensaje dinámico.
 
     A diferencia de Shalom que requiere un Excel con claves, CHAMO y DINSIDES
     usan mensajes de tracking con fecha seleccionable.
@@ -1651,25 +2280,8 @@ def bulk_tracking_simple():
     }
 
     Returns:
-        JSON con resultado del proceso masivo
+        JSON con el job_id; el progreso se consulta en /api/jobs/<job_id>
     """
-    import time
-    import phpserialize
-
-    # Función para formatear fecha a texto legible (ej: "21 de enero")
-    def format_date_spanish(date_str):
-        months = [
-            'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
-            'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
-        ]
-        try:
-            year, month, day = date_str.split('-')
-            day_num = int(day)
-            month_name = months[int(month) - 1]
-            return f"{day_num} de {month_name}"
-        except:
-            return date_str
-
     try:
         data = request.get_json()
         order_ids = data.get('orders', [])
@@ -1685,183 +2297,22 @@ def bulk_tracking_simple():
         if not shipping_date:
             return jsonify({'success': False, 'error': 'No se especificó fecha de envío'}), 400
 
-        # Formatear fecha para el mensaje
-        fecha_formateada = format_date_spanish(shipping_date)
-
-        # Plantillas de mensajes con fecha dinámica (normal y COD)
-        message_templates = {
-            'chamo': {
-                'normal': f"Hola, somos izistore. Su pedido estará llegando el {fecha_formateada} entre las 11:00 am y 7:00 pm.",
-                'cod': f"Hola, somos izistore. Su pedido estará llegando el {fecha_formateada} entre las 11:00 am y 7:00 pm.\n\n⚠️ IMPORTANTE: Este pedido es PAGO CONTRAENTREGA.\nMonto a cancelar: S/ {{monto}}\n\nPor favor, tenga el monto exacto disponible para el courier."
-            },
-            'dinsides': {
-                'normal': f"Hola, somos izistore. Su pedido está programado para ser entregado el {fecha_formateada} entre las 11:00 AM y 7:00 PM.",
-                'cod': f"Hola, somos izistore. Su pedido está programado para ser entregado el {fecha_formateada} entre las 11:00 AM y 7:00 PM.\n\n⚠️ IMPORTANTE: Este pedido es PAGO CONTRAENTREGA.\nMonto a cancelar: S/ {{monto}}\n\nPor favor, tenga el monto exacto disponible para el courier."
-            }
-        }
+        # Idempotencia: mismo pedido + columna + fecha = mismo mensaje de tracking
+        job_id = jobs.enqueue(
+            'bulk_tracking_simple',
+            [
+                {'order_id': order_id, 'key': f"{column}:{shipping_date}"}
+                for order_id in order_ids
+            ],
+            params={'column': column, 'shipping_date': shipping_date},
+            created_by=current_user.username
+        )
 
-        # Proveedores por columna
-        providers = {
-            'chamo': "Motorizado Izi",
-            'dinsides': "Dinsides Courier"
-        }
-
-        shipping_provider = providers[column]
-        date_shipped = shipping_date  # Usar la fecha seleccionada
-        timestamp = int(datetime.utcnow().timestamp())
-
-        # Inicializar API de WooCommerce
-        wc_api = get_wc_api()
-
-        resultados = []
-        exitosos = 0
-        fallidos = 0
-        chamo_registered = 0  # Contador de envíos CHAMO registrados
-
-        current_app.logger.info(f"[BULK-TRACKING-SIMPLE] Iniciando proceso para {len(order_ids)} pedidos de {column.upper()}")
-
-        for order_id in order_ids:
-            try:
-                # Validar que el pedido existe
-                order = Order.query.get(order_id)
-                if not order:
-                    fallidos += 1
-                    resultados.append({
-                        'order_id': order_id,
-                        'success': False,
-                        'error': 'Pedido no encontrado'
-                    })
-                    continue
-
-                # Obtener número de pedido
-                order_number = order.get_meta('_order_number') or f"#{order_id}"
-
-                # Verificar si es pedido COD y generar mensaje personalizado
-                is_cod = order.get_meta('_is_cod') == 'yes'
-                if is_cod:
-                    tracking_message = message_templates[column]['cod'].format(
-                        monto=f"{float(order.total_amount):.2f}"
-                    )
-                    current_app.logger.info(f"[BULK-TRACKING-SIMPLE] Pedido {order_number} es COD, usando mensaje personalizado")
-                else:
-                    tracking_message = message_templates[column]['normal']
-
-                # Crear tracking items en formato PHP serializado
-                tracking_items = [{
-                    'tracking_number': tracking_message,
-                    'tracking_provider': shipping_provider,
-                    'custom_tracking_provider': '',
-                    'custom_tracking_link': '',
-                    'date_shipped': date_shipped,
-                    'tracking_id': str(timestamp)
-                }]
-                serialized_items = phpserialize.dumps(tracking_items).decode('utf-8')
-
-                # 1. ACTUALIZAR VÍA API (cambia estado y envía email)
-                try:
-                    payment_method = order.get_meta('_payment_method') or order.payment_method
-                    wc_api.put(f"orders/{order_id}", {
-                        "status": "completed",
-                        "payment_method": payment_method,
-                        "meta_data": [
-                            {"key": "_tracking_number", "value": tracking_message},
-                            {"key": "_tracking_provider", "value": shipping_provider},
-                            {"key": "_wc_shipment_tracking_items", "value": tracking_items}
-                        ]
-                    })
-                    current_app.logger.info(f"[BULK-TRACKING-SIMPLE] Order {order_number}: API update success")
-                    order.status = 'wc-completed'
-                    order.date_updated_gmt = datetime.utcnow()
-
-                except Exception as api_err:
-                    current_app.logger.error(f"[BULK-TRACKING-SIMPLE] Order {order_number}: API Error - {str(api_err)}")
-                    order.status = 'wc-completed'
-                    order.date_updated_gmt = datetime.utcnow()
-
-                # 2. GUARDAR EN BASE DE DATOS (duplicados para plugin)
-                query_delete_old = text("""
-                    DELETE FROM wpyz_postmeta
-                    WHERE post_id = :order_id
-                      AND meta_key IN ('_tracking_number', '_tracking_provider', '_wc_shipment_tracking_items')
-                """)
-                db.session.execute(query_delete_old, {'order_id': order_id})
-
-                query_insert = text("""
-                    INSERT INTO wpyz_postmeta (post_id, meta_key, meta_value)
-                    VALUES (:order_id, :key, :value)
-                """)
-
-                for key, value in [
-                    ('_tracking_number', tracking_message),
-                    ('_tracking_provider', shipping_provider),
-                    ('_wc_shipment_tracking_items', serialized_items)
-                ]:
-                    db.session.execute(query_insert, {'order_id': order_id, 'key': key, 'value': value})
-
-                # 3. GUARDAR EN HPOS
-                query_hpos = text("""
-                    INSERT INTO wpyz_wc_orders_meta (order_id, meta_key, meta_value)
-                    VALUES (:order_id, '_wc_shipment_tracking_items', :serialized_items)
-                    ON DUPLICATE KEY UPDATE meta_value = :serialized_items
-                """)
-                db.session.execute(query_hpos, {
-                    'order_id': order_id,
-                    'serialized_items': serialized_items
-                })
-
-                # REGISTRO CHAMO: Si la columna es CHAMO, registrar envío (ANTES del commit)
-                if column == 'chamo':
-                    chamo_reg = register_chamo_shipment(
-                        order_id=order_id,
-                        order_number=order_number,
-                        tracking_number=tracking_message,
-                        delivery_date=shipping_date,
-                        sent_via='bulk'
-                    )
-                    if chamo_reg:
-                        chamo_registered += 1
-
-                current_app.logger.info(
-                    f"[BULK-TRACKING-SIMPLE] Tracking asignado a {order_number} ({column.upper()}) por {current_user.username}"
-                )
-
-            except Exception as e:
-                db.session.rollback()
-                fallidos += 1
-                resultados.append({
-                    'order_id': order_id,
-                    'success': False,
-                    'error': str(e)
-                })
-                current_app.logger.error(f"[BULK-TRACKING-SIMPLE] Error procesando order {order_id}: {str(e)}")
-            
-            finally:
-                # IMPORTANTE: Remover la sesión después de cada orden en el bulk 
-                # para asegurar que la conexión vuelva al pool rápidamente
-                # y no se mantenga ocupada durante el sleep.
-                db.session.remove()
-
-                # Rate limiting - esperar 1 segundo entre pedidos (FUERA de la conexión activa)
-                if len(order_ids) > 1:
-                    time.sleep(1)
-
-        current_app.logger.info(
-            f"[BULK-TRACKING-SIMPLE] Proceso completado: {exitosos} exitosos, {fallidos} fallidos"
-        )
-
-        response_data = {
+        return jsonify({
             'success': True,
-            'exitosos': exitosos,
-            'fallidos': fallidos,
-            'total': len(order_ids),
-            'resultados': resultados
-        }
-
-        # Si es CHAMO, agregar info de registros
-        if column == 'chamo':
-            response_data['chamo_registered'] = chamo_registered
-
-        return jsonify(response_data)
+            'job_id': job_id,
+            'total': len(order_ids)
+        }), 202
 
     except Exception as e:
         current_app.logger.error(f"Error en bulk_tracking_simple: {str(e)}")
@@ -1942,8 +2393,7 @@ def bulk_tracking_preview():
         JSON con lista de envíos y su estado de matching
     """
     try:
-        from openpyxl import load_workbook
-        from io import BytesIO
+        from app.utils.excel_manifests import iter_shalom_blocks
 
         # Verificar que se envió un archivo
         if 'file' not in request.files:
@@ -1970,26 +2420,14 @@ def bulk_tracking_preview():
         excel_filename = file.filename
         current_app.logger.info(f"[BULK-TRACKING] Procesando archivo: {excel_filename}")
 
-        # Cargar el Excel desde memoria (sin guardar en disco)
-        workbook = load_workbook(BytesIO(file.read()), data_only=True)
-        sheet = workbook.active
-
-        # Parsear envíos (cada 26 filas)
+        # Parsear envíos (cada 26 filas) leyendo solo la columna A en streaming
         envios = []
-        fila = 1
-        envio_num = 1
-
-        while True:
-            # Verificar si hay datos en la primera celda del bloque
-            celda_inicio = sheet[f'A{fila}'].value
-            if not celda_inicio or not str(celda_inicio).strip():
-                break
 
-            # Extraer datos del bloque de 26 filas
-            dni_destinatario = str(sheet[f'A{fila + 13}'].value or '').strip()  # A14
-            tel_destinatario = str(sheet[f'A{fila + 14}'].value or '').strip()  # A15
-            orden_shalom = str(sheet[f'A{fila + 22}'].value or '').strip()      # A23
-            codigo_shalom = str(sheet[f'A{fila + 23}'].value or '').strip()     # A24
+        for bloque in iter_shalom_blocks(file.stream, excel_filename, max_envios=100):
+            dni_destinatario = bloque['dni_destinatario']
+            tel_destinatario = bloque['tel_destinatario']
+            orden_shalom = bloque['orden_shalom']
+            codigo_shalom = bloque['codigo_shalom']
 
             # Construir la CLAVE (últimos 2 dígitos de DNI destinatario + últimos 2 de teléfono destinatario)
             clave = ''
@@ -2003,8 +2441,8 @@ def bulk_tracking_preview():
             tracking_number = f"{orden_shalom} {codigo_shalom} CLAVE: {clave}"
 
             envio = {
-                'envio_num': envio_num,
-                'fila_inicio': fila,
+                'envio_num': bloque['envio_num'],
+                'fila_inicio': bloque['fila_inicio'],
                 'dni_destinatario': dni_destinatario,
                 'tel_destinatario': tel_destinatario,
                 'orden_shalom': orden_shalom,
@@ -2020,14 +2458,6 @@ def bulk_tracking_preview():
             }
 
             envios.append(envio)
-            fila += 26
-            envio_num += 1
-
-            # Límite de seguridad
-            if envio_num > 100:
-                break
-
-        workbook.close()
 
         if not envios:
             return jsonify({
@@ -2035,8 +2465,11 @@ def bulk_tracking_preview():
                 'error': 'No se encontraron envíos en el archivo Excel'
             }), 400
 
-        # Obtener todos los pedidos Shalom en estado processing
-        shalom_orders = get_shalom_orders_by_dni()
+        # Buscar solo los pedidos Shalom de los DNIs del Excel
+        shalom_orders = get_shalom_orders_by_dni([
+            envio['dni_destinatario'] for envio in envios
+            if len(envio['dni_destinatario']) >= 7
+        ])
 
         # Hacer matching por DNI (con normalización)
         total_ok = 0
@@ -2052,15 +2485,9 @@ def bulk_tracking_preview():
                 total_no_encontrado += 1
                 continue
 
-            # Normalizar DNI del Excel para obtener variantes
+            # Normalizar DNI del Excel (la clave cubre todas las variantes)
             dni_variants = normalize_dni(dni_excel)
-
-            # Buscar en cualquiera de las variantes
-            pedido_encontrado = None
-            for variant in dni_variants:
-                if variant in shalom_orders:
-                    pedido_encontrado = shalom_orders[variant]
-                    break
+            pedido_encontrado = shalom_orders.get(dni_key(dni_excel))
 
             if pedido_encontrado:
                 envio['pedido_id'] = pedido_encontrado['id']
@@ -2152,64 +2579,186 @@ def normalize_dni(dni):
     return variants
 
 
-def get_shalom_orders_by_dni():
+def dni_key(dni):
     """
-    Obtiene todos los pedidos Shalom en estado processing,
-    indexados por DNI del cliente (con normalización flexible).
+    Clave de búsqueda de un DNI: la primera variante de normalize_dni (solo
+    dígitos, sin ceros iniciales).
 
-    Returns:
-        dict: {dni_normalizado: {id, numero, cliente, estado, dni_original}}
+    Dos DNIs comparten alguna variante de normalize_dni si y solo si tienen
+    la misma clave, por lo que buscar por clave equivale a buscar por todas
+    las variantes.
     """
-    query = text("""
-        SELECT
-            o.id,
-            COALESCE(om_number.meta_value, CONCAT('#', o.id)) as order_number,
-            CONCAT(ba.first_name, ' ', ba.last_name) as customer_name,
-            ba.company as customer_dni,
-            o.status,
-            (SELECT oi.order_item_name
-             FROM wpyz_woocommerce_order_items oi
-             WHERE oi.order_id = o.id
-               AND oi.order_item_type = 'shipping'
-             LIMIT 1) as shipping_method
-        FROM wpyz_wc_orders o
-        LEFT JOIN wpyz_wc_orders_meta om_number
-            ON o.id = om_number.order_id
-            AND om_number.meta_key = '_order_number'
-        LEFT JOIN wpyz_wc_order_addresses ba
-            ON o.id = ba.order_id
-            AND ba.address_type = 'billing'
-        WHERE o.status IN ('wc-processing', 'wc-completed')
-          AND o.type = 'shop_order'
-        ORDER BY o.date_created_gmt DESC
-    """)
+    variants = normalize_dni(dni)
+    return variants[0] if variants else None
+
+
+# Pedidos revisados por consulta al actualizar woo_shalom_dni_index
+SHALOM_DNI_SYNC_CHUNK = 500
+
+
+def _shalom_dni_window_start():
+    """Fecha (GMT) del pedido más antiguo que se busca por DNI."""
+    days = current_app.config.get('SHALOM_DNI_LOOKUP_DAYS', 120)
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def _sync_shalom_dni_chunk(order_ids):
+    """
+    Actualiza woo_shalom_dni_index para los pedidos indicados.
+
+    Todos los pedidos de la ventana tienen fila (para que la marca de agua
+    avance), pero dni_key solo se llena para pedidos Shalom en
+    wc-processing/wc-completed con DNI válido.
+    """
+    orders = load_orders(order_ids, [
+        'order_number', 'status', 'date_created_gmt', 'date_updated_gmt',
+        'billing_first_name', 'billing_last_name', 'billing_company', 'shipping_method'
+    ])
+
+    if not orders:
+        return
+
+    params = []
+    for order_id, order in orders.items():
+        dni_original = str(order['billing_company'] or '').strip()
+        shipping_method = order['shipping_method'] or ''
+
+        key = None
+        if ('shalom' in shipping_method.lower()
+                and order['status'] in ('wc-processing', 'wc-completed')
+                and len(dni_original) >= 7):
+            key = dni_key(dni_original)
+
+        params.append({
+            'order_id': order_id,
+            'dni_key': key,
+            'dni_original': dni_original[:100],
+            'order_number': order['order_number'] or f"#{order_id}",
+            'customer_name': full_name(order),
+            'status': order['status'],
+            'date_created_gmt': order['date_created_gmt'],
+            'source_updated_gmt': order['date_updated_gmt'] or order['date_created_gmt']
+        })
+
+    db.session.execute(text("""
+        INSERT INTO woo_shalom_dni_index (
+            order_id, dni_key, dni_original, order_number, customer_name,
+            status, date_created_gmt, source_updated_gmt
+        ) VALUES (
+            :order_id, :dni_key, :dni_original, :order_number, :customer_name,
+            :status, :date_created_gmt, :source_updated_gmt
+        )
+        ON DUPLICATE KEY UPDATE
+            dni_key = VALUES(dni_key),
+            dni_original = VALUES(dni_original),
+            order_number = VALUES(order_number),
+            customer_name = VALUES(customer_name),
+            status = VALUES(status),
+            date_created_gmt = VALUES(date_created_gmt),
+            source_updated_gmt = VALUES(source_updated_gmt)
+    """), params)
+
+
+def refresh_shalom_dni_index():
+    """
+    Incorpora a woo_shalom_dni_index los pedidos de la ventana creados o
+    modificados desde la última actualización y purga los que quedaron
+    fuera de la ventana.
+
+    Usa como marca de agua el mayor date_updated_gmt ya indexado (igual que
+    refresh_dispatch_board); con la tabla vacía indexa toda la ventana.
+    """
+    window_start = _shalom_dni_window_start()
+
+    watermark = db.session.execute(
+        text("SELECT MAX(source_updated_gmt) FROM woo_shalom_dni_index")
+    ).scalar()
+
+    if watermark is None:
+        changed_ids = [
+            row[0] for row in db.session.execute(text("""
+                SELECT id FROM wpyz_wc_orders
+                WHERE type = 'shop_order'
+                  AND date_created_gmt >= :window_start
+            """), {'window_start': window_start}).fetchall()
+        ]
+    else:
+        changed_ids = [
+            row[0] for row in db.session.execute(text("""
+                SELECT o.id
+                FROM wpyz_wc_orders o
+                LEFT JOIN woo_shalom_dni_index i ON i.order_id = o.id
+                WHERE o.type = 'shop_order'
+                  AND o.date_created_gmt >= :window_start
+                  AND o.date_updated_gmt >= :watermark - INTERVAL :overlap MINUTE
+                  AND (i.order_id IS NULL OR i.source_updated_gmt <> o.date_updated_gmt)
+            """), {
+                'window_start': window_start,
+                'watermark': watermark,
+                'overlap': BOARD_REFRESH_OVERLAP_MINUTES
+            }).fetchall()
+        ]
+
+    for i in range(0, len(changed_ids), SHALOM_DNI_SYNC_CHUNK):
+        _sync_shalom_dni_chunk(changed_ids[i:i + SHALOM_DNI_SYNC_CHUNK])
+
+    db.session.execute(
+        text("DELETE FROM woo_shalom_dni_index WHERE date_created_gmt < :window_start"),
+        {'window_start': window_start}
+    )
 
-    results = db.session.execute(query).fetchall()
+    db.session.commit()
+
+    if changed_ids:
+        current_app.logger.info(f"[BULK-TRACKING] Índice DNI Shalom: {len(changed_ids)} pedidos actualizados")
+
+
+def get_shalom_orders_by_dni(dnis):
+    """
+    Busca los pedidos Shalom (processing o completed) de los DNIs indicados,
+    indexados por clave de DNI (ver dni_key).
+
+    Solo consulta las claves de los DNIs recibidos (índice de dni_key en
+    woo_shalom_dni_index), por lo que el costo depende de la cantidad de
+    DNIs y no del historial de pedidos.
+
+    Args:
+        dnis: DNIs del Excel
+
+    Returns:
+        dict: {dni_key: {id, numero, cliente, estado, dni_original}}
+    """
+    keys = {dni_key(dni) for dni in dnis}
+    keys.discard(None)
+    if not keys:
+        return {}
+
+    refresh_shalom_dni_index()
+
+    results = db.session.execute(text("""
+        SELECT order_id, order_number, customer_name, dni_original, status, dni_key
+        FROM woo_shalom_dni_index
+        WHERE dni_key IN :keys
+          AND date_created_gmt >= :window_start
+        ORDER BY date_created_gmt DESC
+    """), {
+        'keys': tuple(keys),
+        'window_start': _shalom_dni_window_start()
+    }).fetchall()
 
-    # Indexar por TODAS las variantes del DNI (para búsqueda flexible)
     orders_by_dni = {}
     for row in results:
-        shipping_method = row[5] or ''
-        # Verificar si es pedido Shalom
-        if 'shalom' in shipping_method.lower():
-            dni_original = str(row[3] or '').strip()
-            if dni_original and len(dni_original) >= 7:
-                # Obtener todas las variantes del DNI
-                dni_variants = normalize_dni(dni_original)
-
-                pedido_data = {
-                    'id': row[0],
-                    'numero': row[1],
-                    'cliente': row[2],
-                    'estado': row[4],
-                    'dni_original': dni_original
-                }
-
-                # Indexar por TODAS las variantes
-                for variant in dni_variants:
-                    # Si hay múltiples pedidos, quedarse con processing primero
-                    if variant not in orders_by_dni or row[4] == 'wc-processing':
-                        orders_by_dni[variant] = pedido_data
+        pedido_data = {
+            'id': row[0],
+            'numero': row[1],
+            'cliente': row[2],
+            'estado': row[4],
+            'dni_original': row[3]
+        }
+
+        # Si hay múltiples pedidos, quedarse con processing primero
+        if row[5] not in orders_by_dni or row[4] == 'wc-processing':
+            orders_by_dni[row[5]] = pedido_data
 
     return orders_by_dni
 
@@ -2219,7 +2768,7 @@ def get_shalom_orders_by_dni():
 @master_required
 def bulk_tracking_process():
     """
-    Procesa los envíos seleccionados y asigna tracking a cada pedido.
+    Encola los envíos seleccionados para asignar tracking a cada pedido.
 
     Request Body:
         {
@@ -2234,7 +2783,8 @@ def bulk_tracking_process():
         }
 
     Returns:
-        JSON con resultados del procesamiento
+        JSON con el job_id; el progreso y los resultados se consultan
+        en /api/jobs/<job_id>
     """
     try:
         data = request.get_json()
@@ -2252,55 +2802,30 @@ def bulk_tracking_process():
             from datetime import date
             fecha_envio = date.today().strftime('%Y-%m-%d')
 
-        resultados = []
-        exitosos = 0
-        fallidos = 0
-
-        for envio in envios:
-            pedido_id = envio.get('pedido_id')
-            tracking_number = envio.get('tracking_number')
-
-            if not pedido_id or not tracking_number:
-                resultados.append({
-                    'pedido_id': pedido_id,
-                    'success': False,
-                    'error': 'Datos incompletos'
-                })
-                fallidos += 1
-                continue
-
-            # Procesar cada pedido usando la misma lógica que add_tracking
-            resultado = process_single_tracking(
-                order_id=pedido_id,
-                tracking_number=tracking_number,
-                shipping_provider='Shalom',
-                date_shipped=fecha_envio,
-                mark_as_shipped=True
-            )
-
-            resultados.append(resultado)
-
-            if resultado['success']:
-                exitosos += 1
-            else:
-                fallidos += 1
-
-            # Liberar conexión después de cada pedido
-            db.session.remove()
+        # Un ítem por pedido (los envíos incompletos se descartan)
+        items = [
+            {'order_id': envio.get('pedido_id'), 'tracking_number': envio.get('tracking_number')}
+            for envio in envios
+            if envio.get('pedido_id') and envio.get('tracking_number')
+        ]
+        if not items:
+            return jsonify({
+                'success': False,
+                'error': 'Datos incompletos'
+            }), 400
 
-            # Rate limiting: esperar 1 segundo entre pedidos (fuera de la sesión)
-            import time
-            time.sleep(1)
+        job_id = jobs.enqueue(
+            'bulk_tracking',
+            items,
+            params={'shipping_provider': 'Shalom', 'fecha_envio': fecha_envio},
+            created_by=current_user.username
+        )
 
         return jsonify({
             'success': True,
-            'resultados': resultados,
-            'resumen': {
-                'total': len(envios),
-                'exitosos': exitosos,
-                'fallidos': fallidos
-            }
-        })
+            'job_id': job_id,
+            'total': len(items)
+        }), 202
 
     except Exception as e:
         current_app.logger.error(f"Error procesando tracking masivo: {str(e)}")
@@ -2312,138 +2837,437 @@ def bulk_tracking_process():
         }), 500
 
 
-def process_single_tracking(order_id, tracking_number, shipping_provider, date_shipped, mark_as_shipped):
+def build_tracking_items(tracking_number, shipping_provider, date_shipped, timestamp=None):
     """
-    Procesa un solo tracking (misma lógica que add_tracking pero retorna dict).
+    Construye la lista de tracking items del plugin Shipment Tracking.
 
-    Returns:
-        dict con resultado del procesamiento
+    Args:
+        timestamp: Usado como tracking_id (por defecto, ahora)
     """
-    try:
-        # Validar que el pedido existe
-        order = Order.query.get(order_id)
-        if not order:
-            return {
-                'pedido_id': order_id,
-                'success': False,
-                'error': f'Pedido {order_id} no encontrado'
-            }
-
-        # Timestamp actual
+    if timestamp is None:
         timestamp = int(datetime.utcnow().timestamp())
 
-        # Crear el array de tracking items
-        tracking_items = [{
-            'tracking_number': tracking_number,
-            'tracking_provider': shipping_provider,
-            'custom_tracking_provider': '',
-            'custom_tracking_link': '',
-            'date_shipped': date_shipped,
-            'tracking_id': str(timestamp)
-        }]
+    return [{
+        'tracking_number': tracking_number,
+        'tracking_provider': shipping_provider,
+        'custom_tracking_provider': '',
+        'custom_tracking_link': '',
+        'date_shipped': date_shipped,
+        'tracking_id': str(timestamp)
+    }]
 
-        # Serializar a formato PHP
-        import phpserialize
-        serialized_items = phpserialize.dumps(tracking_items).decode('utf-8')
 
-        current_app.logger.info(f"[BULK-TRACKING] Order {order_id}: Asignando tracking {tracking_number}")
+def build_tracking_api_payload(payment_method, tracking_number, shipping_provider, tracking_items):
+    """
+    Payload de la API para marcar un pedido como completado con tracking.
 
-        # 1. ACTUALIZAR VÍA API (para disparar emails)
-        if mark_as_shipped:
-            try:
-                wc_api = get_wc_api()
+    Se reenvía payment_method para preservarlo. IMPORTANTE: Se envía
+    tracking_items (LISTA), no serializado; la API de WooCommerce lo
+    serializa una sola vez.
+    """
+    return {
+        "status": "completed",
+        "payment_method": payment_method,
+        "meta_data": [
+            {"key": "_tracking_number", "value": tracking_number},
+            {"key": "_tracking_provider", "value": shipping_provider},
+            {"key": "_wc_shipment_tracking_items", "value": tracking_items}
+        ]
+    }
 
-                payment_method = order.get_meta('_payment_method') or order.payment_method
 
-                wc_api.put(f"orders/{order_id}", {
-                    "status": "completed",
-                    "payment_method": payment_method,
-                    "meta_data": [
-                        {"key": "_tracking_number", "value": tracking_number},
-                        {"key": "_tracking_provider", "value": shipping_provider},
-                        {"key": "_wc_shipment_tracking_items", "value": tracking_items}
-                    ]
-                })
+def load_tracking_orders(order_ids):
+    """
+    Carga en lote los datos que necesita el tracking masivo (ver load_orders).
 
-                current_app.logger.info(f"[BULK-TRACKING] Order {order_id}: API update success")
-                order.status = 'wc-completed'
-                order.date_updated_gmt = datetime.utcnow()
+    Args:
+        order_ids: Lista de IDs de pedidos
 
-            except Exception as api_err:
-                current_app.logger.error(f"[BULK-TRACKING] API Error para {order_id}: {str(api_err)}")
-                # Continuar con actualización local
-                order.status = 'wc-completed'
-                order.date_updated_gmt = datetime.utcnow()
+    Returns:
+        dict: {order_id: {'payment_method', 'order_number', 'is_cod', 'total_amount'}}
+              (los pedidos inexistentes no aparecen)
+    """
+    if not order_ids:
+        return {}
+
+    orders = load_orders(order_ids, [
+        'payment_method', 'payment_method_meta', 'order_number', 'is_cod', 'total_amount'
+    ])
+
+    return {
+        order_id: {
+            'payment_method': order['payment_method_meta'] or order['payment_method'],
+            'order_number': order['order_number'] or f"#{order_id}",
+            'is_cod': order['is_cod'] == 'yes',
+            'total_amount': order['total_amount']
+        }
+        for order_id, order in orders.items()
+    }
 
-        # 2. GUARDAR EN BASE DE DATOS (Legacy)
-        query_delete_old = text("""
-            DELETE FROM wpyz_postmeta
-            WHERE post_id = :order_id
-              AND meta_key IN ('_tracking_number', '_tracking_provider', '_wc_shipment_tracking_items')
-        """)
-        db.session.execute(query_delete_old, {'order_id': order_id})
 
-        query_insert = text("""
-            INSERT INTO wpyz_postmeta (post_id, meta_key, meta_value)
-            VALUES (:order_id, :key, :value)
-        """)
+def _write_tracking_rows(entries, shipping_provider, username, mark_as_shipped, history_method,
+                         before_commit, now):
+    """Escribe y confirma el tracking de un lote de pedidos (ver save_tracking_batch)."""
+    import phpserialize
+
+    order_ids = [entry['order_id'] for entry in entries]
+
+    # 1. ESTADO LOCAL (aunque la API falle)
+    if mark_as_shipped:
+        db.session.execute(text("""
+            UPDATE wpyz_wc_orders
+            SET status = 'wc-completed', date_updated_gmt = :now
+            WHERE id IN :order_ids
+        """), {'now': now, 'order_ids': tuple(order_ids)})
+
+    # 2. GUARDAR EN BASE DE DATOS (Legacy)
+    db.session.execute(text("""
+        DELETE FROM wpyz_postmeta
+        WHERE post_id IN :order_ids
+          AND meta_key IN ('_tracking_number', '_tracking_provider', '_wc_shipment_tracking_items')
+    """), {'order_ids': tuple(order_ids)})
+
+    postmeta_rows = []
+    hpos_rows = []
+    history_rows = []
+    for entry in entries:
+        serialized_items = phpserialize.dumps(entry['tracking_items']).decode('utf-8')
 
         for key, value in [
-            ('_tracking_number', tracking_number),
+            ('_tracking_number', entry['tracking_number']),
             ('_tracking_provider', shipping_provider),
             ('_wc_shipment_tracking_items', serialized_items)
         ]:
-            db.session.execute(query_insert, {'order_id': order_id, 'key': key, 'value': value})
+            postmeta_rows.append({'order_id': entry['order_id'], 'key': key, 'value': value})
 
-        # 3. GUARDAR EN HPOS
-        query_hpos = text("""
-            INSERT INTO wpyz_wc_orders_meta (order_id, meta_key, meta_value)
-            VALUES (:order_id, '_wc_shipment_tracking_items', :serialized_items)
-            ON DUPLICATE KEY UPDATE meta_value = :serialized_items
-        """)
-        db.session.execute(query_hpos, {
-            'order_id': order_id,
-            'serialized_items': serialized_items
+        hpos_rows.append({'order_id': entry['order_id'], 'serialized_items': serialized_items})
+
+        history_rows.append({
+            'order_id': entry['order_id'],
+            'order_number': entry['order_number'],
+            'shipping_method': history_method,
+            'changed_by': username,
+            'changed_at': now,
+            'dispatch_note': f"[TRACKING MASIVO] {entry['tracking_number']}"
         })
 
-        # 4. REGISTRAR EN DISPATCH HISTORY
-        # Obtener el número de orden primero
-        order_number = order.get_meta('_order_number') or f"#{order_id}"
+    # Con lista de parámetros el driver envía un solo INSERT multi-fila
+    db.session.execute(text("""
+        INSERT INTO wpyz_postmeta (post_id, meta_key, meta_value)
+        VALUES (:order_id, :key, :value)
+    """), postmeta_rows)
+
+    # 3. GUARDAR EN HPOS
+    db.session.execute(text("""
+        INSERT INTO wpyz_wc_orders_meta (order_id, meta_key, meta_value)
+        VALUES (:order_id, '_wc_shipment_tracking_items', :serialized_items)
+        ON DUPLICATE KEY UPDATE meta_value = VALUES(meta_value)
+    """), hpos_rows)
+
+    # 4. REGISTRAR EN DISPATCH HISTORY
+    if history_method:
+        db.session.execute(text("""
+            INSERT INTO woo_dispatch_history
+                (order_id, order_number, previous_shipping_method, new_shipping_method,
+                 changed_by, changed_at, dispatch_note)
+            VALUES
+                (:order_id, :order_number, :shipping_method, :shipping_method,
+                 :changed_by, :changed_at, :dispatch_note)
+        """), history_rows)
+
+    if before_commit is not None:
+        before_commit(entries)
+
+    # Actualizar snapshot del tablero en la misma transacción
+    sync_board_orders(order_ids)
+
+    db.session.commit()
+
+
+def save_tracking_batch(entries, shipping_provider, username, mark_as_shipped=True,
+                        history_method='SHALOM', before_commit=None):
+    """
+    Guarda el tracking de varios pedidos en BD con sentencias multi-fila y
+    un solo commit (estado local, wpyz_postmeta, HPOS, historial y snapshot
+    del tablero). Las llamadas a la API se hacen antes, por separado.
 
-        history = DispatchHistory(
-            order_id=order_id,
-            order_number=order_number,
-            previous_shipping_method='SHALOM',
-            new_shipping_method='SHALOM',
-            changed_by=current_user.username,
-            dispatch_note=f'[TRACKING MASIVO] {tracking_number}'
-        )
-        db.session.add(history)
+    Si el lote falla, se guarda cada pedido por separado: las llamadas a la
+    API ya se hicieron, así que solo debe quedar fallido el pedido que no se
+    pudo guardar (un reintento del trabajo volvería a llamar a la API).
 
-        db.session.commit()
+    Args:
+        entries: Lista de dicts con order_id, order_number, tracking_number,
+                 tracking_items y api_result (None si no se llamó a la API)
+        shipping_provider: Proveedor de envío
+        username: Usuario que asigna el tracking
+        mark_as_shipped: Si True, marca los pedidos como wc-completed
+        history_method: Método registrado en woo_dispatch_history (None = sin historial)
+        before_commit: Función opcional que recibe los entries del lote y
+                       escribe en la misma transacción (p. ej. registro CHAMO)
+
+    Returns:
+        list: Resultado por pedido, en el mismo orden que entries
+    """
+    if not entries:
+        return []
+
+    for entry in entries:
+        api_result = entry.get('api_result')
+        if api_result is None:
+            continue
+        if api_result['success']:
+            current_app.logger.info(f"[BULK-TRACKING] Order {entry['order_id']}: API update success")
+        else:
+            current_app.logger.error(f"[BULK-TRACKING] API Error para {entry['order_id']}: {api_result['error']}")
+
+    now = datetime.utcnow()
+    batches = [entries]
+    saved = {}
+    errors = {}
+
+    while batches:
+        batch = batches.pop(0)
+        try:
+            _write_tracking_rows(batch, shipping_provider, username, mark_as_shipped,
+                                 history_method, before_commit, now)
+            saved.update((entry['order_id'], entry) for entry in batch)
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                current_app.logger.warning(
+                    f"[BULK-TRACKING] Error guardando lote de {len(batch)} pedidos, "
+                    f"se guardan por separado: {str(e)}"
+                )
+                batches.extend([entry] for entry in batch)
+                continue
+            current_app.logger.error(f"[BULK-TRACKING] Error guardando pedido {batch[0]['order_id']}: {str(e)}")
+            errors[batch[0]['order_id']] = str(e)
+
+    if saved:
+        events.publish('dispatch', 'tracking', {
+            'order_ids': list(saved),
+            'status_changed': mark_as_shipped,
+            'by': username
+        })
 
         current_app.logger.info(
-            f"[BULK-TRACKING] Tracking asignado a {order_number}: {tracking_number} "
-            f"por {current_user.username}"
+            f"[BULK-TRACKING] Tracking asignado a {len(saved)} pedidos por {username}"
         )
 
-        return {
-            'pedido_id': order_id,
-            'pedido_numero': order_number,
-            'tracking_number': tracking_number,
+    return [
+        {
+            'pedido_id': entry['order_id'],
+            'pedido_numero': entry['order_number'],
+            'tracking_number': entry['tracking_number'],
             'success': True,
             'mensaje': 'Tracking asignado correctamente'
         }
+        if entry['order_id'] in saved else
+        {
+            'pedido_id': entry['order_id'],
+            'success': False,
+            'error': errors.get(entry['order_id'], 'No se pudo guardar')
+        }
+        for entry in entries
+    ]
 
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"[BULK-TRACKING] Error en pedido {order_id}: {str(e)}")
+
+def run_bulk_tracking(envios, shipping_provider, date_shipped, username=None):
+    """
+    Asigna tracking a varios pedidos (Shalom / Olva).
+
+    1. Carga los pedidos en una consulta y prepara los payloads
+    2. Llama a la API de WooCommerce en paralelo con wc_pool (límite de
+       tasa, reintentos y conexión keep-alive)
+    3. Guarda los cambios en BD con save_tracking_batch (un commit)
+
+    Args:
+        envios: Lista de {"pedido_id": ..., "tracking_number": ...}
+        username: Usuario que asigna el tracking (por defecto, el actual)
+
+    Returns:
+        tuple: (resultados, exitosos, fallidos); resultados en el mismo
+               orden que envios
+    """
+    username = username or current_user.username
+    resultados = [None] * len(envios)
+    pendientes = []
+    timestamp = int(datetime.utcnow().timestamp())
+
+    orders = load_tracking_orders([
+        envio.get('pedido_id') for envio in envios
+        if envio.get('pedido_id') and envio.get('tracking_number')
+    ])
+
+    # 1. Preparar payloads
+    for index, envio in enumerate(envios):
+        pedido_id = envio.get('pedido_id')
+        tracking_number = envio.get('tracking_number')
+
+        if not pedido_id or not tracking_number:
+            resultados[index] = {
+                'pedido_id': pedido_id,
+                'success': False,
+                'error': 'Datos incompletos'
+            }
+            continue
+
+        order = orders.get(int(pedido_id))
+        if not order:
+            resultados[index] = {
+                'pedido_id': pedido_id,
+                'success': False,
+                'error': f'Pedido {pedido_id} no encontrado'
+            }
+            continue
+
+        tracking_items = build_tracking_items(tracking_number, shipping_provider, date_shipped, timestamp)
+        pendientes.append({
+            'index': index,
+            'order_id': int(pedido_id),
+            'order_number': order['order_number'],
+            'tracking_number': tracking_number,
+            'tracking_items': tracking_items,
+            'payload': build_tracking_api_payload(
+                order['payment_method'], tracking_number, shipping_provider, tracking_items
+            )
+        })
+
+    # Cerrar la transacción de lectura: la conexión vuelve al pool
+    # mientras se espera a la API
+    db.session.commit()
+
+    # 2. API de WooCommerce en paralelo
+    api_results = wc_pool.map([
+        ('PUT', f"orders/{pendiente['order_id']}", pendiente['payload'])
+        for pendiente in pendientes
+    ])
+    for pendiente, api_result in zip(pendientes, api_results):
+        pendiente['api_result'] = api_result
+
+    # 3. Guardar en BD (un commit para todo el lote)
+    for pendiente, resultado in zip(pendientes, save_tracking_batch(pendientes, shipping_provider, username)):
+        resultados[pendiente['index']] = resultado
+
+    exitosos = sum(1 for resultado in resultados if resultado['success'])
+    return resultados, exitosos, len(resultados) - exitosos
+
+
+def process_single_tracking(order_id, tracking_number, shipping_provider, date_shipped, mark_as_shipped,
+                            username=None):
+    """
+    Procesa un solo tracking (misma lógica que add_tracking pero retorna dict).
+
+    Args:
+        username: Usuario que asigna el tracking (por defecto, el actual;
+                  los trabajos en segundo plano no tienen request)
+
+    Returns:
+        dict con resultado del procesamiento
+    """
+    username = username or current_user.username
+
+    # Validar que el pedido existe
+    order = load_tracking_orders([order_id]).get(int(order_id))
+    if not order:
         return {
             'pedido_id': order_id,
             'success': False,
-            'error': str(e)
+            'error': f'Pedido {order_id} no encontrado'
         }
 
+    tracking_items = build_tracking_items(tracking_number, shipping_provider, date_shipped)
+
+    current_app.logger.info(f"[BULK-TRACKING] Order {order_id}: Asignando tracking {tracking_number}")
+
+    # 1. ACTUALIZAR VÍA API (para disparar emails)
+    api_result = None
+    if mark_as_shipped:
+        try:
+            wc_pool.put(
+                f"orders/{order_id}",
+                build_tracking_api_payload(order['payment_method'], tracking_number, shipping_provider, tracking_items)
+            )
+            api_result = {'success': True}
+        except Exception as api_err:
+            api_result = {'success': False, 'error': str(api_err)}
+
+    # 2. GUARDAR EN BD
+    return save_tracking_batch([{
+        'order_id': int(order_id),
+        'order_number': order['order_number'],
+        'tracking_number': tracking_number,
+        'tracking_items': tracking_items,
+        'api_result': api_result
+    }], shipping_provider, username, mark_as_shipped=mark_as_shipped)[0]
+
+
+# ============================================
+# TRABAJOS EN SEGUNDO PLANO (TRACKING MASIVO)
+# ============================================
+
+# Ítems por lote: cada lote se guarda con un commit y actualiza el progreso
+BULK_JOB_CHUNK = 25
+
+
+@jobs.handler('bulk_tracking')
+def bulk_tracking_job(job):
+    """Tracking masivo Shalom / Olva (params: shipping_provider, fecha_envio)."""
+    for items in job.pending_chunks(BULK_JOB_CHUNK):
+        envios = [
+            {'pedido_id': item.order_id, 'tracking_number': item.tracking_number}
+            for item in items
+        ]
+        resultados, _, _ = run_bulk_tracking(
+            envios,
+            job.params['shipping_provider'],
+            job.params['fecha_envio'],
+            username=job.created_by
+        )
+        job.record_many([
+            (item.id, resultado['success'], resultado)
+            for item, resultado in zip(items, resultados)
+        ])
+
+
+@jobs.handler('bulk_tracking_simple')
+def bulk_tracking_simple_job(job):
+    """Tracking masivo CHAMO / DINSIDES (params: column, shipping_date)."""
+    for items in job.pending_chunks(BULK_JOB_CHUNK):
+        resultados, _, _, _ = run_bulk_tracking_simple(
+            [item.order_id for item in items],
+            job.params['column'],
+            job.params['shipping_date'],
+            username=job.created_by
+        )
+        job.record_many([
+            (item.id, resultado['success'], resultado)
+            for item, resultado in zip(items, resultados)
+        ])
+
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+@master_required
+def get_job(job_id):
+    """
+    Estado de un trabajo en segundo plano.
+
+    Returns:
+        JSON con status (queued, running, completed, failed), contadores
+        (total, processed, exitosos, fallidos) y el resultado de cada pedido
+    """
+    try:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+
+        return jsonify({'success': True, 'job': job})
+
+    except Exception as e:
+        current_app.logger.error(f"Error consultando trabajo {job_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 
 # ============================================
 # TRACKING MASIVO OLVA
@@ -2566,8 +3390,8 @@ def bulk_tracking_olva_preview():
                 'error': 'No se encontraron envíos en el archivo Excel (desde fila 8)'
             }), 400
 
-        # Obtener todos los pedidos OLVA en estado processing
-        olva_orders = get_olva_orders_by_name()
+        # Obtener todos los pedidos OLVA e indexarlos por palabra del nombre
+        olva_index = build_olva_name_index(get_olva_orders_by_name())
 
         # Hacer matching por nombre
         total_ok = 0
@@ -2584,14 +3408,33 @@ def bulk_tracking_olva_preview():
                 continue
 
             # Buscar pedido por nombre (al menos un nombre + un apellido)
-            pedido = match_pedido_por_nombre(nombre, olva_orders)
+            candidatos = rank_pedidos_por_nombre(nombre, olva_index)
 
-            if pedido:
+            if candidatos:
+                pedido = candidatos[0]['pedido']
                 envio['pedido_id'] = pedido['id']
                 envio['pedido_numero'] = pedido['numero']
                 envio['cliente_nombre'] = pedido['cliente']
                 envio['estado_pedido'] = pedido['estado']
 
+                # Confianza del match y alternativas con el mismo score
+                envio['confianza'] = round(candidatos[0]['score'] * 100)
+                envio['candidatos'] = [
+                    {
+                        'pedido_id': c['pedido']['id'],
+                        'pedido_numero': c['pedido']['numero'],
+                        'cliente_nombre': c['pedido']['cliente'],
+                        'estado_pedido': c['pedido']['estado'],
+                        'coincidencias': c['coincidencias'],
+                        'confianza': round(c['score'] * 100)
+                    }
+                    for c in candidatos
+                ]
+                empatados = [
+                    c['pedido']['numero'] for c in candidatos[1:]
+                    if c['score'] == candidatos[0]['score']
+                ]
+
                 if pedido['estado'] == 'wc-completed':
                     envio['validacion'] = 'warning'
                     envio['mensaje'] = 'Pedido ya completado'
@@ -2600,6 +3443,9 @@ def bulk_tracking_olva_preview():
                     envio['validacion'] = 'ok'
                     envio['mensaje'] = 'Listo para procesar'
                     total_ok += 1
+
+                if empatados:
+                    envio['mensaje'] += f" (ambiguo, también: {', '.join(empatados)})"
             else:
                 envio['validacion'] = 'error'
                 envio['mensaje'] = 'Nombre no encontrado en pedidos OLVA'
@@ -2654,47 +3500,49 @@ def get_olva_orders_by_name():
     Returns:
         dict: {nombre_normalizado: {id, numero, cliente, estado}}
     """
-    query = text("""
-        SELECT
-            o.id,
-            COALESCE(om_number.meta_value, CONCAT('#', o.id)) as order_number,
-            CONCAT(ba.first_name, ' ', ba.last_name) as customer_name,
-            o.status,
-            (SELECT oi.order_item_name
-             FROM wpyz_woocommerce_order_items oi
-             WHERE oi.order_id = o.id
-               AND oi.order_item_type = 'shipping'
-             LIMIT 1) as shipping_method
-        FROM wpyz_wc_orders o
-        LEFT JOIN wpyz_wc_orders_meta om_number
-            ON o.id = om_number.order_id
-            AND om_number.meta_key = '_order_number'
-        LEFT JOIN wpyz_wc_order_addresses ba
-            ON o.id = ba.order_id
-            AND ba.address_type = 'billing'
-        WHERE o.status IN ('wc-processing', 'wc-completed')
-          AND o.type = 'shop_order'
-        ORDER BY o.date_created_gmt DESC
-    """)
-
-    results = db.session.execute(query).fetchall()
+    # IDs de pedidos con algún item de envío OLVA (los más recientes primero)
+    order_ids = [
+        row[0] for row in db.session.execute(text("""
+            SELECT o.id
+            FROM wpyz_wc_orders o
+            WHERE o.status IN ('wc-processing', 'wc-completed')
+              AND o.type = 'shop_order'
+              AND EXISTS (
+                  SELECT 1
+                  FROM wpyz_woocommerce_order_items oi
+                  WHERE oi.order_id = o.id
+                    AND oi.order_item_type = 'shipping'
+                    AND oi.order_item_name LIKE '%olva%'
+              )
+            ORDER BY o.date_created_gmt DESC
+        """)).fetchall()
+    ]
+
+    orders = load_orders(order_ids, [
+        'order_number', 'status', 'billing_first_name', 'billing_last_name', 'shipping_method'
+    ])
 
     # Indexar por nombre normalizado (solo pedidos OLVA)
     orders_by_name = {}
-    for row in results:
-        shipping_method = row[4] or ''
-        # Verificar si es pedido OLVA
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if not order:
+            continue
+
+        shipping_method = order['shipping_method'] or ''
+        # Verificar si es pedido OLVA (el primer item de envío)
         if 'olva' in shipping_method.lower():
-            nombre = str(row[2] or '').strip()
+            cliente = full_name(order)
+            nombre = str(cliente or '').strip()
             if nombre and len(nombre) >= 3:
                 nombre_normalizado = normalizar_nombre(nombre)
                 # Si hay múltiples pedidos con el mismo nombre, quedarse con el más reciente (processing primero)
-                if nombre_normalizado not in orders_by_name or row[3] == 'wc-processing':
+                if nombre_normalizado not in orders_by_name or order['status'] == 'wc-processing':
                     orders_by_name[nombre_normalizado] = {
-                        'id': row[0],
-                        'numero': row[1],
-                        'cliente': row[2],
-                        'estado': row[3],
+                        'id': order_id,
+                        'numero': order['order_number'] or f"#{order_id}",
+                        'cliente': cliente,
+                        'estado': order['status'],
                         'nombre_original': nombre
                     }
 
@@ -2732,57 +3580,150 @@ def normalizar_nombre(nombre):
     return nombre
 
 
-def match_pedido_por_nombre(nombre_excel, orders_by_name):
+# Similitud mínima (Jaccard de trigramas) para que dos palabras del nombre
+# cuenten como la misma con errores de tipeo: gonzales/gonzalez = 0.64
+OLVA_NAME_MIN_SIMILARITY = 0.5
+
+# Las palabras más cortas solo coinciden exactas (de, la, luz...)
+OLVA_NAME_FUZZY_MIN_LENGTH = 4
+
+
+def _name_trigrams(palabra):
+    """Trigramas de una palabra ya normalizada, con relleno ('  ana ')."""
+    palabra = f'  {palabra} '
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+def build_olva_name_index(orders_by_name):
     """
-    Busca un pedido por nombre, requiriendo al menos coincidencia de un nombre + un apellido.
+    Construye un índice invertido por palabra del nombre normalizado
+    (sin acentos, ver normalizar_nombre), más un índice de trigramas de
+    esas palabras para encontrar las parecidas.
+
+    Se construye una vez por preview; cada fila del Excel solo compara
+    contra los pedidos que comparten alguna palabra (o trigrama) con ella.
 
     Args:
-        nombre_excel: Nombre del destinatario desde el Excel
-        orders_by_name: Diccionario de pedidos indexados por nombre normalizado
+        orders_by_name: Diccionario de get_olva_orders_by_name
 
     Returns:
-        dict: Pedido encontrado o None
+        dict: {
+            'entries': [(palabras_pedido, pedido), ...],
+            'tokens': {palabra: [índice en entries, ...]},
+            'trigrams': {trigrama: [palabra, ...]},
+            'trigram_counts': {palabra: trigramas de la palabra}
+        }
     """
-    if not nombre_excel or not orders_by_name:
-        return None
+    entries = []
+    tokens = {}
 
-    # Normalizar el nombre del Excel
-    nombre_normalizado = normalizar_nombre(nombre_excel)
+    for nombre_pedido_norm, pedido in orders_by_name.items():
+        palabras_pedido = nombre_pedido_norm.split()
+        position = len(entries)
+        entries.append((palabras_pedido, pedido))
 
-    # Separar en palabras (nombres y apellidos)
-    palabras_excel = nombre_normalizado.split()
+        for palabra in set(palabras_pedido):
+            tokens.setdefault(palabra, []).append(position)
 
-    # Si tiene menos de 2 palabras, no podemos hacer match (necesitamos al menos nombre + apellido)
-    if len(palabras_excel) < 2:
-        return None
+    trigrams = {}
+    trigram_counts = {}
+    for palabra in tokens:
+        if len(palabra) < OLVA_NAME_FUZZY_MIN_LENGTH:
+            continue
+        palabra_trigrams = _name_trigrams(palabra)
+        trigram_counts[palabra] = len(palabra_trigrams)
+        for trigram in palabra_trigrams:
+            trigrams.setdefault(trigram, []).append(palabra)
+
+    return {
+        'entries': entries,
+        'tokens': tokens,
+        'trigrams': trigrams,
+        'trigram_counts': trigram_counts
+    }
 
-    # Buscar en todos los pedidos
-    mejores_matches = []
 
-    for nombre_pedido_norm, pedido in orders_by_name.items():
-        palabras_pedido = nombre_pedido_norm.split()
+def _similar_name_words(palabra, name_index):
+    """
+    Palabras del índice parecidas a `palabra`, con su similitud (0-1).
 
-        # Contar cuántas palabras del Excel coinciden con el pedido
-        coincidencias = 0
-        for palabra_excel in palabras_excel:
-            if palabra_excel in palabras_pedido:
-                coincidencias += 1
-
-        # Requerir al menos 2 palabras coincidentes (nombre + apellido)
-        if coincidencias >= 2:
-            mejores_matches.append({
-                'pedido': pedido,
-                'coincidencias': coincidencias,
-                'score': coincidencias / max(len(palabras_excel), len(palabras_pedido))
-            })
+    La palabra exacta vale 1; las demás, el Jaccard de sus trigramas si
+    alcanza OLVA_NAME_MIN_SIMILARITY.
+    """
+    similares = {}
+    if palabra in name_index['tokens']:
+        similares[palabra] = 1.0
+    if len(palabra) < OLVA_NAME_FUZZY_MIN_LENGTH:
+        return similares
+
+    palabra_trigrams = _name_trigrams(palabra)
+    compartidos = {}
+    for trigram in palabra_trigrams:
+        for candidata in name_index['trigrams'].get(trigram, ()):
+            compartidos[candidata] = compartidos.get(candidata, 0) + 1
+
+    for candidata, comunes in compartidos.items():
+        if candidata == palabra:
+            continue
+        similitud = comunes / (len(palabra_trigrams) + name_index['trigram_counts'][candidata] - comunes)
+        if similitud >= OLVA_NAME_MIN_SIMILARITY:
+            similares[candidata] = similitud
 
-    # Si hay matches, devolver el mejor
-    if mejores_matches:
-        # Ordenar por score (mayor primero)
-        mejores_matches.sort(key=lambda x: x['score'], reverse=True)
-        return mejores_matches[0]['pedido']
+    return similares
 
-    return None
+
+def rank_pedidos_por_nombre(nombre_excel, name_index, limit=3):
+    """
+    Candidatos para un nombre del Excel, ordenados por score.
+
+    Cada palabra del Excel coincide con la palabra más parecida de cada
+    pedido: exacta (1) o con errores de tipeo (similitud de trigramas,
+    ver _similar_name_words). Requiere al menos 2 palabras coincidentes
+    (nombre + apellido).
+    score = suma de similitudes / max(palabras del Excel, palabras del pedido)
+
+    Args:
+        nombre_excel: Nombre del destinatario desde el Excel
+        name_index: Índice de build_olva_name_index
+        limit: Máximo de candidatos a devolver
+
+    Returns:
+        list: [{'pedido', 'coincidencias', 'score'}, ...] (mejor primero)
+    """
+    if not nombre_excel or not name_index['entries']:
+        return []
+
+    palabras_excel = normalizar_nombre(nombre_excel).split()
+
+    # Si tiene menos de 2 palabras, no podemos hacer match (necesitamos al menos nombre + apellido)
+    if len(palabras_excel) < 2:
+        return []
+
+    # Por pedido: mejor similitud de cada palabra del Excel, solo en los
+    # pedidos que comparten palabras (o palabras parecidas)
+    similitudes_por_pedido = {}
+    for indice_palabra, palabra_excel in enumerate(palabras_excel):
+        for palabra, similitud in _similar_name_words(palabra_excel, name_index).items():
+            for position in name_index['tokens'][palabra]:
+                mejores = similitudes_por_pedido.setdefault(position, {})
+                if similitud > mejores.get(indice_palabra, 0):
+                    mejores[indice_palabra] = similitud
+
+    candidatos = []
+    for position, mejores in similitudes_por_pedido.items():
+        if len(mejores) < 2:
+            continue
+
+        palabras_pedido, pedido = name_index['entries'][position]
+        candidatos.append((position, {
+            'pedido': pedido,
+            'coincidencias': len(mejores),
+            'score': sum(mejores.values()) / max(len(palabras_excel), len(palabras_pedido))
+        }))
+
+    # Mayor score primero; a igual score, el orden del índice (más reciente primero)
+    candidatos.sort(key=lambda c: (-c[1]['score'], c[0]))
+    return [candidato for _, candidato in candidatos[:limit]]
 
 
 @bp.route('/api/bulk-tracking-olva/process', methods=['POST'])
@@ -2790,7 +3731,7 @@ def match_pedido_por_nombre(nombre_excel, orders_by_name):
 @master_required
 def bulk_tracking_olva_process():
     """
-    Procesa los envíos OLVA seleccionados y asigna tracking a cada pedido.
+    Encola los envíos OLVA seleccionados para asignar tracking a cada pedido.
 
     Request Body:
         {
@@ -2805,7 +3746,8 @@ def bulk_tracking_olva_process():
         }
 
     Returns:
-        JSON con resultados del procesamiento
+        JSON con el job_id; el progreso y los resultados se consultan
+        en /api/jobs/<job_id>
     """
     try:
         data = request.get_json()
@@ -2823,55 +3765,30 @@ def bulk_tracking_olva_process():
             from datetime import date
             fecha_envio = date.today().strftime('%Y-%m-%d')
 
-        resultados = []
-        exitosos = 0
-        fallidos = 0
-
-        for envio in envios:
-            pedido_id = envio.get('pedido_id')
-            tracking_number = envio.get('tracking_number')
-
-            if not pedido_id or not tracking_number:
-                resultados.append({
-                    'pedido_id': pedido_id,
-                    'success': False,
-                    'error': 'Datos incompletos'
-                })
-                fallidos += 1
-                continue
-
-            # Procesar cada pedido usando la misma lógica que add_tracking
-            resultado = process_single_tracking(
-                order_id=pedido_id,
-                tracking_number=tracking_number,
-                shipping_provider='Olva Courier',
-                date_shipped=fecha_envio,
-                mark_as_shipped=True
-            )
-
-            resultados.append(resultado)
-
-            if resultado['success']:
-                exitosos += 1
-            else:
-                fallidos += 1
-
-            # Liberar conexión después de cada pedido
-            db.session.remove()
+        # Un ítem por pedido (los envíos incompletos se descartan)
+        items = [
+            {'order_id': envio.get('pedido_id'), 'tracking_number': envio.get('tracking_number')}
+            for envio in envios
+            if envio.get('pedido_id') and envio.get('tracking_number')
+        ]
+        if not items:
+            return jsonify({
+                'success': False,
+                'error': 'Datos incompletos'
+            }), 400
 
-            # Rate limiting: esperar 1 segundo entre pedidos (fuera de la sesión)
-            import time
-            time.sleep(1)
+        job_id = jobs.enqueue(
+            'bulk_tracking',
+            items,
+            params={'shipping_provider': 'Olva Courier', 'fecha_envio': fecha_envio},
+            created_by=current_user.username
+        )
 
         return jsonify({
             'success': True,
-            'resultados': resultados,
-            'resumen': {
-                'total': len(envios),
-                'exitosos': exitosos,
-                'fallidos': fallidos
-            }
-        })
+            'job_id': job_id,
+            'total': len(items)
+        }), 202
 
     except Exception as e:
         current_app.logger.error(f"Error procesando tracking masivo OLVA: {str(e)}")
@@ -2945,8 +3862,13 @@ def mark_as_delivered():
         )
         db.session.add(history_entry)
 
+        # Actualizar snapshot del tablero en la misma transacción
+        sync_board_orders(order_id)
+
         db.session.commit()
 
+        publish_board_event('tracking', order_id, order_number=order_number, status_changed=True)
+
         current_app.logger.info(f"[DELIVERED] Order {order_id}: Marcado como entregado exitosamente")
 
         return jsonify({
@@ -3100,17 +4022,14 @@ def update_chamo_shipping_cost(shipment_id):
 @master_required
 def export_chamo_shipments():
     """
-    Exportar envíos CHAMO a CSV para facturación.
+    Exportar envíos CHAMO a Excel (o CSV con ?format=csv) para facturación.
 
     Query params: igual que get_chamo_shipments
     """
     try:
         from app.models import ChamoShipment
         from datetime import datetime
-        from io import BytesIO
-        from flask import make_response
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment
+        from app.utils.exports import ExportSheet, EXPORT_BATCH_SIZE, export_format, export_response
 
         # Obtener parámetros (mismos que get_chamo_shipments)
         date_from = request.args.get('date_from')
@@ -3139,17 +4058,25 @@ def export_chamo_shipments():
             query = query.filter(ChamoShipment.sent_by == sent_by)
 
         query = query.order_by(ChamoShipment.delivery_date.asc())
-        shipments = query.all()
 
-        # Crear workbook Excel
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = 'Envíos CHAMO'
-
-        # Estilos de encabezado
-        header_font = Font(bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='1F4E79', end_color='1F4E79', fill_type='solid')
-        header_align = Alignment(horizontal='center')
+        def rows():
+            # yield_per: cursor del servidor, EXPORT_BATCH_SIZE objetos por vez
+            for s in query.yield_per(EXPORT_BATCH_SIZE):
+                yield [
+                    s.id,
+                    s.order_number,
+                    s.delivery_date.strftime('%d/%m/%Y') if s.delivery_date else '',
+                    s.customer_name or '',
+                    s.customer_phone or '',
+                    s.customer_district or '',
+                    float(s.order_total) if s.order_total else 0,
+                    float(s.shipping_cost) if s.shipping_cost else 0,
+                    float(s.cod_amount) if s.cod_amount else 0,
+                    'Sí' if s.is_cod else 'No',
+                    s.sent_by or '',
+                    s.sent_at.strftime('%d/%m/%Y %H:%M') if s.sent_at else '',
+                    s.sent_via or ''
+                ]
 
         headers = [
             'ID', 'Pedido', 'Fecha Entrega', 'Cliente', 'Teléfono', 'Distrito',
@@ -3157,44 +4084,12 @@ def export_chamo_shipments():
             'Enviado Por', 'Fecha Envío', 'Método'
         ]
 
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_align
-
-        # Datos
-        for row, s in enumerate(shipments, 2):
-            ws.cell(row=row, column=1, value=s.id)
-            ws.cell(row=row, column=2, value=s.order_number)
-            ws.cell(row=row, column=3, value=s.delivery_date.strftime('%d/%m/%Y') if s.delivery_date else '')
-            ws.cell(row=row, column=4, value=s.customer_name or '')
-            ws.cell(row=row, column=5, value=s.customer_phone or '')
-            ws.cell(row=row, column=6, value=s.customer_district or '')
-            ws.cell(row=row, column=7, value=float(s.order_total) if s.order_total else 0)
-            ws.cell(row=row, column=8, value=float(s.shipping_cost) if s.shipping_cost else 0)
-            ws.cell(row=row, column=9, value=float(s.cod_amount) if s.cod_amount else 0)
-            ws.cell(row=row, column=10, value='Sí' if s.is_cod else 'No')
-            ws.cell(row=row, column=11, value=s.sent_by or '')
-            ws.cell(row=row, column=12, value=s.sent_at.strftime('%d/%m/%Y %H:%M') if s.sent_at else '')
-            ws.cell(row=row, column=13, value=s.sent_via or '')
-
-        # Anchos de columna
-        col_widths = [6, 12, 14, 28, 14, 20, 13, 12, 12, 8, 14, 18, 10]
-        for col, width in enumerate(col_widths, 1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = width
-
-        # Guardar en buffer y retornar
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-
-        filename = f"chamo_envios_{datetime.now().strftime('%Y%m%d')}.xlsx"
-        output = make_response(buffer.getvalue())
-        output.headers["Content-Disposition"] = f"attachment; filename={filename}"
-        output.headers["Content-type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-
-        return output
+        sheet = ExportSheet(
+            'Envíos CHAMO', headers, rows(),
+            widths=[6, 12, 14, 28, 14, 20, 13, 12, 12, 8, 14, 18, 10],
+            header_color='1F4E79', borders=False
+        )
+        return export_response(f"chamo_envios_{datetime.now().strftime('%Y%m%d')}", [sheet], export_format())
 
     except Exception as e:
         current_app.logger.error(f"Error exportando envíos CHAMO: {str(e)}")
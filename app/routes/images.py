@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required
-from app.models import Product, ProductMeta, Term
+from app.models import Product, Term
 from app import db
-from sqlalchemy import text, or_
+from app.product_cache import product_cache
+from app.product_search import product_search
+from sqlalchemy import text
+import math
 import os
 
 bp = Blueprint('images', __name__, url_prefix='/images')
@@ -25,26 +28,28 @@ def list_products():
         page = request.args.get('page', 1, type=int)
         per_page = 24  # Grid view se ve mejor con múltiplos de 3 o 4
 
-        query = Product.query.filter(Product.post_type == 'product', Product.post_status == 'publish')
-
         if search:
-            # Separar términos de búsqueda
-            search_terms = search.split()
-            conditions = []
-            for term in search_terms:
-                conditions.append(or_(
-                    Product.post_title.like(f'%{term}%'),
-                    Product.ID.like(f'%{term}%'),
-                    Product.product_meta.any(db.and_(ProductMeta.meta_key == '_sku', ProductMeta.meta_value.like(f'%{term}%')))
-                ))
-            query = query.filter(db.and_(*conditions))
-
-        pagination = query.order_by(Product.post_date.desc()).paginate(page=page, per_page=per_page, error_out=False)
-        products = pagination.items
+            # Índice de búsqueda (app/product_search.py), más recientes primero
+            matches = sorted(
+                product_search.search(search, post_types=('product',)),
+                key=lambda entry: (entry.post_date is not None, entry.post_date), reverse=True
+            )
+            total = len(matches)
+            page_ids = [entry.id for entry in matches[(page - 1) * per_page:page * per_page]]
+            by_id = {p.ID: p for p in Product.query.filter(Product.ID.in_(page_ids)).all()} if page_ids else {}
+            products = [by_id[product_id] for product_id in page_ids if product_id in by_id]
+            pages = math.ceil(total / per_page) if total else 0
+        else:
+            query = Product.query.filter(Product.post_type == 'product', Product.post_status == 'publish')
+            pagination = query.order_by(Product.post_date.desc()).paginate(page=page, per_page=per_page, error_out=False)
+            products = pagination.items
+            total = pagination.total
+            pages = pagination.pages
 
         # Precargar metadatos e imágenes para mayor eficiencia
         Product.preload_metadata_for_products(products, ['_sku', '_thumbnail_id'])
         Product.preload_images_for_products(products)
+        Product.preload_variation_counts(products)
 
         products_list = []
         for p in products:
@@ -59,9 +64,9 @@ def list_products():
         return jsonify({
             'success': True,
             'products': products_list,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'current_page': pagination.page
+            'total': total,
+            'pages': pages,
+            'current_page': page
         })
 
     except Exception as e:
@@ -279,10 +284,9 @@ def upload_image():
             db.session.commit()
             current_app.logger.info(f"[IMAGES] Sync local exitoso: _thumbnail_id={media_id} para post_id={product_id}")
             
-            # Limpiar caché para que el cambio sea visible en todo el sitio
-            from app import cache
-            cache.clear()
-            current_app.logger.info(f"[IMAGES] Caché del sistema limpiada")
+            # Invalidar las páginas en caché que muestran el producto
+            product_cache.invalidate_products([product_id])
+            current_app.logger.info(f"[IMAGES] Caché de listados invalidada para ID={product_id}")
         except Exception as sync_err:
             current_app.logger.warning(f"[IMAGES] Error en sync local (no crítico): {str(sync_err)}")
 
@@ -2,10 +2,18 @@
 from flask import Blueprint, render_template, request, jsonify, current_app, send_from_directory
 from flask_login import login_required, current_user
 from app.models import Order, OrderAddress, OrderItem, OrderItemMeta, OrderMeta, Product, ProductMeta, OrderExternal, OrderExternalItem
-from app import db
+from app import db, cache
+from app.order_read_model import load_orders
+from app.report_cache import report_cache
+from app.list_counts import list_counts
+from app.product_search import product_search
+from app.profit_facts import refresh_order_facts
+from app.sales_daily import refresh_sales_daily
+from app.utils.dates import lima_day
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_filter, keyset_params, pagination_payload
 from datetime import datetime
 from decimal import Decimal, ROUND_DOWN
-from sqlalchemy import or_, desc
+from sqlalchemy import or_, and_, desc
 import pytz
 import hashlib
 import json
@@ -14,6 +22,51 @@ import os
 bp = Blueprint('orders', __name__, url_prefix='/orders')
 
 
+def invalidate_order_reports(order_id):
+    """
+    Recalcula los hechos de ganancia del pedido y sus días en
+    woo_sales_daily, y descarta los reportes en caché de esos días y los
+    totales de los listados de pedidos. Llamar después del commit; un error
+    aquí no debe fallar la operación.
+
+    Los hechos se recalculan aquí (como refresh_external_order_reports) y
+    no se dejan a sync_profit_facts: esa sincronización se omite mientras
+    está limitada o la tiene otro request, y el siguiente reporte guardaría
+    en caché el resumen anterior.
+    """
+    days = set()
+    try:
+        days = refresh_order_facts([order_id])
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not refresh profit facts for order {order_id}: {str(e)}")
+
+    try:
+        list_counts.invalidate('whatsapp')
+        list_counts.invalidate('woocommerce')
+        report_cache.invalidate_dates(days)
+        report_cache.invalidate_orders([order_id])
+    except Exception as e:
+        current_app.logger.warning(f"Could not invalidate report cache for order {order_id}: {str(e)}")
+
+
+def refresh_external_order_reports(date_created_gmt):
+    """
+    Recalcula el día (Lima) de un pedido externo en woo_sales_daily y
+    descarta los reportes en caché de ese día y los totales del listado de
+    externos. Llamar después del commit.
+    """
+    list_counts.invalidate('external')
+    try:
+        day = lima_day(date_created_gmt)
+        refresh_sales_daily([day])
+        db.session.commit()
+        report_cache.invalidate_dates([day])
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not refresh daily sales for {date_created_gmt}: {str(e)}")
+
+
 def get_order_for_edit(order_id):
     """
     Helper para obtener todos los datos de un pedido para edición.
@@ -786,6 +839,8 @@ def list_orders():
     - search: búsqueda por ID, email, nombre, W-XXXXX
     - created_by: filtrar por usuario creador
     - status: filtrar por estado del pedido
+    - cursor: next_cursor de la página anterior (paginación keyset; sin
+      cursor se usa page con OFFSET)
     """
     try:
         from sqlalchemy import text
@@ -797,46 +852,27 @@ def list_orders():
         created_by_filter = request.args.get('created_by', '', type=str)
         status_filter = request.args.get('status', '', type=str)
         payment_method_filter = request.args.get('payment_method', '', type=str)
+        cursor = decode_cursor(request.args.get('cursor', '', type=str))
 
         # Limitar per_page
         per_page = min(per_page, 100)
 
-        # Query optimizada con JOIN a postmeta para filtrar solo pedidos del manager
+        # IDs de la página: los JOIN solo se usan para filtrar
         # IMPORTANTE: Solo mostramos pedidos que tienen _order_number (W-XXXXX)
+        # Se pide una fila de más para saber si hay página siguiente
         query = text("""
-            SELECT DISTINCT
-                o.id,
-                o.status,
-                o.total_amount,
-                o.currency,
-                o.billing_email,
-                o.payment_method,
-                o.payment_method_title,
-                o.date_created_gmt,
-                ba.first_name,
-                ba.last_name,
-                ba.phone,
-                om_order_number.meta_value as order_number,
-                om_created_by.meta_value as created_by,
-                (SELECT COUNT(*) FROM wpyz_woocommerce_order_items WHERE order_id = o.id AND order_item_type = 'line_item') as items_count,
-                (SELECT oi.order_item_name
-                 FROM wpyz_woocommerce_order_items oi
-                 WHERE oi.order_id = o.id AND oi.order_item_type = 'shipping'
-                 LIMIT 1) as shipping_method,
-                om_tracking.meta_value as tracking_number,
-                om_community.meta_value as is_community
+            SELECT DISTINCT o.id, o.date_created_gmt
             FROM wpyz_wc_orders o
             INNER JOIN wpyz_wc_orders_meta om_order_number ON o.id = om_order_number.order_id AND om_order_number.meta_key = '_order_number'
             LEFT JOIN wpyz_wc_orders_meta om_created_by ON o.id = om_created_by.order_id AND om_created_by.meta_key = '_created_by'
-            LEFT JOIN wpyz_wc_orders_meta om_tracking ON o.id = om_tracking.order_id AND om_tracking.meta_key = '_tracking_number'
-            LEFT JOIN wpyz_wc_orders_meta om_community ON o.id = om_community.order_id AND om_community.meta_key = '_is_community'
             LEFT JOIN wpyz_wc_order_addresses ba ON o.id = ba.order_id AND ba.address_type = 'billing'
             WHERE o.status != 'trash'
             {search_filter}
             {created_by_filter}
             {status_filter}
             {payment_method_filter}
-            ORDER BY o.date_created_gmt DESC
+            {cursor_filter}
+            ORDER BY o.date_created_gmt DESC, o.id DESC
             LIMIT :limit OFFSET :offset
         """)
 
@@ -859,10 +895,7 @@ def list_orders():
         created_by_filter_clause = ""
         status_filter_clause = ""
         payment_method_filter_clause = ""
-        params = {
-            'limit': per_page,
-            'offset': (page - 1) * per_page
-        }
+        params = {}
 
         if search:
             # Buscar por order_number (W-XXXXX), email, nombre, teléfono, DNI, ID
@@ -896,7 +929,8 @@ def list_orders():
             search_filter=search_filter,
             created_by_filter=created_by_filter_clause,
             status_filter=status_filter_clause,
-            payment_method_filter=payment_method_filter_clause
+            payment_method_filter=payment_method_filter_clause,
+            cursor_filter=keyset_filter('o.date_created_gmt', 'o.id') if cursor else ''
         )
         final_count_query = count_query.text.format(
             search_filter=search_filter,
@@ -905,51 +939,62 @@ def list_orders():
             payment_method_filter=payment_method_filter_clause
         )
 
-        # Ejecutar queries
-        results = db.session.execute(text(final_query), params).fetchall()
-        total_count = db.session.execute(text(final_count_query), params).fetchone()[0]
+        # Ejecutar queries (con cursor no hay OFFSET)
+        count_params = dict(params)
+        params.update(keyset_params(cursor) if cursor else {})
+        params['limit'] = per_page + 1
+        params['offset'] = 0 if cursor else (page - 1) * per_page
 
-        # Calcular paginación
-        total_pages = (total_count + per_page - 1) // per_page
-        has_prev = page > 1
-        has_next = page < total_pages
-        prev_num = page - 1 if has_prev else None
-        next_num = page + 1 if has_next else None
+        page_rows = db.session.execute(text(final_query), params).fetchall()
+        has_next = len(page_rows) > per_page
+        page_rows = page_rows[:per_page]
+        order_ids = [row[0] for row in page_rows]
+
+        total_count, total_estimated = list_counts.count(
+            'whatsapp', count_params,
+            lambda: db.session.execute(text(final_count_query), count_params).scalar()
+        )
+
+        # Datos de los pedidos de la página en lote
+        orders = load_orders(order_ids, [
+            'status', 'total_amount', 'currency', 'billing_email', 'payment_method',
+            'payment_method_title', 'date_created_gmt', 'billing_first_name',
+            'billing_last_name', 'billing_phone', 'order_number', 'created_by',
+            'items_count', 'shipping_method', 'tracking_number', 'is_community'
+        ])
 
         # Preparar datos
         orders_list = []
-        for row in results:
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if not order:
+                continue
             orders_list.append({
-                'id': row[0],
-                'status': row[1],
-                'total': float(row[2]) if row[2] else 0,
-                'currency': row[3] or 'PEN',
-                'billing_email': row[4] or '',
-                'payment_method': row[6] or row[5] or '',
-                'customer_name': f"{row[8]} {row[9]}" if row[8] and row[9] else 'N/A',
-                'customer_phone': row[10] or 'N/A',
-                'order_number': row[11] or '',  # W-XXXXX
-                'created_by': row[12] or 'N/A',  # Usuario que creó el pedido
-                'items_count': row[13] or 0,
-                'shipping_method': row[14] or 'N/A',  # Método de envío
-                'tracking_number': row[15] or None,  # Número de tracking
-                'is_community': row[16] == 'yes',
-                'date_created': row[7].strftime('%Y-%m-%d %H:%M:%S') if row[7] else ''
+                'id': order_id,
+                'status': order['status'],
+                'total': float(order['total_amount']) if order['total_amount'] else 0,
+                'currency': order['currency'] or 'PEN',
+                'billing_email': order['billing_email'] or '',
+                'payment_method': order['payment_method_title'] or order['payment_method'] or '',
+                'customer_name': f"{order['billing_first_name']} {order['billing_last_name']}" if order['billing_first_name'] and order['billing_last_name'] else 'N/A',
+                'customer_phone': order['billing_phone'] or 'N/A',
+                'order_number': order['order_number'] or '',  # W-XXXXX
+                'created_by': order['created_by'] or 'N/A',  # Usuario que creó el pedido
+                'items_count': order['items_count'] or 0,
+                'shipping_method': order['shipping_method'] or 'N/A',  # Método de envío
+                'tracking_number': order['tracking_number'] or None,  # Número de tracking
+                'is_community': order['is_community'] == 'yes',
+                'date_created': order['date_created_gmt'].strftime('%Y-%m-%d %H:%M:%S') if order['date_created_gmt'] else ''
             })
 
         return jsonify({
             'success': True,
             'orders': orders_list,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total_count,
-                'pages': total_pages,
-                'has_prev': has_prev,
-                'has_next': has_next,
-                'prev_num': prev_num,
-                'next_num': next_num
-            }
+            'pagination': pagination_payload(
+                page, per_page, total_count, has_next,
+                encode_cursor(page_rows[-1][1], page_rows[-1][0]) if page_rows else None,
+                estimated=total_estimated
+            )
         })
 
     except Exception as e:
@@ -973,6 +1018,8 @@ def list_woocommerce():
     - search: búsqueda por ID, email, nombre, teléfono
     - status: filtrar por estado del pedido
     - source: filtrar por fuente del pedido (_order_source)
+    - cursor: next_cursor de la página anterior (paginación keyset; sin
+      cursor se usa page con OFFSET)
     """
     try:
         from sqlalchemy import text
@@ -983,45 +1030,21 @@ def list_woocommerce():
         status_filter = request.args.get('status', '', type=str)
         source_filter = request.args.get('source', '', type=str)
         payment_method_filter = request.args.get('payment_method', '', type=str)
+        cursor = decode_cursor(request.args.get('cursor', '', type=str))
 
         # Limitar per_page
         per_page = min(per_page, 100)
 
-        # Query base (como string, no TextClause todavía)
+        # IDs de la página (como string, no TextClause todavía); los JOIN
+        # solo se usan para filtrar. Se pide una fila de más para saber si
+        # hay página siguiente
         query_template = """
-            SELECT DISTINCT
-                o.id,
-                o.status,
-                o.total_amount,
-                o.currency,
-                o.billing_email,
-                o.payment_method,
-                o.payment_method_title,
-                o.date_created_gmt,
-                ba.first_name,
-                ba.last_name,
-                ba.phone,
-                CONCAT('#', o.id) as order_number,
-                om_source.meta_value as order_source,
-                om_is_cod.meta_value as is_cod,
-                om_is_community.meta_value as is_community,
-                (SELECT COUNT(*) FROM wpyz_woocommerce_order_items WHERE order_id = o.id AND order_item_type = 'line_item') as items_count,
-                (SELECT oi.order_item_name
-                 FROM wpyz_woocommerce_order_items oi
-                 WHERE oi.order_id = o.id AND oi.order_item_type = 'shipping'
-                 LIMIT 1) as shipping_method,
-                om_tracking.meta_value as tracking_number
+            SELECT DISTINCT o.id, o.date_created_gmt
             FROM wpyz_wc_orders o
             LEFT JOIN wpyz_wc_orders_meta om_order_number
                 ON o.id = om_order_number.order_id AND om_order_number.meta_key = '_order_number'
             LEFT JOIN wpyz_wc_orders_meta om_source
                 ON o.id = om_source.order_id AND om_source.meta_key = '_order_source'
-            LEFT JOIN wpyz_wc_orders_meta om_is_cod
-                ON o.id = om_is_cod.order_id AND om_is_cod.meta_key = '_is_cod'
-            LEFT JOIN wpyz_wc_orders_meta om_is_community
-                ON o.id = om_is_community.order_id AND om_is_community.meta_key = '_is_community'
-            LEFT JOIN wpyz_wc_orders_meta om_tracking
-                ON o.id = om_tracking.order_id AND om_tracking.meta_key = '_tracking_number'
             LEFT JOIN wpyz_wc_order_addresses ba
                 ON o.id = ba.order_id AND ba.address_type = 'billing'
             WHERE o.status != 'trash'
@@ -1031,7 +1054,8 @@ def list_woocommerce():
             {status_filter}
             {source_filter}
             {payment_method_filter}
-            ORDER BY o.date_created_gmt DESC
+            {cursor_filter}
+            ORDER BY o.date_created_gmt DESC, o.id DESC
             LIMIT :limit OFFSET :offset
         """
 
@@ -1059,10 +1083,7 @@ def list_woocommerce():
         status_filter_clause = ""
         source_filter_clause = ""
         payment_method_filter_clause = ""
-        params = {
-            'limit': per_page,
-            'offset': (page - 1) * per_page
-        }
+        params = {}
 
         # Filtro de búsqueda
         if search:
@@ -1100,7 +1121,8 @@ def list_woocommerce():
             search_filter=search_filter,
             status_filter=status_filter_clause,
             source_filter=source_filter_clause,
-            payment_method_filter=payment_method_filter_clause
+            payment_method_filter=payment_method_filter_clause,
+            cursor_filter=keyset_filter('o.date_created_gmt', 'o.id') if cursor else ''
         )
         final_count_query_str = count_query_template.format(
             search_filter=search_filter,
@@ -1109,65 +1131,77 @@ def list_woocommerce():
             payment_method_filter=payment_method_filter_clause
         )
 
-        # Ejecutar queries
-        result = db.session.execute(text(final_query_str), params).fetchall()
-        total_count = db.session.execute(text(final_count_query_str), params).scalar()
+        # Ejecutar queries (con cursor no hay OFFSET)
+        count_params = dict(params)
+        params.update(keyset_params(cursor) if cursor else {})
+        params['limit'] = per_page + 1
+        params['offset'] = 0 if cursor else (page - 1) * per_page
+
+        page_rows = db.session.execute(text(final_query_str), params).fetchall()
+        has_next = len(page_rows) > per_page
+        page_rows = page_rows[:per_page]
+        order_ids = [row[0] for row in page_rows]
+
+        total_count, total_estimated = list_counts.count(
+            'woocommerce', count_params,
+            lambda: db.session.execute(text(final_count_query_str), count_params).scalar()
+        )
+
+        # Datos de los pedidos de la página en lote
+        orders_data = load_orders(order_ids, [
+            'status', 'total_amount', 'currency', 'billing_email', 'payment_method',
+            'payment_method_title', 'date_created_gmt', 'billing_first_name',
+            'billing_last_name', 'billing_phone', 'order_source', 'is_cod',
+            'is_community', 'items_count', 'shipping_method', 'tracking_number'
+        ])
 
         # Formatear resultados
         import pytz
         peru_tz = pytz.timezone('America/Lima')
         orders = []
 
-        for row in result:
+        for order_id in order_ids:
+            row = orders_data.get(order_id)
+            if not row:
+                continue
+
             # Convertir fecha UTC a hora de Perú
-            if row.date_created_gmt:
-                date_created_utc = pytz.UTC.localize(row.date_created_gmt)
+            if row['date_created_gmt']:
+                date_created_utc = pytz.UTC.localize(row['date_created_gmt'])
                 date_created_peru = date_created_utc.astimezone(peru_tz)
                 date_str = date_created_peru.strftime('%Y-%m-%d %H:%M:%S')
             else:
                 date_str = None
 
             orders.append({
-                'id': row.id,
-                'order_number': row.order_number,
-                'customer_first_name': row.first_name,
-                'customer_last_name': row.last_name,
-                'customer_email': row.billing_email,
-                'customer_phone': row.phone,
-                'total_amount': float(row.total_amount) if row.total_amount else 0.0,
-                'currency': row.currency,
-                'status': row.status,
-                'payment_method': row.payment_method,
-                'payment_method_title': row.payment_method_title,
-                'is_cod': row.is_cod,
-                'is_community': row.is_community,
-                'shipping_method': row.shipping_method,
-                'tracking_number': row.tracking_number,
-                'items_count': row.items_count,
-                'order_source': row.order_source,
+                'id': order_id,
+                'order_number': f"#{order_id}",
+                'customer_first_name': row['billing_first_name'],
+                'customer_last_name': row['billing_last_name'],
+                'customer_email': row['billing_email'],
+                'customer_phone': row['billing_phone'],
+                'total_amount': float(row['total_amount']) if row['total_amount'] else 0.0,
+                'currency': row['currency'],
+                'status': row['status'],
+                'payment_method': row['payment_method'],
+                'payment_method_title': row['payment_method_title'],
+                'is_cod': row['is_cod'],
+                'is_community': row['is_community'],
+                'shipping_method': row['shipping_method'],
+                'tracking_number': row['tracking_number'],
+                'items_count': row['items_count'],
+                'order_source': row['order_source'],
                 'date_created': date_str
             })
 
-        # Calcular paginación
-        total_pages = (total_count + per_page - 1) // per_page
-        has_prev = page > 1
-        has_next = page < total_pages
-        prev_num = page - 1 if has_prev else None
-        next_num = page + 1 if has_next else None
-
         return jsonify({
             'success': True,
             'orders': orders,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total_count,
-                'pages': total_pages,
-                'has_prev': has_prev,
-                'has_next': has_next,
-                'prev_num': prev_num,
-                'next_num': next_num
-            }
+            'pagination': pagination_payload(
+                page, per_page, total_count, has_next,
+                encode_cursor(page_rows[-1][1], page_rows[-1][0]) if page_rows else None,
+                estimated=total_estimated
+            )
         })
 
     except Exception as e:
@@ -1549,6 +1583,92 @@ def get_users():
         }), 500
 
 
+def _attribute_term_names():
+    """
+    (taxonomía, slug) -> nombre de los términos de atributos globales (pa_*).
+
+    Catálogo chico y casi estático: se cachea 10 minutos en vez de unir
+    wpyz_terms en cada búsqueda.
+    """
+    from sqlalchemy import text
+
+    names = cache.get('orders:attribute_term_names')
+    if names is None:
+        rows = db.session.execute(text("""
+            SELECT tt.taxonomy, t.slug, t.name
+            FROM wpyz_terms t
+            INNER JOIN wpyz_term_taxonomy tt ON t.term_id = tt.term_id
+            WHERE tt.taxonomy LIKE 'pa_%'
+        """)).fetchall()
+        names = {(taxonomy, (slug or '').lower()): name for taxonomy, slug, name in rows}
+        cache.set('orders:attribute_term_names', names, timeout=600)
+    return names
+
+
+def _search_results(products):
+    """
+    Resultados de search_products en un número fijo de consultas: metas
+    (_sku, _price, _stock y attribute_pa_*) de todos los productos, títulos
+    de los padres de las variaciones y nombres de términos (cacheados).
+    """
+    from sqlalchemy import text
+
+    if not products:
+        return []
+
+    metas = {}
+    rows = db.session.execute(text("""
+        SELECT post_id, meta_key, meta_value
+        FROM wpyz_postmeta
+        WHERE post_id IN :ids
+        AND (meta_key IN ('_sku', '_price', '_stock') OR meta_key LIKE 'attribute_pa_%')
+        ORDER BY meta_id
+    """), {'ids': tuple(product.ID for product in products)}).fetchall()
+    for post_id, meta_key, meta_value in rows:
+        metas.setdefault(post_id, {})[meta_key] = meta_value
+
+    parent_ids = {product.post_parent for product in products if product.post_type == 'product_variation' and product.post_parent}
+    parent_titles = {}
+    if parent_ids:
+        parent_titles = dict(db.session.execute(text("""
+            SELECT ID, post_title FROM wpyz_posts WHERE ID IN :ids
+        """), {'ids': tuple(parent_ids)}).fetchall())
+
+    term_names = _attribute_term_names() if any(product.post_type == 'product_variation' for product in products) else {}
+
+    products_list = []
+    for product in products:
+        product_metas = metas.get(product.ID, {})
+        sku = product_metas.get('_sku') or 'N/A'
+        price = product_metas.get('_price') or '0'
+        stock = product_metas.get('_stock') or '0'
+
+        # Si es variación: nombre del padre + atributos (nombre del término)
+        if product.post_type == 'product_variation':
+            attributes = []
+            for meta_key, meta_value in product_metas.items():
+                if meta_key.startswith('attribute_pa_'):
+                    taxonomy = meta_key.replace('attribute_', '', 1)
+                    attr_name = meta_key.replace('attribute_pa_', '').title()
+                    value = term_names.get((taxonomy, (meta_value or '').lower()), meta_value)
+                    attributes.append(f"{attr_name}: {value}")
+
+            variation_label = f" ({', '.join(attributes)})" if attributes else ''
+            product_name = f"{parent_titles.get(product.post_parent, '')}{variation_label}"
+        else:
+            product_name = product.post_title
+
+        products_list.append({
+            'id': product.ID,
+            'name': product_name,
+            'sku': sku,
+            'price': float(price),
+            'stock': int(float(stock)),
+            'type': product.post_type
+        })
+    return products_list
+
+
 @bp.route('/search-products')
 @login_required
 def search_products():
@@ -1572,68 +1692,17 @@ def search_products():
 
         # Si hay término de búsqueda, filtrar
         if search_term and len(search_term) >= 2:
-            # Buscar por título o SKU
-            from sqlalchemy import text
-            sku_search = text("""
-                SELECT DISTINCT post_id
-                FROM wpyz_postmeta
-                WHERE meta_key = '_sku'
-                AND meta_value LIKE :search
-            """)
-
-            result = db.session.execute(sku_search, {'search': f'%{search_term}%'})
-            product_ids_by_sku = [row[0] for row in result]
-
-            # Combinar búsqueda por título y SKU
-            products_query = products_query.filter(
-                or_(
-                    Product.post_title.like(f'%{search_term}%'),
-                    Product.ID.in_(product_ids_by_sku)
-                )
-            )
-            products = products_query.limit(50).all()
+            # Índice de búsqueda (app/product_search.py): título, atributos o SKU
+            matched_ids = [entry.id for entry in product_search.search(search_term)[:50]]
+            by_id = {p.ID: p for p in products_query.filter(Product.ID.in_(matched_ids)).all()} if matched_ids else {}
+            products = [by_id[product_id] for product_id in matched_ids if product_id in by_id]
         else:
             # Sin búsqueda, devolver primeros productos (para carga inicial)
             products = products_query.order_by(Product.post_title.asc()).limit(50).all()
 
-        # Preparar resultados
-        products_list = []
-        for product in products:
-            sku = product.get_meta('_sku') or 'N/A'
-            price = product.get_meta('_price') or '0'
-            stock = product.get_meta('_stock') or '0'
-
-            # Si es variación, obtener atributos
-            variation_label = ''
-            if product.post_type == 'product_variation':
-                # Obtener nombre del producto padre
-                parent = Product.query.get(product.post_parent)
-                parent_name = parent.post_title if parent else ''
-
-                # Obtener atributos de variación
-                attributes = []
-                for meta in product.product_meta:
-                    if meta.meta_key.startswith('attribute_pa_'):
-                        attr_name = meta.meta_key.replace('attribute_pa_', '').title()
-                        attributes.append(f"{attr_name}: {meta.meta_value}")
-
-                variation_label = f" ({', '.join(attributes)})" if attributes else ''
-                product_name = f"{parent_name}{variation_label}"
-            else:
-                product_name = product.post_title
-
-            products_list.append({
-                'id': product.ID,
-                'name': product_name,
-                'sku': sku,
-                'price': float(price),
-                'stock': int(float(stock)),
-                'type': product.post_type
-            })
-
         return jsonify({
             'success': True,
-            'products': products_list
+            'products': _search_results(products)
         })
 
     except Exception as e:
@@ -1895,26 +1964,16 @@ def get_variations(product_id):
             ).fetchall()
             slug_to_name = {row[0]: row[1] for row in terms_result}
 
-        # Obtener URLs de imágenes en batch
+        # Obtener URLs de imágenes en batch (una consulta para padre y variaciones)
         thumbnail_ids = [var[6] for var in variations_result if var[6]]
         if parent_result[5]:
             thumbnail_ids.append(parent_result[5])
 
-        image_urls = {}
-        if thumbnail_ids:
-            image_query = text("""
-                SELECT pm.post_id, pm.meta_value
-                FROM wpyz_postmeta pm
-                WHERE pm.post_id IN :thumbnail_ids
-                AND pm.meta_key = '_wp_attached_file'
-            """)
-            image_results = db.session.execute(
-                image_query,
-                {'thumbnail_ids': tuple(thumbnail_ids)}
-            ).fetchall()
-
-            for img_row in image_results:
-                image_urls[str(img_row[0])] = f"https://www.izistoreperu.com/wp-content/uploads/{img_row[1]}"
+        image_urls = {
+            str(attachment_id): url
+            for attachment_id, url in Product.image_urls_for_attachments(thumbnail_ids).items()
+        }
+        parent_image_url = image_urls.get(str(parent_result[5])) if parent_result[5] else None
 
         # Procesar variaciones
         attributes_map = {}
@@ -1952,7 +2011,8 @@ def get_variations(product_id):
                 'stock': int(float(var[4])) if var[4] else 0,
                 'stock_status': var[5] or 'outofstock',
                 'attributes': attributes,
-                'image_url': image_urls.get(str(var[6])) if var[6] else None
+                # Sin imagen propia, la variación hereda la del padre (como Product.get_image_url)
+                'image_url': image_urls.get(str(var[6])) if var[6] else parent_image_url
             })
 
         # Convertir sets a listas ordenadas
@@ -1965,7 +2025,7 @@ def get_variations(product_id):
             'parent': {
                 'id': parent_result[0],
                 'name': parent_result[1],
-                'image_url': image_urls.get(str(parent_result[5])) if parent_result[5] else None,
+                'image_url': parent_image_url,
                 'price': float(parent_result[2]) if parent_result[2] else 0.0,
                 'sku': parent_result[3] or 'N/A',
                 'stock': int(float(parent_result[4])) if parent_result[4] else 0
@@ -2591,9 +2651,18 @@ def create_order():
             current_app.logger.warning(f"Could not queue cache clear for order {order.id}: {str(cache_error)}")
             # No fallar si la limpieza de cache falla
 
+        # Agregar el pedido al snapshot del tablero de despacho (mismo commit)
+        try:
+            from app.routes.dispatch import sync_board_orders
+            sync_board_orders(order.id)
+        except Exception as board_error:
+            current_app.logger.warning(f"Could not sync dispatch board for order {order.id}: {str(board_error)}")
+            # No fallar: refresh_dispatch_board lo incorporará en la siguiente lectura
+
         # Guardar todo (order, items, addresses, metadata)
         db.session.commit()
         current_app.logger.info(f"Order {order.id} created successfully")
+        invalidate_order_reports(order.id)
 
         # ===== DISPARAR ENVÍO DE CORREO DE WOOCOMMERCE =====
         # Enviar email en background para no bloquear la respuesta al usuario
@@ -3046,6 +3115,30 @@ def enable_stock(product_id):
 
 # ==================== ENDPOINTS PARA PEDIDOS EXTERNOS ====================
 
+def _external_orders_query(search, payment_method):
+    """Query de pedidos externos con los filtros de list_external (sin orden)."""
+    query = OrderExternal.query
+
+    # Filtro de búsqueda
+    if search:
+        query = query.filter(
+            or_(
+                OrderExternal.order_number.ilike(f'%{search}%'),
+                OrderExternal.customer_email.ilike(f'%{search}%'),
+                OrderExternal.customer_first_name.ilike(f'%{search}%'),
+                OrderExternal.customer_last_name.ilike(f'%{search}%'),
+                OrderExternal.customer_phone.ilike(f'%{search}%'),
+                OrderExternal.customer_dni.ilike(f'%{search}%')
+            )
+        )
+
+    # Filtro por método de pago
+    if payment_method:
+        query = query.filter(OrderExternal.payment_method == payment_method)
+
+    return query
+
+
 @bp.route('/list-external')
 @login_required
 def list_external():
@@ -3057,43 +3150,45 @@ def list_external():
     - per_page: registros por página (default: 20)
     - search: búsqueda por ID, email, nombre o teléfono
     - payment_method: filtrar por método de pago (yape, plin, efectivo, etc.)
+    - cursor: next_cursor de la página anterior (paginación keyset; sin
+      cursor se usa page con OFFSET)
     """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         search = request.args.get('search', '', type=str).strip()
         payment_method = request.args.get('payment_method', '', type=str).strip()
+        cursor = decode_cursor(request.args.get('cursor', '', type=str))
 
-        # Query base
-        query = OrderExternal.query
-
-        # Filtro de búsqueda
-        if search:
-            query = query.filter(
-                or_(
-                    OrderExternal.order_number.ilike(f'%{search}%'),
-                    OrderExternal.customer_email.ilike(f'%{search}%'),
-                    OrderExternal.customer_first_name.ilike(f'%{search}%'),
-                    OrderExternal.customer_last_name.ilike(f'%{search}%'),
-                    OrderExternal.customer_phone.ilike(f'%{search}%'),
-                    OrderExternal.customer_dni.ilike(f'%{search}%')
-                )
-            )
+        # Ordenar por fecha descendente (id desempata para el cursor)
+        query = _external_orders_query(search, payment_method).order_by(
+            desc(OrderExternal.date_created_gmt), desc(OrderExternal.id)
+        )
 
-        # Filtro por método de pago
-        if payment_method:
-            query = query.filter(OrderExternal.payment_method == payment_method)
+        if cursor:
+            cursor_date, cursor_id = cursor
+            query = query.filter(or_(
+                OrderExternal.date_created_gmt < cursor_date,
+                and_(OrderExternal.date_created_gmt == cursor_date, OrderExternal.id < cursor_id)
+            ))
+        else:
+            query = query.offset((page - 1) * per_page)
 
-        # Ordenar por fecha descendente
-        query = query.order_by(desc(OrderExternal.date_created_gmt))
+        # Una fila de más para saber si hay página siguiente
+        page_orders = query.limit(per_page + 1).all()
+        has_next = len(page_orders) > per_page
+        page_orders = page_orders[:per_page]
 
-        # Paginación
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # El total puede recalcularse en otro hilo: la consulta se arma ahí
+        total_count, total_estimated = list_counts.count(
+            'external', {'search': search, 'payment_method': payment_method},
+            lambda: _external_orders_query(search, payment_method).count()
+        )
 
         # Construir respuesta
         peru_tz = pytz.timezone('America/Lima')
         orders = []
-        for order in pagination.items:
+        for order in page_orders:
             # Convertir fecha UTC a hora de Perú para mostrar
             date_created_utc = pytz.UTC.localize(order.date_created_gmt)
             date_created_peru = date_created_utc.astimezone(peru_tz)
@@ -3115,16 +3210,11 @@ def list_external():
         return jsonify({
             'success': True,
             'orders': orders,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_prev': pagination.has_prev,
-                'has_next': pagination.has_next,
-                'prev_num': pagination.prev_num,
-                'next_num': pagination.next_num
-            }
+            'pagination': pagination_payload(
+                page, per_page, total_count, has_next,
+                encode_cursor(page_orders[-1].date_created_gmt, page_orders[-1].id) if page_orders else None,
+                estimated=total_estimated
+            )
         })
 
     except Exception as e:
@@ -3403,6 +3493,7 @@ def save_order_external():
                     db.session.add(stock_history)
 
         db.session.commit()
+        refresh_external_order_reports(order_ext.date_created_gmt)
 
         return jsonify({
             'success': True,
@@ -3556,6 +3647,7 @@ def update_order_external(order_id):
         order.date_updated_gmt = get_gmt_time()
 
         db.session.commit()
+        refresh_external_order_reports(order.date_created_gmt)
 
         return jsonify({
             'success': True,
@@ -3625,9 +3717,11 @@ def delete_order_external(order_id):
 
         # Eliminar pedido
         order_number = order.order_number
+        date_created_gmt = order.date_created_gmt
         db.session.delete(order)
 
         db.session.commit()
+        refresh_external_order_reports(date_created_gmt)
 
         return jsonify({
             'success': True,
@@ -3681,6 +3775,7 @@ def update_order(order_id):
 
         # 7. Commit de todas las transacciones
         db.session.commit()
+        invalidate_order_reports(order_id)
 
         # 8. Obtener número de pedido para la respuesta
         order = Order.query.get(order_id)
@@ -4208,6 +4303,7 @@ def status_to_processing(order_id):
         )
         
         db.session.commit()
+        invalidate_order_reports(order_id)
         
         # 3. Disparar email de WooCommerce en background
         def send_email_async(oid, pm, pmt, app):
@@ -4311,6 +4407,7 @@ def trash_order(order_id):
         )
 
         db.session.commit()
+        invalidate_order_reports(order_id)
         
         return jsonify({
             'success': True, 
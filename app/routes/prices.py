@@ -3,10 +3,12 @@ from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app.routes.auth import admin_required, advisor_or_admin_required
 from app.models import Product, ProductMeta, PriceHistory
-from app import db, cache
+from app import db
+from app.product_cache import product_cache
+from app.product_search import product_search
 from config import get_local_time
 from datetime import datetime
-from sqlalchemy import or_, func, text
+from sqlalchemy import or_, func
 from decimal import Decimal, InvalidOperation
 
 bp = Blueprint('prices', __name__, url_prefix='/prices')
@@ -25,7 +27,7 @@ def index():
 
 @bp.route('/list')
 @login_required
-@cache.cached(timeout=300, query_string=True)  # Cache 5 min basado en búsqueda
+@product_cache.cached(timeout=300)  # Cache 5 min por búsqueda, invalidado por producto
 def list_prices():
     """
     Obtener lista de productos con información de precios
@@ -71,61 +73,10 @@ def list_prices():
         # CASO 2: Con búsqueda
         # ========================================
 
-        # Separar términos de búsqueda (Keyword-based search)
-        search_terms = search.strip().split()
-        params = {}
-        
-        # Construir condiciones para búsqueda de productos simples (AND logic)
-        simple_conditions = []
-        for i, term in enumerate(search_terms):
-            param_name = f'term_{i}'
-            simple_conditions.append(f"""
-                (p.post_title LIKE :{param_name} 
-                OR p.ID LIKE :{param_name} 
-                OR pm.meta_value LIKE :{param_name})
-            """)
-            params[param_name] = f'%{term}%'
-        
-        simple_where_clause = " AND ".join(simple_conditions)
-
-        # Buscar en productos simples (con SKU)
-        simple_products_query = text(f"""
-            SELECT DISTINCT p.ID
-            FROM wpyz_posts p
-            LEFT JOIN wpyz_postmeta pm ON p.ID = pm.post_id AND pm.meta_key = '_sku'
-            WHERE p.post_type = 'product'
-            AND p.post_status = 'publish'
-            AND {simple_where_clause}
-        """)
-        
-        result = db.session.execute(simple_products_query, params)
-        simple_ids = [row[0] for row in result]
-        
-        # Construir condiciones para búsqueda de variaciones (AND logic)
-        variation_conditions = []
-        for i, term in enumerate(search_terms):
-            param_name = f'term_{i}'
-            variation_conditions.append(f"""
-                (v.post_title LIKE :{param_name} 
-                OR v.ID LIKE :{param_name} 
-                OR vm.meta_value LIKE :{param_name}
-                OR v.post_parent LIKE :{param_name})
-            """)
-        
-        variation_where_clause = " AND ".join(variation_conditions)
-
-        # Buscar en variaciones (por título, ID, SKU O por ID del producto padre)
-        variations_query = text(f"""
-            SELECT DISTINCT v.ID
-            FROM wpyz_posts v
-            LEFT JOIN wpyz_postmeta vm ON v.ID = vm.post_id AND vm.meta_key = '_sku'
-            WHERE v.post_type = 'product_variation'
-            AND v.post_status = 'publish'
-            AND {variation_where_clause}
-        """)
-        
-        result = db.session.execute(variations_query, params)
-        variation_ids = [row[0] for row in result]
+        # Productos y variaciones publicados que coinciden (app/product_search.py)
+        matches = product_search.search(search)
+        simple_ids = [entry.id for entry in matches if entry.post_type == 'product']
+        variation_ids = [entry.id for entry in matches if entry.post_type == 'product_variation']
 
         # Obtener productos simples
         if simple_ids:
@@ -272,9 +223,6 @@ def update_price(product_id):
     }
     """
     try:
-        # Invalidar caché al actualizar precios
-        cache.clear()
-
         # Obtener datos del request
         data = request.get_json()
         new_regular_price = data.get('regular_price')
@@ -370,6 +318,9 @@ def update_price(product_id):
         # Guardar en la base de datos
         db.session.commit()
 
+        # Invalidar las páginas en caché que contienen el producto
+        product_cache.invalidate_products([product.ID])
+
         # Registrar en el historial (transacción separada)
         try:
             history = PriceHistory(
@@ -434,9 +385,6 @@ def update_multiple_prices():
     De ~200-320 queries a solo 4-5 queries para 40 productos
     """
     try:
-        # Invalidar caché al actualizar precios masivos
-        cache.clear()
-
         # Obtener datos
         data = request.get_json()
         mode = data.get('mode', 'fixed')
@@ -878,6 +826,9 @@ def update_multiple_prices():
                 'error': f'Modo "{mode}" no soportado'
             }), 400
 
+        # Invalidar las páginas en caché que contienen los productos
+        product_cache.invalidate_products(item['id'] for item in updated)
+
         # Respuesta final
         if updated:
             return jsonify({
@@ -2,7 +2,9 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import login_required
 from app.models import Product, ProductMeta, Term
-from app import db, cache
+from app import db
+from app.product_cache import product_cache
+from app.product_search import product_search
 from sqlalchemy import or_
 
 # Crear el blueprint
@@ -23,7 +25,7 @@ def index():
 
 @bp.route('/list')
 @login_required
-@cache.cached(timeout=180, query_string=True)  # Cache 3 min basado en parámetros URL
+@product_cache.cached(timeout=180)  # Cache 3 min por parámetros URL, invalidado por producto
 def list_products():
     """
     Ruta para obtener lista de productos en formato JSON con paginación
@@ -33,8 +35,6 @@ def list_products():
     - Con búsqueda: Busca en productos padre Y variaciones (muestra padre si encuentra variación)
     """
     try:
-        from sqlalchemy import text
-        
         # Obtener parámetros de la URL
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
@@ -48,111 +48,9 @@ def list_products():
         # CASO 1: Con búsqueda
         # ========================================
         if search and search.strip() != '':
-            status_filter = f"AND p.post_status = '{status}'" if status else "AND p.post_status = 'publish'"
-            
-            # Separar términos de búsqueda (Keyword-based search)
-            search_terms = search.strip().split()
-            
-            # Construir condiciones para búsqueda de productos padre (AND logic)
-            parent_conditions = []
-            params = {}
-            for i, term in enumerate(search_terms):
-                param_name = f'term_{i}'
-
-                # Reglas de búsqueda inteligente:
-                # - Si contiene guión y empieza con 7 dígitos: Buscar por SKU completo (ej: 1003228-CSHWGT4BR22M)
-                # - Si son 5 dígitos exactos: Buscar por ID
-                # - Si son 7 dígitos exactos: Buscar por SKU base (ej: 1003226 → 1003226-VARIANTE)
-                # - Si no: Buscar solo por Título
-
-                is_numeric = term.isdigit()
-                term_len = len(term)
-                has_dash = '-' in term
-
-                # Detectar SKU completo con guión (ej: 1003228-CSHWGT4BR22M)
-                if has_dash:
-                    parts = term.split('-')
-                    if len(parts) >= 2 and parts[0].isdigit() and len(parts[0]) == 7:
-                        # Búsqueda por SKU completo
-                        parent_conditions.append(f"(pm.meta_value LIKE :{param_name})")
-                        params[param_name] = f'%{term}%'
-                    else:
-                        # Si tiene guión pero no coincide con formato SKU, buscar por título
-                        parent_conditions.append(f"(p.post_title LIKE :{param_name})")
-                        params[param_name] = f'%{term}%'
-                elif is_numeric and term_len == 5:
-                    # Búsqueda por ID exacto
-                    parent_conditions.append(f"(p.ID = :{param_name})")
-                    params[param_name] = term
-                elif is_numeric and term_len == 7:
-                    # Búsqueda por SKU base (encuentra 1003226 y 1003226-VARIANTE)
-                    parent_conditions.append(f"(pm.meta_value LIKE :{param_name})")
-                    params[param_name] = f'{term}%'
-                else:
-                    # Búsqueda por Título (parcial)
-                    parent_conditions.append(f"(p.post_title LIKE :{param_name})")
-                    params[param_name] = f'%{term}%'
-            
-            parent_where_clause = " AND ".join(parent_conditions)
-            
-            # Buscar en productos padre
-            parent_query = text(f"""
-                SELECT DISTINCT p.ID
-                FROM wpyz_posts p
-                LEFT JOIN wpyz_postmeta pm ON p.ID = pm.post_id AND pm.meta_key = '_sku'
-                WHERE p.post_type = 'product'
-                {status_filter}
-                AND {parent_where_clause}
-            """)
-            
-            parent_result = db.session.execute(parent_query, params)
-            parent_ids = [row[0] for row in parent_result]
-            
-            # Construir condiciones para búsqueda de variaciones (AND logic)
-            variation_conditions = []
-            for i, term in enumerate(search_terms):
-                param_name = f'term_{i}' # Los términos ya están en params
-
-                is_numeric = term.isdigit()
-                term_len = len(term)
-                has_dash = '-' in term
-
-                # Detectar SKU completo con guión (ej: 1003228-CSHWGT4BR22M)
-                if has_dash:
-                    parts = term.split('-')
-                    if len(parts) >= 2 and parts[0].isdigit() and len(parts[0]) == 7:
-                        # Búsqueda por SKU completo de variación
-                        variation_conditions.append(f"(vm.meta_value LIKE :{param_name})")
-                    else:
-                        # Si tiene guión pero no coincide con formato SKU, buscar por título
-                        variation_conditions.append(f"(v.post_title LIKE :{param_name})")
-                elif is_numeric and term_len == 5:
-                    # Si es 5 dígitos, buscar por ID de variación O ID padre
-                    variation_conditions.append(f"(v.ID = :{param_name} OR v.post_parent = :{param_name})")
-                elif is_numeric and term_len == 7:
-                    # Si es 7 dígitos, buscar por SKU base de variación (encuentra 1003226 y 1003226-VARIANTE)
-                    variation_conditions.append(f"(vm.meta_value LIKE :{param_name})")
-                else:
-                    # Búsqueda por título de variación
-                    variation_conditions.append(f"(v.post_title LIKE :{param_name})")
-            
-            variation_where_clause = " AND ".join(variation_conditions)
-            
-            # Buscar en variaciones
-            variation_query = text(f"""
-                SELECT DISTINCT v.post_parent
-                FROM wpyz_posts v
-                LEFT JOIN wpyz_postmeta vm ON v.ID = vm.post_id AND vm.meta_key = '_sku'
-                WHERE v.post_type = 'product_variation'
-                AND v.post_parent != 0
-                AND {variation_where_clause}
-            """)
-            
-            variation_result = db.session.execute(variation_query, params)
-            parent_ids_from_variations = [row[0] for row in variation_result if row[0]]
-            
-            # Combinar todos los IDs de productos padre (sin duplicados)
-            all_parent_ids = list(set(parent_ids + parent_ids_from_variations))
+            # Productos padre que coinciden o tienen una variación que coincide
+            # (reglas de ID de 5 dígitos y SKU de 7 dígitos en app/product_search.py)
+            all_parent_ids = product_search.search_parent_ids(search, statuses=(status or 'publish',))
             
             if not all_parent_ids:
                 # No se encontró nada
@@ -225,18 +123,7 @@ def list_products():
         Product.preload_images_for_products(products_items)
 
         # Contar variaciones de todos los productos en UNA SOLA consulta
-        from sqlalchemy import func
-        product_ids = [p.ID for p in products_items]
-        variations_query = db.session.query(
-            Product.post_parent,
-            func.count(Product.ID).label('count')
-        ).filter(
-            Product.post_type == 'product_variation',
-            Product.post_parent.in_(product_ids)
-        ).group_by(Product.post_parent).all()
-
-        # Crear diccionario para búsqueda rápida
-        variations_dict = {row[0]: row[1] for row in variations_query}
+        Product.preload_variation_counts(products_items)
 
         # Convertir a formato JSON
         products_list = []
@@ -247,8 +134,8 @@ def list_products():
             stock = product.get_meta('_stock') or 'N/A'
             stock_status = product.get_meta('_stock_status') or 'instock'
             
-            # Obtener cantidad de variaciones del diccionario
-            variations_count = variations_dict.get(product.ID, 0)
+            # Obtener cantidad de variaciones (precargada)
+            variations_count = product.variations_count()
 
             # Determinar tipo de producto
             is_variable = variations_count > 0
@@ -359,8 +246,9 @@ def get_variations(product_id):
         ).order_by(Product.ID.asc()).all()
         
         # OPTIMIZACIÓN: Pre-cargar metadatos e imágenes para todas las variaciones de una vez
+        # (las variaciones sin imagen heredan la del padre sin consultarlo una por una)
         Product.preload_metadata_for_products(variations)
-        Product.preload_images_for_products(variations)
+        Product.preload_images_for_products(variations, inherit_parent=True)
         
         variations_list = []
         for variation in variations:
@@ -433,15 +321,19 @@ def view_product(product_id):
         # Obtener variaciones si es producto variable
         variations_query = []
         if product.post_type == 'product':
-            variations_query = Product.query.filter_by(
-                post_type='product_variation',
-                post_parent=product.ID
-            ).all()
+            variations_query = Product.preload_variations_for_products([product])
         
-        # OPTIMIZACIÓN: Pre-cargar metadatos e imágenes para el producto y todas sus variaciones en bulk
+        # Si es variación, obtener el producto padre
+        parent_product = None
+        if product.post_type == 'product_variation' and product.post_parent:
+            parent_product = Product.query.get(product.post_parent)
+        
+        # OPTIMIZACIÓN: Pre-cargar metadatos e imágenes para el producto, su padre y todas sus variaciones en bulk
         all_products_to_load = [product] + variations_query
+        if parent_product:
+            all_products_to_load.append(parent_product)
         Product.preload_metadata_for_products(all_products_to_load)
-        Product.preload_images_for_products(all_products_to_load)
+        Product.preload_images_for_products(all_products_to_load, inherit_parent=True)
         
         # Obtener metadatos importantes del objeto ya cargado (usa caché interna)
         product_data = {
@@ -478,13 +370,6 @@ def view_product(product_id):
             'parent_id': product.post_parent
         }
         
-        # Si es variación, obtener el producto padre
-        parent_product = None
-        if product.post_type == 'product_variation' and product.post_parent:
-            parent_product = Product.query.get(product.post_parent)
-            if parent_product:
-                parent_product.preload_meta() # Cargar sus metas también
-        
         # --- PROCESAMIENTO DE VARIACIONES (AGRUPACIÓN MULTINIVEL) ---
         # 1. Recolectar todos los slugs de atributos globales para buscar sus nombres reales
         term_slugs = set()
@@ -631,6 +516,7 @@ def delete_product(product_id):
             try:
                 product.post_status = 'trash'
                 db.session.commit()
+                product_search.refresh_products([product_id])
             except:
                 db.session.rollback()
                 
@@ -849,6 +735,9 @@ def update_product(product_id):
             if batch_data["update"]:
                 wcapi.post(f"products/{product_id}/variations/batch", batch_data)
 
+        # Título/SKU nuevos visibles ya en las búsquedas (incluye variaciones)
+        product_search.refresh_products([product_id])
+
         return jsonify({
             'success': True, 
             'message': 'Producto actualizado correctamente en WooCommerce.'
@@ -1037,6 +926,8 @@ def store_product():
                         db.session.execute(query, {'product_id': product_id, 'brand_id': int(brand_id)})
                 db.session.commit()
 
+            product_search.refresh_products([product_id])
+
             return jsonify({
                 'success': True,
                 'message': 'Producto creado exitosamente',
@@ -1077,12 +968,10 @@ def export_excel():
     Descripción Larga | Precio Regular | Precio Oferta | URL Imagen | Stock
     """
     try:
-        from datetime import datetime, timedelta
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        from openpyxl.utils import get_column_letter
-        from flask import make_response
-        from io import BytesIO
+        from datetime import datetime
+        from itertools import chain
+        from sqlalchemy import text
+        from app.utils.exports import ExportSheet, export_format, export_response, stream_batches
 
         # Obtener parámetros
         date_from_str = request.args.get('date_from')
@@ -1108,267 +997,154 @@ def export_excel():
                 'error': f'Formato de fecha inválido. Recibido: desde={date_from_str}, hasta={date_to_str}. Se esperaba formato YYYY-MM-DD (ej: 2026-01-26)'
             }), 400
 
-        # PASO 1: Consultar productos del rango de fechas
-        query = db.session.query(Product).filter(
-            Product.post_type.in_(['product', 'product_variation']),
-            Product.post_date >= date_from,
-            Product.post_date <= date_to
-        )
-
-        # Filtrar por título si se especificó
+        # PASO 1: Filtro de productos del rango de fechas (y título si se especificó)
+        where_clause = """
+            p.post_type IN ('product', 'product_variation')
+            AND p.post_date >= :date_from
+            AND p.post_date <= :date_to
+        """
+        params = {'date_from': date_from, 'date_to': date_to}
         if title_filter:
-            query = query.filter(Product.post_title.ilike(f'%{title_filter}%'))
-
-        products = query.order_by(Product.post_date.desc()).all()
-
-        if not products:
+            where_clause += " AND p.post_title LIKE :title"
+            params['title'] = f'%{title_filter}%'
+
+        # PASO 2: Productos por lotes con cursor del servidor (el primer lote
+        # se lee ya para responder 404 si no hay productos)
+        batches = stream_batches(text(f"""
+            SELECT p.ID, p.post_title, p.post_type, p.post_parent, p.post_excerpt, p.post_content
+            FROM wpyz_posts p
+            WHERE {where_clause}
+            ORDER BY p.post_date DESC
+        """), params, 500)
+        first_batch = next(batches, None)
+
+        if not first_batch:
             return jsonify({
                 'success': False,
                 'error': f'No se encontraron productos entre {date_from_str} y {date_to_str}'
             }), 404
 
-        # PASO 2: Obtener todos los IDs de productos
-        product_ids = [p.ID for p in products]
-
-        # PASO 2.5: Obtener IDs de productos padre para variantes
-        parent_ids = set()
-        for p in products:
-            if p.post_type == 'product_variation' and p.post_parent > 0:
-                parent_ids.add(p.post_parent)
-
-        # Cargar productos padre que no están en la lista
-        parent_products = {}
-        if parent_ids:
-            missing_parent_ids = parent_ids - set(product_ids)
-            if missing_parent_ids:
-                parents = db.session.query(Product).filter(
-                    Product.ID.in_(list(missing_parent_ids))
-                ).all()
-                for parent in parents:
-                    parent_products[parent.ID] = parent
-
-        # PASO 3: Eager load de todos los metadatos
-        meta_keys_base = ['_sku', '_price', '_regular_price', '_sale_price', '_stock',
-                         '_stock_status', '_thumbnail_id', '_product_image_gallery', '_product_type']
-
-        all_meta = db.session.query(
-            ProductMeta.post_id,
-            ProductMeta.meta_key,
-            ProductMeta.meta_value
-        ).filter(
-            ProductMeta.post_id.in_(product_ids)
-        ).all()
-
-        # Crear diccionario de metadatos
-        meta_dict = {}
-        for post_id, meta_key, meta_value in all_meta:
-            if post_id not in meta_dict:
-                meta_dict[post_id] = {}
-            meta_dict[post_id][meta_key] = meta_value
-
-        # PASO 3.5: Obtener URLs de imágenes desde los thumbnail IDs
-        thumbnail_ids = set()
-        for post_id in product_ids:
-            thumbnail_id = meta_dict.get(post_id, {}).get('_thumbnail_id')
-            if thumbnail_id:
-                try:
-                    thumbnail_ids.add(int(thumbnail_id))
-                except (ValueError, TypeError):
-                    pass
-
-        # Consultar rutas de archivos desde wpyz_postmeta
-        image_urls = {}
-        if thumbnail_ids:
-            image_meta = db.session.query(
-                ProductMeta.post_id,
-                ProductMeta.meta_value
-            ).filter(
-                ProductMeta.post_id.in_(list(thumbnail_ids)),
-                ProductMeta.meta_key == '_wp_attached_file'
-            ).all()
+        # PASO 3: Detectar todos los atributos únicos (para columnas dinámicas),
+        # buscando tanto attribute_pa_ como attribute_ (sin pa_)
+        attribute_keys = db.session.execute(text(f"""
+            SELECT DISTINCT pm.meta_key
+            FROM wpyz_posts p
+            INNER JOIN wpyz_postmeta pm ON pm.post_id = p.ID
+            WHERE {where_clause}
+                AND pm.meta_key LIKE 'attribute!_%' ESCAPE '!'
+        """), params).scalars().all()
 
-            # Construir URLs completas
-            base_url = 'https://www.izistoreperu.com/wp-content/uploads/'
-            for post_id, file_path in image_meta:
-                if file_path:
-                    image_urls[str(post_id)] = base_url + file_path
-
-        # PASO 4: Detectar todos los atributos únicos (para columnas dinámicas)
-        # Atributos específicos que queremos detectar
-        known_attributes = ['color', 'conector', 'talla', 'medidas', 'medida']
         all_attributes = set()
+        for key in attribute_keys:
+            if key.startswith('attribute_pa_'):
+                all_attributes.add(key.replace('attribute_pa_', ''))
+            else:
+                all_attributes.add(key.replace('attribute_', ''))
 
-        for post_id in product_ids:
-            product_meta = meta_dict.get(post_id, {})
-            for key in product_meta.keys():
-                # Buscar tanto attribute_pa_ como attribute_ (sin pa_)
-                if key.startswith('attribute_'):
-                    # Extraer nombre del atributo
-                    if key.startswith('attribute_pa_'):
-                        attr_slug = key.replace('attribute_pa_', '')
-                    else:
-                        attr_slug = key.replace('attribute_', '')
-                    all_attributes.add(attr_slug)
-
-        # Ordenar atributos alfabéticamente y capitalizar
-        sorted_attributes = sorted(list(all_attributes))
+        # Ordenar atributos alfabéticamente
+        sorted_attributes = sorted(all_attributes)
 
         # Debug: Log de atributos detectados
         print(f"DEBUG: Atributos detectados: {sorted_attributes}")
 
-        # PASO 4.5: Simplificado - ya no necesitamos consultar wpyz_terms
-        # Usaremos los slugs directamente para mantener consistencia con los títulos
-
-        # PASO 5: Crear archivo Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Productos"
+        # Usamos los slugs directamente para mantener consistencia con los títulos
+        meta_keys_base = ['_sku', '_regular_price', '_sale_price', '_stock', '_thumbnail_id']
+        base_url = 'https://www.izistoreperu.com/wp-content/uploads/'
+
+        def rows():
+            for batch in chain([first_batch], batches):
+                product_ids = [row[0] for row in batch]
+
+                # Metadatos del lote
+                meta_dict = {}
+                for post_id, meta_key, meta_value in db.session.execute(text("""
+                    SELECT post_id, meta_key, meta_value
+                    FROM wpyz_postmeta
+                    WHERE post_id IN :post_ids
+                        AND (meta_key IN :meta_keys OR meta_key LIKE 'attribute!_%' ESCAPE '!')
+                """), {'post_ids': product_ids, 'meta_keys': meta_keys_base}):
+                    meta_dict.setdefault(post_id, {})[meta_key] = meta_value
+
+                # Para variaciones, las descripciones se toman del producto padre
+                # (las variaciones suelen tener atributos en post_excerpt)
+                parent_ids = {row[3] for row in batch if row[2] == 'product_variation' and row[3] > 0}
+                parents = {}
+                if parent_ids:
+                    parents = {
+                        parent_id: (excerpt, content)
+                        for parent_id, excerpt, content in db.session.execute(text("""
+                            SELECT ID, post_excerpt, post_content
+                            FROM wpyz_posts
+                            WHERE ID IN :parent_ids
+                        """), {'parent_ids': list(parent_ids)})
+                    }
 
-        # PASO 6: Crear encabezados
+                # URLs de imágenes desde los thumbnail IDs
+                thumbnail_ids = set()
+                for post_id in product_ids:
+                    thumbnail_id = meta_dict.get(post_id, {}).get('_thumbnail_id')
+                    if thumbnail_id:
+                        try:
+                            thumbnail_ids.add(int(thumbnail_id))
+                        except (ValueError, TypeError):
+                            pass
+
+                image_urls = {}
+                if thumbnail_ids:
+                    for post_id, file_path in db.session.execute(text("""
+                        SELECT post_id, meta_value
+                        FROM wpyz_postmeta
+                        WHERE post_id IN :post_ids
+                            AND meta_key = '_wp_attached_file'
+                    """), {'post_ids': list(thumbnail_ids)}):
+                        if file_path:
+                            image_urls[str(post_id)] = base_url + file_path
+
+                for product_id, post_title, post_type, post_parent, post_excerpt, post_content in batch:
+                    product_meta = meta_dict.get(product_id, {})
+
+                    # Atributos dinámicos: attribute_pa_ o attribute_
+                    attr_values = [
+                        product_meta.get('attribute_pa_' + attr_slug, '') or product_meta.get('attribute_' + attr_slug, '')
+                        for attr_slug in sorted_attributes
+                    ]
+
+                    # ID Padre: solo para variaciones
+                    is_variation = post_type == 'product_variation' and post_parent > 0
+                    parent_id = post_parent if is_variation else ''
+
+                    # Descripción Corta y Larga (de la variación: siempre del padre;
+                    # vacío si no se encuentra, no los atributos de la variación)
+                    if is_variation:
+                        desc_corta, desc_larga = parents.get(post_parent, ('', ''))
+                    else:
+                        desc_corta, desc_larga = post_excerpt, post_content
+
+                    thumbnail_id = product_meta.get('_thumbnail_id', '')
+                    image_url = image_urls.get(str(thumbnail_id), '') if thumbnail_id else ''
+
+                    yield [product_id, post_title, product_meta.get('_sku', '')] + attr_values + [
+                        product_id,                      # ID Post
+                        parent_id,
+                        desc_corta or '',
+                        desc_larga or '',
+                        product_meta.get('_regular_price', ''),
+                        product_meta.get('_sale_price', ''),
+                        image_url,
+                        product_meta.get('_stock', '')
+                    ]
+
+        # PASO 4: Encabezados (atributos capitalizados)
         headers = ['ID', 'Título', 'SKU']
-        # Capitalizar nombres de atributos para headers
         headers.extend([attr.replace('_', ' ').title() for attr in sorted_attributes])
         headers.extend(['ID Post', 'ID Padre', 'Descripción Corta', 'Descripción Larga',
                        'Precio Regular', 'Precio Oferta', 'URL Imagen', 'Stock'])
 
-        # Escribir encabezados con estilo
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        # PASO 7: Escribir datos de productos
-        for row_num, product in enumerate(products, 2):
-            product_meta = meta_dict.get(product.ID, {})
-
-            col_num = 1
-
-            # ID
-            ws.cell(row=row_num, column=col_num, value=product.ID)
-            col_num += 1
-
-            # Título
-            ws.cell(row=row_num, column=col_num, value=product.post_title)
-            col_num += 1
-
-            # SKU
-            sku = product_meta.get('_sku', '')
-            ws.cell(row=row_num, column=col_num, value=sku)
-            col_num += 1
-
-            # Atributos dinámicos
-            for attr_slug in sorted_attributes:
-                # Buscar el atributo con ambos formatos: attribute_pa_ y attribute_
-                attr_key_pa = 'attribute_pa_' + attr_slug
-                attr_key_no_pa = 'attribute_' + attr_slug
-
-                attr_value_slug = product_meta.get(attr_key_pa, '') or product_meta.get(attr_key_no_pa, '')
-
-                # Usar el slug directamente sin traducción
-                # Esto mantiene consistencia con los títulos de productos
-                attr_value = attr_value_slug
-
-                ws.cell(row=row_num, column=col_num, value=attr_value)
-                col_num += 1
-
-            # ID Post - Muestra el ID del producto actual (todos los productos)
-            ws.cell(row=row_num, column=col_num, value=product.ID)
-            col_num += 1
-
-            # ID Padre
-            # Lógica simplificada:
-            # - Variaciones: Mostrar ID del padre
-            # - Productos padre (variables): Mostrar vacío
-            # - Productos simples: Mostrar vacío
-            if product.post_type == 'product_variation' and product.post_parent > 0:
-                parent_id = product.post_parent
-            else:
-                parent_id = ''
-
-            ws.cell(row=row_num, column=col_num, value=parent_id)
-            col_num += 1
-
-            # Descripción Corta y Larga
-            # Para variaciones, SIEMPRE obtener del producto padre
-            # Las variaciones suelen tener atributos en post_excerpt, no la descripción real
-            if product.post_type == 'product_variation' and product.post_parent > 0:
-                # Buscar padre en la lista de productos o en parent_products
-                padre = next((p for p in products if p.ID == product.post_parent), None)
-                if not padre and product.post_parent in parent_products:
-                    padre = parent_products[product.post_parent]
-
-                if padre:
-                    desc_corta = padre.post_excerpt or ''
-                    desc_larga = padre.post_content or ''
-                else:
-                    # Si no se encuentra el padre, usar vacío (no los atributos de la variación)
-                    desc_corta = ''
-                    desc_larga = ''
-            else:
-                # Para productos simples y variables (padres), usar su propia descripción
-                desc_corta = product.post_excerpt or ''
-                desc_larga = product.post_content or ''
-
-            ws.cell(row=row_num, column=col_num, value=desc_corta)
-            col_num += 1
-
-            ws.cell(row=row_num, column=col_num, value=desc_larga)
-            col_num += 1
-
-            # Precio Regular
-            regular_price = product_meta.get('_regular_price', '')
-            ws.cell(row=row_num, column=col_num, value=regular_price)
-            col_num += 1
-
-            # Precio Oferta
-            sale_price = product_meta.get('_sale_price', '')
-            ws.cell(row=row_num, column=col_num, value=sale_price)
-            col_num += 1
-
-            # URL Imagen
-            thumbnail_id = product_meta.get('_thumbnail_id', '')
-            image_url = ''
-            if thumbnail_id:
-                image_url = image_urls.get(str(thumbnail_id), '')
-            ws.cell(row=row_num, column=col_num, value=image_url)
-            col_num += 1
-
-            # Stock
-            stock = product_meta.get('_stock', '')
-            ws.cell(row=row_num, column=col_num, value=stock)
-
-        # PASO 8: Ajustar anchos de columnas
-        for col_num in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col_num)
-            max_length = len(str(headers[col_num - 1]))
-
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row,
-                                   min_col=col_num, max_col=col_num):
-                for cell in row:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-
-            # Limitar ancho máximo
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        # PASO 9: Generar archivo en memoria
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        # PASO 10: Crear respuesta HTTP
-        filename = f'productos_{date_from_str}_{date_to_str}.xlsx'
-        response = make_response(output.read())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-
-        return response
+        # Anchos fijos (el archivo se escribe en streaming, no se mide el contenido)
+        widths = [10, 50, 18] + [15] * len(sorted_attributes) + [10, 10, 50, 50, 15, 15, 50, 10]
+
+        sheet = ExportSheet("Productos", headers, rows(), widths=widths, header_color="4472C4", borders=False)
+        return export_response(f'productos_{date_from_str}_{date_to_str}', [sheet], export_format())
 
     except Exception as e:
         import traceback
@@ -1688,6 +1464,8 @@ def create_variable_product():
                     'error': var_response.json()
                 })
 
+        product_search.refresh_products([product_id])
+
         return jsonify({
             'success': True,
             'message': 'Producto variable creado exitosamente',
@@ -11,6 +11,7 @@ from app.models import (
     db, Product, ProductMeta, StockHistory,
     PurchaseOrder, PurchaseOrderItem, PurchaseOrderHistory
 )
+from app.exchange_rates import exchange_rates
 from config import get_local_time
 from datetime import datetime, timedelta
 from sqlalchemy import text, and_, or_
@@ -249,9 +250,7 @@ def export_products_out_of_stock():
         Excel file
     """
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.utils import get_column_letter
+        from app.utils.exports import ExportSheet, export_format, export_response, stream_rows
 
         search = request.args.get('search', '', type=str)
         sort_by = request.args.get('sort_by', 'dias_sin_stock_desc', type=str)
@@ -343,52 +342,20 @@ def export_products_out_of_stock():
                 END
         """)
 
-        result = db.session.execute(query, params)
-
-        products = []
-        for row in result:
-            products.append({
-                'product_id': row.product_id,
-                'product_name': row.product_name,
-                'sku': row.sku,
-                'current_stock': int(float(row.current_stock)) if row.current_stock else 0,
-                'dias_sin_stock': row.dias_sin_stock,
-                'last_updated_by': row.last_updated_by,
-                'last_stock_update': row.last_stock_update.strftime('%d/%m/%Y') if row.last_stock_update else '-',
-                'unit_cost_usd': float(row.unit_cost_usd) if row.unit_cost_usd else 0.00
-            })
+        def rows():
+            for row in stream_rows(query, params):
+                unit_cost_usd = float(row.unit_cost_usd) if row.unit_cost_usd else 0.00
+                yield [
+                    row.sku,
+                    row.product_name,
+                    row.dias_sin_stock,
+                    row.last_stock_update.strftime('%d/%m/%Y') if row.last_stock_update else '-',
+                    row.last_updated_by,
+                    unit_cost_usd,
+                    10,                   # Cantidad sugerida por defecto
+                    unit_cost_usd * 10
+                ]
 
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Productos Sin Stock"
-
-        # Estilos
-        header_fill = PatternFill(start_color="DC3545", end_color="DC3545", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Título del reporte
-        ws.merge_cells('A1:H1')
-        title_cell = ws['A1']
-        title_cell.value = "Reporte de Productos Sin Stock"
-        title_cell.font = Font(bold=True, size=14)
-        title_cell.alignment = Alignment(horizontal="center")
-
-        # Fecha del reporte
-        ws.merge_cells('A2:H2')
-        date_cell = ws['A2']
-        date_cell.value = f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
-        date_cell.alignment = Alignment(horizontal="center")
-
-        # Headers (fila 4)
         headers = [
             'SKU',
             'Producto',
@@ -400,53 +367,16 @@ def export_products_out_of_stock():
             'Total (USD)'
         ]
 
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-            cell.border = border
-
-        # Datos
-        row_num = 5
-        for product in products:
-            ws.cell(row=row_num, column=1, value=product['sku'])
-            ws.cell(row=row_num, column=2, value=product['product_name'])
-            ws.cell(row=row_num, column=3, value=product['dias_sin_stock'])
-            ws.cell(row=row_num, column=4, value=product['last_stock_update'])
-            ws.cell(row=row_num, column=5, value=product['last_updated_by'])
-            ws.cell(row=row_num, column=6, value=product['unit_cost_usd'])
-            ws.cell(row=row_num, column=7, value=10)  # Cantidad sugerida por defecto
-            ws.cell(row=row_num, column=8, value=product['unit_cost_usd'] * 10)
-
-            # Aplicar bordes
-            for col in range(1, 9):
-                ws.cell(row=row_num, column=col).border = border
-
-            row_num += 1
-
-        # Ajustar anchos de columna
-        column_widths = [15, 40, 15, 15, 20, 15, 15, 15]
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = width
-
-        # Guardar en memoria
-        excel_file = BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-
-        # Nombre del archivo
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"productos_sin_stock_{timestamp}.xlsx"
-
-        return send_file(
-            excel_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        sheet = ExportSheet(
+            "Productos Sin Stock", headers, rows(),
+            widths=[15, 40, 15, 15, 20, 15, 15, 15],
+            heading=["Reporte de Productos Sin Stock", f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"],
+            header_color="DC3545"
         )
 
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return export_response(f"productos_sin_stock_{timestamp}", [sheet], export_format())
+
     except Exception as e:
         import traceback
         return jsonify({
@@ -623,14 +553,8 @@ def api_create_order():
             }), 400
 
         # Obtener tipo de cambio actual (usar tasa_compra para órdenes de compra)
-        exchange_rate_query = text("""
-            SELECT tasa_compra
-            FROM woo_tipo_cambio
-            ORDER BY fecha DESC
-            LIMIT 1
-        """)
-        result = db.session.execute(exchange_rate_query).first()
-        exchange_rate = Decimal(str(result[0])) if result else Decimal('3.75')
+        latest_rate = exchange_rates.latest()
+        exchange_rate = Decimal(str(latest_rate.tasa_compra)) if latest_rate else Decimal('3.75')
 
         # Generar número de orden
         year = datetime.now().year
@@ -1,16 +1,26 @@
 # app/routes/reports.py
-from flask import Blueprint, render_template, request, jsonify, current_app, send_file
+from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app.routes.auth import admin_required
-from app import db
+from app import db, cache
+from app.jobs import jobs
 from app.models import TipoCambio
+from app.order_read_model import full_name
+from app.fc_costs import fc_costs
+from app.exchange_rates import exchange_rates
+from app.report_cache import report_cache
+from app.sales_daily import CHANNEL_WHATSAPP, refresh_sales_daily
+from app.utils.dates import lima_range_filter, lima_range_params
+from app.utils.exports import ExportSheet, export_format, export_response, stream_batches
+from app.profit_facts import (
+    PROFIT_FACTS_SYNC_CHUNK, sync_profit_facts, apply_exchange_rates,
+    rebuild_profit_facts, enqueue_rebuild, purge_orphan_facts
+)
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
+from config import get_local_time
 from decimal import Decimal
 from sqlalchemy import text, func
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from io import BytesIO
 
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
@@ -80,6 +90,75 @@ def normalize_payment_method(payment_method_value, is_whatsapp=False):
     return 'N/A'
 
 
+def _coalesce(*values):
+    """COALESCE de SQL: primer valor que no es None."""
+    for value in values:
+        if value is not None:
+            return value
+    return None
+
+
+def _profit_fact_orders_sql(filters, columns):
+    """SELECT de cabeceras de woo_order_profit_facts (ver _profit_fact_orders)."""
+    return text(f"""
+        SELECT f.order_id, f.order_number, f.fecha_lima, f.status{''.join(f', f.{column}' for column in columns)}
+        FROM woo_order_profit_facts f
+        WHERE f.order_item_id = 0
+            AND f.fecha_lima BETWEEN :start_date AND :end_date
+            AND f.status != 'trash'
+            {filters}
+        ORDER BY f.fecha_lima DESC, f.order_id DESC
+    """)
+
+
+def _profit_fact_order_row(row):
+    return (row[0], _coalesce(row[1], str(row[0])), *row[2:])
+
+
+def _profit_fact_orders(start_date, end_date, filters, columns):
+    """
+    Cabeceras de woo_order_profit_facts con fecha (Lima) en el período.
+
+    Args:
+        filters: SQL adicional del WHERE (alias f)
+        columns: Columnas adicionales de la tabla
+
+    Returns:
+        list: Tuplas (order_id, numero, fecha_lima, status, *columns), de la
+              fecha más reciente a la más antigua
+    """
+    rows = db.session.execute(
+        _profit_fact_orders_sql(filters, columns),
+        {'start_date': start_date, 'end_date': end_date}
+    ).fetchall()
+
+    return [_profit_fact_order_row(row) for row in rows]
+
+
+def _profit_fact_order_batches(start_date, end_date, filters, columns, batch_size=500):
+    """Como _profit_fact_orders, pero por lotes leídos con cursor del servidor (exportaciones)."""
+    for batch in stream_batches(
+        _profit_fact_orders_sql(filters, columns),
+        {'start_date': start_date, 'end_date': end_date},
+        batch_size
+    ):
+        yield [_profit_fact_order_row(row) for row in batch]
+
+
+def _profit_fact_items(order_ids, columns):
+    """Líneas de woo_order_profit_facts de los pedidos indicados: tuplas (order_id, *columns)."""
+    rows = []
+    for i in range(0, len(order_ids), 1000):
+        rows.extend(db.session.execute(text(f"""
+            SELECT f.order_id{''.join(f', f.{column}' for column in columns)}
+            FROM woo_order_profit_facts f
+            WHERE f.order_id IN :order_ids
+                AND f.order_item_id > 0
+            ORDER BY f.order_id, f.order_item_id
+        """), {'order_ids': tuple(order_ids[i:i + 1000])}).fetchall())
+    return rows
+
+
 @bp.route('/')
 @login_required
 def index():
@@ -91,6 +170,7 @@ def index():
 
 @bp.route('/api/summary')
 @login_required
+@report_cache.cached
 def api_summary():
     """
     Obtener resumen general de métricas clave
@@ -110,40 +190,30 @@ def api_summary():
         if not start_date:
             start_date = datetime.now().strftime('%Y-%m-%d')
 
-        # Query para métricas generales
-        # IMPORTANTE: Convertir UTC a hora Perú (UTC-5) antes de comparar fechas
+        sync_profit_facts()
+
+        # Métricas generales sobre woo_sales_daily (día en hora Perú ya resuelto):
+        # pedidos con _order_number; los descuentos incluyen los pedidos web
         query = text("""
             SELECT
-                COUNT(DISTINCT o.id) as total_orders,
-                COALESCE(SUM(o.total_amount), 0) as total_sales,
-                COALESCE(AVG(o.total_amount), 0) as avg_order_value,
-                COUNT(DISTINCT CASE WHEN o.status = 'wc-completed' THEN o.id END) as completed_orders,
-                COUNT(DISTINCT CASE WHEN o.status = 'wc-cancelled' THEN o.id END) as cancelled_orders,
-                COUNT(DISTINCT CASE WHEN o.status = 'wc-processing' THEN o.id END) as processing_orders
-            FROM wpyz_wc_orders o
-            INNER JOIN wpyz_wc_orders_meta om ON o.id = om.order_id AND om.meta_key = '_order_number'
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
+                COALESCE(SUM(CASE WHEN d.channel = :channel THEN d.orders_count END), 0) as total_orders,
+                COALESCE(SUM(CASE WHEN d.channel = :channel THEN d.total_amount END), 0) as total_sales,
+                COALESCE(SUM(CASE WHEN d.channel = :channel THEN d.total_amount END)
+                    / NULLIF(SUM(CASE WHEN d.channel = :channel THEN d.orders_count END), 0), 0) as avg_order_value,
+                COALESCE(SUM(CASE WHEN d.channel = :channel AND d.status = 'wc-completed' THEN d.orders_count END), 0) as completed_orders,
+                COALESCE(SUM(CASE WHEN d.channel = :channel AND d.status = 'wc-cancelled' THEN d.orders_count END), 0) as cancelled_orders,
+                COALESCE(SUM(CASE WHEN d.channel = :channel AND d.status = 'wc-processing' THEN d.orders_count END), 0) as processing_orders,
+                COALESCE(SUM(d.discount_amount), 0) as total_discounts
+            FROM woo_sales_daily d
+            WHERE d.fecha_lima BETWEEN :start_date AND :end_date
+                AND d.channel IN ('woocommerce', 'whatsapp')
+                AND d.status != 'trash'
         """)
 
         result = db.session.execute(query, {
             'start_date': start_date,
-            'end_date': end_date
-        }).fetchone()
-
-        # Query para total de descuentos
-        discount_query = text("""
-            SELECT COALESCE(SUM(CAST(meta_value AS DECIMAL(10,2))), 0) as total_discounts
-            FROM wpyz_wc_orders_meta om
-            INNER JOIN wpyz_wc_orders o ON om.order_id = o.id
-            WHERE om.meta_key = '_wc_discount_amount'
-                AND DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
-        """)
-
-        discount_result = db.session.execute(discount_query, {
-            'start_date': start_date,
-            'end_date': end_date
+            'end_date': end_date,
+            'channel': CHANNEL_WHATSAPP
         }).fetchone()
 
         return jsonify({
@@ -155,7 +225,7 @@ def api_summary():
                 'completed_orders': result[3] or 0,
                 'cancelled_orders': result[4] or 0,
                 'processing_orders': result[5] or 0,
-                'total_discounts': float(discount_result[0] or 0),
+                'total_discounts': float(result[6] or 0),
                 'period': {
                     'start': start_date,
                     'end': end_date
@@ -174,6 +244,7 @@ def api_summary():
 
 @bp.route('/api/sales-by-day')
 @login_required
+@report_cache.cached
 def api_sales_by_day():
     """
     Ventas agrupadas por día para gráfico de tendencia
@@ -187,27 +258,30 @@ def api_sales_by_day():
         if not start_date:
             start_date = datetime.now().strftime('%Y-%m-%d')
 
+        sync_profit_facts()
+
         query = text("""
             SELECT
-                DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) as date,
-                COUNT(o.id) as orders,
-                COALESCE(SUM(o.total_amount), 0) as total
-            FROM wpyz_wc_orders o
-            INNER JOIN wpyz_wc_orders_meta om ON o.id = om.order_id AND om.meta_key = '_order_number'
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
-            GROUP BY DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
+                d.fecha_lima as date,
+                SUM(d.orders_count) as orders,
+                COALESCE(SUM(d.total_amount), 0) as total
+            FROM woo_sales_daily d
+            WHERE d.fecha_lima BETWEEN :start_date AND :end_date
+                AND d.channel = :channel
+                AND d.status != 'trash'
+            GROUP BY d.fecha_lima
             ORDER BY date ASC
         """)
 
         results = db.session.execute(query, {
             'start_date': start_date,
-            'end_date': end_date
+            'end_date': end_date,
+            'channel': CHANNEL_WHATSAPP
         }).fetchall()
 
         data = [{
             'date': str(row[0]),
-            'orders': row[1],
+            'orders': int(row[1]),
             'total': float(row[2])
         } for row in results]
 
@@ -227,6 +301,7 @@ def api_sales_by_day():
 
 @bp.route('/api/top-products')
 @login_required
+@report_cache.cached
 def api_top_products():
     """
     Productos más vendidos en el período
@@ -241,7 +316,7 @@ def api_top_products():
         if not start_date:
             start_date = datetime.now().strftime('%Y-%m-%d')
 
-        query = text("""
+        query = text(f"""
             SELECT
                 p.post_title as product_name,
                 SUM(CAST(oim.meta_value AS SIGNED)) as quantity_sold,
@@ -252,7 +327,7 @@ def api_top_products():
             INNER JOIN wpyz_woocommerce_order_itemmeta oim_product ON oi.order_item_id = oim_product.order_item_id AND oim_product.meta_key = '_product_id'
             INNER JOIN wpyz_posts p ON CAST(oim_product.meta_value AS SIGNED) = p.ID
             WHERE oi.order_item_type = 'line_item'
-                AND DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
+                AND {lima_range_filter('o.date_created_gmt')}
                 AND o.status != 'trash'
             GROUP BY p.ID, p.post_title
             ORDER BY quantity_sold DESC
@@ -260,8 +335,7 @@ def api_top_products():
         """)
 
         results = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date,
+            **lima_range_params(start_date, end_date),
             'limit': limit
         }).fetchall()
 
@@ -287,6 +361,7 @@ def api_top_products():
 
 @bp.route('/api/sales-by-user')
 @login_required
+@report_cache.cached
 def api_sales_by_user():
     """
     Ventas por usuario creador
@@ -300,23 +375,26 @@ def api_sales_by_user():
         if not start_date:
             start_date = datetime.now().strftime('%Y-%m-%d')
 
+        sync_profit_facts()
+
+        # advisor = '' cuando el pedido no tiene _created_by
         query = text("""
             SELECT
-                om_created.meta_value as username,
-                COUNT(o.id) as total_orders,
-                COALESCE(SUM(o.total_amount), 0) as total_sales
-            FROM wpyz_wc_orders o
-            INNER JOIN wpyz_wc_orders_meta om_number ON o.id = om_number.order_id AND om_number.meta_key = '_order_number'
-            LEFT JOIN wpyz_wc_orders_meta om_created ON o.id = om_created.order_id AND om_created.meta_key = '_created_by'
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
-            GROUP BY om_created.meta_value
+                NULLIF(d.advisor, '') as username,
+                SUM(d.orders_count) as total_orders,
+                COALESCE(SUM(d.total_amount), 0) as total_sales
+            FROM woo_sales_daily d
+            WHERE d.fecha_lima BETWEEN :start_date AND :end_date
+                AND d.channel = :channel
+                AND d.status != 'trash'
+            GROUP BY d.advisor
             ORDER BY total_sales DESC
         """)
 
         results = db.session.execute(query, {
             'start_date': start_date,
-            'end_date': end_date
+            'end_date': end_date,
+            'channel': CHANNEL_WHATSAPP
         }).fetchall()
 
         # Obtener nombres completos de usuarios
@@ -329,7 +407,7 @@ def api_sales_by_user():
             data.append({
                 'username': username,
                 'full_name': user.full_name if user and user.full_name else username,
-                'total_orders': row[1],
+                'total_orders': int(row[1]),
                 'total_sales': float(row[2])
             })
 
@@ -349,6 +427,7 @@ def api_sales_by_user():
 
 @bp.route('/api/status-distribution')
 @login_required
+@report_cache.cached
 def api_status_distribution():
     """
     Distribución de pedidos por estado
@@ -362,26 +441,29 @@ def api_status_distribution():
         if not start_date:
             start_date = datetime.now().strftime('%Y-%m-%d')
 
+        sync_profit_facts()
+
         query = text("""
             SELECT
-                o.status,
-                COUNT(o.id) as count
-            FROM wpyz_wc_orders o
-            INNER JOIN wpyz_wc_orders_meta om ON o.id = om.order_id AND om.meta_key = '_order_number'
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
-            GROUP BY o.status
+                d.status,
+                SUM(d.orders_count) as count
+            FROM woo_sales_daily d
+            WHERE d.fecha_lima BETWEEN :start_date AND :end_date
+                AND d.channel = :channel
+                AND d.status != 'trash'
+            GROUP BY d.status
             ORDER BY count DESC
         """)
 
         results = db.session.execute(query, {
             'start_date': start_date,
-            'end_date': end_date
+            'end_date': end_date,
+            'channel': CHANNEL_WHATSAPP
         }).fetchall()
 
         data = [{
             'status': row[0],
-            'count': row[1]
+            'count': int(row[1])
         } for row in results]
 
         return jsonify({
@@ -424,102 +506,36 @@ def api_profits():
         if not start_date:
             start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
 
-        # 1. Obtener todos los costos de FC en un diccionario para búsqueda rápida
-        # Se asume que el SKU en fccost es de 7 caracteres y debe coincidir parcialmente con el SKU de Woo
-        fc_costs_rows = db.session.execute(text("SELECT sku, FCLastCost FROM woo_products_fccost WHERE LENGTH(sku) = 7")).fetchall()
-        fc_costs_map = {row[0]: float(row[1] or 0) for row in fc_costs_rows}
-
-        # 2. Obtener tipos de cambio históricos necesarios
-        tc_rows = db.session.execute(text("SELECT fecha, tasa_promedio FROM woo_tipo_cambio WHERE activo = TRUE ORDER BY fecha DESC")).fetchall()
-        # Función auxiliar para obtener TC más cercano a una fecha
-        def get_tc_for_date(order_date):
-            order_date_str = str(order_date)
-            for tc_date, rate in tc_rows:
-                if str(tc_date) <= order_date_str:
-                    return float(rate)
-            return 1.0 # Fallback
-
-        # 3. Construir filtros
+        # 1. Incorporar pedidos nuevos o modificados a woo_order_profit_facts
+        sync_profit_facts()
+
+        # 2. Construir filtros
         source_filter = ""
         if source == 'whatsapp':
-            source_filter = "AND (om_numero.meta_value IS NOT NULL OR oext.order_number IS NOT NULL)"
+            source_filter = "AND f.order_number IS NOT NULL"
         elif source == 'woocommerce':
-            source_filter = "AND om_numero.meta_value IS NULL AND oext.order_number IS NULL"
+            source_filter = "AND f.order_number IS NULL"
 
-        # 4. Consulta de Órdenes (Solo datos básicos)
-        orders_sql = text(f"""
-            SELECT
-                o.id,
-                COALESCE(om_numero.meta_value, CAST(o.id AS CHAR)) as numero_pedido,
-                DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) as fecha,
-                o.status,
-                o.total_amount,
-                ba.first_name,
-                ba.last_name,
-                COALESCE((
-                    SELECT SUM(CAST(oim_shipping.meta_value AS DECIMAL(10,2)))
-                    FROM wpyz_woocommerce_order_items oi_shipping
-                    INNER JOIN wpyz_woocommerce_order_itemmeta oim_shipping ON oi_shipping.order_item_id = oim_shipping.order_item_id
-                    WHERE oi_shipping.order_id = o.id
-                        AND oi_shipping.order_item_type = 'shipping'
-                        AND oim_shipping.meta_key = 'cost'
-                ), 0) as costo_envio,
-                om_community.meta_value as is_community,
-                om_doc_type.meta_value as doc_type,
-                om_business_name.meta_value as business_name,
-                COALESCE(o.payment_method_title, o.payment_method, 'N/A') as metodo_pago
-            FROM wpyz_wc_orders o
-            LEFT JOIN wpyz_wc_orders_meta om_numero ON o.id = om_numero.order_id AND om_numero.meta_key = '_order_number'
-            LEFT JOIN wpyz_wc_order_addresses ba ON o.id = ba.order_id AND ba.address_type = 'billing'
-            LEFT JOIN wpyz_wc_orders_meta om_community ON o.id = om_community.order_id AND om_community.meta_key = '_is_community'
-            LEFT JOIN wpyz_wc_orders_meta om_doc_type ON o.id = om_doc_type.order_id AND om_doc_type.meta_key = '_billing_doc_type'
-            LEFT JOIN wpyz_wc_orders_meta om_business_name ON o.id = om_business_name.order_id AND om_business_name.meta_key = '_billing_business_name'
-            LEFT JOIN (SELECT DISTINCT order_number FROM woo_orders_ext) oext ON om_numero.meta_value COLLATE utf8mb4_unicode_ci = oext.order_number
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
-                AND o.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
-                {source_filter}
-            GROUP BY o.id
-            ORDER BY fecha DESC, o.id DESC
-        """)
-        
-        orders_results = db.session.execute(orders_sql, {'start_date': start_date, 'end_date': end_date}).fetchall()
+        # 3. Cabeceras de los pedidos (costos y tipo de cambio ya calculados)
+        orders_results = _profit_fact_orders(start_date, end_date, f"""
+            AND f.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
+            {source_filter}
+        """, [
+            'total_amount', 'billing_first_name', 'billing_last_name', 'shipping_cost', 'is_community',
+            'billing_doc_type', 'billing_business_name', 'payment_method_label', 'tipo_cambio'
+        ])
         order_ids = [r[0] for r in orders_results]
 
         if not order_ids:
             return jsonify({'success': True, 'data': {'orders': [], 'summary': {}, 'period': {'start': start_date, 'end': end_date}}})
 
-        # 5. Consulta masiva de items para todas las órdenes encontradas
-        items_sql = text("""
-            SELECT
-                oi.order_id,
-                oi.order_item_name,
-                oim_qty.meta_value as qty,
-                pm_sku.meta_value as sku
-            FROM wpyz_woocommerce_order_items oi
-            INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id AND oim_pid.meta_key = '_product_id'
-            INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id AND oim_qty.meta_key = '_qty'
-            LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id AND oim_vid.meta_key = '_variation_id'
-            LEFT JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id AND pm_sku.meta_key = '_sku'
-            WHERE oi.order_id IN :order_ids AND oi.order_item_type = 'line_item'
-        """)
-        
-        # SQLAlchemy bindparams for IN clause can be tricky with raw text, better to use formatting for small lists or bind with list
-        items_results = db.session.execute(items_sql, {'order_ids': order_ids}).fetchall()
-        
-        # Agrupar items por pedido
+        # 4. Líneas de todos los pedidos encontrados
         items_by_order = {}
-        for row in items_results:
-            oid, name, qty, sku = row
+        for oid, name, qty, sku, unit_cost_usd in _profit_fact_items(order_ids, ['product_name', 'qty', 'sku', 'unit_cost_usd']):
             if oid not in items_by_order: items_by_order[oid] = []
-            
-            # Calcular costo unitario buscando en el mapa (Lógica LIKE %sku% en Python)
-            # Se suman TODOS los componentes que hagan match (consistente con purchases.py)
-            cost_unit = 0.0
-            if sku:
-                for fc_sku, cost in fc_costs_map.items():
-                    if fc_sku in sku:
-                        cost_unit += cost
+
+            # Costo unitario: suma de TODOS los componentes FC del SKU (consistente con purchases.py)
+            cost_unit = float(unit_cost_usd or 0)
 
             items_by_order[oid].append({
                 'producto': name,
@@ -542,8 +558,8 @@ def api_profits():
         total_ganancia_pen = 0.0
 
         for r in orders_results:
-            oid, num, fecha, status, total_venta, fname, lname, c_envio, is_comm, doc_type, b_name, p_raw = r
-            tc = get_tc_for_date(fecha)
+            oid, num, fecha, status, total_venta, fname, lname, c_envio, is_comm, doc_type, b_name, p_raw, tipo_cambio = r
+            tc = float(tipo_cambio) if tipo_cambio is not None else 1.0  # Fallback
             items = items_by_order.get(oid, [])
 
             costo_pedido_usd = sum(i['costo_total_usd'] for i in items)
@@ -644,21 +660,14 @@ def api_profits_externos():
         if not start_date:
             start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
 
-        # 1. Obtener todos los costos de FC en un diccionario para búsqueda rápida
-        fc_costs_rows = db.session.execute(text("SELECT sku, FCLastCost FROM woo_products_fccost WHERE LENGTH(sku) = 7")).fetchall()
-        fc_costs_map = {row[0]: float(row[1] or 0) for row in fc_costs_rows}
+        # 1. Índice de costos FC (SKU de 7 caracteres contenidos en el SKU de Woo)
+        fc_index = fc_costs.index
 
-        # 2. Obtener tipos de cambio históricos necesarios
-        tc_rows = db.session.execute(text("SELECT fecha, tasa_promedio FROM woo_tipo_cambio WHERE activo = TRUE ORDER BY fecha DESC")).fetchall()
-        def get_tc_for_date(order_date):
-            order_date_str = str(order_date)
-            for tc_date, rate in tc_rows:
-                if str(tc_date) <= order_date_str:
-                    return float(rate)
-            return 3.8 # Fallback
+        # 2. Calendario de tipos de cambio (búsqueda binaria por fecha)
+        tc_calendar = exchange_rates.calendar
 
         # 3. Consulta de Órdenes (Solo datos básicos)
-        orders_query = text("""
+        orders_query = text(f"""
             SELECT
                 oext.id as pedido_id,
                 oext.order_number as numero_pedido,
@@ -670,14 +679,14 @@ def api_profits_externos():
                 oext.customer_first_name as cliente_nombre,
                 oext.customer_last_name as cliente_apellido
             FROM woo_orders_ext oext
-            WHERE DATE(DATE_SUB(oext.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
+            WHERE {lima_range_filter('oext.date_created_gmt')}
                 AND oext.status != 'trash'
                 AND oext.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
             ORDER BY fecha_pedido DESC, oext.id DESC
             LIMIT 1000
         """)
 
-        orders_results = db.session.execute(orders_query, {'start_date': start_date, 'end_date': end_date}).fetchall()
+        orders_results = db.session.execute(orders_query, lima_range_params(start_date, end_date)).fetchall()
         order_ids = [r[0] for r in orders_results]
 
         if not order_ids:
@@ -710,15 +719,9 @@ def api_profits_externos():
             if oid not in items_by_order: items_by_order[oid] = []
             
             # Buscar costo del SKU
-            costo_unitario = 0.0
             tiene_sku = bool(sku)
-            tiene_costo = False
-            
-            if sku:
-                for fc_sku, cost in fc_costs_map.items():
-                    if fc_sku in sku:
-                        costo_unitario += cost
-                        tiene_costo = True
+            tiene_costo = bool(fc_index.components(sku))
+            costo_unitario = fc_index.unit_cost(sku)
 
             items_by_order[oid].append({
                 'producto': name or 'Sin nombre',
@@ -744,7 +747,7 @@ def api_profits_externos():
 
             total_venta_pen = float(total_venta_pen or 0)
             costo_envio_pen = float(costo_envio_pen or 0)
-            tipo_cambio = get_tc_for_date(fecha_pedido)
+            tipo_cambio = tc_calendar.rate_for(fecha_pedido, default=3.8)
 
             items = items_by_order.get(pedido_id, [])
             costo_total_usd = sum(i['costo_total_usd'] for i in items)
@@ -841,18 +844,11 @@ def export_profits_externos_excel():
         else:
             status_filter = "AND oext.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')"
 
-        # 1. Obtener todos los costos de FC en un diccionario para búsqueda rápida
-        fc_costs_rows = db.session.execute(text("SELECT sku, FCLastCost FROM woo_products_fccost WHERE LENGTH(sku) = 7")).fetchall()
-        fc_costs_map = {row[0]: float(row[1] or 0) for row in fc_costs_rows}
+        # 1. Índice de costos FC (SKU de 7 caracteres contenidos en el SKU de Woo)
+        fc_index = fc_costs.index
 
-        # 2. Obtener tipos de cambio históricos necesarios
-        tc_rows = db.session.execute(text("SELECT fecha, tasa_promedio FROM woo_tipo_cambio WHERE activo = TRUE ORDER BY fecha DESC")).fetchall()
-        def get_tc_for_date(order_date):
-            order_date_str = str(order_date)
-            for tc_date, rate in tc_rows:
-                if str(tc_date) <= order_date_str:
-                    return float(rate)
-            return 3.8 # Fallback
+        # 2. Calendario de tipos de cambio (búsqueda binaria por fecha)
+        tc_calendar = exchange_rates.calendar
 
         # 3. Consulta de Órdenes (Solo datos básicos)
         orders_query_template = """
@@ -869,148 +865,120 @@ def export_profits_externos_excel():
                 oext.customer_last_name as cliente_apellido,
                 oext.customer_dni
             FROM woo_orders_ext oext
-            WHERE DATE(DATE_SUB(oext.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
+            WHERE {lima_filter}
                 AND oext.status != 'trash'
                 {status_filter}
             ORDER BY fecha_pedido DESC, oext.id DESC
             LIMIT 1000
         """
+        orders_query = text(
+            orders_query_template
+            .replace('{status_filter}', status_filter)
+            .replace('{lima_filter}', lima_range_filter('oext.date_created_gmt'))
+        )
 
-        orders_query = text(orders_query_template.replace('{status_filter}', status_filter))
-        orders_results = db.session.execute(orders_query, {'start_date': start_date, 'end_date': end_date}).fetchall()
-        order_ids = [r[0] for r in orders_results]
-
-        if not order_ids:
-            # Si no hay pedidos, devolver Excel vacío o manejar correspondientemente
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Pedidos Externos"
-            ws['A1'] = "No hay datos para el período seleccionado"
-            output = BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f"ganancias_externos_{start_date}_{end_date}.xlsx")
-
-        # 4. Consulta masiva de items para todas las órdenes encontradas
+        # 4. Items de cada lote de órdenes
         items_sql = text("""
             SELECT order_ext_id, product_name, product_sku, quantity, unit_price, tax, total, subtotal
             FROM woo_orders_ext_items
             WHERE order_ext_id IN :order_ids
         """)
-        items_results = db.session.execute(items_sql, {'order_ids': order_ids}).fetchall()
-        
-        # Agrupar items por pedido
-        costo_total_usd_by_order = {}
-        detailed_items = {} # {order_id: [item_data, ...]}
 
-        for row in items_results:
-            # Seleccionamos: oid(0), name(1), sku(2), qty(3), unit_price(4), tax(5), total(6), subtotal(7)
-            oid, name, sku, qty, unit_price, tax, total, subtotal = row
-            if oid not in costo_total_usd_by_order: costo_total_usd_by_order[oid] = 0.0
-            if oid not in detailed_items: detailed_items[oid] = []
-            
-            # Buscar costo del SKU (sumar todos los componentes que hagan match)
-            costo_unitario_usd = 0.0
-            if sku:
-                for fc_sku, cost in fc_costs_map.items():
-                    if fc_sku in sku:
-                        costo_unitario_usd += float(cost)
-            
-            costo_total_item_usd = costo_unitario_usd * int(qty or 1)
-            costo_total_usd_by_order[oid] += costo_total_item_usd
-
-            detailed_items[oid].append({
-                'nombre': name,
-                'sku': sku or 'N/A',
-                'qty': int(qty or 1),
-                'costo_unit_usd': float(costo_unitario_usd),
-                'costo_total_usd': costo_total_item_usd,
-                'venta_total_pen': float(total or 0),
-                'igv_pen': float(tax or 0),
-                'subtotal_pen': float(subtotal or 0)
-            })
-
-        # 5. Combinar y calcular
-        orders_data = []
-
-        # Liberar conexión después de traer todos los datos (el resto es CPU y memoria)
-        db.session.remove()
-
-        for row in orders_results:
-            pedido_id, numero_pedido, fecha_pedido, estado, metodo_pago, total_venta_pen, tax_total_pen, costo_envio_pen, cliente_nombre, cliente_apellido, customer_dni = row
-            
-            total_venta_pen = float(total_venta_pen or 0)
-            costo_envio_pen = float(costo_envio_pen or 0)
-            tipo_cambio = get_tc_for_date(fecha_pedido)
-            
-            costo_total_usd = costo_total_usd_by_order.get(pedido_id, 0.0)
-            costo_total_pen = costo_total_usd * tipo_cambio
-            
-            # Normalizar método de pago a nombre de plataforma
-            plataforma = normalize_payment_method(metodo_pago, is_whatsapp=True)
-
-            # Calcular comisión: 5% si Plataforma contiene "TARJETA"
-            comision_pen = 0
-            if 'TARJETA' in plataforma:
-                comision_pen = round(total_venta_pen * 0.05, 2)
-
-            # Ganancia: Venta total - Costo - Envío - Comisión (sin descontar IGV)
-            ganancia_pen = round(total_venta_pen - costo_total_pen - costo_envio_pen - comision_pen, 2)
-            margen_porcentaje = (ganancia_pen / total_venta_pen * 100) if total_venta_pen > 0 else 0
-
-            cliente_completo = f"{cliente_nombre or ''} {cliente_apellido or ''}".strip() or 'Sin nombre'
-
-            orders_data.append({
-                'pedido_id': pedido_id,
-                'numero_pedido': numero_pedido or str(pedido_id),
-                'fecha_pedido': fecha_pedido,
-                'estado': estado,
-                'metodo_pago': plataforma,
-                'total_venta_pen': total_venta_pen,
-                'tax_total_pen': float(tax_total_pen or 0),
-                'tipo_cambio': tipo_cambio,
-                'costo_total_usd': costo_total_usd,
-                'costo_total_pen': costo_total_pen,
-                'comision_pen': comision_pen,
-                'costo_envio_pen': costo_envio_pen,
-                'ganancia_pen': ganancia_pen,
-                'margen_porcentaje': margen_porcentaje,
-                'cliente': cliente_completo or 'Sin nombre',
-                'customer_dni': customer_dni or '-'
-            })
-
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Pedidos Externos"
-
-        # Estilos
-        header_fill = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Título del reporte
-        title_end_col = 'W' if report_type == 'detailed' else 'P'
-        ws.merge_cells(f'A1:{title_end_col}1')
-        title_cell = ws['A1']
-        title_cell.value = "Reporte de Ganancias - Pedidos Externos"
-        title_cell.font = Font(bold=True, size=14)
-        title_cell.alignment = Alignment(horizontal="center")
-
-        # Período
-        ws.merge_cells(f'A2:{title_end_col}2')
-        period_cell = ws['A2']
-        period_cell.value = f"Período: {start_date} a {end_date}"
-        period_cell.alignment = Alignment(horizontal="center")
-
-        # Headers (fila 4)
+        def rows():
+            for batch in stream_batches(orders_query, lima_range_params(start_date, end_date), 500):
+                detailed_items = {}  # {order_id: [item_data, ...]}
+                items_results = db.session.execute(items_sql, {'order_ids': [r[0] for r in batch]}).fetchall()
+                for row in items_results:
+                    # Seleccionamos: oid(0), name(1), sku(2), qty(3), unit_price(4), tax(5), total(6), subtotal(7)
+                    oid, name, sku, qty, unit_price, tax, total, subtotal = row
+
+                    # Buscar costo del SKU (sumar todos los componentes que hagan match)
+                    costo_unitario_usd = fc_index.unit_cost(sku)
+
+                    detailed_items.setdefault(oid, []).append({
+                        'nombre': name,
+                        'sku': sku or 'N/A',
+                        'qty': int(qty or 1),
+                        'costo_unit_usd': float(costo_unitario_usd),
+                        'costo_total_usd': costo_unitario_usd * int(qty or 1),
+                        'venta_total_pen': float(total or 0),
+                        'igv_pen': float(tax or 0),
+                        'subtotal_pen': float(subtotal or 0)
+                    })
+
+                for row in batch:
+                    oid, numero_pedido, fecha_pedido, estado, metodo_pago, total_venta_pen, tax_total_pen, costo_envio_pen, cliente_nombre, cliente_apellido, customer_dni = row
+
+                    total_venta_pen = float(total_venta_pen or 0)
+                    tax_total_pen = float(tax_total_pen or 0)
+                    costo_envio_pen = float(costo_envio_pen or 0)
+                    tc = tc_calendar.rate_for(fecha_pedido, default=3.8)
+                    items = detailed_items.get(oid, [])
+
+                    costo_total_usd = sum(i['costo_total_usd'] for i in items)
+                    costo_total_pen = costo_total_usd * tc
+
+                    # Normalizar método de pago a nombre de plataforma
+                    plataforma = normalize_payment_method(metodo_pago, is_whatsapp=True)
+
+                    # Calcular comisión: 5% si Plataforma contiene "TARJETA"
+                    comision_pen = 0
+                    if 'TARJETA' in plataforma:
+                        comision_pen = round(total_venta_pen * 0.05, 2)
+
+                    numero_pedido = numero_pedido or str(oid)
+                    cliente = f"{cliente_nombre or ''} {cliente_apellido or ''}".strip() or 'Sin nombre'
+                    customer_dni = customer_dni or '-'
+
+                    if report_type == 'detailed':
+                        total_items_venta = sum(i['venta_total_pen'] for i in items)
+                        for item in items:
+                            costo_item_usd = item['costo_total_usd']
+                            costo_item_pen = costo_item_usd * tc
+                            venta_item_pen = item['venta_total_pen']
+
+                            # Descuento por item: subtotal (precio antes de desc) - total (precio pagado)
+                            precio_bruto_antes = item['subtotal_pen']
+                            monto_desc_item = max(0.0, round(precio_bruto_antes - venta_item_pen, 2))
+                            pct_desc_item = round(monto_desc_item / precio_bruto_antes * 100) if precio_bruto_antes > 0 else 0
+
+                            # Comisión proporcional por item
+                            comision_item = round((venta_item_pen / total_items_venta) * comision_pen, 2) if total_items_venta > 0 else 0
+
+                            # Ganancia = Venta item - Costo - Comisión proporcional
+                            ganancia_item_pen = round(venta_item_pen - costo_item_pen - comision_item, 2)
+                            margen_item = round((ganancia_item_pen / venta_item_pen * 100), 2) if venta_item_pen > 0 else 0
+
+                            yield [
+                                oid, numero_pedido, str(fecha_pedido), estado, plataforma, customer_dni, cliente,
+                                item['nombre'], item['sku'], item['qty'],
+                                round(total_venta_pen, 2), round(venta_item_pen, 2),
+                                monto_desc_item, pct_desc_item,
+                                round(tax_total_pen, 2), round(item['costo_unit_usd'], 2),
+                                round(costo_item_usd, 2), round(costo_item_pen, 2), comision_item,
+                                round(ganancia_item_pen, 2), round(margen_item, 2),
+                                round(tc, 3), round(costo_envio_pen, 2)
+                            ]
+                    else:
+                        # Ganancia: Venta total - Costo - Envío - Comisión (sin descontar IGV)
+                        ganancia_pen = round(total_venta_pen - costo_total_pen - costo_envio_pen - comision_pen, 2)
+                        margen_porcentaje = (ganancia_pen / total_venta_pen * 100) if total_venta_pen > 0 else 0
+
+                        # Descuento del pedido: suma de (subtotal - total) por item
+                        descuento_orden = round(sum(
+                            max(0, i['subtotal_pen'] - i['venta_total_pen'])
+                            for i in items
+                        ), 2)
+
+                        yield [
+                            oid, numero_pedido, str(fecha_pedido), estado, plataforma, customer_dni,
+                            descuento_orden, round(total_venta_pen, 2), round(tc, 3),
+                            round(costo_total_usd, 2), round(costo_total_pen, 2),
+                            round(comision_pen, 2), round(costo_envio_pen, 2),
+                            round(ganancia_pen, 2), round(margen_porcentaje, 2), cliente
+                        ]
+
+        # Headers
         # Detallado: 23 cols | Consolidado: 16 cols
         if report_type == 'detailed':
             headers = [
@@ -1023,6 +991,12 @@ def export_profits_externos_excel():
                 'Ganancia Linea (PEN)', 'Margen Linea %',
                 'T.C.', 'Envío Pedido (PEN)'
             ]
+            # 23 cols: ID, Num, Fecha, Estado, Plat, DNI, Cliente,
+            #          Prod, SKU, Cant, VentaTotalPed, PrecioItem,
+            #          MontoDesc, PctDesc, IGV,
+            #          CostoUnitUSD, CostoTotalUSD, CostoTotalPEN, Comision5%,
+            #          GananciaLinea, MargenLinea, TC, EnvioPed
+            column_widths = [10, 15, 12, 12, 20, 15, 30, 40, 15, 10, 20, 20, 18, 12, 15, 15, 15, 15, 14, 18, 12, 8, 14]
         else:
             headers = [
                 'Pedido ID', 'Número', 'Fecha', 'Estado', 'Plataforma', 'DNI',
@@ -1031,127 +1005,15 @@ def export_profits_externos_excel():
                 'Comisión (PEN)', 'Envío (PEN)', 'Ganancia (PEN)',
                 'Margen %', 'Cliente'
             ]
-
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-            cell.border = border
-
-        # Datos
-        row_num = 5
-        for order in orders_data:
-            oid = order['pedido_id']
-            tc = order['tipo_cambio']
-            comision_pen = order['comision_pen']
-
-            if report_type == 'detailed':
-                items = detailed_items.get(oid, [])
-                total_items_venta = sum(i['venta_total_pen'] for i in items)
-                for item in items:
-                    costo_item_usd = item['costo_total_usd']
-                    costo_item_pen = costo_item_usd * tc
-                    venta_item_pen = item['venta_total_pen']
-
-                    # Descuento por item: subtotal (precio antes de desc) - total (precio pagado)
-                    precio_bruto_antes = item['subtotal_pen']
-                    monto_desc_item = max(0.0, round(precio_bruto_antes - venta_item_pen, 2))
-                    pct_desc_item = round(monto_desc_item / precio_bruto_antes * 100) if precio_bruto_antes > 0 else 0
-
-                    # Comisión proporcional por item
-                    comision_item = round((venta_item_pen / total_items_venta) * comision_pen, 2) if total_items_venta > 0 else 0
-
-                    # Ganancia = Venta item - Costo - Comisión proporcional
-                    ganancia_item_pen = round(venta_item_pen - costo_item_pen - comision_item, 2)
-                    margen_item = round((ganancia_item_pen / venta_item_pen * 100), 2) if venta_item_pen > 0 else 0
-
-                    ws.cell(row=row_num, column=1,  value=oid)
-                    ws.cell(row=row_num, column=2,  value=order['numero_pedido'])
-                    ws.cell(row=row_num, column=3,  value=str(order['fecha_pedido']))
-                    ws.cell(row=row_num, column=4,  value=order['estado'])
-                    ws.cell(row=row_num, column=5,  value=order['metodo_pago'])
-                    ws.cell(row=row_num, column=6,  value=order['customer_dni'])
-                    ws.cell(row=row_num, column=7,  value=order['cliente'])
-                    ws.cell(row=row_num, column=8,  value=item['nombre'])
-                    ws.cell(row=row_num, column=9,  value=item['sku'])
-                    ws.cell(row=row_num, column=10, value=item['qty'])
-                    ws.cell(row=row_num, column=11, value=round(order['total_venta_pen'], 2))
-                    ws.cell(row=row_num, column=12, value=round(venta_item_pen, 2))
-                    ws.cell(row=row_num, column=13, value=monto_desc_item)
-                    ws.cell(row=row_num, column=14, value=pct_desc_item)
-                    ws.cell(row=row_num, column=15, value=round(order['tax_total_pen'], 2))
-                    ws.cell(row=row_num, column=16, value=round(item['costo_unit_usd'], 2))
-                    ws.cell(row=row_num, column=17, value=round(costo_item_usd, 2))
-                    ws.cell(row=row_num, column=18, value=round(costo_item_pen, 2))
-                    ws.cell(row=row_num, column=19, value=comision_item)
-                    ws.cell(row=row_num, column=20, value=round(ganancia_item_pen, 2))
-                    ws.cell(row=row_num, column=21, value=round(margen_item, 2))
-                    ws.cell(row=row_num, column=22, value=round(tc, 3))
-                    ws.cell(row=row_num, column=23, value=round(order['costo_envio_pen'], 2))
-
-                    for col in range(1, 24):
-                        ws.cell(row=row_num, column=col).border = border
-                    row_num += 1
-            else:
-                # Descuento del pedido: suma de (subtotal - total) por item
-                descuento_orden = round(sum(
-                    max(0, i['subtotal_pen'] - i['venta_total_pen'])
-                    for i in detailed_items.get(oid, [])
-                ), 2)
-
-                ws.cell(row=row_num, column=1,  value=oid)
-                ws.cell(row=row_num, column=2,  value=order['numero_pedido'])
-                ws.cell(row=row_num, column=3,  value=str(order['fecha_pedido']))
-                ws.cell(row=row_num, column=4,  value=order['estado'])
-                ws.cell(row=row_num, column=5,  value=order['metodo_pago'])
-                ws.cell(row=row_num, column=6,  value=order['customer_dni'])
-                ws.cell(row=row_num, column=7,  value=descuento_orden)
-                ws.cell(row=row_num, column=8,  value=round(order['total_venta_pen'], 2))
-                ws.cell(row=row_num, column=9,  value=round(tc, 3))
-                ws.cell(row=row_num, column=10, value=round(order['costo_total_usd'], 2))
-                ws.cell(row=row_num, column=11, value=round(order['costo_total_pen'], 2))
-                ws.cell(row=row_num, column=12, value=round(comision_pen, 2))
-                ws.cell(row=row_num, column=13, value=round(order['costo_envio_pen'], 2))
-                ws.cell(row=row_num, column=14, value=round(order['ganancia_pen'], 2))
-                ws.cell(row=row_num, column=15, value=round(order['margen_porcentaje'], 2))
-                ws.cell(row=row_num, column=16, value=order['cliente'])
-
-                for col in range(1, 17):
-                    ws.cell(row=row_num, column=col).border = border
-
-                row_num += 1
-
-        # Ajustar anchos de columna
-        if report_type == 'detailed':
-            # 23 cols: ID, Num, Fecha, Estado, Plat, DNI, Cliente,
-            #          Prod, SKU, Cant, VentaTotalPed, PrecioItem,
-            #          MontoDesc, PctDesc, IGV,
-            #          CostoUnitUSD, CostoTotalUSD, CostoTotalPEN, Comision5%,
-            #          GananciaLinea, MargenLinea, TC, EnvioPed
-            column_widths = [10, 15, 12, 12, 20, 15, 30, 40, 15, 10, 20, 20, 18, 12, 15, 15, 15, 15, 14, 18, 12, 8, 14]
-        else:
             # 16 cols: ID, Num, Fecha, Estado, Plat, DNI,
             #          Descuento, Venta, TC, CostoUSD, CostoPEN, Comision, Envio, Ganancia, Margen, Cliente
             column_widths = [10, 15, 12, 12, 20, 15, 14, 15, 8, 12, 12, 12, 12, 14, 10, 30]
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = width
-
-        # Guardar en memoria
-        excel_file = BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-
-        # Nombre del archivo
-        filename = f"ganancias_externos_{start_date}_{end_date}.xlsx"
-
-        return send_file(
-            excel_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+
+        sheet = ExportSheet(
+            "Pedidos Externos", headers, rows(), widths=column_widths,
+            heading=["Reporte de Ganancias - Pedidos Externos", f"Período: {start_date} a {end_date}"]
         )
+        return export_response(f"ganancias_externos_{start_date}_{end_date}", [sheet], export_format())
 
     except Exception as e:
         import traceback
@@ -1194,173 +1056,141 @@ def export_profits_excel():
             if status_list:
                 # Crear filtro IN con los estados seleccionados
                 status_placeholders = ', '.join([f"'{s}'" for s in status_list])
-                status_filter = f"AND o.status IN ({status_placeholders})"
+                status_filter = f"AND f.status IN ({status_placeholders})"
             else:
                 # Por defecto excluir cancelados, reembolsados y fallidos
-                status_filter = "AND o.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')"
+                status_filter = "AND f.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')"
         else:
             # Por defecto excluir cancelados, reembolsados y fallidos
-            status_filter = "AND o.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')"
+            status_filter = "AND f.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')"
 
         # Determinar filtro de origen
         source_filter = ""
         source_name = "Todos"
         if source == 'whatsapp':
-            source_filter = "AND (om_numero.meta_value IS NOT NULL OR oext.order_number IS NOT NULL)"
+            source_filter = "AND f.order_number IS NOT NULL"
             source_name = "WhatsApp"
         elif source == 'woocommerce':
-            source_filter = "AND om_numero.meta_value IS NULL AND oext.order_number IS NULL"
+            source_filter = "AND f.order_number IS NULL"
             source_name = "WooCommerce"
 
-        # 1. Obtener todos los costos de FC en un diccionario para búsqueda rápida
-        fc_costs_rows = db.session.execute(text("SELECT sku, FCLastCost FROM woo_products_fccost WHERE LENGTH(sku) = 7")).fetchall()
-        fc_costs_map = {row[0]: float(row[1] or 0) for row in fc_costs_rows}
-
-        # 2. Obtener tipos de cambio históricos
-        tc_rows = db.session.execute(text("SELECT fecha, tasa_promedio FROM woo_tipo_cambio WHERE activo = TRUE ORDER BY fecha DESC")).fetchall()
-        def get_tc_for_date(order_date):
-            order_date_str = str(order_date)
-            for tc_date, rate in tc_rows:
-                if str(tc_date) <= order_date_str:
-                    return float(rate)
-            return 1.0
-
-        # 3. Consulta de Órdenes (Solo datos básicos + plataforma)
-        orders_sql = text(f"""
-            SELECT
-                o.id,
-                COALESCE(om_numero.meta_value, CAST(o.id AS CHAR)) as numero_pedido,
-                DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) as fecha,
-                o.status,
-                COALESCE(o.payment_method_title, o.payment_method, 'N/A') as metodo_pago,
-                o.total_amount,
-                o.tax_amount,
-                CONCAT(ba.first_name, ' ', ba.last_name) as cliente_nombre,
-                ba.company as customer_dni,
-                COALESCE((
-                    SELECT SUM(CAST(oim_shipping.meta_value AS DECIMAL(10,2)))
-                    FROM wpyz_woocommerce_order_items oi_shipping
-                    INNER JOIN wpyz_woocommerce_order_itemmeta oim_shipping ON oi_shipping.order_item_id = oim_shipping.order_item_id
-                    WHERE oi_shipping.order_id = o.id
-                        AND oi_shipping.order_id = o.id
-                        AND oi_shipping.order_item_type = 'shipping'
-                        AND oim_shipping.meta_key = 'cost'
-                ), 0) as costo_envio,
-                om_community.meta_value as is_community,
-                om_doc_type.meta_value as doc_type,
-                om_business_name.meta_value as business_name,
-                COALESCE(om_discount.meta_value, 0) as order_discount
-            FROM wpyz_wc_orders o
-            LEFT JOIN wpyz_wc_orders_meta om_numero ON o.id = om_numero.order_id AND om_numero.meta_key = '_order_number'
-            LEFT JOIN wpyz_wc_order_addresses ba ON o.id = ba.order_id AND ba.address_type = 'billing'
-            LEFT JOIN wpyz_wc_orders_meta om_community ON o.id = om_community.order_id AND om_community.meta_key = '_is_community'
-            LEFT JOIN wpyz_wc_orders_meta om_doc_type ON o.id = om_doc_type.order_id AND om_doc_type.meta_key = '_billing_doc_type'
-            LEFT JOIN wpyz_wc_orders_meta om_business_name ON o.id = om_business_name.order_id AND om_business_name.meta_key = '_billing_business_name'
-            LEFT JOIN wpyz_wc_orders_meta om_discount ON o.id = om_discount.order_id AND om_discount.meta_key = '_wc_discount_amount'
-            LEFT JOIN (SELECT DISTINCT order_number FROM woo_orders_ext) oext ON om_numero.meta_value COLLATE utf8mb4_unicode_ci = oext.order_number
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
+        # 1. Incorporar pedidos nuevos o modificados a woo_order_profit_facts
+        sync_profit_facts()
+
+        def order_batches():
+            """Lotes de cabeceras con sus líneas (un lote de líneas por lote de pedidos)."""
+            for batch in _profit_fact_order_batches(start_date, end_date, f"""
                 {status_filter}
                 {source_filter}
-            GROUP BY o.id
-            ORDER BY fecha DESC, o.id DESC
-        """)
-        
-        orders_results = db.session.execute(orders_sql, {'start_date': start_date, 'end_date': end_date}).fetchall()
-        order_ids = [r[0] for r in orders_results]
-
-        # 4. Consulta masiva de items para todas las órdenes encontradas
-        # Usamos diccionarios diferentes según el tipo de reporte
-        items_by_order = {}       # Para Consolidado: {order_id: costo_total_usd}
-        detailed_items = {}       # Para Detallado: {order_id: [item_data, ...]}
-
-        if order_ids:
-            items_sql = text("""
-                SELECT
-                    oi.order_id,
-                    oi.order_item_name as product_name,
-                    oim_qty.meta_value as qty,
-                    pm_sku.meta_value as sku,
-                    oim_total.meta_value as line_total,
-                    oim_tax.meta_value as line_tax,
-                    oim_subtotal.meta_value as line_subtotal,
-                    oim_subtotal_tax.meta_value as line_subtotal_tax
-                FROM wpyz_woocommerce_order_items oi
-                INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id AND oim_pid.meta_key = '_product_id'
-                INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id AND oim_qty.meta_key = '_qty'
-                INNER JOIN wpyz_woocommerce_order_itemmeta oim_total ON oi.order_item_id = oim_total.order_item_id AND oim_total.meta_key = '_line_total'
-                LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id AND oim_vid.meta_key = '_variation_id'
-                LEFT JOIN wpyz_woocommerce_order_itemmeta oim_tax ON oi.order_item_id = oim_tax.order_item_id AND oim_tax.meta_key = '_line_tax'
-                LEFT JOIN wpyz_woocommerce_order_itemmeta oim_subtotal ON oi.order_item_id = oim_subtotal.order_item_id AND oim_subtotal.meta_key = '_line_subtotal'
-                LEFT JOIN wpyz_woocommerce_order_itemmeta oim_subtotal_tax ON oi.order_item_id = oim_subtotal_tax.order_item_id AND oim_subtotal_tax.meta_key = '_line_subtotal_tax'
-                LEFT JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id AND pm_sku.meta_key = '_sku'
-                WHERE oi.order_id IN :order_ids AND oi.order_item_type = 'line_item'
-            """)
-            items_results = db.session.execute(items_sql, {'order_ids': order_ids}).fetchall()
-            
-            for oid, name, qty, sku, line_total, line_tax, line_subtotal, line_subtotal_tax in items_results:
-                # Calcular costo unitario (sumar todos los componentes que hagan match)
-                costo_unitario_usd = 0.0
-                if sku:
-                    for fc_sku, cost in fc_costs_map.items():
-                        if fc_sku in sku:
-                            costo_unitario_usd += float(cost)
-
-                costo_total_usd = costo_unitario_usd * int(qty or 1)
-
-                # Precios y Tax
-                line_total_pen = float(line_total or 0)          # ex-tax después de descuento
-                tax_pen = float(line_tax or 0)                   # IGV sobre precio descontado
-                line_subtotal_pen = float(line_subtotal or 0)    # ex-tax antes de descuento
-                line_subtotal_tax_pen = float(line_subtotal_tax or 0)  # IGV sobre precio original
-                venta_item_pen = line_total_pen + tax_pen        # bruto con IGV, ya con descuento
-                precio_bruto_antes = line_subtotal_pen + line_subtotal_tax_pen  # bruto con IGV, sin descuento
-
-                # Para el reporte Consolidado
-                if oid not in items_by_order: items_by_order[oid] = 0.0
-                items_by_order[oid] += costo_total_usd
-
-                # Para el reporte Detallado
-                if oid not in detailed_items: detailed_items[oid] = []
-                detailed_items[oid].append({
-                    'nombre': name,
-                    'qty': int(qty or 1),
-                    'sku': sku or 'N/A',
-                    'costo_unit_usd': costo_unitario_usd,
-                    'costo_total_usd': costo_total_usd,
-                    'venta_item_pen': venta_item_pen,
-                    'precio_bruto_antes': precio_bruto_antes,
-                    'line_subtotal_pen': line_subtotal_pen,
-                    'line_total_pen': line_total_pen,
-                    'tax_pen': tax_pen,
-                })
-
-        # Liberar conexión después de traer todos los datos (el resto es CPU y memoria)
-        db.session.remove()
-
-        # Crear workbook de Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Ganancias"
-
-        # Estilos etc (mismo código ...)
-        header_fill = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-
-        # Detailed: 25 cols (A-Y), Consolidated: 18 cols (A-R)
-        title_end_col = 'Y' if report_type == 'detailed' else 'R'
-        ws.merge_cells(f'A1:{title_end_col}1')
-        title_cell = ws['A1']
-        title_cell.value = f"Reporte de Ganancias - {source_name}"
-        title_cell.font = Font(bold=True, size=14)
-        title_cell.alignment = Alignment(horizontal="center")
-
-        ws.merge_cells(f'A2:{title_end_col}2')
-        period_cell = ws['A2']
-        period_cell.value = f"Período: {start_date} a {end_date}"
-        period_cell.alignment = Alignment(horizontal="center")
+            """, [
+                'payment_method_label', 'total_amount', 'tax_amount', 'billing_first_name',
+                'billing_last_name', 'billing_company', 'shipping_cost', 'is_community',
+                'billing_doc_type', 'billing_business_name', 'discount_amount', 'tipo_cambio'
+            ]):
+                items_by_order = {}
+                for oid, name, qty, sku, line_total, line_tax, line_subtotal, line_subtotal_tax, unit_cost_usd in _profit_fact_items(
+                    [r[0] for r in batch],
+                    ['product_name', 'qty', 'sku', 'line_total', 'line_tax',
+                     'line_subtotal', 'line_subtotal_tax', 'unit_cost_usd']
+                ):
+                    if line_total is None:
+                        continue   # Líneas sin _line_total (no se exportaban)
+
+                    # Costo unitario (suma de todos los componentes FC del SKU)
+                    costo_unitario_usd = float(unit_cost_usd or 0)
+
+                    # Precios y Tax
+                    line_total_pen = float(line_total or 0)          # ex-tax después de descuento
+                    tax_pen = float(line_tax or 0)                   # IGV sobre precio descontado
+                    line_subtotal_pen = float(line_subtotal or 0)    # ex-tax antes de descuento
+                    line_subtotal_tax_pen = float(line_subtotal_tax or 0)  # IGV sobre precio original
+
+                    items_by_order.setdefault(oid, []).append({
+                        'nombre': name,
+                        'qty': int(qty or 1),
+                        'sku': sku or 'N/A',
+                        'costo_unit_usd': costo_unitario_usd,
+                        'costo_total_usd': costo_unitario_usd * int(qty or 1),
+                        'venta_item_pen': line_total_pen + tax_pen,        # bruto con IGV, ya con descuento
+                        'precio_bruto_antes': line_subtotal_pen + line_subtotal_tax_pen,  # bruto con IGV, sin descuento
+                    })
+
+                yield batch, items_by_order
+
+        def rows():
+            for batch, items_by_order in order_batches():
+                for r in batch:
+                    # Orden: oid(0), num(1), fecha(2), status(3), p_raw(4), total(5), tax(6),
+                    #        first_name(7), last_name(8), dni(9), envio(10), is_comm(11), doc_type(12),
+                    #        b_name(13), order_discount(14), tc(15)
+                    (oid, num, fecha, status, p_raw, total_venta_pen_order, tax_amount_pen, first_name, last_name,
+                     customer_dni, c_envio, is_comm, doc_type, b_name, order_discount, tipo_cambio) = r
+                    cliente = full_name({'billing_first_name': first_name, 'billing_last_name': last_name})
+                    tc = float(tipo_cambio) if tipo_cambio is not None else 1.0
+                    envio_pen = float(c_envio or 0)
+                    total_venta_order = float(total_venta_pen_order or 0)
+                    descuento_orden = float(_coalesce(order_discount, 0) or 0)
+
+                    # Si el pedido es de tipo RUC, mostrar razón social; si no, mostrar nombre del cliente
+                    cliente_display = (b_name or cliente or '') if (doc_type or 'dni').lower() == 'ruc' else (cliente or '')
+
+                    # Normalizar plataforma y calcular comisión
+                    is_whatsapp = num and str(num).startswith('W-')
+                    plataforma = normalize_payment_method(p_raw, is_whatsapp=is_whatsapp)
+                    comision_pen = round(total_venta_order * 0.05, 2) if 'TARJETA' in plataforma else 0
+
+                    items = items_by_order.get(oid, [])
+                    if report_type == 'detailed':
+                        # Calcular comisión proporcional por item
+                        total_items_venta = sum(i['venta_item_pen'] for i in items)
+                        for item in items:
+                            costo_item_usd = item['costo_total_usd']
+                            costo_item_pen = costo_item_usd * tc
+                            venta_item_pen = item['venta_item_pen']
+
+                            # Descuento por item (bruto con IGV): precio original - precio pagado
+                            precio_bruto_antes = item['precio_bruto_antes']
+                            monto_desc_item = max(0.0, round(precio_bruto_antes - venta_item_pen, 2))
+                            pct_desc_item = round(monto_desc_item / precio_bruto_antes * 100) if precio_bruto_antes > 0 else 0
+
+                            # Comisión proporcional
+                            comision_item = round((venta_item_pen / total_items_venta) * comision_pen, 2) if total_items_venta > 0 else 0
+
+                            # Ganancia = Venta item - Costo - Comisión proporcional (sin descontar IGV)
+                            ganancia_item_pen = round(venta_item_pen - costo_item_pen - comision_item, 2)
+                            margen_item = round((ganancia_item_pen / venta_item_pen * 100), 2) if venta_item_pen > 0 else 0
+
+                            yield [
+                                oid, num or oid, str(fecha), status, plataforma,
+                                (doc_type or 'dni').upper(), customer_dni or '-', cliente_display,
+                                item['nombre'], item['sku'], item['qty'],
+                                round(total_venta_order, 2), round(venta_item_pen, 2),
+                                monto_desc_item, pct_desc_item,
+                                round(float(tax_amount_pen or 0), 2), round(item['costo_unit_usd'], 2),
+                                round(costo_item_usd, 2), round(costo_item_pen, 2), comision_item,
+                                round(ganancia_item_pen, 2), round(margen_item, 2),
+                                round(tc, 3), round(envio_pen, 2), 'SÍ' if is_comm == 'yes' else 'NO'
+                            ]
+                    else:
+                        # Solo incluir pedidos con items con costo (si es consolidado)
+                        if not items:
+                            continue
+
+                        costo_usd = sum(i['costo_total_usd'] for i in items)
+                        costo_pen = costo_usd * tc
+
+                        # Ganancia = Venta total - Envío - Costo - Comisión (sin descontar IGV)
+                        ganancia_pen = round(total_venta_order - costo_pen - envio_pen - comision_pen, 2)
+                        margen_porcentaje = round((ganancia_pen / total_venta_order * 100), 2) if total_venta_order > 0 else 0
+
+                        yield [
+                            oid, num or oid, str(fecha), status, plataforma,
+                            (doc_type or 'dni').upper(), customer_dni or '-',
+                            round(descuento_orden, 2), round(total_venta_order, 2), round(tc, 3),
+                            round(costo_usd, 2), round(costo_pen, 2), round(comision_pen, 2),
+                            round(envio_pen, 2), round(ganancia_pen, 2), round(margen_porcentaje, 2),
+                            cliente_display, 'SÍ' if is_comm == 'yes' else 'NO'
+                        ]
 
         # Razón Social fusionada en Cliente: si doc_type=RUC muestra b_name, si no muestra nombre del cliente
         if report_type == 'detailed':
@@ -1374,124 +1204,6 @@ def export_profits_excel():
                 'Ganancia Linea (PEN)', 'Margen Linea %',
                 'T.C.', 'Envío Pedido (PEN)', 'Comunidad'
             ]
-        else:
-            headers = [
-                'Pedido ID', 'Número', 'Fecha', 'Estado', 'Plataforma', 'Tipo Doc', 'Nro Doc',
-                'Descuento (PEN)',
-                'Venta (PEN)', 'T.C.', 'Costo (USD)', 'Costo (PEN)', 'Comisión 5%',
-                'Envío (PEN)', 'Ganancia (PEN)', 'Margen %', 'Cliente', 'Comunidad'
-            ]
-
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col_num)
-            cell.value = header
-            cell.fill, cell.font, cell.alignment, cell.border = header_fill, header_font, header_alignment, border
-
-        # Datos
-        row_num = 5
-        for r in orders_results:
-            # Orden en SQL: oid(0), num(1), fecha(2), status(3), p_raw(4), total(5), tax(6),
-            #               cliente(7), dni(8), envio(9), is_comm(10), doc_type(11), b_name(12), order_discount(13)
-            oid, num, fecha, status, p_raw, total_venta_pen_order, tax_amount_pen, cliente, customer_dni, c_envio, is_comm, doc_type, b_name, order_discount = r
-            tc = get_tc_for_date(fecha)
-            envio_pen = float(c_envio or 0)
-            total_venta_order = float(total_venta_pen_order or 0)
-            descuento_orden = float(order_discount or 0)
-
-            # Si el pedido es de tipo RUC, mostrar razón social; si no, mostrar nombre del cliente
-            cliente_display = (b_name or cliente or '') if (doc_type or 'dni').lower() == 'ruc' else (cliente or '')
-
-            # Normalizar plataforma y calcular comisión
-            is_whatsapp = num and str(num).startswith('W-')
-            plataforma = normalize_payment_method(p_raw, is_whatsapp=is_whatsapp)
-            comision_pen = round(total_venta_order * 0.05, 2) if 'TARJETA' in plataforma else 0
-
-            if report_type == 'detailed':
-                items = detailed_items.get(oid, [])
-                # Calcular comisión proporcional por item
-                total_items_venta = sum(i['venta_item_pen'] for i in items)
-                for item in items:
-                    costo_item_usd = item['costo_total_usd']
-                    costo_item_pen = costo_item_usd * tc
-                    venta_item_pen = item['venta_item_pen']
-
-                    # Descuento por item (bruto con IGV): precio original - precio pagado
-                    precio_bruto_antes = item['precio_bruto_antes']
-                    monto_desc_item = max(0.0, round(precio_bruto_antes - venta_item_pen, 2))
-                    pct_desc_item = round(monto_desc_item / precio_bruto_antes * 100) if precio_bruto_antes > 0 else 0
-
-                    # Comisión proporcional
-                    comision_item = round((venta_item_pen / total_items_venta) * comision_pen, 2) if total_items_venta > 0 else 0
-
-                    # Ganancia = Venta item - Costo - Comisión proporcional (sin descontar IGV)
-                    ganancia_item_pen = round(venta_item_pen - costo_item_pen - comision_item, 2)
-                    margen_item = round((ganancia_item_pen / venta_item_pen * 100), 2) if venta_item_pen > 0 else 0
-
-                    ws.cell(row=row_num, column=1,  value=oid)
-                    ws.cell(row=row_num, column=2,  value=num or oid)
-                    ws.cell(row=row_num, column=3,  value=str(fecha))
-                    ws.cell(row=row_num, column=4,  value=status)
-                    ws.cell(row=row_num, column=5,  value=plataforma)
-                    ws.cell(row=row_num, column=6,  value=(doc_type or 'dni').upper())
-                    ws.cell(row=row_num, column=7,  value=customer_dni or '-')
-                    ws.cell(row=row_num, column=8,  value=cliente_display)
-                    ws.cell(row=row_num, column=9,  value=item['nombre'])
-                    ws.cell(row=row_num, column=10, value=item['sku'])
-                    ws.cell(row=row_num, column=11, value=item['qty'])
-                    ws.cell(row=row_num, column=12, value=round(total_venta_order, 2))
-                    ws.cell(row=row_num, column=13, value=round(venta_item_pen, 2))
-                    ws.cell(row=row_num, column=14, value=monto_desc_item)
-                    ws.cell(row=row_num, column=15, value=pct_desc_item)
-                    ws.cell(row=row_num, column=16, value=round(float(tax_amount_pen or 0), 2))
-                    ws.cell(row=row_num, column=17, value=round(item['costo_unit_usd'], 2))
-                    ws.cell(row=row_num, column=18, value=round(costo_item_usd, 2))
-                    ws.cell(row=row_num, column=19, value=round(costo_item_pen, 2))
-                    ws.cell(row=row_num, column=20, value=comision_item)
-                    ws.cell(row=row_num, column=21, value=round(ganancia_item_pen, 2))
-                    ws.cell(row=row_num, column=22, value=round(margen_item, 2))
-                    ws.cell(row=row_num, column=23, value=round(tc, 3))
-                    ws.cell(row=row_num, column=24, value=round(envio_pen, 2))
-                    ws.cell(row=row_num, column=25, value='SÍ' if is_comm == 'yes' else 'NO')
-
-                    for col in range(1, 26):
-                        ws.cell(row=row_num, column=col).border = border
-                    row_num += 1
-            else:
-                costo_usd = items_by_order.get(oid, 0.0)
-                costo_pen = costo_usd * tc
-
-                # Ganancia = Venta total - Envío - Costo - Comisión (sin descontar IGV)
-                ganancia_pen = round(total_venta_order - costo_pen - envio_pen - comision_pen, 2)
-                margen_porcentaje = round((ganancia_pen / total_venta_order * 100), 2) if total_venta_order > 0 else 0
-
-                # Solo incluir pedidos con items con costo (si es consolidado)
-                if costo_usd == 0 and oid not in items_by_order: continue
-
-                ws.cell(row=row_num, column=1,  value=oid)
-                ws.cell(row=row_num, column=2,  value=num or oid)
-                ws.cell(row=row_num, column=3,  value=str(fecha))
-                ws.cell(row=row_num, column=4,  value=status)
-                ws.cell(row=row_num, column=5,  value=plataforma)
-                ws.cell(row=row_num, column=6,  value=(doc_type or 'dni').upper())
-                ws.cell(row=row_num, column=7,  value=customer_dni or '-')
-                ws.cell(row=row_num, column=8,  value=round(descuento_orden, 2))
-                ws.cell(row=row_num, column=9,  value=round(total_venta_order, 2))
-                ws.cell(row=row_num, column=10, value=round(tc, 3))
-                ws.cell(row=row_num, column=11, value=round(costo_usd, 2))
-                ws.cell(row=row_num, column=12, value=round(costo_pen, 2))
-                ws.cell(row=row_num, column=13, value=round(comision_pen, 2))
-                ws.cell(row=row_num, column=14, value=round(envio_pen, 2))
-                ws.cell(row=row_num, column=15, value=round(ganancia_pen, 2))
-                ws.cell(row=row_num, column=16, value=round(margen_porcentaje, 2))
-                ws.cell(row=row_num, column=17, value=cliente_display)
-                ws.cell(row=row_num, column=18, value='SÍ' if is_comm == 'yes' else 'NO')
-
-                for col in range(1, 19):
-                    ws.cell(row=row_num, column=col).border = border
-                row_num += 1
-
-        # Ajustar anchos de columna
-        if report_type == 'detailed':
             # 25 columnas: ID, Num, Fecha, Estado, Plataforma, TipoDoc, NroDoc, Cliente,
             #              Producto, SKU, Cant, VentaTotalPed, PrecioItem,
             #              MontoDesc, PctDesc, IGV,
@@ -1499,27 +1211,24 @@ def export_profits_excel():
             #              GananciaLinea, MargenLinea, TC, EnvioPed, Comunidad
             column_widths = [10, 15, 12, 12, 20, 10, 15, 30, 40, 15, 10, 20, 20, 18, 12, 18, 15, 15, 15, 14, 18, 12, 8, 14, 10]
         else:
+            headers = [
+                'Pedido ID', 'Número', 'Fecha', 'Estado', 'Plataforma', 'Tipo Doc', 'Nro Doc',
+                'Descuento (PEN)',
+                'Venta (PEN)', 'T.C.', 'Costo (USD)', 'Costo (PEN)', 'Comisión 5%',
+                'Envío (PEN)', 'Ganancia (PEN)', 'Margen %', 'Cliente', 'Comunidad'
+            ]
             # 18 columnas: ID, Num, Fecha, Estado, Plataforma, TipoDoc, NroDoc,
             #              Descuento, Venta, TC, CostoUSD, CostoPEN, Comision5%, Envio, Ganancia, Margen,
             #              Cliente, Comunidad
             column_widths = [10, 15, 12, 12, 20, 10, 15, 14, 15, 8, 12, 12, 14, 12, 14, 12, 30, 10]
-            
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = width
-
-        # Guardar en memoria
-        excel_file = BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-
-        # Nombre del archivo
-        filename = f"{report_type}_ganancias_{source_name.lower()}_{start_date}_{end_date}.xlsx"
-
-        return send_file(
-            excel_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+
+        sheet = ExportSheet(
+            "Reporte de Ganancias", headers, rows(), widths=column_widths,
+            heading=[f"Reporte de Ganancias - {source_name}", f"Período: {start_date} a {end_date}"]
+        )
+        return export_response(
+            f"{report_type}_ganancias_{source_name.lower()}_{start_date}_{end_date}",
+            [sheet], export_format()
         )
 
     except Exception as e:
@@ -1664,6 +1373,19 @@ def api_create_exchange_rate():
             db.session.add(tipo_cambio)
 
         db.session.commit()
+        exchange_rates.invalidate()
+
+        # El tipo de cambio aplica desde su fecha hasta la siguiente tasa:
+        # recalcular tipo_cambio en los hechos de ganancia y esos días del
+        # resumen diario
+        next_fecha = exchange_rates.calendar.next_date(fecha)
+        until = max(next_fecha - timedelta(days=1) if next_fecha else get_local_time().date(), fecha)
+
+        apply_exchange_rates(start_day=fecha, end_day=until)
+        refresh_sales_daily([fecha + timedelta(days=n) for n in range((until - fecha).days + 1)])
+        db.session.commit()
+
+        report_cache.invalidate_range(fecha, until)
 
         return jsonify({
             'success': True,
@@ -1692,6 +1414,46 @@ def api_create_exchange_rate():
         }), 500
 
 
+@jobs.handler('profit_facts_rebuild')
+def profit_facts_rebuild_job(job):
+    """Reconstrucción total de woo_order_profit_facts (un ítem por pedido)."""
+    for items in job.pending_chunks(PROFIT_FACTS_SYNC_CHUNK):
+        rebuild_profit_facts([item.order_id for item in items])
+        job.record_many([(item.id, True, {}) for item in items])
+
+    purge_orphan_facts()
+    db.session.commit()
+
+    # Los costos cambian en todas las fechas
+    report_cache.clear()
+
+
+@bp.route('/api/profits/facts/rebuild', methods=['POST'])
+@login_required
+@admin_required
+def api_rebuild_profit_facts():
+    """
+    Encola la reconstrucción total de woo_order_profit_facts (por ejemplo
+    después de importar costos FC). El progreso se consulta en
+    /dispatch/api/jobs/<job_id>.
+    """
+    try:
+        # Releer woo_products_fccost aunque no haya vencido la revisión de firma
+        fc_costs.invalidate()
+
+        job_id, total = enqueue_rebuild(created_by=current_user.username)
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'total': total
+        }), 202
+
+    except Exception as e:
+        current_app.logger.error(f"Error al encolar reconstrucción de hechos de ganancia: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # ============================================================================
 # DASHBOARD DE GRÁFICOS
 # ============================================================================
@@ -1705,184 +1467,227 @@ def profits_dashboard():
     return render_template('reports_profits_dashboard.html', title='Dashboard de Ganancias')
 
 
-@bp.route('/api/profits/charts/monthly', methods=['GET'])
-@login_required
-def api_profits_monthly():
-    """
-    Obtener datos de ganancias agrupados por mes
+# Consultas paralelas del dashboard combinado (una conexión del pool cada una)
+DASHBOARD_QUERY_WORKERS = 5
 
-    Query params:
-    - start_date: fecha inicio (YYYY-MM-DD)
-    - end_date: fecha fin (YYYY-MM-DD)
 
-    Retorna datos mensuales de: ventas, costos, ganancias, margen
-    """
-    try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+def _chart_monthly(conn, start_date, end_date):
+    """Ganancias por mes (woo_sales_daily)."""
+    # Agregado mensual sobre woo_sales_daily (costo FC y tipo de cambio ya
+    # resueltos en los hechos de ganancia de cada pedido)
+    results = conn.execute(text("""
+        SELECT
+            DATE_FORMAT(d.fecha_lima, '%Y-%m') as mes,
+            SUM(d.orders_count) as total_pedidos,
+            ROUND(SUM(d.total_amount), 2) as ventas_totales_pen,
+            ROUND(SUM(d.cost_pen), 2) as costos_totales_pen,
+            ROUND(SUM(COALESCE(d.shipping_cost, 0)), 2) as costos_envio_totales_pen,
+            ROUND(SUM(d.total_amount) - SUM(d.cost_pen) - SUM(COALESCE(d.shipping_cost, 0)), 2) as ganancias_totales_pen,
+            ROUND(
+                (SUM(d.total_amount) - SUM(d.cost_pen) - SUM(COALESCE(d.shipping_cost, 0)))
+                / NULLIF(SUM(d.total_amount), 0) * 100
+            , 2) as margen_promedio_porcentaje
+        FROM woo_sales_daily d
+        WHERE d.fecha_lima BETWEEN :start_date AND :end_date
+            AND d.channel = :channel
+            AND d.status != 'trash'
+            AND d.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
+        GROUP BY mes
+        ORDER BY mes
+    """), {
+        'start_date': start_date,
+        'end_date': end_date,
+        'channel': CHANNEL_WHATSAPP
+    }).fetchall()
+
+    return [{
+        'mes': row[0],
+        'total_pedidos': int(row[1] or 0),
+        'ventas_totales_pen': float(row[2] or 0),
+        'costos_totales_pen': float(row[3] or 0),
+        'costos_envio_totales_pen': float(row[4] or 0),
+        'ganancias_totales_pen': float(row[5] or 0),
+        'margen_promedio_porcentaje': float(row[6] or 0)
+    } for row in results]
+
+
+def _chart_top_products(conn, start_date, end_date, limit):
+    """Productos más rentables (líneas de woo_order_profit_facts)."""
+    results = conn.execute(text("""
+        SELECT
+            f.product_name as producto,
+            SUM(f.qty) as cantidad_vendida,
+            ROUND(SUM(f.line_subtotal), 2) as ventas_totales_pen,
+            ROUND(SUM(f.unit_cost_usd * f.qty * f.tipo_cambio), 2) as costos_totales_pen,
+            ROUND(SUM(f.line_subtotal) - SUM(f.unit_cost_usd * f.qty * f.tipo_cambio), 2) as ganancia_total_pen,
+            ROUND(
+                (SUM(f.line_subtotal) - SUM(f.unit_cost_usd * f.qty * f.tipo_cambio))
+                / NULLIF(SUM(f.line_subtotal), 0) * 100
+            , 2) as margen_porcentaje
+        FROM woo_order_profit_facts f
+        WHERE f.order_item_id > 0
+            AND f.fecha_lima BETWEEN :start_date AND :end_date
+            AND f.status != 'trash'
+            AND f.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
+            AND f.line_subtotal IS NOT NULL
+        GROUP BY f.product_name
+        HAVING ganancia_total_pen IS NOT NULL
+        ORDER BY ganancia_total_pen DESC
+        LIMIT :limit
+    """), {
+        'start_date': start_date,
+        'end_date': end_date,
+        'limit': limit
+    }).fetchall()
+
+    return [{
+        'producto': row[0],
+        'cantidad_vendida': int(row[1] or 0),
+        'ventas_totales_pen': float(row[2] or 0),
+        'costos_totales_pen': float(row[3] or 0),
+        'ganancia_total_pen': float(row[4] or 0),
+        'margen_porcentaje': float(row[5] or 0)
+    } for row in results]
+
+
+def _chart_by_advisor(conn, start_date, end_date):
+    """Ganancias por asesor (cabeceras de woo_order_profit_facts)."""
+    # Datos por asesor (usuario que creó el pedido); el costo se convierte
+    # con el tipo de cambio de cada pedido
+    results = conn.execute(text("""
+        SELECT
+            COALESCE(f.created_by, 'WooCommerce') as asesor_nombre,
+            COUNT(DISTINCT f.order_id) as total_pedidos,
+            COALESCE(SUM(f.total_amount), 0) as ventas_totales_pen,
+            COALESCE(SUM(f.cost_usd * COALESCE(f.tipo_cambio, 3.75)), 0) as costos_totales_pen,
+            COALESCE(SUM(f.shipping_cost), 0) as costos_envio_totales_pen
+        FROM woo_order_profit_facts f
+        WHERE f.order_item_id = 0
+            AND f.fecha_lima BETWEEN :start_date AND :end_date
+            AND f.status IN ('wc-completed', 'wc-processing')
+        GROUP BY asesor_nombre
+        HAVING ventas_totales_pen > 0
+        ORDER BY ventas_totales_pen DESC
+    """), {
+        'start_date': start_date,
+        'end_date': end_date
+    }).fetchall()
+
+    advisors_data = []
+    for row in results:
+        costos_totales_pen = float(row[3] or 0)
+        costos_envio_totales_pen = float(row[4] or 0)
+        ventas_totales_pen = float(row[2] or 0)
+        ganancia_total_pen = ventas_totales_pen - costos_totales_pen - costos_envio_totales_pen
+        margen_porcentaje = (ganancia_total_pen / ventas_totales_pen * 100) if ventas_totales_pen > 0 else 0
+
+        advisors_data.append({
+            'asesor_nombre': row[0],
+            'total_pedidos': int(row[1] or 0),
+            'ventas_totales_pen': ventas_totales_pen,
+            'costos_totales_pen': costos_totales_pen,
+            'costos_envio_totales_pen': costos_envio_totales_pen,
+            'ganancia_total_pen': ganancia_total_pen,
+            'margen_porcentaje': margen_porcentaje
+        })
+    return advisors_data
 
-        if not start_date or not end_date:
-            return jsonify({
-                'success': False,
-                'error': 'Se requieren start_date y end_date'
-            }), 400
 
-        # Query para datos mensuales
-        monthly_query = text("""
+def _chart_by_status(conn, start_date, end_date):
+    """Pedidos y ventas por estado (wpyz_wc_orders)."""
+    results = conn.execute(text(f"""
+        SELECT
+            o.status,
+            COUNT(DISTINCT o.id) as total_pedidos,
+            COALESCE(SUM(o.total_amount), 0) as ventas_totales_pen
+        FROM wpyz_wc_orders o
+        WHERE {lima_range_filter('o.date_created_gmt')}
+        GROUP BY o.status
+        ORDER BY total_pedidos DESC
+    """), lima_range_params(start_date, end_date)).fetchall()
+
+    return [{
+        'status': row[0],
+        'total_pedidos': int(row[1] or 0),
+        'ventas_totales_pen': float(row[2] or 0)
+    } for row in results]
+
+
+def _chart_low_margin_products(conn, start_date, end_date, threshold, limit):
+    """Productos con margen menor a threshold (líneas de woo_order_profit_facts)."""
+    # Costo convertido con el tipo de cambio de cada pedido
+    results = conn.execute(text("""
+        SELECT
+            producto,
+            total_pedidos,
+            cantidad_total,
+            ventas_totales_pen,
+            costos_totales_pen,
+            (ventas_totales_pen - costos_totales_pen) as ganancia_pen,
+            ((ventas_totales_pen - costos_totales_pen) / ventas_totales_pen * 100) as margen_porcentaje
+        FROM (
             SELECT
-                DATE_FORMAT(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR), '%Y-%m') as mes,
-                COUNT(DISTINCT o.id) as total_pedidos,
-                ROUND(SUM(o.total_amount), 2) as ventas_totales_pen,
-                ROUND(SUM(
-                    (
-                        SELECT SUM(
-                            (
-                                SELECT SUM(fc.FCLastCost)
-                                FROM woo_products_fccost fc
-                                WHERE pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                                    AND LENGTH(fc.sku) = 7
-                            ) * oim_qty.meta_value
-                        )
-                        FROM wpyz_woocommerce_order_items oi
-                        INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id
-                            AND oim_pid.meta_key = '_product_id'
-                        INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id
-                            AND oim_qty.meta_key = '_qty'
-                        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id
-                            AND oim_vid.meta_key = '_variation_id'
-                        INNER JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id
-                            AND pm_sku.meta_key = '_sku'
-                        WHERE oi.order_id = o.id
-                            AND oi.order_item_type = 'line_item'
-                    ) * (
-                        SELECT tasa_promedio
-                        FROM woo_tipo_cambio tc
-                        WHERE tc.fecha <= DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
-                            AND tc.activo = TRUE
-                        ORDER BY tc.fecha DESC
-                        LIMIT 1
-                    )
-                ), 2) as costos_totales_pen,
-                ROUND(SUM(
-                    COALESCE((
-                        SELECT SUM(CAST(oim_shipping.meta_value AS DECIMAL(10,2)))
-                        FROM wpyz_woocommerce_order_items oi_shipping
-                        INNER JOIN wpyz_woocommerce_order_itemmeta oim_shipping ON oi_shipping.order_item_id = oim_shipping.order_item_id
-                        WHERE oi_shipping.order_id = o.id
-                            AND oi_shipping.order_item_type = 'shipping'
-                            AND oim_shipping.meta_key = 'cost'
-                    ), 0)
-                ), 2) as costos_envio_totales_pen,
-                ROUND(SUM(o.total_amount) - SUM(
-                    (
-                        SELECT SUM(
-                            (
-                                SELECT SUM(fc.FCLastCost)
-                                FROM woo_products_fccost fc
-                                WHERE pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                                    AND LENGTH(fc.sku) = 7
-                            ) * oim_qty.meta_value
-                        )
-                        FROM wpyz_woocommerce_order_items oi
-                        INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id
-                            AND oim_pid.meta_key = '_product_id'
-                        INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id
-                            AND oim_qty.meta_key = '_qty'
-                        LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id
-                            AND oim_vid.meta_key = '_variation_id'
-                        INNER JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id
-                            AND pm_sku.meta_key = '_sku'
-                        WHERE oi.order_id = o.id
-                            AND oi.order_item_type = 'line_item'
-                    ) * (
-                        SELECT tasa_promedio
-                        FROM woo_tipo_cambio tc
-                        WHERE tc.fecha <= DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
-                            AND tc.activo = TRUE
-                        ORDER BY tc.fecha DESC
-                        LIMIT 1
-                    )
-                ) - SUM(
-                    COALESCE((
-                        SELECT SUM(CAST(oim_shipping.meta_value AS DECIMAL(10,2)))
-                        FROM wpyz_woocommerce_order_items oi_shipping
-                        INNER JOIN wpyz_woocommerce_order_itemmeta oim_shipping ON oi_shipping.order_item_id = oim_shipping.order_item_id
-                        WHERE oi_shipping.order_id = o.id
-                            AND oi_shipping.order_item_type = 'shipping'
-                            AND oim_shipping.meta_key = 'cost'
-                    ), 0)
-                ), 2) as ganancias_totales_pen,
-                ROUND(
-                    (SUM(o.total_amount) - SUM(
-                        (
-                            SELECT SUM(
-                                (
-                                    SELECT SUM(fc.FCLastCost)
-                                    FROM woo_products_fccost fc
-                                    WHERE pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                                        AND LENGTH(fc.sku) = 7
-                                ) * oim_qty.meta_value
-                            )
-                            FROM wpyz_woocommerce_order_items oi
-                            INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id
-                                AND oim_pid.meta_key = '_product_id'
-                            INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id
-                                AND oim_qty.meta_key = '_qty'
-                            LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id
-                                AND oim_vid.meta_key = '_variation_id'
-                            INNER JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id
-                                AND pm_sku.meta_key = '_sku'
-                            WHERE oi.order_id = o.id
-                                AND oi.order_item_type = 'line_item'
-                        ) * (
-                            SELECT tasa_promedio
-                            FROM woo_tipo_cambio tc
-                            WHERE tc.fecha <= DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
-                                AND tc.activo = TRUE
-                            ORDER BY tc.fecha DESC
-                            LIMIT 1
-                        )
-                    ) - SUM(
-                        COALESCE((
-                            SELECT SUM(CAST(oim_shipping.meta_value AS DECIMAL(10,2)))
-                            FROM wpyz_woocommerce_order_items oi_shipping
-                            INNER JOIN wpyz_woocommerce_order_itemmeta oim_shipping ON oi_shipping.order_item_id = oim_shipping.order_item_id
-                            WHERE oi_shipping.order_id = o.id
-                                AND oi_shipping.order_item_type = 'shipping'
-                                AND oim_shipping.meta_key = 'cost'
-                        ), 0)
-                    )) / NULLIF(SUM(o.total_amount), 0) * 100
-                , 2) as margen_promedio_porcentaje
-            FROM wpyz_wc_orders o
-            INNER JOIN wpyz_wc_orders_meta om_numero ON o.id = om_numero.order_id
-                AND om_numero.meta_key = '_order_number'
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND o.status != 'trash'
-                AND o.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
-            GROUP BY mes
-            ORDER BY mes
-        """)
+                f.product_name as producto,
+                COUNT(DISTINCT f.order_id) as total_pedidos,
+                SUM(f.qty) as cantidad_total,
+                COALESCE(SUM(f.line_total), 0) as ventas_totales_pen,
+                COALESCE(SUM(f.unit_cost_usd * f.qty * COALESCE(f.tipo_cambio, 3.75)), 0) as costos_totales_pen
+            FROM woo_order_profit_facts f
+            WHERE f.order_item_id > 0
+                AND f.fecha_lima BETWEEN :start_date AND :end_date
+                AND f.status IN ('wc-completed', 'wc-processing')
+                AND f.line_total IS NOT NULL
+            GROUP BY producto
+        ) AS productos_agregados
+        WHERE ventas_totales_pen > 0
+        ORDER BY margen_porcentaje ASC
+        LIMIT :limit
+    """), {
+        'start_date': start_date,
+        'end_date': end_date,
+        'limit': limit
+    }).fetchall()
+
+    products_data = []
+    for row in results:
+        margen_porcentaje = float(row[6] or 0)
+
+        # Solo incluir si el margen es menor al umbral
+        if margen_porcentaje < threshold:
+            products_data.append({
+                'producto': row[0],
+                'total_pedidos': int(row[1] or 0),
+                'cantidad_total': float(row[2] or 0),
+                'ventas_totales_pen': float(row[3] or 0),
+                'costos_totales_pen': float(row[4] or 0),
+                'ganancia_total_pen': float(row[5] or 0),
+                'margen_porcentaje': margen_porcentaje
+            })
+    return products_data
 
-        results = db.session.execute(monthly_query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall()
 
-        monthly_data = []
-        for row in results:
-            monthly_data.append({
-                'mes': row[0],
-                'total_pedidos': row[1] or 0,
-                'ventas_totales_pen': float(row[2] or 0),
-                'costos_totales_pen': float(row[3] or 0),
-                'costos_envio_totales_pen': float(row[4] or 0),
-                'ganancias_totales_pen': float(row[5] or 0),
-                'margen_promedio_porcentaje': float(row[6] or 0)
-            })
+def _chart_dates():
+    """start_date y end_date requeridos de los gráficos (None si falta alguno)."""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if not start_date or not end_date:
+        return None
+    return start_date, end_date
+
+
+def _chart_response(compute):
+    """Respuesta JSON de un gráfico: compute(start_date, end_date) -> data."""
+    try:
+        dates = _chart_dates()
+        if dates is None:
+            return jsonify({
+                'success': False,
+                'error': 'Se requieren start_date y end_date'
+            }), 400
 
         return jsonify({
             'success': True,
-            'data': monthly_data
+            'data': compute(*dates)
         })
 
     except Exception as e:
@@ -1894,125 +1699,59 @@ def api_profits_monthly():
         }), 500
 
 
-@bp.route('/api/profits/charts/top-products', methods=['GET'])
+@bp.route('/api/profits/charts/dashboard', methods=['GET'])
 @login_required
-def api_profits_top_products():
+@report_cache.cached
+def api_profits_dashboard():
     """
-    Obtener top productos más rentables
+    Datos de los cinco gráficos del dashboard en una sola respuesta
 
     Query params:
-    - start_date: fecha inicio (YYYY-MM-DD)
-    - end_date: fecha fin (YYYY-MM-DD)
-    - limit: cantidad de productos a retornar (default: 10)
+    - start_date, end_date: fechas (YYYY-MM-DD), requeridas
+    - limit: top productos (default: 10)
+    - threshold, low_margin_limit: productos con margen bajo (default: 15, 10)
 
-    Retorna productos ordenados por ganancia total
+    Sincroniza los hechos de ganancia una vez y ejecuta las cinco consultas
+    en paralelo, cada una en su propia conexión del pool.
     """
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        limit = int(request.args.get('limit', 10))
-
-        if not start_date or not end_date:
+        dates = _chart_dates()
+        if dates is None:
             return jsonify({
                 'success': False,
                 'error': 'Se requieren start_date y end_date'
             }), 400
+        start_date, end_date = dates
 
-        # Query para top productos
-        top_products_query = text("""
-            SELECT
-                oi.order_item_name as producto,
-                SUM(oim_qty.meta_value) as cantidad_vendida,
-                ROUND(SUM(oim_subtotal.meta_value), 2) as ventas_totales_pen,
-                ROUND(SUM(
-                    (
-                        SELECT SUM(fc.FCLastCost)
-                        FROM woo_products_fccost fc
-                        WHERE pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                            AND LENGTH(fc.sku) = 7
-                    ) * oim_qty.meta_value * (
-                        SELECT tasa_promedio
-                        FROM woo_tipo_cambio tc
-                        WHERE tc.fecha <= DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
-                            AND tc.activo = TRUE
-                        ORDER BY tc.fecha DESC
-                        LIMIT 1
-                    )
-                ), 2) as costos_totales_pen,
-                ROUND(SUM(oim_subtotal.meta_value) - SUM(
-                    (
-                        SELECT SUM(fc.FCLastCost)
-                        FROM woo_products_fccost fc
-                        WHERE pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                            AND LENGTH(fc.sku) = 7
-                    ) * oim_qty.meta_value * (
-                        SELECT tasa_promedio
-                        FROM woo_tipo_cambio tc
-                        WHERE tc.fecha <= DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
-                            AND tc.activo = TRUE
-                        ORDER BY tc.fecha DESC
-                        LIMIT 1
-                    )
-                ), 2) as ganancia_total_pen,
-                ROUND(
-                    (SUM(oim_subtotal.meta_value) - SUM(
-                        (
-                            SELECT SUM(fc.FCLastCost)
-                            FROM woo_products_fccost fc
-                            WHERE pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                                AND LENGTH(fc.sku) = 7
-                        ) * oim_qty.meta_value * (
-                            SELECT tasa_promedio
-                            FROM woo_tipo_cambio tc
-                            WHERE tc.fecha <= DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR))
-                                AND tc.activo = TRUE
-                            ORDER BY tc.fecha DESC
-                            LIMIT 1
-                        )
-                    )) / NULLIF(SUM(oim_subtotal.meta_value), 0) * 100
-                , 2) as margen_porcentaje
-            FROM wpyz_woocommerce_order_items oi
-            INNER JOIN wpyz_wc_orders o ON oi.order_id = o.id
-            INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id
-                AND oim_pid.meta_key = '_product_id'
-            INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id
-                AND oim_qty.meta_key = '_qty'
-            INNER JOIN wpyz_woocommerce_order_itemmeta oim_subtotal ON oi.order_item_id = oim_subtotal.order_item_id
-                AND oim_subtotal.meta_key = '_line_subtotal'
-            LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id
-                AND oim_vid.meta_key = '_variation_id'
-            LEFT JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id
-                AND pm_sku.meta_key = '_sku'
-            WHERE DATE(DATE_SUB(o.date_created_gmt, INTERVAL 5 HOUR)) BETWEEN :start_date AND :end_date
-                AND oi.order_item_type = 'line_item'
-                AND o.status != 'trash'
-                AND o.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
-            GROUP BY oi.order_item_name
-            HAVING ganancia_total_pen IS NOT NULL
-            ORDER BY ganancia_total_pen DESC
-            LIMIT :limit
-        """)
+        limit = int(request.args.get('limit', 10))
+        threshold = float(request.args.get('threshold', 15))
+        low_margin_limit = int(request.args.get('low_margin_limit', 10))
 
-        results = db.session.execute(top_products_query, {
-            'start_date': start_date,
-            'end_date': end_date,
-            'limit': limit
-        }).fetchall()
+        sync_profit_facts()
 
-        products_data = []
-        for row in results:
-            products_data.append({
-                'producto': row[0],
-                'cantidad_vendida': int(row[1] or 0),
-                'ventas_totales_pen': float(row[2] or 0),
-                'costos_totales_pen': float(row[3] or 0),
-                'ganancia_total_pen': float(row[4] or 0),
-                'margen_porcentaje': float(row[5] or 0)
-            })
+        charts = {
+            'monthly': (_chart_monthly, (start_date, end_date)),
+            'top_products': (_chart_top_products, (start_date, end_date, limit)),
+            'by_advisor': (_chart_by_advisor, (start_date, end_date)),
+            'by_status': (_chart_by_status, (start_date, end_date)),
+            'low_margin_products': (_chart_low_margin_products, (start_date, end_date, threshold, low_margin_limit))
+        }
+
+        # El engine se obtiene aquí: los hilos no tienen contexto de aplicación
+        engine = db.engine
+
+        def run(chart):
+            compute, args = chart
+            with engine.connect() as conn:
+                return compute(conn, *args)
+
+        with ThreadPoolExecutor(max_workers=DASHBOARD_QUERY_WORKERS, thread_name_prefix='profits-dashboard') as executor:
+            futures = {name: executor.submit(run, chart) for name, chart in charts.items()}
+            data = {name: future.result() for name, future in futures.items()}
 
         return jsonify({
             'success': True,
-            'data': products_data
+            'data': data
         })
 
     except Exception as e:
@@ -2023,270 +1762,113 @@ def api_profits_top_products():
             'traceback': traceback.format_exc()
         }), 500
 
-@bp.route('/api/profits/charts/by-advisor', methods=['GET'])
+
+@bp.route('/api/profits/charts/monthly', methods=['GET'])
 @login_required
-def api_profits_by_advisor():
+@report_cache.cached
+def api_profits_monthly():
     """
-    API para obtener ganancias por asesor
+    Obtener datos de ganancias agrupados por mes
+
+    Query params:
+    - start_date: fecha inicio (YYYY-MM-DD)
+    - end_date: fecha fin (YYYY-MM-DD)
+
+    Retorna datos mensuales de: ventas, costos, ganancias, margen
     """
-    try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+    def compute(start_date, end_date):
+        sync_profit_facts()
+        return _chart_monthly(db.session, start_date, end_date)
 
-        if not start_date or not end_date:
-            return jsonify({
-                'success': False,
-                'error': 'Se requieren start_date y end_date'
-            }), 400
+    return _chart_response(compute)
 
-        # Query para obtener datos por asesor (usuario que creó el pedido)
-        query = text("""
-            SELECT
-                COALESCE(pm_created.meta_value, 'WooCommerce') as asesor_nombre,
-                COUNT(DISTINCT o.id) as total_pedidos,
-                COALESCE(SUM(o.total_amount), 0) as ventas_totales_pen,
-                COALESCE(SUM(
-                    (SELECT SUM(fc.FCLastCost * CAST(oim_qty.meta_value AS DECIMAL(10,2)))
-                    FROM wpyz_woocommerce_order_items oi
-                    INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id
-                        AND oim_pid.meta_key = '_product_id'
-                    LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id
-                        AND oim_vid.meta_key = '_variation_id'
-                    INNER JOIN wpyz_postmeta pm_sku ON CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED) = pm_sku.post_id
-                        AND pm_sku.meta_key = '_sku'
-                    INNER JOIN woo_products_fccost fc ON pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                        AND LENGTH(fc.sku) = 7
-                    INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id
-                        AND oim_qty.meta_key = '_qty'
-                    WHERE oi.order_id = o.id
-                        AND oi.order_item_type = 'line_item')
-                ), 0) as costos_totales_usd,
-                COALESCE(tc.tasa_promedio, 3.75) as tipo_cambio_promedio,
-                COALESCE(SUM(
-                    (SELECT SUM(CAST(oim_shipping.meta_value AS DECIMAL(10,2)))
-                    FROM wpyz_woocommerce_order_items oi_shipping
-                    INNER JOIN wpyz_woocommerce_order_itemmeta oim_shipping ON oi_shipping.order_item_id = oim_shipping.order_item_id
-                    WHERE oi_shipping.order_id = o.id
-                        AND oi_shipping.order_item_type = 'shipping'
-                        AND oim_shipping.meta_key = 'cost')
-                ), 0) as costos_envio_totales_pen
-            FROM wpyz_wc_orders o
-            LEFT JOIN wpyz_wc_orders_meta pm_created ON o.id = pm_created.order_id
-                AND pm_created.meta_key = '_created_by'
-            LEFT JOIN woo_tipo_cambio tc ON DATE(o.date_created_gmt) = tc.fecha
-                AND tc.activo = 1
-            WHERE DATE(o.date_created_gmt) BETWEEN :start_date AND :end_date
-                AND o.status IN ('wc-completed', 'wc-processing')
-            GROUP BY asesor_nombre
-            HAVING ventas_totales_pen > 0
-            ORDER BY ventas_totales_pen DESC
-        """)
 
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall()
+@bp.route('/api/profits/charts/top-products', methods=['GET'])
+@login_required
+@report_cache.cached
+def api_profits_top_products():
+    """
+    Obtener top productos más rentables
 
-        advisors_data = []
-        for row in result:
-            costos_totales_pen = float(row[3] or 0) * float(row[4] or 3.75)
-            costos_envio_totales_pen = float(row[5] or 0)
-            ventas_totales_pen = float(row[2] or 0)
-            ganancia_total_pen = ventas_totales_pen - costos_totales_pen - costos_envio_totales_pen
-            margen_porcentaje = (ganancia_total_pen / ventas_totales_pen * 100) if ventas_totales_pen > 0 else 0
+    Query params:
+    - start_date: fecha inicio (YYYY-MM-DD)
+    - end_date: fecha fin (YYYY-MM-DD)
+    - limit: cantidad de productos a retornar (default: 10)
 
-            advisors_data.append({
-                'asesor_nombre': row[0],
-                'total_pedidos': int(row[1] or 0),
-                'ventas_totales_pen': ventas_totales_pen,
-                'costos_totales_pen': costos_totales_pen,
-                'costos_envio_totales_pen': costos_envio_totales_pen,
-                'ganancia_total_pen': ganancia_total_pen,
-                'margen_porcentaje': margen_porcentaje
-            })
+    Retorna productos ordenados por ganancia total
+    """
+    def compute(start_date, end_date):
+        limit = int(request.args.get('limit', 10))
+        sync_profit_facts()
+        return _chart_top_products(db.session, start_date, end_date, limit)
 
-        return jsonify({
-            'success': True,
-            'data': advisors_data
-        })
+    return _chart_response(compute)
 
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
+
+@bp.route('/api/profits/charts/by-advisor', methods=['GET'])
+@login_required
+@report_cache.cached
+def api_profits_by_advisor():
+    """
+    API para obtener ganancias por asesor
+    """
+    def compute(start_date, end_date):
+        sync_profit_facts()
+        return _chart_by_advisor(db.session, start_date, end_date)
+
+    return _chart_response(compute)
 
 
 @bp.route('/api/profits/charts/by-status', methods=['GET'])
 @login_required
+@report_cache.cached
 def api_profits_by_status():
     """
     API para obtener distribución de pedidos por estado
     """
-    try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-
-        if not start_date or not end_date:
-            return jsonify({
-                'success': False,
-                'error': 'Se requieren start_date y end_date'
-            }), 400
-
-        # Query para obtener datos por estado
-        query = text("""
-            SELECT
-                o.status,
-                COUNT(DISTINCT o.id) as total_pedidos,
-                COALESCE(SUM(o.total_amount), 0) as ventas_totales_pen
-            FROM wpyz_wc_orders o
-            WHERE DATE(o.date_created_gmt) BETWEEN :start_date AND :end_date
-            GROUP BY o.status
-            ORDER BY total_pedidos DESC
-        """)
-
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall()
-
-        status_data = []
-        for row in result:
-            status_data.append({
-                'status': row[0],
-                'total_pedidos': int(row[1] or 0),
-                'ventas_totales_pen': float(row[2] or 0)
-            })
-
-        return jsonify({
-            'success': True,
-            'data': status_data
-        })
-
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
+    return _chart_response(lambda start_date, end_date: _chart_by_status(db.session, start_date, end_date))
 
 
 @bp.route('/api/profits/charts/low-margin-products', methods=['GET'])
 @login_required
+@report_cache.cached
 def api_profits_low_margin_products():
     """
     API para obtener productos con márgenes bajos o pérdidas
     """
-    try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+    def compute(start_date, end_date):
         threshold = float(request.args.get('threshold', 15))  # Margen mínimo aceptable (%)
         limit = int(request.args.get('limit', 10))
+        sync_profit_facts()
+        return _chart_low_margin_products(db.session, start_date, end_date, threshold, limit)
 
-        if not start_date or not end_date:
-            return jsonify({
-                'success': False,
-                'error': 'Se requieren start_date y end_date'
-            }), 400
+    return _chart_response(compute)
 
-        # Query para productos con margen bajo (usando subconsulta para evitar error de MySQL)
-        query = text("""
-            SELECT
-                producto,
-                total_pedidos,
-                cantidad_total,
-                ventas_totales_pen,
-                costos_totales_usd,
-                tipo_cambio_promedio,
-                (ventas_totales_pen - (costos_totales_usd * tipo_cambio_promedio)) as ganancia_pen,
-                ((ventas_totales_pen - (costos_totales_usd * tipo_cambio_promedio)) / ventas_totales_pen * 100) as margen_porcentaje
-            FROM (
-                SELECT
-                    oi.order_item_name as producto,
-                    COUNT(DISTINCT o.id) as total_pedidos,
-                    SUM(CAST(oim_qty.meta_value AS DECIMAL(10,2))) as cantidad_total,
-                    COALESCE(SUM(CAST(oim_total.meta_value AS DECIMAL(10,2))), 0) as ventas_totales_pen,
-                    COALESCE(SUM(
-                        (SELECT SUM(fc.FCLastCost * CAST(oim_qty.meta_value AS DECIMAL(10,2)))
-                        FROM woo_products_fccost fc
-                        INNER JOIN wpyz_postmeta pm_sku ON pm_sku.meta_value COLLATE utf8mb4_unicode_520_ci LIKE CONCAT('%', fc.sku COLLATE utf8mb4_unicode_520_ci, '%')
-                            AND LENGTH(fc.sku) = 7
-                        WHERE pm_sku.post_id = CAST(COALESCE(NULLIF(oim_vid.meta_value, '0'), oim_pid.meta_value) AS UNSIGNED)
-                            AND pm_sku.meta_key = '_sku')
-                    ), 0) as costos_totales_usd,
-                    AVG(COALESCE(tc.tasa_promedio, 3.75)) as tipo_cambio_promedio
-                FROM wpyz_wc_orders o
-                INNER JOIN wpyz_woocommerce_order_items oi ON o.id = oi.order_id
-                    AND oi.order_item_type = 'line_item'
-                INNER JOIN wpyz_woocommerce_order_itemmeta oim_pid ON oi.order_item_id = oim_pid.order_item_id
-                    AND oim_pid.meta_key = '_product_id'
-                LEFT JOIN wpyz_woocommerce_order_itemmeta oim_vid ON oi.order_item_id = oim_vid.order_item_id
-                    AND oim_vid.meta_key = '_variation_id'
-                INNER JOIN wpyz_woocommerce_order_itemmeta oim_qty ON oi.order_item_id = oim_qty.order_item_id
-                    AND oim_qty.meta_key = '_qty'
-                INNER JOIN wpyz_woocommerce_order_itemmeta oim_total ON oi.order_item_id = oim_total.order_item_id
-                    AND oim_total.meta_key = '_line_total'
-                LEFT JOIN woo_tipo_cambio tc ON DATE(o.date_created_gmt) = tc.fecha
-                    AND tc.activo = 1
-                WHERE DATE(o.date_created_gmt) BETWEEN :start_date AND :end_date
-                    AND o.status IN ('wc-completed', 'wc-processing')
-                GROUP BY producto
-            ) AS productos_agregados
-            WHERE ventas_totales_pen > 0
-            ORDER BY margen_porcentaje ASC
-            LIMIT :limit
-        """)
 
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date,
-            'limit': limit
-        }).fetchall()
+# ========== CAMPAÑAS IZISTORE ==========
 
-        products_data = []
-        for row in result:
-            # La subconsulta ya calcula ganancia_pen y margen_porcentaje
-            costos_totales_pen = float(row[4] or 0) * float(row[5] or 3.75)
-            ventas_totales_pen = float(row[3] or 0)
-            ganancia_total_pen = float(row[6] or 0)  # Ya calculado en la query
-            margen_porcentaje = float(row[7] or 0)   # Ya calculado en la query
-
-            # Solo incluir si el margen es menor al umbral
-            if margen_porcentaje < threshold:
-                products_data.append({
-                    'producto': row[0],
-                    'total_pedidos': int(row[1] or 0),
-                    'cantidad_total': float(row[2] or 0),
-                    'ventas_totales_pen': ventas_totales_pen,
-                    'costos_totales_pen': costos_totales_pen,
-                    'ganancia_total_pen': ganancia_total_pen,
-                    'margen_porcentaje': margen_porcentaje
-                })
+# Claves de meta de los items que alimentan color y talla (MySQL compara
+# meta_key sin distinguir mayúsculas; en Python se normaliza con lower())
+CAMPAIGN_COLOR_KEYS = ('color', 'colores')
+CAMPAIGN_TALLA_KEYS = ('talla', 'medida', 'medidas')
+CAMPAIGN_TALLA_TERM_KEYS = ('pa_talla', 'pa_medida')
+CAMPAIGN_ITEM_META_KEYS = (
+    CAMPAIGN_COLOR_KEYS + ('pa_color', '_variation_id', '_product_id')
+    + CAMPAIGN_TALLA_KEYS + CAMPAIGN_TALLA_TERM_KEYS
+)
 
-        return jsonify({
-            'success': True,
-            'data': products_data
-        })
+# Ids por consulta IN al leer meta de items y variaciones
+CAMPAIGN_META_CHUNK = 1000
 
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
-
-
-# ========== CAMPAÑAS IZISTORE ==========
 
 def _campaigns_sql(source_filter='', status_filter='', for_export=False):
-    """Genera el SQL base para el reporte de campañas.
+    """Genera el SQL base (pedidos y líneas del rango) del reporte de campañas.
+
+    Color y talla no se resuelven aquí sino en _campaigns_rows, solo para
+    las líneas devueltas.
     Columnas: 0=numero_pedido, 1=fecha, 2=nombres, 3=apellidos, 4=telefono,
               5=correo, 6=ciudad, 7=sexo, 8=precio_venta, 9=fuente,
-              10=producto, 11=color, 12=talla
+              10=producto, 11=order_item_id
     """
     limit_clause = '' if for_export else 'LIMIT 5000'
     return f"""
@@ -2305,8 +1887,7 @@ def _campaigns_sql(source_filter='', status_filter='', for_export=False):
                 ELSE 'WooCommerce'
             END as fuente,
             oi.order_item_name as producto,
-            COALESCE(pm_color.color_val, item_m.item_color, '') as color,
-            COALESCE(talla_m.val, '') as talla
+            oi.order_item_id
         FROM wpyz_wc_orders o
         LEFT JOIN wpyz_wc_orders_meta om_numero ON o.id = om_numero.order_id AND om_numero.meta_key = '_order_number'
         LEFT JOIN wpyz_wc_order_addresses ba ON o.id = ba.order_id AND ba.address_type = 'billing'
@@ -2314,51 +1895,152 @@ def _campaigns_sql(source_filter='', status_filter='', for_export=False):
         LEFT JOIN (SELECT DISTINCT order_number FROM woo_orders_ext) oext
             ON om_numero.meta_value COLLATE utf8mb4_unicode_ci = oext.order_number
         INNER JOIN wpyz_woocommerce_order_items oi ON o.id = oi.order_id AND oi.order_item_type = 'line_item'
-        LEFT JOIN (
-            SELECT oim.order_item_id,
-                COALESCE(
-                    MAX(CASE WHEN oim.meta_key IN ('color', 'colores', 'Color', 'Colores') THEN oim.meta_value END),
-                    MAX(CASE WHEN oim.meta_key = 'pa_color' THEN oim.meta_value END)
-                ) as item_color,
-                MAX(CASE WHEN oim.meta_key = '_variation_id' THEN NULLIF(oim.meta_value, '0') END) as variation_id,
-                MAX(CASE WHEN oim.meta_key = '_product_id' THEN oim.meta_value END) as product_id
-            FROM wpyz_woocommerce_order_itemmeta oim
-            GROUP BY oim.order_item_id
-        ) item_m ON oi.order_item_id = item_m.order_item_id
-        LEFT JOIN (
-            SELECT post_id,
-                COALESCE(
-                    MAX(CASE WHEN meta_key = 'attribute_pa_color' THEN meta_value END),
-                    MAX(CASE WHEN meta_key = 'attribute_color' THEN meta_value END)
-                ) as color_val
-            FROM wpyz_postmeta
-            WHERE meta_key IN ('attribute_pa_color', 'attribute_color')
-            GROUP BY post_id
-        ) pm_color ON pm_color.post_id = CAST(COALESCE(item_m.variation_id, item_m.product_id) AS UNSIGNED)
-        LEFT JOIN (
-            SELECT oim.order_item_id,
-                COALESCE(
-                    MAX(CASE WHEN oim.meta_key IN ('talla', 'Talla', 'medida', 'medidas') THEN oim.meta_value END),
-                    MAX(CASE WHEN oim.meta_key IN ('pa_talla', 'pa_medida') THEN COALESCE(t_talla.name, oim.meta_value) END)
-                ) as val
-            FROM wpyz_woocommerce_order_itemmeta oim
-            LEFT JOIN wpyz_terms t_talla ON (
-                oim.meta_key IN ('pa_talla', 'pa_medida') AND t_talla.slug = oim.meta_value
-                AND t_talla.term_id IN (SELECT term_id FROM wpyz_term_taxonomy WHERE taxonomy IN ('pa_talla', 'pa_medida'))
-            )
-            WHERE oim.meta_key IN ('pa_talla', 'Talla', 'talla', 'pa_medida', 'medida', 'medidas')
-            GROUP BY oim.order_item_id
-        ) talla_m ON oi.order_item_id = talla_m.order_item_id
-        WHERE o.date_created_gmt >= DATE_ADD(:start_date, INTERVAL 5 HOUR)
-            AND o.date_created_gmt < DATE_ADD(DATE_ADD(:end_date, INTERVAL 1 DAY), INTERVAL 5 HOUR)
+        WHERE {lima_range_filter('o.date_created_gmt')}
             AND o.status NOT IN ('trash', 'wc-cancelled', 'wc-refunded', 'wc-failed')
             {status_filter}
             {source_filter}
-        ORDER BY fecha DESC, o.id DESC
+        ORDER BY fecha DESC, o.id DESC, oi.order_item_id
         {limit_clause}
     """
 
 
+def _chunks(values, size=CAMPAIGN_META_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield tuple(values[i:i + size])
+
+
+def _max_value(values):
+    """MAX() de SQL: ignora NULL y devuelve None si no queda nada."""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def _talla_term_names(conn):
+    """
+    Slug -> nombre de los términos de pa_talla / pa_medida.
+
+    Es un catálogo chico y casi estático: se cachea 10 minutos en vez de
+    unir wpyz_terms por cada línea del reporte.
+    """
+    names = cache.get('reports:campaigns:talla_terms')
+    if names is None:
+        rows = conn.execute(text("""
+            SELECT t.slug, t.name
+            FROM wpyz_terms t
+            INNER JOIN wpyz_term_taxonomy tt ON t.term_id = tt.term_id
+            WHERE tt.taxonomy IN ('pa_talla', 'pa_medida')
+        """)).fetchall()
+        names = {}
+        for slug, name in rows:
+            key = (slug or '').lower()
+            if name is not None and (key not in names or name > names[key]):
+                names[key] = name
+        cache.set('reports:campaigns:talla_terms', names, timeout=600)
+    return names
+
+
+def _campaign_item_attributes(conn, item_ids):
+    """
+    Color y talla de las líneas indicadas: {order_item_id: (color, talla)}.
+
+    Lee solo la meta de esas líneas y los atributos de color de sus
+    productos/variaciones, con las mismas prioridades que tenía el SQL:
+        color = attribute_pa_color / attribute_color del producto,
+                si no color/colores del item, si no pa_color del item
+        talla = talla/medida/medidas del item, si no el nombre del término
+                de pa_talla/pa_medida (o el slug si no existe)
+    """
+    meta_by_item = {}
+    for chunk in _chunks(item_ids):
+        rows = conn.execute(text("""
+            SELECT order_item_id, meta_key, meta_value
+            FROM wpyz_woocommerce_order_itemmeta
+            WHERE order_item_id IN :item_ids
+                AND meta_key IN :meta_keys
+        """), {'item_ids': chunk, 'meta_keys': CAMPAIGN_ITEM_META_KEYS}).fetchall()
+        for item_id, meta_key, meta_value in rows:
+            meta_by_item.setdefault(item_id, {}).setdefault(meta_key.lower(), []).append(meta_value)
+
+    # Producto o variación de cada línea (CAST(... AS UNSIGNED) del SQL anterior)
+    post_by_item = {}
+    for item_id, meta in meta_by_item.items():
+        variation_id = _max_value(value for value in meta.get('_variation_id', []) if value != '0')
+        post_id = _coalesce(variation_id, _max_value(meta.get('_product_id', [])))
+        try:
+            post_by_item[item_id] = int(post_id)
+        except (TypeError, ValueError):
+            continue
+
+    colors_by_post = {}
+    for chunk in _chunks(set(post_by_item.values())):
+        rows = conn.execute(text("""
+            SELECT post_id, meta_key, meta_value
+            FROM wpyz_postmeta
+            WHERE post_id IN :post_ids
+                AND meta_key IN ('attribute_pa_color', 'attribute_color')
+        """), {'post_ids': chunk}).fetchall()
+        for post_id, meta_key, meta_value in rows:
+            colors_by_post.setdefault(post_id, {}).setdefault(meta_key.lower(), []).append(meta_value)
+
+    term_names = _talla_term_names(conn) if meta_by_item else {}
+
+    attributes = {}
+    for item_id in item_ids:
+        meta = meta_by_item.get(item_id, {})
+        post_colors = colors_by_post.get(post_by_item.get(item_id), {})
+
+        color = _coalesce(
+            _max_value(post_colors.get('attribute_pa_color', [])),
+            _max_value(post_colors.get('attribute_color', [])),
+            _max_value(value for key in CAMPAIGN_COLOR_KEYS for value in meta.get(key, [])),
+            _max_value(meta.get('pa_color', [])),
+            ''
+        )
+        talla = _coalesce(
+            _max_value(value for key in CAMPAIGN_TALLA_KEYS for value in meta.get(key, [])),
+            _max_value(
+                term_names.get((value or '').lower(), value)
+                for key in CAMPAIGN_TALLA_TERM_KEYS for value in meta.get(key, [])
+            ),
+            ''
+        )
+        attributes[item_id] = (color, talla)
+
+    return attributes
+
+
+def _campaigns_rows(conn, sql, params):
+    """
+    Ejecuta _campaigns_sql y completa color y talla por lotes.
+
+    Returns:
+        list: tuplas de 13 columnas (ver _row_to_dict)
+    """
+    return _with_campaign_attributes(conn, conn.execute(sql, params).fetchall())
+
+
+def _with_campaign_attributes(conn, rows):
+    attributes = _campaign_item_attributes(conn, [row[11] for row in rows])
+    return [tuple(row[:11]) + attributes.get(row[11], ('', '')) for row in rows]
+
+
+def _campaigns_stream(source, params, source_filter='', status_filter='', ext_status_filter=''):
+    """
+    Filas del reporte de campañas leídas con cursor del servidor (exportación).
+
+    Color y talla se completan por lote con la sesión (otra conexión).
+    """
+    if source == 'externos':
+        for batch in stream_batches(text(_campaigns_ext_sql(ext_status_filter=ext_status_filter, for_export=True)), params):
+            yield from batch
+        return
+
+    sql = text(_campaigns_sql(source_filter=source_filter, status_filter=status_filter, for_export=True))
+    for batch in stream_batches(sql, params):
+        yield from _with_campaign_attributes(db.session, batch)
+
+
 def _campaigns_ext_sql(ext_status_filter='', for_export=False):
     """SQL para pedidos externos."""
     limit_clause = '' if for_export else 'LIMIT 5000'
@@ -2378,8 +2060,7 @@ def _campaigns_ext_sql(ext_status_filter='', for_export=False):
             '' as color, '' as talla
         FROM woo_orders_ext oext
         LEFT JOIN woo_orders_ext_items oext_item ON oext.id = oext_item.order_ext_id
-        WHERE oext.date_created_gmt >= DATE_ADD(:start_date, INTERVAL 5 HOUR)
-            AND oext.date_created_gmt < DATE_ADD(DATE_ADD(:end_date, INTERVAL 1 DAY), INTERVAL 5 HOUR)
+        WHERE {lima_range_filter('oext.date_created_gmt')}
             AND oext.status NOT IN ('wc-cancelled', 'wc-refunded', 'wc-failed')
             {ext_status_filter}
         ORDER BY fecha DESC, oext.id DESC
@@ -2428,9 +2109,10 @@ def api_campaigns():
         with db.engine.connect() as conn:
             if source == 'externos':
                 sql = text(_campaigns_ext_sql())
+                rows = conn.execute(sql, lima_range_params(start_date, end_date)).fetchall()
             else:
                 sql = text(_campaigns_sql(source_filter=source_filter))
-            rows = conn.execute(sql, {'start_date': start_date, 'end_date': end_date}).fetchall()
+                rows = _campaigns_rows(conn, sql, lima_range_params(start_date, end_date))
 
         data = [_row_to_dict(r) for r in rows]
 
@@ -2473,125 +2155,65 @@ def export_campaigns_excel():
         elif source == 'woocommerce':
             source_filter_sql = "AND om_numero.meta_value IS NULL AND oext.order_number IS NULL"
 
-        with db.engine.connect() as conn:
-            if source == 'externos':
-                sql = text(_campaigns_ext_sql(ext_status_filter=ext_status_filter, for_export=True))
-            else:
-                sql = text(_campaigns_sql(source_filter=source_filter_sql, status_filter=status_filter, for_export=True))
-            rows = conn.execute(sql, {'start_date': start_date, 'end_date': end_date}).fetchall()
-
-        # Estilos compartidos
-        header_fill = PatternFill(start_color="0066CC", end_color="0066CC", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=11)
-        header_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        center_align = Alignment(horizontal="center", vertical="center")
-        left_align = Alignment(horizontal="left", vertical="center")
-
-        def write_title(ws, ncols, title, period):
-            col_letter = get_column_letter(ncols)
-            ws.merge_cells(f'A1:{col_letter}1')
-            ws['A1'] = title
-            ws['A1'].font = Font(bold=True, size=14)
-            ws['A1'].alignment = Alignment(horizontal="center")
-            ws.row_dimensions[1].height = 22
-            ws.merge_cells(f'A2:{col_letter}2')
-            ws['A2'] = f'Período: {period[0]} al {period[1]}'
-            ws['A2'].alignment = Alignment(horizontal="center")
-            ws.row_dimensions[2].height = 18
-
-        def write_headers(ws, headers, row_num=4):
-            for col_idx, header in enumerate(headers, 1):
-                cell = ws.cell(row=row_num, column=col_idx, value=header)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_align
-                cell.border = thin_border
-            ws.row_dimensions[row_num].height = 30
-
-        def write_row(ws, row_idx, values, center_cols, price_col=None):
-            for col_idx, value in enumerate(values, 1):
-                cell = ws.cell(row=row_idx, column=col_idx, value=value)
-                cell.border = thin_border
-                if price_col and col_idx == price_col:
-                    cell.alignment = center_align
-                    cell.number_format = '#,##0.00'
-                elif col_idx in center_cols:
-                    cell.alignment = center_align
-                else:
-                    cell.alignment = left_align
-
-        def set_col_widths(ws, widths):
-            for col_idx, width in enumerate(widths, 1):
-                ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-        wb = Workbook()
-
-        # ── Hoja 1: Consolidado (un pedido por fila) ──────────────────────────
-        ws_cons = wb.active
-        ws_cons.title = "Consolidado"
+        params = lima_range_params(start_date, end_date)
 
-        cons_headers = ['Pedido', 'Fecha', 'Nombres', 'Apellidos', 'Teléfono', 'Correo',
-                        'Ciudad', 'Sexo', 'Precio Venta (PEN)', 'Fuente', 'Items']
-        write_title(ws_cons, len(cons_headers), f'Campañas IziStore - {source_name} (Consolidado)', (start_date, end_date))
-        write_headers(ws_cons, cons_headers)
-
-        seen_orders = {}  # numero_pedido -> row index (first occurrence)
-        order_items_count = {}
-
-        # Primera pasada: recopilar datos únicos por pedido
-        for row in rows:
-            key = str(row[0] or '')
-            if key not in seen_orders:
-                seen_orders[key] = row
-                order_items_count[key] = 1
-            else:
-                order_items_count[key] += 1
+        def campaign_rows():
+            return _campaigns_stream(
+                source, params, source_filter=source_filter_sql,
+                status_filter=status_filter, ext_status_filter=ext_status_filter
+            )
 
-        for row_idx, (key, row) in enumerate(seen_orders.items(), 5):
-            values = [
+        def base_values(row):
+            return [
                 str(row[0] or ''), str(row[1]) if row[1] else '',
                 str(row[2] or ''), str(row[3] or ''),
                 str(row[4] or ''), str(row[5] or ''),
                 str(row[6] or ''), str(row[7] or ''),
                 float(row[8] or 0), str(row[9] or ''),
-                order_items_count[key],
             ]
-            write_row(ws_cons, row_idx, values, center_cols={1, 2, 8, 10, 11}, price_col=9)
 
-        set_col_widths(ws_cons, [12, 12, 22, 22, 15, 32, 20, 8, 18, 14, 8])
+        def consolidated_rows():
+            # Las filas vienen ordenadas por pedido: cada grupo consecutivo es un pedido
+            first_row, items_count = None, 0
+            for row in campaign_rows():
+                if first_row is not None and str(row[0] or '') == str(first_row[0] or ''):
+                    items_count += 1
+                    continue
+                if first_row is not None:
+                    yield base_values(first_row) + [items_count]
+                first_row, items_count = row, 1
+            if first_row is not None:
+                yield base_values(first_row) + [items_count]
+
+        def detailed_rows():
+            for row in campaign_rows():
+                yield base_values(row) + [str(row[10] or ''), str(row[11] or ''), str(row[12] or '')]
 
-        # ── Hoja 2: Detallado (un item por fila) ─────────────────────────────
-        ws_det = wb.create_sheet(title="Detallado")
+        # ── Hoja 1: Consolidado (un pedido por fila) ──────────────────────────
+        cons_headers = ['Pedido', 'Fecha', 'Nombres', 'Apellidos', 'Teléfono', 'Correo',
+                        'Ciudad', 'Sexo', 'Precio Venta (PEN)', 'Fuente', 'Items']
+        ws_cons = ExportSheet(
+            "Consolidado", cons_headers, consolidated_rows(),
+            widths=[12, 12, 22, 22, 15, 32, 20, 8, 18, 14, 8],
+            heading=[f'Campañas IziStore - {source_name} (Consolidado)', f'Período: {start_date} al {end_date}'],
+            center_cols={1, 2, 8, 9, 10, 11}, number_formats={9: '#,##0.00'}
+        )
 
+        # ── Hoja 2: Detallado (un item por fila) ─────────────────────────────
         det_headers = ['Pedido', 'Fecha', 'Nombres', 'Apellidos', 'Teléfono', 'Correo',
                        'Ciudad', 'Sexo', 'Precio Venta (PEN)', 'Fuente', 'Producto', 'Color', 'Talla']
-        write_title(ws_det, len(det_headers), f'Campañas IziStore - {source_name} (Detallado)', (start_date, end_date))
-        write_headers(ws_det, det_headers)
-
-        for row_idx, row in enumerate(rows, 5):
-            values = [
-                str(row[0] or ''), str(row[1]) if row[1] else '',
-                str(row[2] or ''), str(row[3] or ''),
-                str(row[4] or ''), str(row[5] or ''),
-                str(row[6] or ''), str(row[7] or ''),
-                float(row[8] or 0), str(row[9] or ''),
-                str(row[10] or ''), str(row[11] or ''), str(row[12] or ''),
-            ]
-            write_row(ws_det, row_idx, values, center_cols={1, 2, 8, 10, 12, 13}, price_col=9)
-
-        set_col_widths(ws_det, [12, 12, 22, 22, 15, 32, 20, 8, 18, 14, 38, 15, 10])
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        ws_det = ExportSheet(
+            "Detallado", det_headers, detailed_rows(),
+            widths=[12, 12, 22, 22, 15, 32, 20, 8, 18, 14, 38, 15, 10],
+            heading=[f'Campañas IziStore - {source_name} (Detallado)', f'Período: {start_date} al {end_date}'],
+            center_cols={1, 2, 8, 9, 10, 12, 13}, number_formats={9: '#,##0.00'}
+        )
 
-        filename = f"campanas_izistore_{source}_{start_date}_{end_date}.xlsx"
-        return send_file(output, as_attachment=True, download_name=filename,
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        # En CSV solo va el detallado (contiene todas las columnas)
+        return export_response(
+            f"campanas_izistore_{source}_{start_date}_{end_date}",
+            [ws_cons, ws_det], export_format(), csv_sheet=1
+        )
 
     except Exception as e:
         import traceback
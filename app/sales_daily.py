@@ -0,0 +1,143 @@
+# app/sales_daily.py
+"""
+Resumen diario de ventas (woo_sales_daily)
+
+Los reportes de series de tiempo (resumen, ventas por día, ventas por
+usuario, distribución por estado, ganancias mensuales) agrupaban los
+pedidos por DATE(DATE_SUB(date_created_gmt, INTERVAL 5 HOUR)), expresión
+que no puede usar índices: cada consulta de meses o años recorría todos
+los pedidos. Aquí se guarda una fila por:
+
+    día (Lima) x canal x estado x método de pago x asesor
+
+con la cantidad de pedidos y los montos sumados. Un reporte de un año es
+un GROUP BY sobre unos cientos de filas.
+
+Canales:
+    - 'woocommerce': pedidos web (sin _order_number)
+    - 'whatsapp': pedidos creados en el sistema (con _order_number)
+    - 'external': woo_orders_ext (sin costo FC: cost_pen NULL)
+
+Los dos primeros salen de las cabeceras de woo_order_profit_facts, de modo
+que el costo y el tipo de cambio son los mismos de los reportes de
+ganancias.
+
+Mantenimiento (los días ya cerrados no se recalculan):
+    - refresh_sales_daily(days): recalcula los días indicados. La llama
+      app/profit_facts.py con los días de los pedidos que sincroniza (el
+      día de hoy se actualiza así con cada reporte), el alta de tipos de
+      cambio y los cambios de pedidos externos
+    - rebuild_sales_daily(): recalcula todo (migración y reconstrucción
+      total de los hechos de ganancia)
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app.utils.dates import lima_range_filter, lima_range_params
+
+CHANNEL_WOOCOMMERCE = 'woocommerce'
+CHANNEL_WHATSAPP = 'whatsapp'
+CHANNEL_EXTERNAL = 'external'
+
+SALES_DAILY_COLUMNS = (
+    'fecha_lima', 'channel', 'status', 'payment_method', 'advisor', 'orders_count',
+    'total_amount', 'discount_amount', 'shipping_cost', 'cost_pen', 'refreshed_at'
+)
+
+# Pedidos WooCommerce y WhatsApp (cabeceras de los hechos de ganancia)
+_FACTS_SELECT = f"""
+    SELECT
+        f.fecha_lima,
+        CASE WHEN f.order_number IS NULL THEN '{CHANNEL_WOOCOMMERCE}' ELSE '{CHANNEL_WHATSAPP}' END,
+        f.status,
+        COALESCE(f.payment_method_label, 'N/A'),
+        COALESCE(f.created_by, ''),
+        COUNT(*),
+        SUM(f.total_amount),
+        SUM(f.discount_amount),
+        SUM(f.shipping_cost),
+        SUM(f.cost_usd * f.tipo_cambio),
+        NOW()
+    FROM woo_order_profit_facts f
+    WHERE f.order_item_id = 0
+        AND f.fecha_lima IS NOT NULL
+        {{range_filter}}
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+# Pedidos externos (rango por date_created_gmt para usar su índice)
+_EXTERNAL_SELECT = f"""
+    SELECT
+        DATE(DATE_SUB(e.date_created_gmt, INTERVAL 5 HOUR)),
+        '{CHANNEL_EXTERNAL}',
+        e.status,
+        COALESCE(e.payment_method_title, e.payment_method, 'N/A'),
+        COALESCE(e.created_by, ''),
+        COUNT(*),
+        SUM(e.total_amount),
+        SUM(e.discount_amount),
+        SUM(e.shipping_cost),
+        NULL,
+        NOW()
+    FROM woo_orders_ext e
+    WHERE 1 = 1
+        {{range_filter}}
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+_INSERT = f"INSERT INTO woo_sales_daily ({', '.join(SALES_DAILY_COLUMNS)})"
+
+
+def _session(session):
+    if session is None:
+        from app import db
+        return db.session
+    return session
+
+
+def _day_runs(days):
+    """Agrupa días (date) en tramos consecutivos: [(inicio, fin), ...]."""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def _refresh_run(session, start, end):
+    """Reemplaza las filas de los días start..end (sin commit)."""
+    params = {'start': start, 'end': end, **lima_range_params(start, end)}
+
+    session.execute(text("DELETE FROM woo_sales_daily WHERE fecha_lima BETWEEN :start AND :end"), params)
+    session.execute(text(_INSERT + _FACTS_SELECT.format(
+        range_filter='AND f.fecha_lima BETWEEN :start AND :end'
+    )), params)
+    session.execute(text(_INSERT + _EXTERNAL_SELECT.format(
+        range_filter='AND ' + lima_range_filter('e.date_created_gmt')
+    )), params)
+
+
+def refresh_sales_daily(days, session=None):
+    """
+    Recalcula los días (date, hora de Lima) indicados. No hace commit.
+
+    Returns:
+        int: Días recalculados
+    """
+    session = _session(session)
+    days = [day for day in days if day is not None]
+    for start, end in _day_runs(days):
+        _refresh_run(session, start, end)
+    return len(set(days))
+
+
+def rebuild_sales_daily(session=None):
+    """Recalcula woo_sales_daily completa (sin commit)."""
+    session = _session(session)
+    session.execute(text("DELETE FROM woo_sales_daily"))
+    session.execute(text(_INSERT + _FACTS_SELECT.format(range_filter='')))
+    session.execute(text(_INSERT + _EXTERNAL_SELECT.format(range_filter='')))
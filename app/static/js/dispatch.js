@@ -9,6 +9,23 @@ let orderDetailModalInstance = null; // Instancia única del modal
 let pendingDeliveryOrderId = null; // ID del pedido a marcar como entregado
 let pendingDeliveryOrderNumber = null; // Número del pedido a marcar como entregado
 
+// Estado del tablero para actualizaciones incrementales (?since=cursor)
+let boardState = {};          // {orderId: {order, column}}
+let boardCursor = null;       // Cursor devuelto por /dispatch/api/orders
+let deltaPollCount = 0;       // Consultas incrementales desde la última carga completa
+const DELTA_POLL_INTERVAL = 20000;   // Consulta incremental cada 20 segundos
+const FULL_REFRESH_EVERY = 15;       // Recarga completa cada 15 consultas (~5 min) para refrescar horas sin mover
+const BOARD_COLUMNS = ['Por Asignar', 'Olva Courier', 'Recojo en Almacén', 'Motorizado (CHAMO)', 'SHALOM', 'DINSIDES'];
+const PRIORITY_LEVEL_RANK = { normal: 1, high: 2, urgent: 3 };
+
+// Eventos en tiempo real (SSE) de otros operadores
+let boardEventSource = null;
+let boardEventsConnected = false;  // Con SSE conectado no se consulta por polling
+let boardEventTimer = null;
+let pendingBoardEvents = false;    // Eventos recibidos mientras había un modal abierto
+const BOARD_EVENT_TYPES = ['move', 'priority', 'atendido', 'note', 'tracking'];
+const BOARD_EVENT_DEBOUNCE = 300;  // Agrupar ráfagas de eventos (ej. tracking masivo)
+
 // ============================================
 // SELECCIÓN MASIVA CHAMO/DINSIDES
 // ============================================
@@ -123,8 +140,11 @@ document.addEventListener('DOMContentLoaded', function () {
     // Cargar pedidos con filtro de fechas del mes actual
     loadOrders();
 
-    // Auto-refresh cada 2 minutos (solo si no hay modal abierto)
-    setInterval(autoRefreshOrders, 120000);
+    // Actualizaciones en tiempo real por SSE
+    connectBoardEvents();
+
+    // Auto-refresh incremental (solo si no hay modal abierto)
+    setInterval(autoRefreshOrders, DELTA_POLL_INTERVAL);
 
     // Limpiar instancia del modal cuando se cierra
     const modalElement = document.getElementById('orderDetailModal');
@@ -143,11 +163,10 @@ document.addEventListener('DOMContentLoaded', function () {
 });
 
 /**
- * Auto-refresh de pedidos solo si no hay modales de tracking abiertos
- * Evita perder selecciones de checkboxes mientras el usuario trabaja
+ * Indica si el auto-refresh debe omitirse (modales de tracking abiertos o
+ * pedidos seleccionados) para no perder selecciones mientras el usuario trabaja
  */
-function autoRefreshOrders() {
-    // Verificar si hay modales de tracking abiertos
+function isAutoRefreshBlocked() {
     const bulkTrackingModal = document.getElementById('bulkTrackingConfirmModal');
     const trackingModal = document.getElementById('trackingModal');
 
@@ -157,13 +176,75 @@ function autoRefreshOrders() {
     // También verificar si hay pedidos seleccionados para tracking masivo
     const hasSelectedOrders = bulkSelectedOrders.length > 0;
 
-    if (isBulkModalOpen || isTrackingModalOpen || hasSelectedOrders) {
+    return isBulkModalOpen || isTrackingModalOpen || hasSelectedOrders;
+}
+
+/**
+ * Auto-refresh de pedidos solo si no hay modales de tracking abiertos
+ * Evita perder selecciones de checkboxes mientras el usuario trabaja
+ */
+function autoRefreshOrders() {
+    if (isAutoRefreshBlocked()) {
         console.log('[Auto-refresh] Omitido - Modal abierto o pedidos seleccionados');
         return;
     }
 
-    console.log('[Auto-refresh] Ejecutando recarga de pedidos...');
-    loadOrders();
+    // Consultar solo los cambios; recarga completa periódica
+    if (boardCursor && deltaPollCount < FULL_REFRESH_EVERY) {
+        deltaPollCount++;
+
+        // Con SSE conectado los cambios llegan por eventos
+        if (!boardEventsConnected || pendingBoardEvents) {
+            pendingBoardEvents = false;
+            loadOrdersDelta();
+        }
+    } else {
+        console.log('[Auto-refresh] Ejecutando recarga completa de pedidos...');
+        pendingBoardEvents = false;
+        loadOrders();
+    }
+}
+
+/**
+ * Conectar al stream SSE del tablero. El servidor cierra la conexión cada
+ * ~55s y EventSource reconecta solo (con Last-Event-ID)
+ */
+function connectBoardEvents() {
+    if (!window.EventSource) {
+        // Navegador sin SSE: se mantiene el polling incremental
+        return;
+    }
+
+    boardEventSource = new EventSource('/dispatch/api/events');
+
+    boardEventSource.onopen = function () {
+        boardEventsConnected = true;
+    };
+
+    boardEventSource.onerror = function () {
+        // Mientras reconecta, el polling cubre los cambios
+        boardEventsConnected = false;
+    };
+
+    BOARD_EVENT_TYPES.forEach(type => {
+        boardEventSource.addEventListener(type, onBoardEvent);
+    });
+}
+
+/**
+ * Aplicar un evento del tablero: pedir el parche incremental (agrupando
+ * ráfagas de eventos en una sola consulta)
+ */
+function onBoardEvent(event) {
+    clearTimeout(boardEventTimer);
+    boardEventTimer = setTimeout(() => {
+        if (!boardCursor || isAutoRefreshBlocked()) {
+            // Se aplicará en el siguiente ciclo de auto-refresh
+            pendingBoardEvents = true;
+            return;
+        }
+        loadOrdersDelta();
+    }, BOARD_EVENT_DEBOUNCE);
 }
 
 /**
@@ -209,34 +290,37 @@ function clearFilters() {
 }
 
 /**
- * Cargar pedidos desde el backend
+ * Construir parámetros de filtro actuales del tablero
+ */
+function buildOrderFilterParams() {
+    const params = new URLSearchParams();
+
+    const dateFrom = document.getElementById('filter-date-from').value;
+    const dateTo = document.getElementById('filter-date-to').value;
+    const priorityOnly = document.getElementById('filter-priority').checked;
+    const atendidoOnly = document.getElementById('filter-atendido').checked;
+    const noAtendidoOnly = document.getElementById('filter-no-atendido').checked;
+
+    // Solo aplicar filtro de fechas si AMBAS fechas están presentes
+    if (dateFrom && dateTo) {
+        params.append('date_from', dateFrom);
+        params.append('date_to', dateTo);
+    }
+
+    if (priorityOnly) params.append('priority_only', 'true');
+    if (atendidoOnly) params.append('atendido_only', 'true');
+    if (noAtendidoOnly) params.append('no_atendido_only', 'true');
+
+    return params;
+}
+
+/**
+ * Cargar pedidos desde el backend (carga completa)
  */
 async function loadOrders() {
     try {
-        // Construir parámetros de filtro
-        const params = new URLSearchParams();
-
-        const dateFrom = document.getElementById('filter-date-from').value;
-        const dateTo = document.getElementById('filter-date-to').value;
-        const priorityOnly = document.getElementById('filter-priority').checked;
-        const atendidoOnly = document.getElementById('filter-atendido').checked;
-        const noAtendidoOnly = document.getElementById('filter-no-atendido').checked;
-
-        // Debug: Log de filtros
-        console.log('Filtros aplicados:', { dateFrom, dateTo, priorityOnly, atendidoOnly, noAtendidoOnly });
-
-        // Solo aplicar filtro de fechas si AMBAS fechas están presentes
-        if (dateFrom && dateTo) {
-            params.append('date_from', dateFrom);
-            params.append('date_to', dateTo);
-            console.log('Filtro de fechas - Params:', params.toString());
-        } else {
-            console.log('Filtro de fechas NO aplicado - falta una o ambas fechas');
-        }
-
-        if (priorityOnly) params.append('priority_only', 'true');
-        if (atendidoOnly) params.append('atendido_only', 'true');
-        if (noAtendidoOnly) params.append('no_atendido_only', 'true');
+        const params = buildOrderFilterParams();
+        console.log('Filtros aplicados:', params.toString());
 
         // Fetch data
         const response = await fetch(`/dispatch/api/orders?${params.toString()}`);
@@ -251,6 +335,16 @@ async function loadOrders() {
             throw new Error(data.error || 'Error desconocido');
         }
 
+        // Reiniciar estado local del tablero
+        boardState = {};
+        for (const [method, orders] of Object.entries(data.orders)) {
+            orders.forEach(order => {
+                boardState[order.id] = { order: order, column: method };
+            });
+        }
+        boardCursor = data.cursor || null;
+        deltaPollCount = 0;
+
         // Renderizar pedidos en el tablero
         renderOrders(data.orders);
 
@@ -266,6 +360,97 @@ async function loadOrders() {
     }
 }
 
+/**
+ * Cargar solo los pedidos modificados desde el último cursor y
+ * aplicar el parche sobre el estado local del tablero
+ */
+async function loadOrdersDelta() {
+    try {
+        const params = buildOrderFilterParams();
+        params.append('since', boardCursor);
+
+        const response = await fetch(`/dispatch/api/orders?${params.toString()}`);
+
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+
+        const data = await response.json();
+
+        if (!data.success) {
+            throw new Error(data.error || 'Error desconocido');
+        }
+
+        boardCursor = data.cursor || boardCursor;
+
+        const removed = data.removed || [];
+        let changed = removed.length;
+
+        removed.forEach(orderId => {
+            delete boardState[orderId];
+        });
+
+        for (const [method, orders] of Object.entries(data.orders)) {
+            orders.forEach(order => {
+                boardState[order.id] = { order: order, column: method };
+                changed++;
+            });
+        }
+
+        // Sin cambios: no tocar el DOM
+        if (changed === 0) {
+            return;
+        }
+
+        console.log(`[Auto-refresh] ${changed} pedidos actualizados (${removed.length} retirados)`);
+
+        renderOrders(groupBoardState());
+        updateStats(computeBoardStats());
+        initializeDragDrop();
+
+    } catch (error) {
+        // Ante cualquier error, volver a una carga completa en el siguiente ciclo
+        console.error('Error en actualización incremental:', error);
+        boardCursor = null;
+    }
+}
+
+/**
+ * Agrupar el estado local por columna con el mismo orden que el backend
+ * (prioridad, nivel de prioridad y horas sin mover)
+ */
+function groupBoardState() {
+    const grouped = {};
+    BOARD_COLUMNS.forEach(column => { grouped[column] = []; });
+
+    Object.values(boardState).forEach(({ order, column }) => {
+        (grouped[column] || grouped['Por Asignar']).push(order);
+    });
+
+    Object.values(grouped).forEach(orders => {
+        orders.sort((a, b) =>
+            (b.is_priority - a.is_priority) ||
+            ((PRIORITY_LEVEL_RANK[b.priority_level] || 0) - (PRIORITY_LEVEL_RANK[a.priority_level] || 0)) ||
+            (b.hours_since_update - a.hours_since_update)
+        );
+    });
+
+    return grouped;
+}
+
+/**
+ * Calcular estadísticas desde el estado local del tablero
+ */
+function computeBoardStats() {
+    const orders = Object.values(boardState).map(entry => entry.order);
+    return {
+        total: orders.length,
+        priority: orders.filter(o => o.is_priority).length,
+        atendido: orders.filter(o => o.is_atendido).length,
+        stale: orders.filter(o => o.is_stale).length
+    };
+}
+
 /**
  * Renderizar pedidos en las columnas
  */
@@ -1876,13 +2061,23 @@ async function confirmBulkTracking() {
 
         const data = await response.json();
 
+        // El trabajo se procesa en segundo plano: mostrar progreso en el botón
+        let job = null;
+        if (data.success) {
+            job = await waitForJob(data.job_id, (progress) => {
+                btn.innerHTML = `<span class="spinner-border spinner-border-sm"></span> Procesando ${progress.processed}/${progress.total}...`;
+            });
+        }
+
         // Cerrar modal
         bootstrap.Modal.getInstance(document.getElementById('bulkTrackingConfirmModal')).hide();
 
-        if (data.success) {
-            let msg = `Tracking asignado a ${data.exitosos} pedido(s).`;
-            if (data.fallidos > 0) {
-                msg += ` ${data.fallidos} fallido(s).`;
+        if (data.success && job.status === 'failed') {
+            showError(job.error || 'Error al procesar tracking masivo');
+        } else if (data.success) {
+            let msg = `Tracking asignado a ${job.exitosos} pedido(s).`;
+            if (job.fallidos > 0) {
+                msg += ` ${job.fallidos} fallido(s).`;
             }
             showSuccess(msg);
             clearBulkSelection();
@@ -1900,6 +2095,30 @@ async function confirmBulkTracking() {
     }
 }
 
+/**
+ * Consultar el estado de un trabajo en segundo plano hasta que termine
+ * @param {number} jobId - ID devuelto al encolar el trabajo
+ * @param {function} onProgress - Recibe el estado del trabajo en cada consulta
+ */
+async function waitForJob(jobId, onProgress) {
+    while (true) {
+        const response = await fetch(`/dispatch/api/jobs/${jobId}`);
+        const data = await response.json();
+
+        if (!data.success) {
+            throw new Error(data.error || 'Error consultando el trabajo');
+        }
+
+        onProgress(data.job);
+
+        if (data.job.status === 'completed' || data.job.status === 'failed') {
+            return data.job;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, 1500));
+    }
+}
+
 /**
  * Copiar información del pedido para CHAMO al portapapeles
  */
@@ -0,0 +1,62 @@
+# app/utils/dates.py
+"""
+Rangos de días de Lima sobre columnas GMT
+
+Los filtros por fecha comparaban DATE(DATE_SUB(date_created_gmt, INTERVAL
+5 HOUR)) BETWEEN :start AND :end: al envolver la columna en funciones,
+MySQL no puede usar su índice y recorre la tabla completa. Aquí el rango
+de días (hora de Lima, UTC-5 sin horario de verano) se convierte una vez a
+límites GMT y se compara la columna tal cual:
+
+    date_created_gmt >= inicio 00:00 Lima (en GMT)
+    AND date_created_gmt < día siguiente al fin 00:00 Lima (en GMT)
+
+Uso:
+    where = lima_range_filter('o.date_created_gmt')
+    params.update(lima_range_params(start_date, end_date))
+"""
+
+from datetime import date, datetime, timedelta
+
+# Hora de Lima = UTC - 5 (las columnas *_gmt están en UTC)
+LIMA_UTC_OFFSET = timedelta(hours=5)
+
+
+def parse_day(value):
+    """date, datetime o 'YYYY-MM-DD' -> date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def lima_day(value_gmt):
+    """Día (Lima) de un datetime GMT (None si no hay)."""
+    return (value_gmt - LIMA_UTC_OFFSET).date() if value_gmt else None
+
+
+def lima_day_bounds(start, end):
+    """
+    Límites GMT [desde, hasta) de los días de Lima start..end (inclusive).
+
+    Args:
+        start, end: date o 'YYYY-MM-DD'
+
+    Returns:
+        tuple: (datetime desde, datetime hasta), naive en GMT
+    """
+    since = datetime.combine(parse_day(start), datetime.min.time()) + LIMA_UTC_OFFSET
+    until = datetime.combine(parse_day(end) + timedelta(days=1), datetime.min.time()) + LIMA_UTC_OFFSET
+    return since, until
+
+
+def lima_range_filter(column, prefix=''):
+    """Condición SQL sargable sobre una columna GMT (parámetros de lima_range_params)."""
+    return f"{column} >= :{prefix}since_gmt AND {column} < :{prefix}until_gmt"
+
+
+def lima_range_params(start, end, prefix=''):
+    """Parámetros :since_gmt / :until_gmt de lima_range_filter."""
+    since, until = lima_day_bounds(start, end)
+    return {f'{prefix}since_gmt': since, f'{prefix}until_gmt': until}
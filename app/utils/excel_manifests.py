@@ -0,0 +1,121 @@
+# app/utils/excel_manifests.py
+"""
+Lectura de manifiestos Excel de courier (tracking masivo)
+
+Los manifiestos de Shalom traen un envío cada 26 filas y solo usan la
+columna A. En vez de cargar el libro completo y leer celdas sueltas, aquí
+se recorre la columna A en modo streaming:
+
+    - .xlsx: openpyxl en modo read_only, pidiendo solo la columna a
+      iter_rows (memoria acotada, fila a fila)
+    - .xls:  xlrd (formato antiguo, máximo 65.536 filas)
+
+Sin dependencias de Flask para poder usarse desde scripts
+(ver benchmark_shalom_manifest.py).
+"""
+
+from openpyxl import load_workbook
+
+# Filas por envío en el manifiesto de Shalom
+SHALOM_BLOCK_ROWS = 26
+
+# Desplazamiento (desde la primera fila del bloque) de cada dato en la columna A
+SHALOM_BLOCK_FIELDS = {
+    'dni_destinatario': 13,   # A14
+    'tel_destinatario': 14,   # A15
+    'orden_shalom': 22,       # A23
+    'codigo_shalom': 23       # A24
+}
+
+
+def _cell_text(value):
+    """Texto de una celda ('' si está vacía; 12345678.0 -> '12345678')."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_column_values(file_obj, filename, column=1):
+    """
+    Recorre los valores de una columna de la hoja activa, fila por fila.
+
+    Args:
+        file_obj: Archivo (o BytesIO) del Excel
+        filename: Nombre original (decide .xls / .xlsx)
+        column: Columna a leer (1 = A)
+
+    Yields:
+        Valor de la celda (None si está vacía), en orden de fila desde la 1
+    """
+    if filename.lower().endswith('.xls'):
+        try:
+            import xlrd
+        except ImportError:
+            raise ValueError('Para leer archivos .xls se requiere xlrd (pip install xlrd)')
+
+        book = xlrd.open_workbook(file_contents=file_obj.read(), on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            if sheet.ncols >= column:
+                for value in sheet.col_values(column - 1):
+                    yield None if value == '' else value
+        finally:
+            book.release_resources()
+        return
+
+    # read_only: las filas se leen en streaming (las vacías llegan como None)
+    book = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        for (value,) in book.active.iter_rows(min_col=column, max_col=column, values_only=True):
+            yield value
+    finally:
+        book.close()
+
+
+def iter_shalom_blocks(file_obj, filename, max_envios=None):
+    """
+    Recorre un manifiesto de Shalom bloque por bloque (26 filas por envío).
+
+    La lectura termina en el primer bloque cuya celda inicial (columna A)
+    está vacía. Solo se mantiene en memoria el bloque actual.
+
+    Args:
+        file_obj: Archivo (o BytesIO) del Excel
+        filename: Nombre original (decide .xls / .xlsx)
+        max_envios: Límite de envíos a leer (None = sin límite)
+
+    Yields:
+        dict: {envio_num, fila_inicio, dni_destinatario, tel_destinatario,
+               orden_shalom, codigo_shalom}
+    """
+    def build(block, envio_num):
+        # Un bloque incompleto al final del archivo se completa con vacíos
+        block = block + [None] * (SHALOM_BLOCK_ROWS - len(block))
+        envio = {
+            'envio_num': envio_num,
+            'fila_inicio': (envio_num - 1) * SHALOM_BLOCK_ROWS + 1
+        }
+        for field, offset in SHALOM_BLOCK_FIELDS.items():
+            envio[field] = _cell_text(block[offset])
+        return envio
+
+    block = []
+    envio_num = 1
+
+    for value in iter_column_values(file_obj, filename):
+        if not block and not _cell_text(value):
+            return
+
+        block.append(value)
+        if len(block) == SHALOM_BLOCK_ROWS:
+            yield build(block, envio_num)
+            block = []
+            envio_num += 1
+
+            if max_envios is not None and envio_num > max_envios:
+                return
+
+    if block:
+        yield build(block, envio_num)
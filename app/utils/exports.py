@@ -0,0 +1,221 @@
+# app/utils/exports.py
+"""
+Exportaciones tabulares en streaming (XLSX / CSV)
+
+Las exportaciones armaban un Workbook completo en memoria a partir de un
+resultado traído entero con fetchall()/.all(). Aquí:
+
+    - Las filas se leen con cursor del servidor (stream_results) por lotes,
+      en una conexión propia, de modo que la sesión queda libre para las
+      consultas auxiliares de cada lote
+    - XLSX: Workbook en modo write_only (cada fila se escribe a disco al
+      agregarla) guardado en un archivo temporal que se envía por bloques
+    - CSV: las filas se envían al cliente a medida que se generan
+
+Cada hoja recibe sus filas como un iterable perezoso (normalmente un
+generador); el formato se elige con ?format=csv|xlsx (XLSX por defecto).
+El CSV solo lleva una hoja (csv_sheet) y omite los títulos.
+
+Uso:
+    sheet = ExportSheet('Envíos', headers, rows(), widths=[10, 20])
+    return export_response('envios_2025', [sheet], export_format())
+"""
+
+import csv
+import io
+import tempfile
+
+from flask import Response, request, send_file, stream_with_context
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+
+# Filas por lote leídas del cursor del servidor
+EXPORT_BATCH_SIZE = 1000
+
+# Filas de CSV acumuladas antes de enviar un bloque al cliente
+CSV_FLUSH_ROWS = 500
+
+THIN_BORDER = Border(
+    left=Side(style='thin'), right=Side(style='thin'),
+    top=Side(style='thin'), bottom=Side(style='thin')
+)
+
+
+def export_format(default='xlsx'):
+    """Formato pedido en ?format= ('xlsx' o 'csv')."""
+    fmt = (request.args.get('format') or default).lower()
+    return 'csv' if fmt == 'csv' else 'xlsx'
+
+
+def stream_batches(sql, params=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Lotes de filas de un SELECT leídos con cursor del servidor.
+
+    Usa una conexión propia (no la de db.session) que se cierra al agotar
+    o abandonar el generador.
+
+    Yields:
+        list: Hasta batch_size filas
+    """
+    from app import db
+
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(sql, params or {})
+        for partition in result.partitions(batch_size):
+            yield partition
+
+
+def stream_rows(sql, params=None, batch_size=EXPORT_BATCH_SIZE):
+    """Filas de un SELECT una a una (ver stream_batches)."""
+    for batch in stream_batches(sql, params, batch_size):
+        yield from batch
+
+
+class ExportSheet:
+    """
+    Hoja de una exportación.
+
+    Args:
+        title: Nombre de la hoja
+        headers: Encabezados de columna
+        rows: Iterable de filas (listas de valores); se consume una sola vez
+        widths: Anchos de columna (opcional)
+        heading: Líneas de título sobre los encabezados (solo XLSX; la
+                 primera en negrita). Con heading, los encabezados quedan
+                 tras una fila en blanco
+        header_color: Color de fondo de los encabezados
+        borders: Bordes finos en encabezados y datos
+        center_cols: Columnas (desde 1) centradas
+        number_formats: {columna (desde 1): formato numérico}
+    """
+
+    def __init__(self, title, headers, rows, widths=None, heading=(), header_color='0066CC',
+                 borders=True, center_cols=(), number_formats=None):
+        self.title = title
+        self.headers = list(headers)
+        self.rows = rows
+        self.widths = widths
+        self.heading = list(heading)
+        self.header_color = header_color
+        self.borders = borders
+        self.center_cols = set(center_cols)
+        self.number_formats = number_formats or {}
+
+    def _column_styles(self):
+        """Estilo de cada columna de datos (dict vacío si no lleva ninguno)."""
+        center = Alignment(horizontal='center', vertical='center')
+        styles = []
+        for col in range(1, len(self.headers) + 1):
+            style = {}
+            if self.borders:
+                style['border'] = THIN_BORDER
+            if col in self.center_cols:
+                style['alignment'] = center
+            if col in self.number_formats:
+                style['number_format'] = self.number_formats[col]
+            styles.append(style)
+        return styles
+
+    def write_xlsx(self, wb):
+        ws = wb.create_sheet(title=self.title[:31])
+        ncols = len(self.headers)
+
+        for col, width in enumerate(self.widths or [], 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+
+        if self.heading:
+            for row_num, line in enumerate(self.heading, 1):
+                cell = WriteOnlyCell(ws, value=line)
+                cell.alignment = Alignment(horizontal='center')
+                if row_num == 1:
+                    cell.font = Font(bold=True, size=14)
+                ws.append([cell])
+                if ncols > 1:
+                    ws.merged_cells.add(f'A{row_num}:{get_column_letter(ncols)}{row_num}')
+            ws.append([])
+
+        header_fill = PatternFill(start_color=self.header_color, end_color=self.header_color, fill_type='solid')
+        header_font = Font(color='FFFFFF', bold=True, size=11)
+        header_align = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        header_cells = []
+        for header in self.headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.fill, cell.font, cell.alignment = header_fill, header_font, header_align
+            if self.borders:
+                cell.border = THIN_BORDER
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        styles = self._column_styles()
+        if not any(styles):
+            for values in self.rows:
+                ws.append(list(values))
+            return
+
+        for values in self.rows:
+            cells = []
+            for value, style in zip(values, styles):
+                cell = WriteOnlyCell(ws, value=value)
+                for attr, style_value in style.items():
+                    setattr(cell, attr, style_value)
+                cells.append(cell)
+            ws.append(cells)
+
+    def iter_csv(self):
+        """Bloques de texto CSV (encabezados + filas)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.headers)
+
+        pending = 0
+        for values in self.rows:
+            writer.writerow(['' if value is None else value for value in values])
+            pending += 1
+            if pending >= CSV_FLUSH_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        yield buffer.getvalue()
+
+
+def export_response(filename, sheets, fmt='xlsx', csv_sheet=0):
+    """
+    Respuesta de descarga de una exportación.
+
+    Args:
+        filename: Nombre del archivo sin extensión
+        sheets: Lista de ExportSheet
+        fmt: 'xlsx' o 'csv'
+        csv_sheet: Índice de la hoja que se exporta en CSV
+    """
+    if fmt == 'csv':
+        sheet = sheets[csv_sheet]
+
+        def generate():
+            # BOM para que Excel abra el CSV como UTF-8
+            yield '\ufeff'.encode('utf-8')
+            for chunk in sheet.iter_csv():
+                yield chunk.encode('utf-8')
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype=CSV_MIMETYPE,
+            headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'}
+        )
+
+    wb = Workbook(write_only=True)
+    for sheet in sheets:
+        sheet.write_xlsx(wb)
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+
+    return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=f'{filename}.xlsx')
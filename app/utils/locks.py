@@ -0,0 +1,39 @@
+# app/utils/locks.py
+"""
+Locks con nombre de MySQL (GET_LOCK / RELEASE_LOCK)
+
+Las sincronizaciones que se disparan desde requests de lectura (tablero de
+despacho, hechos de ganancia) escriben las mismas filas; si varios workers
+las ejecutan a la vez, sus DELETE/INSERT se bloquean entre sí. Con un lock
+con nombre y espera 0, solo un request sincroniza y el resto sigue sin
+esperar.
+
+El lock pertenece a la conexión que lo toma: se usa una conexión propia,
+porque la sesión devuelve la suya al pool en cada commit.
+
+Uso:
+    with try_named_lock(db.session, 'dispatch_board_refresh') as acquired:
+        if acquired:
+            ...
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+
+@contextmanager
+def try_named_lock(session, name):
+    """
+    Intenta tomar el lock `name` sin esperar.
+
+    Yields:
+        bool: True si se tomó (se libera al salir del bloque)
+    """
+    with session.get_bind().connect() as lock_conn:
+        acquired = bool(lock_conn.execute(text("SELECT GET_LOCK(:name, 0)"), {'name': name}).scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': name})
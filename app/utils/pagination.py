@@ -0,0 +1,88 @@
+# app/utils/pagination.py
+"""
+Paginación por cursor (keyset) de los listados de pedidos
+
+Con LIMIT/OFFSET, la página N obliga a MySQL a generar y descartar las
+(N - 1) * per_page filas anteriores. Con un cursor se continúa desde la
+última fila vista, ordenando por (date_created_gmt, id):
+
+    WHERE o.date_created_gmt < :cursor_date
+       OR (o.date_created_gmt = :cursor_date AND o.id < :cursor_id)
+    ORDER BY o.date_created_gmt DESC, o.id DESC
+    LIMIT :limit
+
+El cursor viaja como texto opaco ('AAAAMMDDHHMMSS-id'). Cada respuesta
+devuelve next_cursor (inicio de la página siguiente); el frontend guarda el
+cursor de cada página visitada. Sin cursor (primera página o salto directo
+a un número de página) se usa OFFSET como antes.
+"""
+
+from datetime import datetime
+
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S'
+
+
+def encode_cursor(date_created, row_id):
+    """Cursor de una fila (None si no tiene fecha)."""
+    if date_created is None:
+        return None
+    return f'{date_created.strftime(CURSOR_DATE_FORMAT)}-{row_id}'
+
+
+def decode_cursor(value):
+    """
+    Cursor -> (datetime, id).
+
+    Returns:
+        tuple o None si el cursor falta o no es válido
+    """
+    if not value:
+        return None
+    try:
+        date_part, id_part = value.split('-', 1)
+        return datetime.strptime(date_part, CURSOR_DATE_FORMAT), int(id_part)
+    except ValueError:
+        return None
+
+
+def keyset_filter(date_column, id_column):
+    """Condición SQL 'después del cursor' en orden descendente (parámetros de keyset_params)."""
+    return (
+        f"AND ({date_column} < :cursor_date "
+        f"OR ({date_column} = :cursor_date AND {id_column} < :cursor_id))"
+    )
+
+
+def keyset_params(cursor):
+    """Parámetros :cursor_date / :cursor_id de keyset_filter."""
+    cursor_date, cursor_id = cursor
+    return {'cursor_date': cursor_date, 'cursor_id': cursor_id}
+
+
+def pagination_payload(page, per_page, total, has_next, next_cursor, estimated=False):
+    """
+    Bloque 'pagination' de las respuestas (mismas claves que antes, más
+    next_cursor y total_estimated).
+
+    has_next sale de la consulta (se pide una fila de más), no del total,
+    que puede ser una estimación.
+    """
+    # Con un total estimado, las páginas alcanzan al menos hasta la actual (+1 si hay más)
+    total_pages = (total + per_page - 1) // per_page
+    if has_next:
+        total_pages = max(total_pages, page + 1)
+    elif page > 1:
+        total_pages = max(total_pages, page)
+    has_prev = page > 1
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': total_pages,
+        'has_prev': has_prev,
+        'has_next': has_next,
+        'prev_num': page - 1 if has_prev else None,
+        'next_num': page + 1 if has_next else None,
+        'next_cursor': next_cursor if has_next else None,
+        'total_estimated': estimated
+    }
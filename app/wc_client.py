@@ -0,0 +1,225 @@
+# app/wc_client.py
+"""
+Cliente compartido de la API REST de WooCommerce para procesos masivos
+
+A diferencia de woocommerce.API (una conexión nueva por llamada y sin
+reintentos), este cliente:
+    - Reutiliza una sesión HTTP keep-alive entre llamadas
+    - Limita la tasa con un token bucket (WC_API_RATE_PER_SECOND / WC_API_BURST)
+    - Ejecuta hasta WC_API_CONCURRENCY llamadas en paralelo
+    - Reintenta con backoff exponencial ante 429/5xx y errores de red
+
+Las llamadas se ejecutan en hilos sin contexto de Flask: solo hacen HTTP.
+Las escrituras en BD deben hacerse en el hilo de la request con los
+resultados de map().
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+# Códigos HTTP que se reintentan
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class WooCommerceAPIError(Exception):
+    """Error definitivo de la API (tras agotar reintentos o error 4xx)."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Limitador de tasa thread-safe: `rate` tokens por segundo, hasta `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta obtener un token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class WooCommerceRestPool:
+    """
+    Pool de llamadas REST a WooCommerce con límite de tasa y concurrencia.
+
+    Uso:
+        wc_pool.put('orders/123', {...})                # síncrono
+        wc_pool.map([('PUT', 'orders/123', {...}), ...])  # concurrente
+    """
+
+    def __init__(self, app=None):
+        self.logger = None
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.url = app.config['WC_API_URL'].rstrip('/')
+        self.consumer_key = app.config['WC_CONSUMER_KEY']
+        self.consumer_secret = app.config['WC_CONSUMER_SECRET']
+        self.version = 'wc/v3'
+        self.timeout = app.config.get('WC_API_TIMEOUT', 30)
+        self.concurrency = app.config.get('WC_API_CONCURRENCY', 4)
+        self.max_retries = app.config.get('WC_API_MAX_RETRIES', 3)
+        self.backoff = app.config.get('WC_API_BACKOFF_SECONDS', 1.0)
+        self.bucket = TokenBucket(
+            app.config.get('WC_API_RATE_PER_SECOND', 4),
+            app.config.get('WC_API_BURST', 4)
+        )
+        self.logger = app.logger
+
+    @property
+    def session(self):
+        """Sesión HTTP keep-alive (creada al primer uso, compartida por los hilos)."""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({
+                        'user-agent': 'WooManager-REST-Pool',
+                        'accept': 'application/json'
+                    })
+                    if self.url.startswith('https'):
+                        session.auth = HTTPBasicAuth(self.consumer_key, self.consumer_secret)
+                    self._session = session
+        return self._session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency,
+                        thread_name_prefix='wc-rest'
+                    )
+        return self._executor
+
+    def _build_url(self, endpoint, method):
+        url = f"{self.url}/wp-json/{self.version}/{endpoint}"
+        if self.url.startswith('https'):
+            return url
+
+        # Sin SSL: firmar con OAuth 1.0a igual que woocommerce.API
+        from woocommerce.oauth import OAuth
+        return OAuth(
+            url=url,
+            consumer_key=self.consumer_key,
+            consumer_secret=self.consumer_secret,
+            version=self.version,
+            method=method,
+            oauth_timestamp=int(time.time())
+        ).get_oauth_url()
+
+    def _retry_delay(self, attempt, response=None):
+        """Backoff exponencial con jitter; respeta Retry-After si viene en la respuesta."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    def request(self, method, endpoint, data=None, params=None):
+        """
+        Ejecuta una llamada con límite de tasa y reintentos.
+
+        Returns:
+            dict/list: JSON de la respuesta
+
+        Raises:
+            WooCommerceAPIError: Si la llamada falla definitivamente
+        """
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = None
+
+            try:
+                response = self.session.request(
+                    method,
+                    self._build_url(endpoint, method),
+                    json=data,
+                    params=params,
+                    timeout=self.timeout
+                )
+
+                if response.status_code < 400:
+                    try:
+                        return response.json()
+                    except ValueError:
+                        return None
+
+                last_error = WooCommerceAPIError(
+                    f"HTTP {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise last_error
+
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = WooCommerceAPIError(f"Error de red: {str(e)}")
+
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                self.logger.warning(
+                    f"[WC-POOL] {method} {endpoint}: {last_error} - reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+        raise last_error
+
+    def put(self, endpoint, data):
+        return self.request('PUT', endpoint, data)
+
+    def map(self, calls):
+        """
+        Ejecuta varias llamadas en paralelo (respetando tasa y concurrencia).
+
+        Args:
+            calls: Lista de tuplas (method, endpoint, data)
+
+        Returns:
+            list: Un dict por llamada, en el mismo orden:
+                  {'success': True, 'data': ...} o {'success': False, 'error': '...'}
+        """
+        def run(call):
+            method, endpoint, data = call
+            try:
+                return {'success': True, 'data': self.request(method, endpoint, data)}
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
+
+        return list(self.executor.map(run, calls))
+
+
+wc_pool = WooCommerceRestPool()
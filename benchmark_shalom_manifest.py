@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del parser de manifiestos Shalom (tracking masivo)
+
+Genera un manifiesto sintético (26 filas por envío, datos en la columna A)
+y compara:
+    - legacy: load_workbook completo + lectura de celdas sueltas
+      (como lo hacía bulk_tracking_preview)
+    - streaming: app/utils/excel_manifests.iter_shalom_blocks (read_only)
+
+Mide tiempo y pico de memoria (tracemalloc) y verifica que ambos
+devuelvan los mismos envíos.
+
+Ejecutar: python benchmark_shalom_manifest.py --envios 2000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+
+from app.utils.excel_manifests import SHALOM_BLOCK_ROWS, iter_shalom_blocks
+
+
+def generar_manifiesto(envios, seed=42):
+    """
+    Genera un manifiesto Shalom sintético en memoria.
+
+    Cada bloque de 26 filas trae texto de relleno en la columna A y los
+    datos en A14 (DNI), A15 (teléfono), A23 (orden) y A24 (código).
+    También llena columnas B-F para simular el peso de un manifiesto real.
+    Se usa un Workbook normal (no write_only) para que los textos queden en
+    sharedStrings, como en los archivos que genera Excel.
+
+    Returns:
+        BytesIO: Archivo .xlsx
+    """
+    rng = random.Random(seed)
+    workbook = Workbook()
+    sheet = workbook.active
+
+    for envio in range(envios):
+        for offset in range(SHALOM_BLOCK_ROWS):
+            if offset == 13:
+                value = str(rng.randint(10000000, 99999999))
+            elif offset == 14:
+                value = '9' + str(rng.randint(10000000, 99999999))
+            elif offset == 22:
+                value = f"N° de orden: {rng.randint(10000000, 99999999)}"
+            elif offset == 23:
+                value = f"Código: {rng.choice('ABCDEFGHJK')}{rng.choice('LMNPQRSTUV')}{rng.randint(10, 99)}"
+            else:
+                value = f"Envío {envio + 1} - línea {offset + 1}"
+
+            sheet.append([value] + [f"col{c}-{envio}" for c in range(5)])
+
+    output = BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def parse_legacy(data):
+    """Lectura original: libro completo en memoria y celdas por coordenada."""
+    workbook = load_workbook(BytesIO(data), data_only=True)
+    sheet = workbook.active
+
+    envios = []
+    fila = 1
+    envio_num = 1
+    while True:
+        celda_inicio = sheet[f'A{fila}'].value
+        if not celda_inicio or not str(celda_inicio).strip():
+            break
+
+        envios.append({
+            'envio_num': envio_num,
+            'fila_inicio': fila,
+            'dni_destinatario': str(sheet[f'A{fila + 13}'].value or '').strip(),
+            'tel_destinatario': str(sheet[f'A{fila + 14}'].value or '').strip(),
+            'orden_shalom': str(sheet[f'A{fila + 22}'].value or '').strip(),
+            'codigo_shalom': str(sheet[f'A{fila + 23}'].value or '').strip()
+        })
+        fila += SHALOM_BLOCK_ROWS
+        envio_num += 1
+
+    workbook.close()
+    return envios
+
+
+def parse_streaming(data):
+    return list(iter_shalom_blocks(BytesIO(data), 'manifiesto.xlsx'))
+
+
+def medir(nombre, func, data, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        start = time.perf_counter()
+        resultado = func(data)
+        tiempos.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(data)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{nombre:<10} {min(tiempos) * 1000:>10.1f} ms {pico / 1024 / 1024:>10.1f} MB")
+    return resultado, min(tiempos), pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del parser de manifiestos Shalom')
+    parser.add_argument('--envios', type=int, default=2000, help='Envíos en el manifiesto sintético')
+    parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones por parser (se toma el mejor tiempo)')
+    args = parser.parse_args()
+
+    data = generar_manifiesto(args.envios).getvalue()
+    print(f"Manifiesto: {args.envios} envíos, {args.envios * SHALOM_BLOCK_ROWS} filas, {len(data) / 1024:.0f} KB")
+    print(f"{'parser':<10} {'tiempo':>13} {'memoria pico':>13}")
+
+    legacy, t_legacy, m_legacy = medir('legacy', parse_legacy, data, args.repeticiones)
+    streaming, t_streaming, m_streaming = medir('streaming', parse_streaming, data, args.repeticiones)
+
+    assert legacy == streaming, 'Los parsers devuelven envíos distintos'
+    print(f"\n[OK] {len(streaming)} envíos idénticos - "
+          f"{t_legacy / t_streaming:.1f}x más rápido, {m_legacy / m_streaming:.1f}x menos memoria")
+
+
+if __name__ == '__main__':
+    main()
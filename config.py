@@ -1,5 +1,6 @@
 # config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 from datetime import datetime
@@ -32,11 +33,83 @@ class Config:
     WC_CONSUMER_KEY = os.environ.get('WC_CONSUMER_KEY')
     WC_CONSUMER_SECRET = os.environ.get('WC_CONSUMER_SECRET')
 
+    # Pool REST de WooCommerce para procesos masivos (app/wc_client.py)
+    WC_API_RATE_PER_SECOND = float(os.environ.get('WC_API_RATE_PER_SECOND', 4))
+    WC_API_BURST = int(os.environ.get('WC_API_BURST', 4))
+    WC_API_CONCURRENCY = int(os.environ.get('WC_API_CONCURRENCY', 4))
+    WC_API_MAX_RETRIES = 3
+    WC_API_TIMEOUT = 30
+
     # WordPress API (Media)
     WP_USER = os.environ.get('WP_USER')
     WP_APP_PASSWORD = os.environ.get('WP_APP_PASSWORD')
 
 
+    # Eventos en tiempo real (SSE) del tablero de despacho
+    # 'database' funciona con varios workers de gunicorn; 'memory' solo con un proceso
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'database')
+    EVENTS_POLL_INTERVAL = 1.0        # Segundos entre lecturas de woo_dispatch_events
+    EVENTS_MAX_STREAM_SECONDS = 55    # Duración de cada conexión SSE (menor al timeout de gunicorn)
+
+    # Trabajos en segundo plano (app/jobs.py)
+    # JOBS_QUEUE_URI: None = tablas en la BD de la app; 'sqlite:///jobs.db' para pruebas locales
+    # JOBS_EXECUTOR: 'thread' (hilo en el worker web) o 'process' (python run_jobs_worker.py)
+    JOBS_QUEUE_URI = os.environ.get('JOBS_QUEUE_URI')
+    JOBS_EXECUTOR = os.environ.get('JOBS_EXECUTOR', 'thread')
+    JOBS_STALE_SECONDS = 120          # Sin heartbeat por este tiempo = trabajo huérfano (se retoma)
+
+    # Tablero de despacho: como mucho una sincronización del snapshot
+    # (woo_dispatch_board) con los cambios externos cada tantos segundos por worker
+    DISPATCH_BOARD_REFRESH_SECONDS = 10
+
+    # Tracking masivo Shalom: antigüedad máxima (días) de los pedidos que se
+    # buscan por DNI (tabla woo_shalom_dni_index)
+    SHALOM_DNI_LOOKUP_DAYS = 120
+
+    # Reportes de ganancias: cada cuántos segundos se revisa si cambió
+    # woo_products_fccost para recargar el índice de costos (app/fc_costs.py)
+    FC_COSTS_CHECK_SECONDS = 30
+
+    # Reportes de ganancias: como mucho una sincronización incremental de
+    # woo_order_profit_facts cada tantos segundos por worker (app/profit_facts.py)
+    PROFIT_FACTS_SYNC_SECONDS = 30
+
+    # Tipos de cambio: cada cuántos segundos se revisa si cambió
+    # woo_tipo_cambio para recargar el calendario (app/exchange_rates.py)
+    EXCHANGE_RATES_CHECK_SECONDS = 30
+
+    # Caché de la app (Flask-Caching). SimpleCache es privada de cada worker
+    # de gunicorn; con varios workers usar una compartida:
+    #   - 'FileSystemCache': archivos en CACHE_DIR (workers del mismo servidor)
+    #   - 'RedisCache': CACHE_REDIS_URL (varios servidores; requiere pip install redis)
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_DEFAULT_TIMEOUT = 300       # 5 minutos por defecto
+    CACHE_THRESHOLD = int(os.environ.get('CACHE_THRESHOLD', 5000))   # Máximo de entradas (SimpleCache/FileSystemCache)
+    CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'woo_manager_cache'))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'woo_manager:')
+    CACHE_STATS_FLUSH_SECONDS = 10    # Cada cuánto cada worker publica sus contadores (app/cache_stats.py)
+
+    # Caché de resultados de reportes (app/report_cache.py)
+    # 'local': LRU por proceso; 'shared': además, la caché de Flask-Caching de la app
+    # (usar 'shared' cuando CACHE_TYPE es compartida)
+    REPORT_CACHE_ENABLED = os.environ.get('REPORT_CACHE_ENABLED', 'true').lower() == 'true'
+    REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND', 'local')
+    REPORT_CACHE_MAX_ENTRIES = 512
+    REPORT_CACHE_TODAY_SECONDS = 60   # Vigencia de los rangos que incluyen hoy
+    REPORT_CACHE_PAST_SECONDS = 86400  # Vigencia de los rangos ya cerrados con 'shared' (con 'local', la de hoy)
+
+    # Totales de los listados de pedidos (app/list_counts.py)
+    LIST_COUNT_FRESH_SECONDS = 60      # Total exacto sin recalcular
+    LIST_COUNT_MAX_AGE_SECONDS = 900   # Se sirve como estimación y se recalcula en segundo plano
+
+    # Caché de listados de productos/stock/precios (app/product_cache.py)
+    PRODUCT_CACHE_ENABLED = os.environ.get('PRODUCT_CACHE_ENABLED', 'true').lower() == 'true'
+
+    # Índice de búsqueda de productos (app/product_search.py)
+    PRODUCT_SEARCH_CHECK_SECONDS = 30      # Revisión de productos modificados (incremental)
+    PRODUCT_SEARCH_RELOAD_SECONDS = 3600   # Recarga completa
+
     # Configuración de sesión
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
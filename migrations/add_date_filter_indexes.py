@@ -0,0 +1,68 @@
+# add_date_filter_indexes.py
+"""
+Migración: índices para los filtros por rango de fechas
+
+Los reportes, listados de pedidos y el tablero de despacho filtran por
+date_created_gmt con límites GMT (app/utils/dates.py) en vez de
+DATE(DATE_SUB(...)). Estos índices permiten resolver esos filtros con
+un rango en lugar de recorrer la tabla completa:
+
+    - wpyz_wc_orders (status, date_created_gmt): listados por estado
+      ordenados por fecha y reportes con status + rango
+    - woo_orders_ext (date_created_gmt): reportes de externos y campañas
+    - woo_dispatch_board (date_created_gmt): filtro de fechas del tablero
+
+Es idempotente: omite los índices que ya existen.
+Verificar los planes después: python verify_date_filter_plans.py --explain
+
+Ejecutar: python migrations/add_date_filter_indexes.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path para importar app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# (tabla, nombre del índice, columnas)
+DATE_FILTER_INDEXES = [
+    ('wpyz_wc_orders', 'idx_status_date_created', 'status, date_created_gmt'),
+    ('woo_orders_ext', 'idx_date_created_gmt', 'date_created_gmt'),
+    ('woo_dispatch_board', 'idx_date_created_gmt', 'date_created_gmt'),
+]
+
+
+def add_date_filter_indexes():
+    app = create_app()
+
+    with app.app_context():
+        for table, index_name, columns in DATE_FILTER_INDEXES:
+            try:
+                exists = db.session.execute(text("""
+                    SELECT COUNT(*)
+                    FROM information_schema.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                    AND TABLE_NAME = :table
+                    AND INDEX_NAME = :index_name
+                """), {'table': table, 'index_name': index_name}).scalar()
+
+                if exists:
+                    print(f"✓ {table}.{index_name} ya existe")
+                    continue
+
+                print(f"Creando {table}.{index_name} ({columns})...")
+                db.session.execute(text(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns})"))
+                db.session.commit()
+                print(f"✓ {table}.{index_name} creado")
+
+            except Exception as e:
+                db.session.rollback()
+                print(f"✗ Error al crear {table}.{index_name}: {str(e)}")
+                raise
+
+
+if __name__ == '__main__':
+    add_date_filter_indexes()
@@ -0,0 +1,25 @@
+-- ============================================
+-- Migración: Cursor incremental del tablero de despacho
+-- Fecha: 2026-10-16
+-- Descripción: Agrega updated_at a woo_dispatch_priorities para que
+--              /dispatch/api/orders?since=<cursor> detecte cambios de
+--              prioridad y atendido sin reconstruir todo el tablero
+-- ============================================
+
+-- La aplicación escribe updated_at en UTC (datetime.utcnow), igual que
+-- woo_dispatch_history.changed_at; por eso no se usa ON UPDATE CURRENT_TIMESTAMP
+-- (dependería de la zona horaria de la sesión MySQL)
+ALTER TABLE woo_dispatch_priorities
+ADD COLUMN updated_at DATETIME NULL AFTER priority_note,
+ADD INDEX idx_updated_at (updated_at);
+
+UPDATE woo_dispatch_priorities
+SET updated_at = UTC_TIMESTAMP()
+WHERE updated_at IS NULL;
+
+-- Los filtros por fecha de actualización usan estos índices existentes:
+--   wpyz_wc_orders.date_updated (date_updated_gmt)  -- esquema HPOS
+--   woo_dispatch_history.idx_changed_at (changed_at)
+
+-- Verificar cambios
+DESCRIBE woo_dispatch_priorities;
@@ -0,0 +1,107 @@
+# create_dispatch_board_table.py
+"""
+Script de migración para crear la tabla woo_dispatch_board
+
+Esta tabla es el snapshot materializado del tablero Kanban de despacho:
+una fila por pedido activo con su columna, prioridad, atendido, COD,
+costo de envío y datos del cliente. Se mantiene en cada escritura del
+tablero (ver app/routes/dispatch.py: sync_board_orders).
+
+El script también (re)construye el snapshot desde las tablas fuente, por lo
+que puede volver a ejecutarse si el snapshot queda desincronizado.
+
+Ejecutar: python migrations/create_dispatch_board_table.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path para importar app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# Usar development environment (local database)
+app = create_app('development')
+
+with app.app_context():
+    print("=" * 60)
+    print("Creating dispatch board snapshot table")
+    print("=" * 60)
+
+    try:
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS woo_dispatch_board (
+            order_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+            order_number VARCHAR(50) NOT NULL,
+            whatsapp_number VARCHAR(50),
+
+            -- Ubicación en el tablero
+            board_column VARCHAR(100) NOT NULL DEFAULT 'Por Asignar' COMMENT 'Columna actual del Kanban',
+            shipping_method VARCHAR(255) COMMENT 'Método de envío original',
+            status VARCHAR(20) NOT NULL COMMENT 'Estado del pedido en WooCommerce',
+
+            -- Fechas del pedido (GMT)
+            date_created_gmt DATETIME,
+            source_updated_gmt DATETIME COMMENT 'wpyz_wc_orders.date_updated_gmt sincronizado',
+
+            -- Cliente
+            total_amount DECIMAL(26,8),
+            billing_email VARCHAR(320),
+            first_name VARCHAR(255),
+            last_name VARCHAR(255),
+            phone VARCHAR(100),
+            shipping_district VARCHAR(255),
+            created_by VARCHAR(100),
+
+            -- Estado de despacho
+            is_priority TINYINT(1) NOT NULL DEFAULT 0,
+            priority_level ENUM('normal', 'high', 'urgent') DEFAULT 'normal',
+            is_atendido TINYINT(1) NOT NULL DEFAULT 0,
+            is_cod TINYINT(1) NOT NULL DEFAULT 0 COMMENT 'Es contraentrega',
+            shipping_cost DECIMAL(10,2) DEFAULT 0,
+
+            -- Última sincronización (UTC)
+            updated_at DATETIME NOT NULL COMMENT 'Cursor incremental del tablero',
+
+            -- Índices para queries eficientes
+            INDEX idx_status_priority (status, is_priority, priority_level),
+            INDEX idx_source_updated (source_updated_gmt),
+            INDEX idx_updated_at (updated_at)
+
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+        COMMENT='Materialized snapshot of the dispatch Kanban board';
+        """
+
+        db.session.execute(text(create_table_sql))
+        db.session.commit()
+
+        print("[OK] Table woo_dispatch_board created successfully")
+
+        # Reconstruir el snapshot desde las tablas fuente
+        from app.routes.dispatch import rebuild_dispatch_board
+        total = rebuild_dispatch_board()
+
+        print(f"[OK] Snapshot rebuilt: {total} orders in wc-processing")
+
+        # Mostrar distribución por columna
+        columns = db.session.execute(text("""
+            SELECT board_column, COUNT(*)
+            FROM woo_dispatch_board
+            WHERE status = 'wc-processing'
+            GROUP BY board_column
+        """))
+        print("\nOrders per column:")
+        for col in columns:
+            print(f"  - {col[0]}: {col[1]}")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRATION COMPLETED SUCCESSFULLY")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] Error creating table: {e}")
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
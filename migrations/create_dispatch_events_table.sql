@@ -0,0 +1,22 @@
+-- ============================================
+-- Migración: Eventos en tiempo real del tablero de despacho
+-- Fecha: 2026-10-16
+-- Descripción: Crea woo_dispatch_events, backend compartido del stream
+--              SSE /dispatch/api/events. Cada worker de gunicorn lee los
+--              eventos nuevos por id (EVENTS_BACKEND = 'database')
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS woo_dispatch_events (
+    id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    channel VARCHAR(50) NOT NULL DEFAULT 'dispatch',
+    event_type VARCHAR(50) NOT NULL COMMENT 'move, priority, atendido, note, tracking',
+    payload TEXT NOT NULL COMMENT 'JSON del evento',
+    created_at DATETIME NOT NULL COMMENT 'UTC',
+
+    INDEX idx_channel_id (channel, id),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+COMMENT='Realtime dispatch board events (SSE)';
+
+-- Verificar cambios
+DESCRIBE woo_dispatch_events;
@@ -0,0 +1,48 @@
+-- ============================================
+-- Migración: Trabajos en segundo plano del módulo de despacho
+-- Fecha: 2026-10-16
+-- Descripción: Crea la cola de trabajos (app/jobs.py) usada por el
+--              tracking masivo. Un trabajo tiene un ítem por pedido; el
+--              progreso se consulta en /dispatch/api/jobs/<id>
+--              (Con JOBS_QUEUE_URI=sqlite:///... las tablas se crean solas)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS woo_dispatch_jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL COMMENT 'bulk_tracking, bulk_tracking_simple',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' COMMENT 'queued, running, completed, failed',
+    params TEXT COMMENT 'JSON',
+    total INT NOT NULL DEFAULT 0,
+    processed INT NOT NULL DEFAULT 0,
+    exitosos INT NOT NULL DEFAULT 0,
+    fallidos INT NOT NULL DEFAULT 0,
+    created_by VARCHAR(100),
+    created_at DATETIME NOT NULL COMMENT 'UTC',
+    started_at DATETIME,
+    finished_at DATETIME,
+    heartbeat_at DATETIME COMMENT 'Vencido = trabajo huérfano, se retoma',
+    error TEXT,
+
+    INDEX idx_status (status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+COMMENT='Background jobs queue (bulk tracking)';
+
+CREATE TABLE IF NOT EXISTS woo_dispatch_job_items (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    job_id BIGINT NOT NULL,
+    position INT NOT NULL,
+    order_id BIGINT NOT NULL,
+    tracking_number TEXT,
+    idempotency_key VARCHAR(64) NOT NULL COMMENT 'sha1(pedido:tracking)',
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' COMMENT 'pending, done, failed, skipped',
+    result TEXT COMMENT 'JSON',
+    processed_at DATETIME,
+
+    INDEX idx_job_position (job_id, position),
+    INDEX idx_idempotency_status (idempotency_key, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+COMMENT='Background job items (one per order)';
+
+-- Verificar cambios
+DESCRIBE woo_dispatch_jobs;
+DESCRIBE woo_dispatch_job_items;
@@ -0,0 +1,112 @@
+# create_order_profit_facts_table.py
+"""
+Script de migración para crear la tabla woo_order_profit_facts
+
+Esta tabla guarda por pedido (cabecera, order_item_id = 0) y por
+line_item los montos, el costo FC en USD y el tipo de cambio ya resueltos,
+para que los reportes de ganancias agreguen sobre ella en vez de recalcular
+desde wpyz_woocommerce_order_itemmeta y wpyz_postmeta (ver
+app/profit_facts.py). Se mantiene de forma incremental en cada reporte.
+
+El script también llena la tabla con todos los pedidos; puede volver a
+ejecutarse para reconstruirla (por ejemplo después de importar costos FC
+sin pasar por /reports/api/profits/facts/rebuild).
+
+Ejecutar: python migrations/create_order_profit_facts_table.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path para importar app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# Usar development environment (local database)
+app = create_app('development')
+
+with app.app_context():
+    print("=" * 60)
+    print("Creating order profit facts table")
+    print("=" * 60)
+
+    try:
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS woo_order_profit_facts (
+            order_id BIGINT UNSIGNED NOT NULL,
+            order_item_id BIGINT UNSIGNED NOT NULL COMMENT '0 = cabecera del pedido',
+
+            -- Comunes (cabecera y líneas)
+            order_type VARCHAR(20),
+            status VARCHAR(20) NOT NULL,
+            fecha_lima DATE COMMENT 'DATE(date_created_gmt - 5h)',
+            date_created_gmt DATETIME,
+            order_number VARCHAR(50) COMMENT '_order_number (NULL = pedido web)',
+            created_by VARCHAR(100),
+            tipo_cambio DECIMAL(10,4) COMMENT 'Última tasa activa <= fecha_lima',
+
+            -- Cabecera
+            total_amount DECIMAL(12,2),
+            tax_amount DECIMAL(12,2),
+            shipping_cost DECIMAL(12,2),
+            discount_amount DECIMAL(12,2),
+            payment_method_label VARCHAR(255),
+            cost_usd DOUBLE COMMENT 'Suma de líneas con costo FC (NULL si ninguna)',
+            items_count INT,
+            billing_first_name VARCHAR(255),
+            billing_last_name VARCHAR(255),
+            billing_company VARCHAR(255),
+            billing_doc_type VARCHAR(20),
+            billing_business_name VARCHAR(255),
+            is_community VARCHAR(10),
+
+            -- Líneas
+            product_name VARCHAR(255),
+            sku VARCHAR(100),
+            qty DECIMAL(10,2),
+            line_subtotal DECIMAL(12,2),
+            line_subtotal_tax DECIMAL(12,2),
+            line_total DECIMAL(12,2),
+            line_tax DECIMAL(12,2),
+            unit_cost_usd DOUBLE COMMENT 'Suma de componentes FC del SKU (NULL si ninguno)',
+
+            source_updated_gmt DATETIME COMMENT 'wpyz_wc_orders.date_updated_gmt sincronizado',
+
+            PRIMARY KEY (order_id, order_item_id),
+
+            -- Índices para queries eficientes
+            INDEX idx_fecha_item (fecha_lima, order_item_id),
+            INDEX idx_date_created (date_created_gmt),
+            INDEX idx_source_updated (source_updated_gmt)
+
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+        COMMENT='Per-order and per-line profit facts for the profit reports';
+        """
+
+        db.session.execute(text(create_table_sql))
+        db.session.execute(text("DELETE FROM woo_order_profit_facts"))
+        db.session.commit()
+
+        print("[OK] Table woo_order_profit_facts created successfully")
+
+        # Llenar la tabla con todos los pedidos
+        from app.profit_facts import all_order_ids, rebuild_profit_facts
+        total = rebuild_profit_facts(all_order_ids())
+
+        orders, lines = db.session.execute(text("""
+            SELECT SUM(order_item_id = 0), SUM(order_item_id > 0) FROM woo_order_profit_facts
+        """)).fetchone()
+
+        print(f"[OK] Facts built: {total} orders ({orders or 0} headers, {lines or 0} lines)")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRATION COMPLETED SUCCESSFULLY")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] Error creating table: {e}")
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
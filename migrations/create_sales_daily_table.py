@@ -0,0 +1,89 @@
+# create_sales_daily_table.py
+"""
+Script de migración para crear la tabla woo_sales_daily
+
+Resumen diario de ventas por día (Lima), canal, estado, método de pago y
+asesor, para que los reportes de series de tiempo no agrupen los pedidos
+por DATE(DATE_SUB(date_created_gmt, INTERVAL 5 HOUR)) (ver
+app/sales_daily.py). Se mantiene por día al sincronizar los hechos de
+ganancia, por lo que woo_order_profit_facts debe existir antes
+(migrations/create_order_profit_facts_table.py).
+
+El script también llena la tabla; puede volver a ejecutarse para
+reconstruirla.
+
+Ejecutar: python migrations/create_sales_daily_table.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path para importar app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# Usar development environment (local database)
+app = create_app('development')
+
+with app.app_context():
+    print("=" * 60)
+    print("Creating daily sales table")
+    print("=" * 60)
+
+    try:
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS woo_sales_daily (
+            fecha_lima DATE NOT NULL COMMENT 'DATE(date_created_gmt - 5h)',
+            channel VARCHAR(20) NOT NULL COMMENT 'woocommerce / whatsapp / external',
+            status VARCHAR(50) NOT NULL,
+            payment_method VARCHAR(255) NOT NULL,
+            advisor VARCHAR(100) NOT NULL DEFAULT '' COMMENT '_created_by ('''' si no tiene)',
+
+            orders_count INT NOT NULL DEFAULT 0,
+            total_amount DECIMAL(14,2),
+            discount_amount DECIMAL(14,2),
+            shipping_cost DECIMAL(14,2),
+            cost_pen DOUBLE COMMENT 'SUM(cost_usd * tipo_cambio); NULL en externos',
+            refreshed_at DATETIME,
+
+            PRIMARY KEY (fecha_lima, channel, status, payment_method, advisor),
+
+            -- Índices para queries eficientes
+            INDEX idx_channel_fecha (channel, fecha_lima)
+
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+        COMMENT='Daily sales rollup for the time-series reports';
+        """
+
+        db.session.execute(text(create_table_sql))
+        db.session.commit()
+
+        print("[OK] Table woo_sales_daily created successfully")
+
+        # Llenar la tabla (los hechos de ganancia se sincronizan primero)
+        from app.profit_facts import sync_profit_facts
+        from app.sales_daily import rebuild_sales_daily
+
+        synced = sync_profit_facts()
+        print(f"[OK] Profit facts synced: {synced} orders")
+
+        rebuild_sales_daily()
+        db.session.commit()
+
+        rows, days = db.session.execute(text("""
+            SELECT COUNT(*), COUNT(DISTINCT fecha_lima) FROM woo_sales_daily
+        """)).fetchone()
+
+        print(f"[OK] Daily sales built: {rows} rows over {days} days")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRATION COMPLETED SUCCESSFULLY")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] Error creating table: {e}")
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
@@ -0,0 +1,79 @@
+# create_shalom_dni_index_table.py
+"""
+Script de migración para crear la tabla woo_shalom_dni_index
+
+Esta tabla indexa por DNI normalizado los pedidos recientes
+(SHALOM_DNI_LOOKUP_DAYS) para que el preview del tracking masivo Shalom
+busque solo los DNIs del Excel. Se mantiene de forma incremental en cada
+preview (ver app/routes/dispatch.py: refresh_shalom_dni_index).
+
+El script también llena el índice con la ventana configurada; puede
+volver a ejecutarse para regenerarlo.
+
+Ejecutar: python migrations/create_shalom_dni_index_table.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path para importar app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# Usar development environment (local database)
+app = create_app('development')
+
+with app.app_context():
+    print("=" * 60)
+    print("Creating Shalom DNI lookup table")
+    print("=" * 60)
+
+    try:
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS woo_shalom_dni_index (
+            order_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+            dni_key VARCHAR(20) COMMENT 'DNI normalizado (solo dígitos, sin ceros iniciales); NULL si no aplica',
+            dni_original VARCHAR(100),
+            order_number VARCHAR(50) NOT NULL,
+            customer_name VARCHAR(255),
+            status VARCHAR(20) NOT NULL,
+            date_created_gmt DATETIME,
+            source_updated_gmt DATETIME COMMENT 'wpyz_wc_orders.date_updated_gmt indexado',
+
+            -- Índices para queries eficientes
+            INDEX idx_dni_key (dni_key),
+            INDEX idx_source_updated (source_updated_gmt),
+            INDEX idx_date_created (date_created_gmt)
+
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_520_ci
+        COMMENT='Recent orders indexed by normalized billing DNI (Shalom bulk tracking)';
+        """
+
+        db.session.execute(text(create_table_sql))
+        db.session.execute(text("DELETE FROM woo_shalom_dni_index"))
+        db.session.commit()
+
+        print("[OK] Table woo_shalom_dni_index created successfully")
+
+        # Llenar el índice con la ventana configurada
+        from app.routes.dispatch import refresh_shalom_dni_index
+        refresh_shalom_dni_index()
+
+        total, shalom = db.session.execute(text("""
+            SELECT COUNT(*), COUNT(dni_key) FROM woo_shalom_dni_index
+        """)).fetchone()
+
+        print(f"[OK] Index built: {total} orders in window, {shalom} Shalom orders with DNI")
+        print(f"     Window: {app.config.get('SHALOM_DNI_LOOKUP_DAYS', 120)} days")
+
+        print("\n" + "=" * 60)
+        print("[OK] MIGRATION COMPLETED SUCCESSFULLY")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] Error creating table: {e}")
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
@@ -0,0 +1,29 @@
+# run_jobs_worker.py
+"""
+Worker de trabajos en segundo plano (tracking masivo)
+
+Se usa con JOBS_EXECUTOR=process: el servidor web solo encola los trabajos
+y este proceso los ejecuta. También retoma los trabajos que quedaron a
+medias si un worker se reinició.
+
+Ejecutar: python run_jobs_worker.py
+"""
+
+from app import create_app
+from app.jobs import jobs
+import sys
+
+# Configurar encoding para Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Crear la aplicación (registra los handlers de los blueprints)
+app = create_app()
+
+if __name__ == '__main__':
+    print(f"\n{'='*50}")
+    print(f"Worker de trabajos - {app.config['ENVIRONMENT'].upper()}")
+    print(f"Cola: {app.config.get('JOBS_QUEUE_URI') or 'BD de la aplicación'}")
+    print(f"{'='*50}\n")
+
+    jobs.run_worker()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Verificación de filtros por fecha sargables (app/utils/dates.py)
+
+Dos comprobaciones; el script termina con código 1 si alguna falla:
+
+    - Estática (siempre): busca en app/ filtros WHERE/AND que envuelven
+      una columna *_gmt en funciones (DATE(DATE_SUB(o.date_created_gmt ...)),
+      DATE(...), DATE_FORMAT(...)), que impiden usar el índice
+    - --explain: ejecuta EXPLAIN de las consultas representativas contra la
+      base configurada y falla si la tabla filtrada no tiene índice posible
+      (possible_keys vacío = recorrido completo). Si hay índice posible pero
+      MySQL elige type=ALL solo se advierte (tablas pequeñas)
+
+Ejecutar:
+    python verify_date_filter_plans.py
+    python verify_date_filter_plans.py --explain
+"""
+import argparse
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Columna *_gmt dentro de una función en una condición
+NON_SARGABLE_RE = re.compile(
+    r'\b(WHERE|AND|OR)\s+\(?\s*(DATE|DATE_SUB|DATE_ADD|DATE_FORMAT|YEAR|MONTH|CONVERT_TZ)\s*\(\s*'
+    r'(DATE_SUB\s*\(\s*|CONVERT_TZ\s*\(\s*)?[\w.]*_gmt\b',
+    re.IGNORECASE
+)
+
+# (descripción, tabla filtrada (alias), SQL con :since_gmt/:until_gmt o :start/:end)
+EXPLAIN_QUERIES = [
+    ('Reportes sobre wpyz_wc_orders', 'o', """
+        SELECT o.status, COUNT(*) FROM wpyz_wc_orders o
+        WHERE {wc_orders} AND o.status != 'trash'
+        GROUP BY o.status
+    """),
+    ('Listado por estado ordenado por fecha', 'o', """
+        SELECT o.id FROM wpyz_wc_orders o
+        WHERE o.status = 'wc-processing'
+        ORDER BY o.date_created_gmt DESC
+        LIMIT 20
+    """),
+    ('Pedidos externos', 'oext', """
+        SELECT oext.id FROM woo_orders_ext oext
+        WHERE {orders_ext}
+    """),
+    ('Tablero de despacho', 'b', """
+        SELECT b.order_id FROM woo_dispatch_board b
+        WHERE {dispatch_board}
+    """),
+    ('Hechos de ganancia', 'f', """
+        SELECT f.order_id FROM woo_order_profit_facts f
+        WHERE f.order_item_id = 0 AND f.fecha_lima BETWEEN :start AND :end
+    """),
+    ('Resumen diario', 'd', """
+        SELECT d.fecha_lima, SUM(d.orders_count) FROM woo_sales_daily d
+        WHERE d.fecha_lima BETWEEN :start AND :end AND d.channel = 'whatsapp'
+        GROUP BY d.fecha_lima
+    """),
+]
+
+
+def check_sources():
+    """Filtros no sargables en app/: lista de (archivo, línea, texto)."""
+    problems = []
+    for dirpath, _, filenames in os.walk(os.path.join(ROOT, 'app')):
+        for filename in filenames:
+            if not filename.endswith('.py'):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if NON_SARGABLE_RE.search(line):
+                        problems.append((os.path.relpath(path, ROOT), line_number, line.strip()))
+    return problems
+
+
+def check_plans(start, end):
+    """EXPLAIN de EXPLAIN_QUERIES: (errores, advertencias)."""
+    from sqlalchemy import text
+
+    from app import create_app, db
+    from app.utils.dates import lima_range_filter, lima_range_params
+
+    filters = {
+        'wc_orders': lima_range_filter('o.date_created_gmt'),
+        'orders_ext': lima_range_filter('oext.date_created_gmt'),
+        'dispatch_board': lima_range_filter('b.date_created_gmt'),
+    }
+    params = {'start': start, 'end': end, **lima_range_params(start, end)}
+
+    errors, warnings = [], []
+    app = create_app()
+    with app.app_context():
+        for description, alias, sql in EXPLAIN_QUERIES:
+            rows = db.session.execute(text('EXPLAIN ' + sql.format(**filters)), params).mappings().all()
+            plan = next((row for row in rows if row['table'] == alias), None)
+            if plan is None:
+                warnings.append(f'{description}: sin fila de plan para {alias}')
+                continue
+
+            summary = f"type={plan['type']} possible_keys={plan['possible_keys']} key={plan['key']} rows={plan['rows']}"
+            print(f'  {description}: {summary}')
+            if not plan['possible_keys'] and plan['type'] == 'ALL':
+                errors.append(f'{description}: recorrido completo sin índice posible ({summary})')
+            elif plan['type'] == 'ALL':
+                warnings.append(f'{description}: MySQL eligió recorrido completo ({summary})')
+    return errors, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--explain', action='store_true', help='Ejecutar EXPLAIN contra la base configurada')
+    parser.add_argument('--desde', default='2025-01-01')
+    parser.add_argument('--hasta', default='2025-01-31')
+    args = parser.parse_args()
+
+    failed = False
+
+    print('Filtros por fecha en app/:')
+    problems = check_sources()
+    for path, line_number, line in problems:
+        print(f'  ✗ {path}:{line_number}: {line}')
+    if problems:
+        failed = True
+    else:
+        print('  ✓ Sin columnas *_gmt envueltas en funciones')
+
+    if args.explain:
+        print(f'\nPlanes ({args.desde} a {args.hasta}):')
+        errors, warnings = check_plans(args.desde, args.hasta)
+        for warning in warnings:
+            print(f'  ! {warning}')
+        for error in errors:
+            print(f'  ✗ {error}')
+        if errors:
+            failed = True
+        else:
+            print('  ✓ Todas las consultas tienen índice posible')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Verificación del calendario de tipos de cambio (app/exchange_rates.py)
+
+Genera tasas sintéticas (días hábiles, algunas inactivas y fechas
+repetidas) y compara RateCalendar contra:
+    - legacy_python: el recorrido de los reportes externos
+      (for tc_date, rate in tc_rows: if str(tc_date) <= str(fecha))
+    - legacy_model: TipoCambio.get_tasa_por_fecha (fecha exacta y si no,
+      la más cercana anterior)
+
+Ejecutar: python verify_exchange_rate_calendar.py --dias 1500 --pedidos 20000
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.exchange_rates import RateCalendar, RateEntry
+
+
+def generar_tasas(dias, seed=11):
+    rng = random.Random(seed)
+    inicio = date(2021, 1, 1)
+    filas = []   # (RateEntry, activo)
+    next_id = 1
+    for offset in range(dias):
+        fecha = inicio + timedelta(days=offset)
+        if fecha.weekday() >= 5 or rng.random() < 0.05:
+            continue
+        for _ in range(2 if rng.random() < 0.02 else 1):
+            compra = Decimal(str(round(rng.uniform(3.5, 4.0), 4)))
+            venta = compra + Decimal('0.0100')
+            entry = RateEntry(next_id, fecha, compra, venta, (compra + venta) / 2, 'admin', '')
+            filas.append((entry, rng.random() > 0.03))
+            next_id += 1
+    return inicio, filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verificación del calendario de tipos de cambio')
+    parser.add_argument('--dias', type=int, default=1500, help='Días de historia de tasas')
+    parser.add_argument('--pedidos', type=int, default=20000, help='Fechas de pedido a resolver')
+    args = parser.parse_args()
+
+    inicio, filas = generar_tasas(args.dias)
+    activas = [entry for entry, activo in filas if activo]
+    calendario = RateCalendar(activas)
+    print(f"Tasas: {len(filas)} filas, {len(activas)} activas, {len(calendario)} fechas")
+
+    rng = random.Random(3)
+    fechas = [
+        datetime.combine(inicio, datetime.min.time()) + timedelta(minutes=rng.randint(-3 * 1440, (args.dias + 5) * 1440))
+        for _ in range(args.pedidos)
+    ]
+
+    # 1. Paridad con el recorrido de los reportes externos (mayor id gana en fechas repetidas)
+    tc_rows = [(e.fecha, e.tasa_promedio) for e in sorted(activas, key=lambda e: (e.fecha, e.id), reverse=True)]
+
+    def get_tc_for_date(order_date):
+        order_date_str = str(order_date)
+        for tc_date, rate in tc_rows:
+            if str(tc_date) <= order_date_str:
+                return float(rate)
+        return 3.8
+
+    start = time.perf_counter()
+    esperado = [get_tc_for_date(fecha) for fecha in fechas]
+    t_legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    obtenido = [calendario.rate_for(fecha, default=3.8) for fecha in fechas]
+    t_calendar = time.perf_counter() - start
+
+    diferencias = [(f, e, o) for f, e, o in zip(fechas, esperado, obtenido) if e != o]
+    assert not diferencias, f"Difiere del recorrido Python: {diferencias[:5]}"
+    print(f"[OK] legacy_python: {len(fechas)} tasas idénticas - "
+          f"{t_legacy * 1000:.0f} ms vs {t_calendar * 1000:.0f} ms ({t_legacy / t_calendar:.0f}x)")
+
+    # 2. Paridad con get_tasa_por_fecha (exacta o la más cercana anterior)
+    for fecha in fechas[:5000]:
+        dia = fecha.date()
+        exactas = [e for e in activas if e.fecha == dia]
+        anteriores = [e for e in activas if e.fecha <= dia]
+        esperado_modelo = max(exactas or anteriores, key=lambda e: (e.fecha, e.id), default=None)
+        assert calendario.entry_for(dia) == esperado_modelo, f"Registro distinto para {dia}"
+    print("[OK] legacy_model: 5000 fechas con el mismo registro")
+
+    # 3. Casos borde
+    assert calendario.entry_for(inicio - timedelta(days=1)) is None
+    assert calendario.rate_for('2000-01-01', default=3.75) == 3.75
+    assert calendario.entry_for(str(fechas[0])) == calendario.entry_for(fechas[0])
+    assert calendario.latest() == max(activas, key=lambda e: (e.fecha, e.id))
+    assert RateCalendar([]).latest() is None and RateCalendar([]).rate_for(date.today()) is None
+    print("[OK] casos borde")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Verificación del índice de costos FC (app/fc_costs.py)
+
+Genera un catálogo sintético de woo_products_fccost y SKUs de WooCommerce
+(simples, combos 'AAA1111-BBB2222', con prefijos/sufijos y sin costo) y
+compara FCCostIndex contra:
+    - legacy_python: el recorrido original de los reportes
+      (for fc_sku, cost in fc_costs_map.items(): if fc_sku in sku)
+    - legacy_sql: SUM(fc.FCLastCost) ... LIKE CONCAT('%', fc.sku, '%')
+      con collation *_ci (sin distinguir mayúsculas)
+
+Los costos deben ser idénticos (mismo orden de suma = mismos bits).
+También mide el tiempo de ambos enfoques.
+
+Ejecutar: python verify_fc_cost_resolver.py --fc 5000 --skus 20000
+"""
+import argparse
+import random
+import string
+import time
+
+from app.fc_costs import FCCostIndex
+
+
+def generar_catalogo(n_fc, n_skus, seed=7):
+    rng = random.Random(seed)
+
+    def fc_sku():
+        return ''.join(rng.choice(string.ascii_uppercase) for _ in range(3)) + str(rng.randint(1000, 9999))
+
+    fc_rows = []
+    seen = set()
+    while len(fc_rows) < n_fc:
+        sku = fc_sku()
+        if sku in seen:
+            continue
+        seen.add(sku)
+        fc_rows.append((sku, round(rng.uniform(0.5, 80), 4)))
+
+    fc_skus = [row[0] for row in fc_rows]
+    woo_skus = []
+    for _ in range(n_skus):
+        kind = rng.random()
+        if kind < 0.45:
+            sku = rng.choice(fc_skus)
+        elif kind < 0.7:
+            sku = '-'.join(rng.sample(fc_skus, rng.randint(2, 3)))
+        elif kind < 0.85:
+            sku = f"{rng.choice(fc_skus)}-{rng.choice(['NEGRO', 'AZUL', 'XL', 'V2'])}"
+        elif kind < 0.93:
+            sku = fc_sku()   # Sin costo (casi siempre)
+        else:
+            sku = rng.choice(['', None])
+        woo_skus.append(sku)
+
+    return fc_rows, woo_skus
+
+
+def legacy_sql(fc_rows, sku):
+    """LIKE CONCAT('%', fc.sku, '%') con collation _ci: None si no hay match."""
+    if sku is None:
+        return None
+    matches = [float(cost or 0) for fc_sku, cost in fc_rows if fc_sku.upper() in sku.upper()]
+    return sum(matches) if matches else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verificación del índice de costos FC')
+    parser.add_argument('--fc', type=int, default=5000, help='SKUs en woo_products_fccost')
+    parser.add_argument('--skus', type=int, default=20000, help='SKUs de WooCommerce a resolver')
+    args = parser.parse_args()
+
+    fc_rows, woo_skus = generar_catalogo(args.fc, args.skus)
+    print(f"Catálogo: {len(fc_rows)} SKUs FC, {len(woo_skus)} SKUs Woo")
+
+    # 1. Paridad con el recorrido en Python
+    fc_costs_map = {row[0]: float(row[1] or 0) for row in fc_rows}
+    start = time.perf_counter()
+    esperado = []
+    for sku in woo_skus:
+        cost_unit = 0.0
+        if sku:
+            for fc_sku, cost in fc_costs_map.items():
+                if fc_sku in sku:
+                    cost_unit += cost
+        esperado.append(cost_unit)
+    t_legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = FCCostIndex(fc_rows)
+    obtenido = [index.unit_cost(sku) for sku in woo_skus]
+    t_index = time.perf_counter() - start
+
+    diferencias = [(sku, e, o) for sku, e, o in zip(woo_skus, esperado, obtenido) if e != o]
+    assert not diferencias, f"Difiere del recorrido Python: {diferencias[:5]}"
+    print(f"[OK] legacy_python: {len(woo_skus)} costos idénticos - "
+          f"{t_legacy * 1000:.0f} ms vs {t_index * 1000:.0f} ms ({t_legacy / t_index:.0f}x)")
+
+    # 2. Paridad con el LIKE de SQL (incluye SKUs en minúsculas)
+    muestra = woo_skus[:2000] + [sku.lower() for sku in woo_skus[:500] if sku]
+    for sku in muestra:
+        componentes = index.components(sku)
+        obtenido_sql = sum(cost for _, cost in componentes) if componentes else None
+        esperado_sql = legacy_sql(fc_rows, sku)
+        assert (obtenido_sql is None) == (esperado_sql is None), f"Match distinto para {sku!r}"
+        if esperado_sql is not None:
+            assert abs(obtenido_sql - esperado_sql) < 1e-9, f"Costo distinto para {sku!r}"
+    print(f"[OK] legacy_sql: {len(muestra)} SKUs con el mismo match y costo")
+
+    # 3. Casos borde
+    index = FCCostIndex([('ABC1234', 10), ('XYZ5678', 2.5), ('abc1234', 1), ('DEF0000', None)])
+    assert index.unit_cost('ABC1234-XYZ5678') == 10 + 1 + 2.5
+    assert index.unit_cost('ABC1234ABC1234') == 11          # Un componente se suma una sola vez
+    assert index.components('DEF0000') == (('DEF0000', 0.0),)
+    assert index.unit_cost('ABC123') == 0.0
+    assert index.unit_cost(None) == 0.0 and index.components('') == ()
+    print("[OK] casos borde")
+
+
+if __name__ == '__main__':
+    main()